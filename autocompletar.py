@@ -0,0 +1,70 @@
+import bisect
+import re
+
+from duplicados import digitos_telefono
+from texto import normalizar
+
+# Índice de prefijos para autocompletar clientes mientras se escribe. Cada
+# palabra del nombre normalizado y los últimos 8 dígitos del teléfono van a
+# una lista ordenada; buscar es una búsqueda binaria por la palabra más
+# escasa de la consulta y un filtro sobre esos pocos candidatos.
+
+MAX_SUGERENCIAS = 8
+_FIN = "\uffff"
+
+
+class IndicePrefijos:
+    def __init__(self, clientes, claves_cliente=None):
+        self.clientes = list(clientes)
+        self._nombres = []
+        entradas = []
+        for posicion, cliente in enumerate(self.clientes):
+            nombre = claves_cliente(cliente).nombre if claves_cliente else normalizar(cliente.get("nombre_completo", ""))
+            palabras = nombre.split()
+            self._nombres.append(palabras)
+            for palabra in set(palabras):
+                entradas.append((palabra, posicion))
+            telefono = digitos_telefono(cliente.get("telefono", ""))
+            if telefono:
+                entradas.append((telefono, posicion))
+        entradas.sort()
+        self._palabras = [palabra for palabra, _ in entradas]
+        self._posiciones = [posicion for _, posicion in entradas]
+
+    def __len__(self):
+        return len(self.clientes)
+
+    def _rango(self, prefijo):
+        inicio = bisect.bisect_left(self._palabras, prefijo)
+        fin = bisect.bisect_left(self._palabras, prefijo + _FIN, inicio)
+        return inicio, fin
+
+    def buscar(self, texto, limite=MAX_SUGERENCIAS):
+        consulta = normalizar(texto or "").strip()
+        if not consulta:
+            return []
+        solo_digitos = re.sub(r"[\s+\-]", "", consulta)
+        if solo_digitos.isdigit():
+            # Un teléfono escrito completo se busca por sus últimos 8 dígitos
+            prefijos = [solo_digitos[-8:] if len(solo_digitos) >= 8 else solo_digitos]
+        else:
+            prefijos = consulta.split()
+
+        rangos = sorted((self._rango(p) for p in prefijos), key=lambda r: r[1] - r[0])
+        inicio, fin = rangos[0]
+        if inicio == fin:
+            return []
+        resto = prefijos if len(prefijos) > 1 else []
+        vistos = set()
+        resultados = []
+        for i in range(inicio, fin):
+            posicion = self._posiciones[i]
+            if posicion in vistos:
+                continue
+            vistos.add(posicion)
+            palabras = self._nombres[posicion]
+            if all(any(p.startswith(prefijo) for p in palabras) for prefijo in resto):
+                resultados.append(self.clientes[posicion])
+                if len(resultados) >= limite:
+                    break
+        return resultados
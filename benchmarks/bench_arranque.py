@@ -0,0 +1,53 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datos_sinteticos import generar_datos
+
+# Tiempo hasta la primera pintura y hasta que la ventana queda interactiva.
+# Lanza `index.py --medir-arranque` varias veces sobre un db.json sintético;
+# la aplicación imprime sus fases (segundos desde el inicio del proceso) y se
+# cierra sola. Necesita una pantalla (DISPLAY) disponible.
+
+INDEX = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "index.py")
+TAMANOS = (1_000, 10_000, 100_000)
+REPETICIONES = 5
+
+
+def medir(n, repeticiones=REPETICIONES):
+    with tempfile.TemporaryDirectory() as carpeta:
+        with open(os.path.join(carpeta, "db.json"), "w", encoding="utf-8") as f:
+            json.dump(generar_datos(n), f, indent=4, ensure_ascii=False)
+        corridas = []
+        for _ in range(repeticiones):
+            proceso = subprocess.run(
+                [sys.executable, INDEX, "--medir-arranque"],
+                cwd=carpeta, capture_output=True, text=True, timeout=300,
+                env=dict(os.environ, CONTROL_REPARTO_VIGILANTE="0")
+            )
+            if proceso.returncode != 0:
+                error = proceso.stderr.strip().splitlines()
+                raise RuntimeError(error[-1] if error else f"index.py terminó con código {proceso.returncode}")
+            corridas.append(json.loads(proceso.stdout.strip().splitlines()[-1]))
+    fases = corridas[0].keys()
+    return {fase: statistics.median(c[fase] for c in corridas if fase in c) for fase in fases}
+
+
+def main():
+    for n in TAMANOS:
+        try:
+            fases = medir(n)
+        except RuntimeError as e:
+            print(f"No se pudo medir el arranque: {e}")
+            return
+        detalle = "  ".join(f"{fase} {segundos * 1000:.0f}ms" for fase, segundos in fases.items())
+        print(f"{n:>8}: {detalle}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import gc
+import os
+import random
+import sys
+import time
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import texto
+from datos_sinteticos import COMUNAS, generar_cliente
+from nucleo import RepartoStore
+
+# Compara la normalización anterior (NFD + categoría por carácter en cada
+# llamada) con la actual (atajo ASCII + caché LRU) sobre 100k nombres, y el
+# efecto de las claves precalculadas en la búsqueda de clientes.
+
+N_NOMBRES = 100_000
+BUSQUEDAS = ["gonzalez", "muñoz", "jose", "maria diaz", "nuñez", "+56 9 12", "ortuzar", "sofia", "xyz", "peña"]
+
+
+def normalizar_anterior(texto):
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', (texto or "").lower())
+        if unicodedata.category(c) != 'Mn'
+    )
+
+
+def buscar_anterior(clientes, consulta):
+    consulta = normalizar_anterior(consulta.strip())
+    return [
+        c for c in clientes
+        if consulta in normalizar_anterior(c.get("nombre_completo", "")) or consulta in normalizar_anterior(c.get("telefono", ""))
+    ]
+
+
+def cronometrar(funcion):
+    gc.collect()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    rng = random.Random(2024)
+    clientes = [generar_cliente(rng) for _ in range(N_NOMBRES)]
+    nombres = [c["nombre_completo"] for c in clientes]
+    corpus = nombres + [c["telefono"] for c in clientes] + [rng.choice(COMUNAS) for _ in range(N_NOMBRES)]
+
+    esperado = [normalizar_anterior(t) for t in corpus]
+    texto.limpiar_cache()
+    if [texto.normalizar(t) for t in corpus] != esperado:
+        raise SystemExit("La normalización nueva no coincide con la anterior")
+
+    print(f"Corpus: {len(corpus)} textos ({len(set(corpus))} distintos)")
+    antes, _ = cronometrar(lambda: [normalizar_anterior(t) for t in corpus])
+    texto.limpiar_cache()
+    frio, _ = cronometrar(lambda: [texto.normalizar(t) for t in corpus])
+    caliente, _ = cronometrar(lambda: [texto.normalizar(t) for t in corpus])
+    print(f"  anterior:          {antes * 1000:8.1f} ms")
+    print(f"  nueva (caché fría):{frio * 1000:8.1f} ms  x{antes / frio:.1f}")
+    print(f"  nueva (caliente):  {caliente * 1000:8.1f} ms  x{antes / caliente:.1f}")
+    print(f"  aciertos de caché: {texto.tasa_aciertos_cache()}")
+
+    store = RepartoStore({"clientes": clientes})
+    antes, previos = cronometrar(lambda: [buscar_anterior(clientes, b) for b in BUSQUEDAS])
+    ahora, actuales = cronometrar(lambda: [store.buscar_clientes(b) for b in BUSQUEDAS])
+    if [len(r) for r in previos] != [len(r) for r in actuales]:
+        raise SystemExit("La búsqueda nueva no devuelve lo mismo que la anterior")
+    print(f"Búsqueda de {len(BUSQUEDAS)} textos en {N_NOMBRES} clientes:")
+    print(f"  anterior: {antes * 1000:8.1f} ms   con claves precalculadas: {ahora * 1000:8.1f} ms  x{antes / ahora:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rutas
+
+# Mide el orden de rutas (vecino más cercano + 2-opt) con paradas aleatorias
+# alrededor de Santiago: matriz en frío, ordenamiento, consulta en caché y
+# recálculo incremental cuando cambian algunas paradas.
+
+TAMANOS = (50, 100, 300, 500)
+
+
+def paradas_aleatorias(n, rng):
+    return [(-33.45 + rng.uniform(-0.12, 0.12), -70.65 + rng.uniform(-0.15, 0.15)) for _ in range(n)]
+
+
+def medir(n, semilla=2024):
+    rng = random.Random(semilla + n)
+    coords = paradas_aleatorias(n, rng)
+    claves = [f"parada {i}|comuna" for i in range(n)]
+    cache = rutas.CacheDistancias()
+
+    inicio = time.perf_counter()
+    dist = cache.matriz("ruta", claves, coords)
+    t_matriz = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    orden = rutas.ordenar_paradas(dist)
+    t_orden = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    cache.matriz("ruta", claves, coords)
+    t_cache = time.perf_counter() - inicio
+
+    # Cambian el 5% de las paradas (clientes editados o nuevos)
+    cambios = max(1, n // 20)
+    for i in rng.sample(range(n), cambios):
+        claves[i] = f"nueva {i}|comuna"
+        coords[i] = paradas_aleatorias(1, rng)[0]
+    inicio = time.perf_counter()
+    cache.matriz("ruta", claves, coords)
+    t_incremental = time.perf_counter() - inicio
+
+    orden_original = list(range(n))
+    return {
+        "paradas": n,
+        "matriz_s": t_matriz,
+        "orden_s": t_orden,
+        "cache_s": t_cache,
+        "incremental_s": t_incremental,
+        "km_sin_ordenar": rutas.longitud_recorrido(dist, orden_original),
+        "km_ordenado": rutas.longitud_recorrido(dist, orden)
+    }
+
+
+def main():
+    print(f"{'Paradas':>8} {'Matriz':>9} {'Orden':>9} {'Caché':>9} {'Increm.':>9} {'km orig.':>10} {'km ruta':>10}")
+    for n in TAMANOS:
+        r = medir(n)
+        print(
+            f"{r['paradas']:>8} {r['matriz_s']:>8.3f}s {r['orden_s']:>8.3f}s {r['cache_s']:>8.4f}s "
+            f"{r['incremental_s']:>8.3f}s {r['km_sin_ordenar']:>10.1f} {r['km_ordenado']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
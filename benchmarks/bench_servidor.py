@@ -0,0 +1,95 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import servidor
+from nucleo import RepartoStore
+
+# Varios "repartidores" concurrentes contra el servidor local: cada hilo usa
+# su propia conexión keep-alive y mezcla búsquedas, consultas de ruta,
+# entregas y pagos. Al final se comprueba que no se perdió ninguna entrega.
+
+COMUNAS = ["Maipú", "Ñuñoa", "Estación Central", "Puente Alto", "La Florida", "Peñalolén"]
+DIAS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes"]
+
+
+def crear_store(n, archivo, rng):
+    store = RepartoStore(archivo=archivo)
+    for i in range(n):
+        cliente = store.agregar_cliente(
+            f"Cliente {i}", f"+5691{i:07d}", f"Calle {i % 300} #{i}", rng.choice(COMUNAS), rng.choice(DIAS)
+        )
+        store.agregar_pedido(cliente, rng.randint(5, 20))
+    return store
+
+
+def repartidor(puerto, ids, solicitudes, rng, resultados):
+    cliente = servidor.ClienteReparto(puerto=puerto)
+    entregadas = 0
+    errores = 0
+    for _ in range(solicitudes):
+        accion = rng.random()
+        if accion < 0.5:
+            estado, datos = cliente.entregar(rng.choice(ids), 1)
+            if estado == 200:
+                entregadas += datos["entregadas"]
+        elif accion < 0.7:
+            estado, _ = cliente.pagar(rng.choice(ids), 1000, "Efectivo")
+        elif accion < 0.9:
+            estado, _ = cliente.buscar(f"Cliente {rng.randrange(len(ids))}", 5)
+        else:
+            estado, _ = cliente.rutas(rng.choice(COMUNAS), rng.choice(DIAS))
+        errores += estado != 200
+    cliente.cerrar()
+    resultados.append((entregadas, errores))
+
+
+def medir(clientes=2000, hilos=8, solicitudes=500, semilla=2024):
+    rng = random.Random(semilla)
+    with tempfile.TemporaryDirectory() as carpeta:
+        store = crear_store(clientes, os.path.join(carpeta, "db.json"), rng)
+        pendiente_inicial = sum(c["cajas_de_huevos"] for c in store.clientes)
+        ids = [c["id"] for c in store.clientes]
+        srv = servidor.ServidorReparto(store, "127.0.0.1", 0, geocodigos={})
+        srv.iniciar(escritor_propio=True)
+
+        resultados = []
+        trabajadores = [
+            threading.Thread(target=repartidor, args=(srv.puerto, ids, solicitudes, random.Random(semilla + i), resultados))
+            for i in range(hilos)
+        ]
+        inicio = time.perf_counter()
+        for t in trabajadores:
+            t.start()
+        for t in trabajadores:
+            t.join()
+        segundos = time.perf_counter() - inicio
+        srv.detener()
+
+        entregadas = sum(r[0] for r in resultados)
+        errores = sum(r[1] for r in resultados)
+        guardado = RepartoStore.cargar(store.archivo)
+        pendiente_final = sum(c["cajas_de_huevos"] for c in guardado.clientes)
+        return {
+            "solicitudes": hilos * solicitudes,
+            "segundos": segundos,
+            "por_segundo": hilos * solicitudes / segundos,
+            "errores": errores,
+            "consistente": pendiente_inicial - pendiente_final == entregadas
+        }
+
+
+def main():
+    print(f"{'hilos':>6} {'solicitudes':>12} {'seg':>7} {'sol/s':>8} {'errores':>8} {'consistente':>12}")
+    for hilos in (1, 4, 16):
+        r = medir(hilos=hilos, solicitudes=2000 // hilos)
+        print(f"{hilos:>6} {r['solicitudes']:>12} {r['segundos']:>7.2f} {r['por_segundo']:>8.0f} {r['errores']:>8} {str(r['consistente']):>12}")
+
+
+if __name__ == "__main__":
+    main()
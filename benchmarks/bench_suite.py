@@ -0,0 +1,164 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nucleo
+import reportes_caja
+from datos_sinteticos import COMUNAS, DIAS, TAMANOS, generar_datos
+from nucleo import RepartoStore
+
+# Mide los caminos más usados de la aplicación sobre datos sintéticos de
+# 1k/10k/100k/1M clientes y guarda los resultados en JSON
+# (benchmarks/resultados/<etiqueta>.json) para comparar entre versiones.
+
+CARPETA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+BUSQUEDAS = ["gonzalez", "muñoz", "jose", "maria diaz", "nuñez", "+56 9 12", "ortuzar", "sofia", "xyz", "peña"]
+CONSULTAS = [
+    "comuna in (Maipú, Ñuñoa) and pendiente >= 5 and adeudado > 20000",
+    "nombre ~ gonzalez or telefono ~ 9123",
+    "dia = lunes and not (pendiente = 0)",
+]
+ORDEN_CONSULTAS = [("Comuna", False), ("Total adeudado", True)]
+
+
+def etiqueta_por_defecto():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(CARPETA_RESULTADOS), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "local"
+    return commit or "local"
+
+
+def cronometrar(funcion, repeticiones):
+    # Mejor de N: descarta ruido de otros procesos
+    mejor = None
+    resultado = None
+    for _ in range(repeticiones):
+        gc.collect()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor, resultado
+
+
+def medir(n, carpeta, semilla=2024):
+    repeticiones = 3 if n <= 10_000 else 1
+    datos = generar_datos(n, semilla=semilla)
+    archivo = os.path.join(carpeta, f"db_{n}.json")
+    tiempos = {}
+
+    tiempos["guardar_datos"], _ = cronometrar(lambda: nucleo.guardar_datos(datos, archivo), repeticiones)
+    tiempos["cargar_datos"], datos = cronometrar(lambda: nucleo.cargar_datos(archivo), repeticiones)
+    tiempos["crear_store"], store = cronometrar(lambda: RepartoStore(nucleo.cargar_datos(archivo), archivo), 1)
+
+    def ver_clientes():
+        store.filas_clientes()
+        for comuna, dia in ((COMUNAS[0], None), (None, DIAS[2]), (COMUNAS[1], DIAS[0])):
+            store.filas_clientes(comuna=comuna, dia=dia)
+
+    tiempos["ver_clientes"], _ = cronometrar(ver_clientes, repeticiones)
+    tiempos["buscar_clientes"], _ = cronometrar(lambda: [store.buscar_clientes(texto) for texto in BUSQUEDAS], repeticiones)
+    tiempos["consultas"], _ = cronometrar(
+        lambda: [store.clientes_tabla(consulta=store.compilar_consulta(texto), orden=ORDEN_CONSULTAS) for texto in CONSULTAS],
+        repeticiones
+    )
+    tiempos["resumen"], _ = cronometrar(store.resumen, repeticiones)
+    tiempos["obtener_precio"], _ = cronometrar(
+        lambda: sum(store.obtener_precio(c.get("comuna")) for c in store.clientes), repeticiones
+    )
+
+    def reporte_caja():
+        columnas = reportes_caja.ColumnasCaja(store.movimientos)
+        reportes_caja.reporte_periodos(columnas, "Mensual")
+        reportes_caja.reporte_agrupado(columnas, "referencia", limite=50)
+
+    tiempos["reporte_caja"], _ = cronometrar(reporte_caja, 1)
+
+    # Ventana abierta de nuevo tras registrar un pago: columnas del store
+    def reporte_caja_repetido():
+        store.registrar_pago(store.clientes[0], 1000)
+        columnas = store.columnas_caja()
+        reportes_caja.reporte_periodos(columnas, "Mensual")
+        reportes_caja.reporte_agrupado(columnas, "referencia", limite=50)
+
+    store.columnas_caja()
+    tiempos["reporte_caja_repetido"], _ = cronometrar(reporte_caja_repetido, repeticiones)
+
+    # generar_reparto exporta una comuna, como se usa en la práctica
+    seleccion = store.filtrar(comuna=COMUNAS[0], solo_pendientes=True)
+    salida = os.path.join(carpeta, f"reparto_{n}.xlsx")
+    tiempos["generar_reparto"], _ = cronometrar(lambda: store.exportar_reparto(seleccion, salida), 1)
+
+    return {
+        "clientes": n,
+        "movimientos": len(store.movimientos),
+        "bytes_db": os.path.getsize(archivo),
+        "clientes_exportados": len(seleccion),
+        "segundos": tiempos
+    }
+
+
+def comparar(actual, anterior):
+    print(f"\nComparación con '{anterior['etiqueta']}' (>1 = más lento ahora)")
+    for tamano, resultado in actual["resultados"].items():
+        previo = anterior["resultados"].get(tamano)
+        if not previo:
+            continue
+        partes = []
+        for operacion, segundos in resultado["segundos"].items():
+            antes = previo["segundos"].get(operacion)
+            if antes:
+                partes.append(f"{operacion} x{segundos / antes:.2f}")
+        print(f"{int(tamano):>9}: " + "  ".join(partes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de Control de Reparto")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[t for t in TAMANOS if t <= 100_000])
+    parser.add_argument("--etiqueta", default=None, help="nombre del archivo de resultados (por defecto el commit actual)")
+    parser.add_argument("--comparar", help="archivo JSON de una ejecución anterior")
+    parser.add_argument("--semilla", type=int, default=2024)
+    args = parser.parse_args()
+
+    etiqueta = args.etiqueta or etiqueta_por_defecto()
+    resultado = {
+        "etiqueta": etiqueta,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "semilla": args.semilla,
+        "resultados": {}
+    }
+    with tempfile.TemporaryDirectory() as carpeta:
+        for n in args.tamanos:
+            medicion = medir(n, carpeta, args.semilla)
+            resultado["resultados"][str(n)] = medicion
+            detalle = "  ".join(f"{op} {seg * 1000:.1f}ms" for op, seg in medicion["segundos"].items())
+            print(f"{n:>9}: {detalle}", flush=True)
+
+    os.makedirs(CARPETA_RESULTADOS, exist_ok=True)
+    ruta = os.path.join(CARPETA_RESULTADOS, f"{etiqueta}.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=4, ensure_ascii=False)
+    print(f"\nResultados guardados en {ruta}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
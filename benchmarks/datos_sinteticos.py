@@ -0,0 +1,130 @@
+import argparse
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+# Generador reproducible de datos con la forma de db.json: clientes chilenos
+# con tildes y eñes, comunas de Santiago, días de reparto y movimientos de
+# caja repartidos en varios años. La misma semilla produce los mismos datos.
+
+NOMBRES = [
+    "José", "María", "Sofía", "Martín", "Matías", "Benjamín", "Agustín", "Tomás", "Lucía", "Valentina",
+    "Inés", "Andrés", "Ramón", "Héctor", "Mónica", "Verónica", "Óscar", "Raúl", "Begoña", "Íñigo",
+    "Catalina", "Joaquín", "Florencia", "Constanza", "Cristóbal", "Sebastián", "Ignacia", "Germán", "Rocío", "Fabián"
+]
+APELLIDOS = [
+    "González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva", "Martínez", "Sepúlveda",
+    "Morales", "Rodríguez", "López", "Fuentes", "Hernández", "Torres", "Araya", "Flores", "Espinoza", "Valenzuela",
+    "Castillo", "Tapia", "Reyes", "Gutiérrez", "Castro", "Pizarro", "Álvarez", "Vásquez", "Sánchez", "Núñez",
+    "Ibáñez", "Peña", "Cáceres", "Jiménez", "Fernández", "Gómez", "Ortúzar", "Saavedra", "Carrasco", "Vergara"
+]
+CALLES = [
+    "Av. Pajaritos", "Los Aromos", "Av. Grecia", "Irarrázaval", "José Pedro Alessandri", "Av. Macul",
+    "Camino a Melipilla", "Los Pensamientos", "Av. Ossa", "Pasaje Las Añañucas", "Av. Vicuña Mackenna",
+    "El Peñón", "Santa Rosa", "Gran Avenida", "Av. La Florida", "Los Copihues", "Av. Ecuador", "Av. Alameda",
+    "Los Álamos", "Calle Ñandú", "Av. Departamental", "Tobalaba", "Av. Cordillera", "Pasaje Río Maipo"
+]
+COMUNAS = [
+    "Maipú", "Ñuñoa", "Estación Central", "Peñalolén", "La Florida", "Puente Alto", "San Joaquín", "Macul",
+    "Providencia", "Las Condes", "La Reina", "Quinta Normal", "Conchalí", "Recoleta", "Independencia",
+    "San Miguel", "La Cisterna", "El Bosque", "Pudahuel", "Cerrillos", "Lo Prado", "Renca", "Quilicura",
+    "Huechuraba", "Vitacura", "Lo Barnechea", "San Bernardo", "Peñaflor", "Padre Hurtado", "Colina"
+]
+DIAS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado"]
+METODOS = ["Efectivo", "Transferencia", "Transferencia BancoEstado", "Débito"]
+DESCRIPCIONES_EGRESO = ["Compra de huevos", "Bencina", "Peaje", "Bandejas", "Mantención camioneta"]
+
+TAMANOS = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def generar_cliente(rng):
+    nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+    # Mayúsculas y espacios irregulares, como los escribe la gente
+    if rng.random() < 0.1:
+        nombre = nombre.upper()
+    elif rng.random() < 0.1:
+        nombre = nombre.lower()
+    comuna = rng.choice(COMUNAS)
+    if rng.random() < 0.05:
+        comuna = comuna.lower()
+    total = rng.randint(0, 400)
+    return {
+        "id": uuid.UUID(int=rng.getrandbits(128)).hex,
+        "nombre_completo": nombre,
+        "telefono": f"+56 9 {rng.randint(1000, 9999)} {rng.randint(1000, 9999)}",
+        "direccion": f"{rng.choice(CALLES)} {rng.randint(1, 9999)}",
+        "comuna": comuna,
+        "cajas_de_huevos_total": total,
+        "cajas_de_huevos": rng.randint(0, 12) if rng.random() < 0.6 else 0,
+        "dia_reparto": rng.choice(DIAS) if rng.random() < 0.9 else None
+    }
+
+
+def generar_movimiento(rng, clientes, inicio, segundos_totales):
+    fecha = inicio + timedelta(seconds=rng.randrange(segundos_totales))
+    registro = {
+        "id": fecha.strftime("%Y%m%d%H%M%S") + f"{rng.randrange(1_000_000):06d}",
+        "fecha": fecha.strftime("%d-%m-%Y %H:%M"),
+        "fecha_iso": fecha.isoformat()
+    }
+    azar = rng.random()
+    if azar < 0.7 and clientes:
+        cliente = rng.choice(clientes)
+        metodo = rng.choice(METODOS)
+        registro.update({
+            "tipo": "Ingreso",
+            "monto": float(rng.randint(1, 20) * 3500),
+            "descripcion": f"Pago de {cliente['nombre_completo']}",
+            "referencia": metodo,
+            "cliente": cliente["nombre_completo"],
+            "metodo": metodo
+        })
+    elif azar < 0.95:
+        registro.update({
+            "tipo": "Egreso",
+            "monto": float(rng.randint(5, 300) * 1000),
+            "descripcion": rng.choice(DESCRIPCIONES_EGRESO),
+            "referencia": ""
+        })
+    else:
+        registro.update({"tipo": "Otro", "monto": float(rng.randint(1, 50) * 1000), "descripcion": "Ajuste", "referencia": ""})
+    return registro
+
+
+def generar_datos(n_clientes, n_movimientos=None, anios=4, semilla=2024):
+    rng = random.Random(semilla)
+    clientes = [generar_cliente(rng) for _ in range(n_clientes)]
+    n_movimientos = n_clientes if n_movimientos is None else n_movimientos
+    inicio = datetime(2021, 1, 1)
+    segundos_totales = int(timedelta(days=365 * anios).total_seconds())
+    movimientos = [generar_movimiento(rng, clientes, inicio, segundos_totales) for _ in range(n_movimientos)]
+    # db.json guarda los movimientos en orden de registro
+    movimientos.sort(key=lambda m: m["fecha_iso"])
+    precios = {comuna: rng.choice((3200, 3500, 3800, 4000)) for comuna in rng.sample(COMUNAS, 10)}
+    return {
+        "clientes": clientes,
+        "precio_caja": 3500,
+        "precios_por_comuna": precios,
+        "movimientos": movimientos,
+        "caja_manual": {},
+        "comunas": sorted(COMUNAS),
+        "capacidad_vehiculo": 60
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un db.json sintético reproducible")
+    parser.add_argument("clientes", type=int)
+    parser.add_argument("salida")
+    parser.add_argument("--movimientos", type=int)
+    parser.add_argument("--semilla", type=int, default=2024)
+    args = parser.parse_args()
+    datos = generar_datos(args.clientes, args.movimientos, semilla=args.semilla)
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=4, ensure_ascii=False)
+    print(f"{len(datos['clientes'])} clientes y {len(datos['movimientos'])} movimientos en '{args.salida}'")
+
+
+if __name__ == "__main__":
+    main()
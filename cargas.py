@@ -0,0 +1,110 @@
+import bisect
+from collections import OrderedDict
+
+from texto import normalizar
+
+# División de un reparto en viajes según la capacidad del vehículo.
+# Cada comuna se empaqueta como una unidad para que sus paradas viajen
+# juntas; solo las comunas que no caben en un vehículo se reparten en varios
+# viajes. El empaquetado es "mejor ajuste decreciente" con las capacidades
+# libres en una lista ordenada (bisect), O(n log n) en la práctica.
+
+CAPACIDAD_POR_DEFECTO = 60
+
+
+class Viaje:
+    __slots__ = ("numero", "capacidad", "paradas")
+
+    def __init__(self, capacidad):
+        self.numero = 0
+        self.capacidad = capacidad
+        self.paradas = []
+
+    @property
+    def cajas(self):
+        return sum(cajas for _, cajas in self.paradas)
+
+    @property
+    def libre(self):
+        return self.capacidad - self.cajas
+
+    def comunas(self):
+        vistas = OrderedDict()
+        for cliente, _ in self.paradas:
+            vistas.setdefault(cliente.get("comuna", ""), None)
+        return list(vistas)
+
+
+def _cajas(cliente):
+    try:
+        return max(0, int(cliente.get("cajas_de_huevos", 0) or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _piezas_cliente(cliente, capacidad):
+    # Un pedido más grande que el vehículo se entrega en varias partes
+    cajas = _cajas(cliente)
+    piezas = []
+    while cajas > capacidad:
+        piezas.append((cliente, capacidad))
+        cajas -= capacidad
+    if cajas:
+        piezas.append((cliente, cajas))
+    return piezas
+
+
+def _mejor_ajuste(items, capacidad, viajes):
+    # items: lista de (tamaño, paradas) ordenada de mayor a menor.
+    # libres: lista ordenada de (capacidad_libre, índice_viaje).
+    libres = []
+    for tamano, paradas in items:
+        pos = bisect.bisect_left(libres, (tamano, -1))
+        if pos < len(libres):
+            libre, idx = libres.pop(pos)
+        else:
+            viajes.append(Viaje(capacidad))
+            libre, idx = capacidad, len(viajes) - 1
+        viajes[idx].paradas.extend(paradas)
+        restante = libre - tamano
+        if restante > 0:
+            bisect.insort(libres, (restante, idx))
+    return viajes
+
+
+def planificar_cargas(clientes, capacidad):
+    if capacidad <= 0:
+        raise ValueError("La capacidad del vehículo debe ser mayor a 0.")
+
+    por_comuna = OrderedDict()
+    for cliente in clientes:
+        if _cajas(cliente):
+            por_comuna.setdefault(normalizar(cliente.get("comuna", "")), []).append(cliente)
+
+    viajes = []
+    items = []
+    for grupo in por_comuna.values():
+        piezas = [pieza for cliente in grupo for pieza in _piezas_cliente(cliente, capacidad)]
+        total = sum(cajas for _, cajas in piezas)
+        if total <= capacidad:
+            items.append((total, piezas))
+            continue
+        # Comuna más grande que un vehículo: viajes propios y el sobrante
+        # (el viaje menos lleno) vuelve al empaquetado general.
+        piezas.sort(key=lambda p: p[1], reverse=True)
+        propios = _mejor_ajuste([(cajas, [(cliente, cajas)]) for cliente, cajas in piezas], capacidad, [])
+        propios.sort(key=lambda v: v.cajas, reverse=True)
+        sobrante = propios.pop()
+        viajes.extend(propios)
+        items.append((sobrante.cajas, sobrante.paradas))
+
+    items.sort(key=lambda item: item[0], reverse=True)
+    viajes.extend(_mejor_ajuste(items, capacidad, []))
+
+    # Dentro de cada viaje se respeta el orden original (p. ej. el de la ruta)
+    posicion = {id(cliente): idx for idx, cliente in enumerate(clientes)}
+    viajes.sort(key=lambda v: min(posicion[id(c)] for c, _ in v.paradas))
+    for numero, viaje in enumerate(viajes, start=1):
+        viaje.numero = numero
+        viaje.paradas.sort(key=lambda p: posicion[id(p[0])])
+    return viajes
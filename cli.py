@@ -0,0 +1,556 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import cargas
+import fragmentos
+import nucleo
+import replicacion
+import reportes_caja
+import respaldos
+import rutas
+import servidor
+from concurrencia import ArchivoBloqueado
+from duplicados import digitos_telefono
+from nucleo import ErrorDatos, RepartoStore, formato_moneda
+from texto import normalizar
+
+# Entrada por línea de comandos para operaciones masivas.
+# Cada ejecución carga los datos una vez, aplica todas las operaciones en
+# memoria y guarda una sola vez al final.
+
+FILA_INVALIDA = "línea JSON inválida"
+
+
+class Medidor:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.tiempos = {}
+
+    def medir(self, etapa, funcion, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = funcion(*args, **kwargs)
+        self.tiempos[etapa] = time.perf_counter() - inicio
+        return resultado
+
+    def reportar(self, operaciones, etiqueta="operaciones", salida=sys.stderr):
+        total = time.perf_counter() - self.inicio
+        detalle = " • ".join(f"{etapa}: {segundos * 1000:.0f} ms" for etapa, segundos in self.tiempos.items())
+        ritmo = operaciones / total if total > 0 else 0
+        print(f"{operaciones} {etiqueta} en {total:.2f} s ({ritmo:,.0f}/s) • {detalle}".replace(",", "."), file=salida)
+
+
+def _texto(valor):
+    # En JSON Lines los valores pueden venir como números: se tratan igual
+    # que las celdas de un CSV
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _cantidad(texto):
+    try:
+        return int(texto)
+    except ValueError:
+        raise ValueError(f"cantidad inválida: {texto}") from None
+
+
+def _leer_filas(ruta):
+    # CSV (con encabezado) o JSON Lines, leídos fila a fila. Una línea JSON
+    # que no se puede leer llega como None para informarla como error
+    if ruta == "-":
+        archivo = sys.stdin
+    else:
+        archivo = open(ruta, "r", encoding="utf-8-sig", newline="")
+    try:
+        if ruta.endswith(".jsonl") or ruta.endswith(".ndjson"):
+            for numero, linea in enumerate(archivo, start=1):
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except ValueError:
+                    fila = None
+                if not isinstance(fila, dict):
+                    yield numero, None
+                    continue
+                yield numero, {str(k).strip().lower(): _texto(v) for k, v in fila.items()}
+        else:
+            for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+                yield numero, {(k or "").strip().lower(): (v or "").strip() for k, v in fila.items()}
+    finally:
+        if archivo is not sys.stdin:
+            archivo.close()
+
+
+def _parsear_fecha(texto):
+    if not texto:
+        return None
+    for formato in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Fecha inválida: {texto} (usa dd-mm-aaaa)")
+
+
+class IndiceClientes:
+    def __init__(self, store):
+        self.store = store
+        self.por_telefono = {}
+        self.por_nombre = {}
+        for cliente in store.clientes:
+            self.agregar(cliente)
+
+    def agregar(self, cliente):
+        telefono = digitos_telefono(cliente.get("telefono", ""))
+        if telefono:
+            self.por_telefono.setdefault(telefono, cliente)
+        self.por_nombre.setdefault(normalizar(cliente.get("nombre_completo", "")).strip(), cliente)
+
+    def buscar(self, fila):
+        if fila.get("id"):
+            return self.store.cliente_por_id(fila["id"])
+        telefono = digitos_telefono(fila.get("telefono", ""))
+        if telefono and telefono in self.por_telefono:
+            return self.por_telefono[telefono]
+        nombre = fila.get("nombre") or fila.get("nombre_completo") or fila.get("cliente") or ""
+        return self.por_nombre.get(normalizar(nombre).strip())
+
+
+def _reportar_errores(errores):
+    for numero, mensaje in errores[:10]:
+        print(f"  línea {numero}: {mensaje}", file=sys.stderr)
+    if len(errores) > 10:
+        print(f"  … y {len(errores) - 10} errores más", file=sys.stderr)
+
+
+# ------------------ Subcomandos ------------------
+
+def cmd_import_clients(store, args, medidor):
+    indice = IndiceClientes(store)
+    agregados = omitidos = 0
+    errores = []
+    inicio = time.perf_counter()
+    for numero, fila in _leer_filas(args.archivo):
+        if fila is None:
+            errores.append((numero, FILA_INVALIDA))
+            continue
+        if indice.buscar({"telefono": fila.get("telefono", "")}) and not args.permitir_repetidos:
+            omitidos += 1
+            continue
+        try:
+            cliente = store.agregar_cliente(
+                fila.get("nombre_completo") or fila.get("nombre"),
+                fila.get("telefono"),
+                fila.get("direccion"),
+                fila.get("comuna"),
+                fila.get("dia_reparto") or fila.get("dia")
+            )
+        except ValueError as e:
+            errores.append((numero, str(e)))
+            continue
+        pendiente = fila.get("cajas_de_huevos") or fila.get("pendiente")
+        if pendiente:
+            try:
+                store.agregar_pedido(cliente, _cantidad(pendiente))
+            except ValueError as e:
+                errores.append((numero, str(e)))
+        indice.agregar(cliente)
+        agregados += 1
+    medidor.tiempos["aplicar"] = time.perf_counter() - inicio
+    print(f"Clientes agregados: {agregados} • omitidos por teléfono repetido: {omitidos} • errores: {len(errores)}")
+    _reportar_errores(errores)
+    return agregados, agregados > 0
+
+
+def cmd_add_orders(store, args, medidor):
+    indice = IndiceClientes(store)
+    aplicados = 0
+    total_cajas = 0
+    errores = []
+    inicio = time.perf_counter()
+    for numero, fila in _leer_filas(args.archivo):
+        if fila is None:
+            errores.append((numero, FILA_INVALIDA))
+            continue
+        cliente = indice.buscar(fila)
+        if cliente is None:
+            errores.append((numero, "cliente no encontrado"))
+            continue
+        try:
+            cantidad = _cantidad(fila.get("cantidad") or fila.get("cajas") or "0")
+            store.agregar_pedido(cliente, cantidad)
+        except ValueError as e:
+            errores.append((numero, str(e)))
+            continue
+        aplicados += 1
+        total_cajas += cantidad
+    medidor.tiempos["aplicar"] = time.perf_counter() - inicio
+    print(f"Pedidos aplicados: {aplicados} ({total_cajas} cajas) • errores: {len(errores)}")
+    _reportar_errores(errores)
+    return aplicados, aplicados > 0
+
+
+def _seleccion_reparto(store, args):
+    clientes = store.filtrar(comuna=args.comuna, dia=args.dia, solo_pendientes=True)
+    texto = args.consulta
+    if args.vista:
+        if args.vista not in store.vistas:
+            raise ValueError(f"No existe la vista '{args.vista}'.")
+        texto = store.vistas[args.vista].get("consulta", "")
+    consulta = store.compilar_consulta(texto)
+    return consulta.filtrar(clientes) if consulta else clientes
+
+
+def cmd_export_reparto(store, args, medidor):
+    clientes = _seleccion_reparto(store, args)
+    if not clientes:
+        print("No hay pedidos pendientes para generar reparto.")
+        return 0, False
+    if args.ordenar_ruta:
+        geocodigos = rutas.cargar_geocodigos()
+        clientes, sin_coordenadas = medidor.medir("ruta", rutas.ordenar_por_rutas, clientes, geocodigos)
+        if sin_coordenadas:
+            print(f"{sin_coordenadas} cliente(s) sin coordenadas quedaron al final de su ruta.", file=sys.stderr)
+    viajes = []
+    if args.capacidad:
+        viajes = medidor.medir("cargas", cargas.planificar_cargas, clientes, args.capacidad)
+    nombre_archivo = args.salida or store.nombre_archivo_reparto(store.estandarizar_comuna(args.comuna) if args.comuna else None)
+    total_cajas, total_ganancias = medidor.medir("exportar", store.exportar_reparto, clientes, nombre_archivo, viajes)
+    detalle_viajes = f" en {len(viajes)} viajes" if viajes else ""
+    print(f"Archivo '{nombre_archivo}' generado con {len(clientes)} clientes, {total_cajas} cajas{detalle_viajes} y total {formato_moneda(total_ganancias)}")
+    if args.marcar_entregados:
+        store.marcar_entregados(clientes)
+        return len(clientes), True
+    return len(clientes), False
+
+
+def cmd_mark_delivered(store, args, medidor):
+    if args.archivo:
+        indice = IndiceClientes(store)
+        clientes = []
+        errores = []
+        for numero, fila in _leer_filas(args.archivo):
+            if fila is None:
+                errores.append((numero, FILA_INVALIDA))
+                continue
+            cliente = indice.buscar(fila)
+            if cliente is None:
+                errores.append((numero, "cliente no encontrado"))
+            else:
+                clientes.append(cliente)
+        _reportar_errores(errores)
+    elif args.comuna or args.dia or args.consulta or args.vista or args.todos:
+        clientes = _seleccion_reparto(store, args)
+    else:
+        print("Indica --archivo, --comuna/--dia/--consulta/--vista o --todos.", file=sys.stderr)
+        return 0, False
+    cajas = sum(c.get("cajas_de_huevos", 0) for c in clientes)
+    store.marcar_entregados(clientes)
+    print(f"Clientes marcados como entregados: {len(clientes)} ({cajas} cajas)")
+    return len(clientes), bool(clientes)
+
+
+def cmd_caja_report(store, args, medidor):
+    columnas = medidor.medir("columnas", store.columnas_caja)
+    desde, hasta = args.desde, args.hasta
+    filas = medidor.medir("reporte", reportes_caja.reporte_periodos, columnas, args.periodo, desde, hasta)
+    for fila in filas:
+        print(
+            f"{fila['inicio'].strftime('%d-%m-%Y')} al {fila['fin'].strftime('%d-%m-%Y')}  "
+            f"movs: {fila['movimientos']:>6}  ingresos: {formato_moneda(fila['ingresos']):>14}  "
+            f"egresos: {formato_moneda(fila['egresos']):>14}  neto: {formato_moneda(fila['neto']):>14}"
+        )
+    total = reportes_caja.resumen_total(columnas, desde, hasta)
+    print(
+        f"Total: {total['movimientos']} movimientos • ingresos {formato_moneda(total['ingresos'])} • "
+        f"egresos {formato_moneda(total['egresos'])} • otros {formato_moneda(total['otros'])} • neto {formato_moneda(total['neto'])}"
+    )
+    if args.salida:
+        medidor.medir("exportar", reportes_caja.exportar_reportes_xlsx, columnas, args.salida, args.periodo, desde, hasta)
+        print(f"Reporte guardado en '{args.salida}'")
+    return len(columnas), False
+
+
+def cmd_compact(store, args, medidor):
+    antes = os.path.getsize(store.archivo) if os.path.exists(store.archivo) else 0
+    # Canonizar comunas y eliminar movimientos repetidos por id
+    store.actualizar_comunas_existentes(store.comunas)
+    vistos = set()
+    unicos = []
+    for mov in store.movimientos:
+        mov_id = mov.get("id")
+        if mov_id and mov_id in vistos:
+            continue
+        vistos.add(mov_id)
+        unicos.append(mov)
+    repetidos = len(store.movimientos) - len(unicos)
+    store.movimientos[:] = unicos
+    store.compacto = True
+    # Los fragmentos de clientes también pasan a formato compacto
+    fragmentos.olvidar(store.archivo)
+    if args.simular:
+        print(f"Movimientos repetidos: {repetidos} (sin guardar)")
+        return len(store.clientes) + len(store.movimientos), False
+    # Se guarda aquí mismo para informar el tamaño final
+    medidor.medir("guardar", store.guardar)
+    despues = os.path.getsize(store.archivo)
+    print(f"Archivo compactado: {antes:,} → {despues:,} bytes • movimientos repetidos eliminados: {repetidos}".replace(",", "."))
+    return len(store.clientes) + len(store.movimientos), False
+
+
+def cmd_shard(store, args, medidor):
+    activar = not args.unir
+    if (store.fragmentos is not None) == activar:
+        print("El archivo ya está por comunas." if activar else "El archivo ya es un solo db.json.")
+        return 0, False
+    store.fragmentar(activar)
+    if args.simular:
+        if activar:
+            print(f"Se escribirían {len(fragmentos.agrupar(store.clientes))} archivos de clientes (sin guardar)")
+        else:
+            print(f"Se juntarían los clientes en '{store.archivo}' (sin guardar)")
+        return len(store.clientes), False
+    medidor.medir("guardar", store.guardar)
+    if activar:
+        print(f"Clientes repartidos en {len(fragmentos.agrupar(store.clientes))} archivos en '{fragmentos.carpeta(store.archivo)}'")
+    else:
+        fragmentos.borrar(store.archivo)
+        print(f"Clientes de vuelta en '{store.archivo}'")
+    return len(store.clientes), False
+
+
+def cmd_restore(store, args, medidor):
+    disponibles = respaldos.listar(store.archivo)
+    if args.listar or not disponibles:
+        if not disponibles:
+            print("No hay respaldos.")
+        for respaldo in disponibles:
+            tipo = "completo" if respaldo.es_completo else "delta"
+            print(f"{respaldo.nombre[:22]}  {respaldo.fecha:%d-%m-%Y %H:%M:%S}  {tipo}")
+        return len(disponibles), False
+    respaldo = respaldos.buscar(store.archivo, args.respaldo) if args.respaldo else disponibles[-1]
+    if respaldo is None:
+        raise ValueError(f"No existe el respaldo '{args.respaldo}'.")
+    try:
+        datos = medidor.medir("reconstruir", respaldos.reconstruir, store.archivo, respaldo, disponibles)
+    except respaldos.ErrorRespaldo as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 0, False
+    print(f"Respaldo {respaldo.fecha:%d-%m-%Y %H:%M:%S}: {len(datos.get('clientes', []))} clientes, {len(datos.get('movimientos', []))} movimientos")
+    if args.simular:
+        return 1, False
+    # Lo que había se respalda antes, así restaurar también se puede deshacer
+    respaldos.gestor(store.archivo).respaldar(store.como_dict(), forzar=True)
+    medidor.medir("guardar", nucleo.guardar_datos_versionado, datos, store.archivo, store.compacto, store.version, store.firma_archivo)
+    print(f"Datos restaurados en '{store.archivo}'")
+    return 1, False
+
+
+def cmd_export_changes(store, args, medidor):
+    destino = replicacion.buscar_instalacion(store.replica, args.para) if args.para else None
+    paquete = medidor.medir("exportar", store.exportar_cambios, destino, args.desde)
+    cantidad = len(paquete["clientes"]) + len(paquete["movimientos"]) + len(paquete["entregas"])
+    bajas = sum(len(b) for b in paquete["bajas"].values())
+    if args.simular:
+        print(f"Cambios para exportar: {cantidad} registros, {bajas} eliminados (sin escribir)")
+        return cantidad, False
+    ruta = args.salida or replicacion.nombre_archivo(store, destino)
+    medidor.medir("escribir", replicacion.escribir, paquete, ruta)
+    store.confirmar_exportacion(paquete)
+    print(f"Archivo '{ruta}' generado con {cantidad} registros y {bajas} eliminados ({os.path.getsize(ruta):,} bytes)".replace(",", "."))
+    # Se guarda hasta dónde se exportó
+    return cantidad, True
+
+
+def cmd_import_changes(store, args, medidor):
+    total = 0
+    for ruta in args.archivos:
+        paquete = medidor.medir("leer", replicacion.leer, ruta)
+        resumen = medidor.medir("fusionar", store.importar_cambios, paquete)
+        cantidad = resumen["clientes"] + resumen["movimientos"] + resumen["entregas"] + resumen["eliminados"] + resumen["ajustes"]
+        total += cantidad
+        print(
+            f"{os.path.basename(ruta)} ({paquete.get('nombre') or paquete['origen']}): "
+            f"{resumen['clientes']} clientes ({resumen['sumados']} con cajas sumadas), "
+            f"{resumen['eliminados']} eliminados, {resumen['movimientos']} movimientos, "
+            f"{resumen['entregas']} entregas, {resumen['ajustes']} precios"
+        )
+    return total, True
+
+
+def cmd_replica_info(store, args, medidor):
+    estado = store.replica
+    modificado = False
+    if args.nueva_instalacion:
+        replicacion.nueva_instalacion(store)
+        modificado = True
+    if args.nombre:
+        estado["nombre"] = args.nombre.strip()
+        modificado = True
+    print(f"Esta instalación: {estado['nombre']} ({estado['instalacion']}) • reloj {estado['reloj']}")
+    otras = sorted((set(estado["enviado"]) | set(estado["recibido"])) - {"*"})
+    for instalacion in otras:
+        print(
+            f"  {replicacion.nombre_instalacion(estado, instalacion)} ({instalacion}): "
+            f"enviado hasta {estado['enviado'].get(instalacion, '-')}, recibido hasta {estado['recibido'].get(instalacion, '-')}"
+        )
+    return len(otras), modificado
+
+
+def cmd_serve(store, args, medidor):
+    # Fuera de este equipo cualquiera en la red podría marcar entregas y
+    # pagos: sin --token se genera uno
+    token = args.token
+    if not token and not servidor.es_local(args.host):
+        token = servidor.nuevo_token()
+    srv = servidor.ServidorReparto(store, args.host, args.puerto, token=token)
+    srv.iniciar(escritor_propio=not args.simular)
+    print(f"Servidor escuchando en http://{args.host}:{srv.puerto} (Ctrl+C para detener)", file=sys.stderr)
+    if token and not args.token:
+        print(f"Token para los repartidores: {token} (Authorization: Bearer {token} o ?token={token})", file=sys.stderr)
+    try:
+        if args.simular:
+            # Sin guardar: el hilo principal es el único escritor
+            while True:
+                srv.atender_cola(bloquear=True)
+        else:
+            srv.esperar()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.detener()
+    # Cada lote de cambios ya se guardó desde el escritor
+    return srv.solicitudes, False
+
+
+# ------------------ Parser ------------------
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="index.py", description="Control de Reparto de Huevos — operaciones por lotes")
+    parser.add_argument("--db", default=nucleo.ARCHIVO, help="archivo de datos (por defecto db.json)")
+    parser.add_argument("--simular", action="store_true", help="aplica las operaciones sin guardar")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("import-clients", help="importa clientes desde CSV o JSON Lines")
+    p.add_argument("archivo", help="columnas: nombre_completo, telefono, direccion, comuna, dia_reparto[, cajas_de_huevos]")
+    p.add_argument("--permitir-repetidos", action="store_true", help="no omitir teléfonos ya registrados")
+    p.set_defaults(funcion=cmd_import_clients, etiqueta="clientes")
+
+    p = sub.add_parser("add-orders", help="agrega pedidos desde CSV o JSON Lines")
+    p.add_argument("archivo", help="columnas: id | telefono | nombre, cantidad")
+    p.set_defaults(funcion=cmd_add_orders, etiqueta="pedidos")
+
+    p = sub.add_parser("export-reparto", help="genera la planilla de reparto")
+    p.add_argument("--comuna")
+    p.add_argument("--dia")
+    p.add_argument("--consulta", help='p. ej. "comuna in (Maipú, Ñuñoa) and pendiente >= 5"')
+    p.add_argument("--vista", help="usa la consulta de una vista guardada")
+    p.add_argument("--capacidad", type=int, help="divide el reparto en viajes de esta capacidad")
+    p.add_argument("--ordenar-ruta", action="store_true", help="ordena las paradas con geocodigos.json")
+    p.add_argument("--salida", help="nombre del archivo .xlsx")
+    p.add_argument("--marcar-entregados", action="store_true")
+    p.set_defaults(funcion=cmd_export_reparto, etiqueta="clientes", solo_comuna=True)
+
+    p = sub.add_parser("mark-delivered", help="marca pedidos como entregados (pone 0)")
+    p.add_argument("--archivo", help="CSV/JSON Lines con id | telefono | nombre")
+    p.add_argument("--comuna")
+    p.add_argument("--dia")
+    p.add_argument("--consulta", help='p. ej. "comuna in (Maipú, Ñuñoa) and pendiente >= 5"')
+    p.add_argument("--vista", help="usa la consulta de una vista guardada")
+    p.add_argument("--todos", action="store_true")
+    p.set_defaults(funcion=cmd_mark_delivered, etiqueta="clientes", solo_comuna=True)
+
+    p = sub.add_parser("caja-report", help="reporte de caja por período")
+    p.add_argument("--from", dest="desde", type=_parsear_fecha)
+    p.add_argument("--to", dest="hasta", type=_parsear_fecha)
+    p.add_argument("--periodo", choices=reportes_caja.PERIODOS, default="Mensual")
+    p.add_argument("--salida", help="exporta el reporte a .xlsx")
+    p.set_defaults(funcion=cmd_caja_report, etiqueta="movimientos")
+
+    p = sub.add_parser("serve", help="servidor HTTP/JSON para los repartidores")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--puerto", type=int, default=servidor.PUERTO_POR_DEFECTO)
+    p.add_argument("--token", help="exige 'Authorization: Bearer <token>' en cada solicitud (si falta y --host no es local, se genera uno)")
+    p.set_defaults(funcion=cmd_serve, etiqueta="solicitudes")
+
+    p = sub.add_parser("compact", help="reescribe el archivo de datos en formato compacto")
+    p.set_defaults(funcion=cmd_compact, etiqueta="registros")
+
+    p = sub.add_parser("shard", help="guarda los clientes en un archivo por comuna (bases muy grandes)")
+    p.add_argument("--unir", action="store_true", help="vuelve a guardar todo en un solo db.json")
+    p.set_defaults(funcion=cmd_shard, etiqueta="clientes")
+
+    p = sub.add_parser("restore", help="restaura un respaldo de la carpeta respaldos/")
+    p.add_argument("respaldo", nargs="?", help="fecha del respaldo (AAAAMMDD-HHMMSS...); por defecto el más reciente")
+    p.add_argument("--listar", action="store_true", help="solo muestra los respaldos disponibles")
+    p.set_defaults(funcion=cmd_restore, etiqueta="respaldos")
+
+    p = sub.add_parser("export-changes", help="exporta los cambios para otra instalación (.cambios.json.gz)")
+    p.add_argument("--para", help="id o nombre de la otra instalación; sin esto se exporta todo")
+    p.add_argument("--desde", type=int, help="reloj desde el que exportar (por defecto, la última exportación)")
+    p.add_argument("--salida", help="ruta del archivo de cambios")
+    p.set_defaults(funcion=cmd_export_changes, etiqueta="registros")
+
+    p = sub.add_parser("import-changes", help="incorpora archivos de cambios de otra instalación")
+    p.add_argument("archivos", nargs="+", help="archivos .cambios.json.gz, en el orden en que se exportaron")
+    p.set_defaults(funcion=cmd_import_changes, etiqueta="registros")
+
+    p = sub.add_parser("replica-info", help="muestra o ajusta la identidad de esta instalación")
+    p.add_argument("--nombre", help="nombre de esta instalación (aparece en los archivos de cambios)")
+    p.add_argument("--nueva-instalacion", action="store_true", help="id nuevo tras copiar db.json desde otra instalación")
+    p.set_defaults(funcion=cmd_replica_info, etiqueta="instalaciones")
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    medidor = Medidor()
+    # Un reparto de una sola comuna lee solo su fragmento (si el archivo
+    # está por comunas; si no, se carga todo igual)
+    comunas = None
+    if getattr(args, "solo_comuna", False) and args.comuna and not getattr(args, "archivo", None):
+        comunas = [args.comuna]
+    try:
+        store = medidor.medir("cargar", RepartoStore.cargar, args.db, comunas)
+    except ErrorDatos as e:
+        try:
+            respaldo = nucleo.recuperar_datos(args.db)
+        except OSError as error_recuperar:
+            print(f"Error: {e}. {error_recuperar}", file=sys.stderr)
+            return 2
+        if respaldo is None:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+        print(f"Aviso: {e}. Se recuperó el respaldo del {respaldo.fecha:%d-%m-%Y %H:%M}.", file=sys.stderr)
+        store = RepartoStore.cargar(args.db, comunas)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    try:
+        operaciones, modificado = args.funcion(store, args, medidor)
+    except (OSError, ValueError, json.JSONDecodeError, ArchivoBloqueado, ErrorDatos) as e:
+        # compact, shard y restore guardan ellos mismos
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if modificado and not args.simular:
+        try:
+            medidor.medir("guardar", store.guardar)
+        except (ArchivoBloqueado, ErrorDatos, OSError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        # Cambios de otra copia sobre los mismos clientes: se mantuvo lo de aquí
+        for conflicto in store.conflictos:
+            print(f"Conflicto en {conflicto['nombre']}: {conflicto['motivo']}", file=sys.stderr)
+    medidor.reportar(operaciones, args.etiqueta)
+    return 0
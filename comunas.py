@@ -0,0 +1,59 @@
+import bisect
+import unicodedata
+
+from texto import normalizar
+
+# Registro de comunas ordenado con colación del español: sin distinguir
+# mayúsculas ni tildes en el primer nivel y con la ñ entre la n y la o
+# ("Estación Central" antes de "Estadio", "Ñuñoa" después de "Nogales").
+# La clave de cada nombre se calcula una sola vez; insertar una comuna
+# nueva es una búsqueda binaria en la lista ya ordenada.
+
+_ENIE = "n\x7f"  # la ñ queda después de cualquier "n" seguida de letra
+
+
+def clave_orden(nombre):
+    texto = unicodedata.normalize("NFD", (nombre or "").lower())
+    base = []
+    for c in texto:
+        if unicodedata.category(c) != "Mn":
+            base.append(c)
+        elif c == "\u0303" and base and base[-1] == "n":
+            base[-1] = _ENIE
+    # Desempate: tildes y mayúsculas, para que el orden sea total y estable
+    return ("".join(base), normalizar(nombre) != (nombre or "").lower(), nombre or "")
+
+
+class RegistroComunas:
+    def __init__(self):
+        self.nombres = []
+        self.version = 0
+        self._claves_orden = []
+        self._por_clave = {}
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def __contains__(self, nombre):
+        return normalizar(nombre) in self._por_clave
+
+    def buscar(self, comuna):
+        return self._por_clave.get(normalizar(comuna))
+
+    def agregar(self, nombre):
+        # Devuelve (nombre canónico, True si era nueva)
+        clave = normalizar(nombre)
+        existente = self._por_clave.get(clave)
+        if existente is not None:
+            return existente, False
+        orden = clave_orden(nombre)
+        posicion = bisect.bisect_left(self._claves_orden, orden)
+        self._claves_orden.insert(posicion, orden)
+        self.nombres.insert(posicion, nombre)
+        self._por_clave[clave] = nombre
+        self.version += 1
+        return nombre, True
+
+    def ordenar(self, nombres):
+        # Ordena nombres sueltos con la misma colación (p. ej. comunas de precios)
+        return sorted(nombres, key=clave_orden)
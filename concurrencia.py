@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Varias copias de la aplicación sobre la misma carpeta compartida. Los
+# guardados se hacen con un bloqueo consultivo sobre "<archivo>.lock" y solo
+# si el archivo sigue como lo dejó la última lectura o escritura propia
+# (misma firma de mtime/tamaño y mismo contador "version"); si no, primero
+# hay que incorporar los cambios ajenos.
+
+ESPERA_BLOQUEO = 10  # segundos
+INTERVALO_REINTENTO = 0.05
+_VERSION = re.compile(rb'^\s*\{\s*"version"\s*:\s*(\d+)')
+
+
+class ArchivoBloqueado(Exception):
+    pass
+
+
+class CambioExterno(Exception):
+    pass
+
+
+def _tomar(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def _soltar(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def bloquear(archivo, espera=ESPERA_BLOQUEO):
+    with open(archivo + ".lock", "a+b") as f:
+        limite = time.monotonic() + espera
+        while True:
+            try:
+                _tomar(f)
+                break
+            except OSError:
+                if time.monotonic() >= limite:
+                    raise ArchivoBloqueado(f"Otra copia de la aplicación está guardando '{archivo}'.")
+                time.sleep(INTERVALO_REINTENTO)
+        try:
+            yield
+        finally:
+            _soltar(f)
+
+
+def firma(archivo):
+    try:
+        info = os.stat(archivo)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+def leer_version(archivo):
+    # "version" es la primera clave del archivo: basta con leer el comienzo
+    try:
+        with open(archivo, "rb") as f:
+            inicio = f.read(128)
+    except FileNotFoundError:
+        return 0
+    coincidencia = _VERSION.match(inicio)
+    return int(coincidencia.group(1)) if coincidencia else 0
+
+
+def huella(registro):
+    # Identifica el contenido de un registro sin guardar una copia
+    try:
+        return hash(frozenset(registro.items()))
+    except TypeError:
+        return hash(json.dumps(registro, sort_keys=True, default=str))
+
+
+def clave_movimiento(mov):
+    return mov.get("id") or huella(mov)
+
+
+def calcular_base(datos):
+    # Estado del archivo tras la última lectura/escritura propia
+    return {
+        "clientes": {c.get("id"): huella(c) for c in datos.get("clientes", []) if c.get("id")},
+        "movimientos": {clave_movimiento(m) for m in datos.get("movimientos", [])},
+        "entregas": {clave_movimiento(e) for e in datos.get("entregas", [])},
+        "precio_caja": datos.get("precio_caja"),
+        "capacidad_vehiculo": datos.get("capacidad_vehiculo"),
+        "precios_por_comuna": dict(datos.get("precios_por_comuna", {})),
+        "vistas": dict(datos.get("vistas", {}))
+    }
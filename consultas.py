@@ -0,0 +1,346 @@
+import operator
+import re
+
+from comunas import clave_orden
+from texto import normalizar
+
+# Consultas sobre la tabla principal, p. ej.
+#   comuna in (Maipú, Ñuñoa) and pendiente >= 5 and adeudado > 20000
+# El texto se compila una sola vez a funciones anidadas. Nombre y teléfono
+# se leen de las claves ya normalizadas de cada cliente
+# (RepartoStore.claves_cliente); comuna y día tienen pocos valores distintos
+# y se resuelven con un diccionario valor -> normalizado y un set de los
+# buscados, sin normalizar nada por fila. Las condiciones de un "and" se
+# evalúan de la más barata a la más cara.
+
+COLUMNAS = ("Nombre", "Teléfono", "Dirección", "Comuna", "Día de Reparto", "Pendiente a entrega", "Total histórico", "Total adeudado")
+
+CAMPOS_TEXTO = ("nombre", "telefono", "direccion", "comuna", "dia")
+CAMPOS_NUMERO = ("pendiente", "total", "adeudado")
+ALIAS = {
+    "cliente": "nombre",
+    "fono": "telefono",
+    "historico": "total",
+    "cajas": "pendiente",
+    "deuda": "adeudado"
+}
+
+_Y = {"and", "y"}
+_O = {"or", "o"}
+_NO = {"not", "no"}
+_EN = {"in", "en"}
+_PALABRAS_CLAVE = _Y | _O | _NO | _EN
+
+_OPERADORES = {
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le
+}
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<texto>'[^']*'|"[^"]*")
+  | (?P<op>>=|<=|!=|==|=|>|<|~|\(|\)|,)
+  | (?P<palabra>[^\s()'",=!<>~]+)
+)""", re.VERBOSE)
+
+
+class ErrorConsulta(ValueError):
+    pass
+
+
+def _tokenizar(texto):
+    tokens = []
+    posicion = 0
+    texto = texto.rstrip()
+    while posicion < len(texto):
+        coincidencia = _TOKEN.match(texto, posicion)
+        if not coincidencia or coincidencia.end() == posicion:
+            raise ErrorConsulta(f"No se entiende la consulta desde «{texto[posicion:].strip()}».")
+        tipo = coincidencia.lastgroup
+        valor = coincidencia.group(tipo)
+        if tipo == "texto":
+            valor = valor[1:-1]
+        tokens.append((tipo, valor))
+        posicion = coincidencia.end()
+    return tokens
+
+
+_MILES = re.compile(r"^-?\d{1,3}(\.\d{3})+$")
+
+
+def _numero(valor):
+    # Igual que los montos de la caja: "20.000", "$5000" o "2,5". El punto
+    # separa miles solo si lo siguen grupos de tres dígitos ("2.5" es 2,5)
+    limpio = valor.replace(" ", "").replace("$", "")
+    if "," in limpio or _MILES.match(limpio):
+        limpio = limpio.replace(".", "").replace(",", ".")
+    try:
+        return float(limpio)
+    except ValueError:
+        raise ErrorConsulta(f"«{valor}» no es un número.") from None
+
+
+class Consulta:
+    def __init__(self, texto, store):
+        self.texto = texto.strip()
+        self._store = store
+        self._precios = {}
+        self._tokens = _tokenizar(self.texto)
+        self._posicion = 0
+        if not self._tokens:
+            raise ErrorConsulta("La consulta está vacía.")
+        self.predicado, _ = self._expresion()
+        if self._posicion < len(self._tokens):
+            raise ErrorConsulta(f"Sobra «{self._tokens[self._posicion][1]}» al final de la consulta.")
+        del self._tokens
+
+    def filtrar(self, clientes):
+        # Los precios por comuna se leen una vez por ejecución
+        self._precios.clear()
+        predicado = self.predicado
+        return [c for c in clientes if predicado(c)]
+
+    # ------------------ Análisis ------------------
+
+    def _ver(self):
+        return self._tokens[self._posicion] if self._posicion < len(self._tokens) else (None, None)
+
+    def _es_palabra(self, palabras):
+        tipo, valor = self._ver()
+        return tipo == "palabra" and valor.lower() in palabras
+
+    def _esperar(self, simbolo):
+        tipo, valor = self._ver()
+        if tipo != "op" or valor != simbolo:
+            raise ErrorConsulta(f"Se esperaba «{simbolo}» y se encontró «{valor or 'el final'}».")
+        self._posicion += 1
+
+    def _expresion(self):
+        terminos = [self._conjuncion()]
+        while self._es_palabra(_O):
+            self._posicion += 1
+            terminos.append(self._conjuncion())
+        return _unir(terminos, any)
+
+    def _conjuncion(self):
+        terminos = [self._negacion()]
+        while self._es_palabra(_Y):
+            self._posicion += 1
+            terminos.append(self._negacion())
+        # Primero lo barato: comparar claves antes que buscar subcadenas
+        terminos.sort(key=lambda t: t[1])
+        return _unir(terminos, all)
+
+    def _negacion(self):
+        if self._es_palabra(_NO):
+            self._posicion += 1
+            predicado, costo = self._negacion()
+            return (lambda c: not predicado(c)), costo
+        tipo, valor = self._ver()
+        if tipo == "op" and valor == "(":
+            self._posicion += 1
+            resultado = self._expresion()
+            self._esperar(")")
+            return resultado
+        return self._comparacion()
+
+    def _valor(self):
+        # Un texto entre comillas o varias palabras seguidas (San Miguel)
+        tipo, valor = self._ver()
+        if tipo == "texto":
+            self._posicion += 1
+            return valor
+        partes = []
+        while tipo == "palabra" and valor.lower() not in _PALABRAS_CLAVE:
+            partes.append(valor)
+            self._posicion += 1
+            tipo, valor = self._ver()
+        if not partes:
+            raise ErrorConsulta(f"Falta un valor antes de «{valor or 'el final'}».")
+        return " ".join(partes)
+
+    def _lista(self):
+        self._esperar("(")
+        valores = [self._valor()]
+        while self._ver() == ("op", ","):
+            self._posicion += 1
+            valores.append(self._valor())
+        self._esperar(")")
+        return valores
+
+    def _comparacion(self):
+        tipo, nombre = self._ver()
+        if tipo != "palabra":
+            raise ErrorConsulta(f"Se esperaba un campo y se encontró «{nombre or 'el final'}».")
+        campo = normalizar(nombre)
+        campo = ALIAS.get(campo, campo)
+        if campo not in CAMPOS_TEXTO and campo not in CAMPOS_NUMERO:
+            disponibles = ", ".join(CAMPOS_TEXTO + CAMPOS_NUMERO)
+            raise ErrorConsulta(f"Campo desconocido «{nombre}». Campos: {disponibles}.")
+        self._posicion += 1
+
+        negado = False
+        if self._es_palabra(_NO):
+            negado = True
+            self._posicion += 1
+        if self._es_palabra(_EN):
+            self._posicion += 1
+            predicado, costo = self._pertenencia(campo, self._lista())
+            if negado:
+                return (lambda c: not predicado(c)), costo
+            return predicado, costo
+        if negado:
+            raise ErrorConsulta(f"Después de «{nombre} not» se esperaba «in».")
+
+        tipo, simbolo = self._ver()
+        if tipo != "op" or (simbolo not in _OPERADORES and simbolo != "~"):
+            raise ErrorConsulta(f"Se esperaba un operador (=, !=, >, >=, <, <=, ~, in) después de «{nombre}».")
+        self._posicion += 1
+        valor = self._valor()
+        if campo in CAMPOS_NUMERO:
+            if simbolo == "~":
+                raise ErrorConsulta(f"«~» solo sirve para campos de texto, no para «{nombre}».")
+            return self._comparar_numero(campo, _OPERADORES[simbolo], _numero(valor))
+        return self._comparar_texto(campo, simbolo, valor)
+
+    # ------------------ Campos ------------------
+
+    def _lector_texto(self, campo):
+        claves_cliente = self._store.claves_cliente
+        if campo == "direccion":
+            return lambda c: normalizar(c.get("direccion") or "")
+        if campo in ("comuna", "dia"):
+            # Pocos valores distintos: cada uno se normaliza una sola vez y
+            # cada fila es una búsqueda en un diccionario
+            origen = "comuna" if campo == "comuna" else "dia_reparto"
+            normalizados = {}
+
+            def leer(c):
+                valor = c.get(origen)
+                normalizado = normalizados.get(valor)
+                if normalizado is None:
+                    normalizado = normalizados[valor] = normalizar((valor or "").strip())
+                return normalizado
+
+            return leer
+        if campo == "telefono":
+            return lambda c: claves_cliente(c).telefono
+        return lambda c: claves_cliente(c).nombre
+
+    def _lector_numero(self, campo):
+        if campo == "pendiente":
+            return lambda c: c.get("cajas_de_huevos", 0) or 0
+        if campo == "total":
+            return lambda c: c.get("cajas_de_huevos_total", 0) or 0
+        precios = self._precios
+        obtener_precio = self._store.obtener_precio
+
+        def adeudado(c):
+            comuna = c.get("comuna")
+            precio = precios.get(comuna)
+            if precio is None:
+                precio = precios[comuna] = obtener_precio(comuna)
+            return (c.get("cajas_de_huevos", 0) or 0) * precio
+
+        return adeudado
+
+    def _comparar_texto(self, campo, simbolo, valor):
+        leer = self._lector_texto(campo)
+        buscado = normalizar(valor.strip())
+        costo = 2 if campo == "direccion" else 1
+        if simbolo == "~":
+            return (lambda c: buscado in leer(c)), costo + 2
+        if simbolo in ("=", "=="):
+            return (lambda c: leer(c) == buscado), costo
+        if simbolo == "!=":
+            return (lambda c: leer(c) != buscado), costo
+        raise ErrorConsulta(f"«{simbolo}» no sirve para «{campo}»; usa =, !=, ~ o in.")
+
+    def _comparar_numero(self, campo, comparar, numero):
+        leer = self._lector_numero(campo)
+        return (lambda c: comparar(leer(c), numero)), 2 if campo == "adeudado" else 1
+
+    def _pertenencia(self, campo, valores):
+        if campo in CAMPOS_NUMERO:
+            leer = self._lector_numero(campo)
+            numeros = {_numero(v) for v in valores}
+            return (lambda c: leer(c) in numeros), 2 if campo == "adeudado" else 1
+        leer = self._lector_texto(campo)
+        buscados = frozenset(normalizar(v.strip()) for v in valores)
+        return (lambda c: leer(c) in buscados), 2 if campo == "direccion" else 1
+
+
+def _unir(terminos, modo):
+    if len(terminos) == 1:
+        return terminos[0]
+    costo = max(c for _, c in terminos)
+    predicados = [p for p, _ in terminos]
+    # Se encadenan de a dos para no pagar un generador por fila
+    resultado = predicados[0]
+    for siguiente in predicados[1:]:
+        if modo is all:
+            resultado = (lambda a, b: lambda c: a(c) and b(c))(resultado, siguiente)
+        else:
+            resultado = (lambda a, b: lambda c: a(c) or b(c))(resultado, siguiente)
+    return resultado, costo
+
+
+def compilar(texto, store):
+    # Devuelve None si no hay consulta (se muestran todos)
+    if not (texto or "").strip():
+        return None
+    return Consulta(texto, store)
+
+
+# ------------------ Orden por columnas ------------------
+
+def _clave_columna(store, columna):
+    claves_cliente = store.claves_cliente
+    if columna == "Nombre":
+        return lambda c: claves_cliente(c).nombre
+    if columna == "Teléfono":
+        return lambda c: claves_cliente(c).telefono
+    if columna == "Dirección":
+        return lambda c: normalizar(c.get("direccion") or "")
+    if columna == "Comuna":
+        # Misma colación que la lista de comunas (la ñ después de la n)
+        orden_comunas = {}
+
+        def clave_comuna(c):
+            comuna = c.get("comuna") or ""
+            clave = orden_comunas.get(comuna)
+            if clave is None:
+                clave = orden_comunas[comuna] = clave_orden(store.estandarizar_comuna(comuna))
+            return clave
+
+        return clave_comuna
+    if columna == "Día de Reparto":
+        return lambda c: claves_cliente(c).dia
+    if columna == "Pendiente a entrega":
+        return lambda c: c.get("cajas_de_huevos", 0) or 0
+    if columna == "Total histórico":
+        return lambda c: c.get("cajas_de_huevos_total", 0) or 0
+    if columna == "Total adeudado":
+        precios = {}
+
+        def clave_adeudado(c):
+            comuna = c.get("comuna")
+            precio = precios.get(comuna)
+            if precio is None:
+                precio = precios[comuna] = store.obtener_precio(comuna)
+            return (c.get("cajas_de_huevos", 0) or 0) * precio
+
+        return clave_adeudado
+    raise ErrorConsulta(f"Columna desconocida «{columna}».")
+
+
+def ordenar(store, clientes, orden):
+    # orden: [(columna, descendente), ...], la primera manda. sort es
+    # estable, así que se ordena de la última columna a la primera.
+    for columna, descendente in reversed(orden):
+        clientes.sort(key=_clave_columna(store, columna), reverse=descendente)
+    return clientes
@@ -0,0 +1,150 @@
+import re
+import time
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from texto import normalizar
+
+# Detección de clientes duplicados sin comparar todos contra todos.
+# Los candidatos se agrupan en bloques (teléfono normalizado y comuna +
+# tokens de dirección) y solo se comparan pares dentro de cada bloque.
+
+UMBRAL_POR_DEFECTO = 0.78
+MAX_BLOQUE = 60
+DIGITOS_TELEFONO = 8
+
+PALABRAS_VACIAS = {
+    "av", "avda", "avenida", "calle", "pasaje", "psje", "pje", "pasj", "camino",
+    "de", "del", "la", "las", "los", "el", "y", "n", "no", "num", "depto", "dpto", "casa", "block"
+}
+
+
+def digitos_telefono(telefono):
+    digitos = re.sub(r"\D", "", telefono or "")
+    # Se ignoran el prefijo de país y el 9 de celulares: basta con los últimos 8
+    return digitos[-DIGITOS_TELEFONO:] if len(digitos) >= DIGITOS_TELEFONO else ""
+
+
+def tokens_direccion(direccion):
+    texto = re.sub(r"[^a-z0-9 ]", " ", normalizar(direccion))
+    palabras = []
+    numeros = []
+    for token in texto.split():
+        if token.isdigit():
+            numeros.append(token)
+        elif token not in PALABRAS_VACIAS and len(token) > 1:
+            palabras.append(token)
+    return palabras, numeros
+
+
+def _nombre_ordenado(nombre):
+    return " ".join(sorted(normalizar(nombre).split()))
+
+
+class _Ficha:
+    __slots__ = ("cliente", "nombre", "telefono", "comuna", "direccion", "palabras", "numeros")
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.nombre = _nombre_ordenado(cliente.get("nombre_completo", ""))
+        self.telefono = digitos_telefono(cliente.get("telefono", ""))
+        self.comuna = normalizar(cliente.get("comuna", "")).strip()
+        self.palabras, self.numeros = tokens_direccion(cliente.get("direccion", ""))
+        self.direccion = " ".join(self.palabras + self.numeros)
+
+
+def _claves_bloque(ficha):
+    if ficha.telefono:
+        yield ("tel", ficha.telefono)
+    if ficha.comuna and ficha.palabras:
+        numero = ficha.numeros[0] if ficha.numeros else ""
+        # Prefijo de la calle: tolera errores de tipeo al final de la palabra
+        yield ("dir", ficha.comuna, ficha.palabras[0][:4], numero)
+        yield ("dir", ficha.comuna, " ".join(sorted(ficha.palabras)), numero)
+
+
+def _similitud(a, b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b)
+    if matcher.real_quick_ratio() < 0.5:
+        return 0.0
+    return matcher.ratio()
+
+
+def puntuar(a, b):
+    nombre = _similitud(a.nombre, b.nombre)
+    direccion = _similitud(a.direccion, b.direccion)
+    if a.numeros and b.numeros and a.numeros[0] != b.numeros[0]:
+        direccion *= 0.5
+    mismo_telefono = bool(a.telefono) and a.telefono == b.telefono
+    misma_comuna = a.comuna == b.comuna
+    puntaje = 0.45 * nombre + 0.35 * direccion * (1.0 if misma_comuna else 0.6) + (0.2 if mismo_telefono else 0.0)
+    motivos = []
+    if mismo_telefono:
+        motivos.append("mismo teléfono")
+    if nombre >= 0.85:
+        motivos.append("nombre similar")
+    if direccion >= 0.85 and misma_comuna:
+        motivos.append("misma dirección")
+    # Mismo teléfono y misma dirección es el mismo hogar aunque el nombre cambie
+    if mismo_telefono and direccion >= 0.85:
+        puntaje = max(puntaje, 0.9)
+    return puntaje, motivos
+
+
+def buscar_duplicados(clientes, umbral=UMBRAL_POR_DEFECTO, max_bloque=MAX_BLOQUE):
+    inicio = time.perf_counter()
+    fichas = [_Ficha(c) for c in clientes]
+    bloques = defaultdict(list)
+    for idx, ficha in enumerate(fichas):
+        # Las dos claves de dirección coinciden con una sola palabra: una
+        # ficha no debe quedar dos veces en su bloque (sería par consigo misma)
+        for clave in set(_claves_bloque(ficha)):
+            bloques[clave].append(idx)
+
+    vistos = set()
+    pares = []
+    comparaciones = 0
+    for miembros in bloques.values():
+        # Bloques enormes (p. ej. un teléfono de relleno) no aportan
+        if len(miembros) < 2 or len(miembros) > max_bloque:
+            continue
+        for pos, i in enumerate(miembros):
+            for j in miembros[pos + 1:]:
+                par = (i, j) if i < j else (j, i)
+                if par in vistos:
+                    continue
+                vistos.add(par)
+                comparaciones += 1
+                puntaje, motivos = puntuar(fichas[i], fichas[j])
+                if puntaje >= umbral:
+                    pares.append((clientes[par[0]], clientes[par[1]], puntaje, motivos))
+
+    pares.sort(key=lambda p: p[2], reverse=True)
+    estadisticas = {
+        "clientes": len(clientes),
+        "bloques": len(bloques),
+        "comparaciones": comparaciones,
+        "pares": len(pares),
+        "segundos": time.perf_counter() - inicio
+    }
+    return pares, estadisticas
+
+
+# ------------------ Fusión ------------------
+
+def cambios_fusion(conservado, duplicado):
+    # Campos del conservado que cambian al absorber al duplicado
+    cambios = {}
+    for campo in ("cajas_de_huevos", "cajas_de_huevos_total"):
+        if duplicado.get(campo, 0):
+            cambios[campo] = (conservado.get(campo, 0) or 0) + (duplicado.get(campo, 0) or 0)
+    for campo in ("telefono", "direccion", "dia_reparto"):
+        if not conservado.get(campo) and duplicado.get(campo):
+            cambios[campo] = duplicado[campo]
+    if duplicado.get("dia_fijo") and not conservado.get("dia_fijo"):
+        cambios["dia_fijo"] = True
+    return cambios
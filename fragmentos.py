@@ -0,0 +1,205 @@
+import json
+import os
+import re
+import threading
+
+import concurrencia
+from texto import normalizar
+
+# Clientes repartidos en un archivo por comuna para bases muy grandes.
+# db.json queda como manifiesto (versión, caja, precios...) y en
+# "fragmentos" lista los archivos de <db>.clientes/, uno por comuna
+# canónica. Al guardar solo se reescriben los fragmentos cuyos clientes
+# cambiaron (se comparan las huellas que ya usa la sincronización) y cada
+# fragmento reescrito va a un archivo con otro número: db.json se reemplaza
+# al final, así que un cliente que cambia de comuna queda en los dos
+# fragmentos a la vez o en ninguno. Después se borran los archivos que no
+# usan ni el manifiesto nuevo ni el anterior (otra copia podría estar
+# leyéndolos).
+#
+# Un reparto o una vista de una comuna puede cargar solo su fragmento
+# (cargar_datos(..., comunas=[...])); al guardar, los demás quedan como
+# estaban.
+
+SUFIJO_CARPETA = ".clientes"
+SIN_COMUNA = "sin-comuna"
+_NOMBRE = re.compile(r"^[a-z0-9-]+\.\d+\.json$")
+
+# Por archivo de datos: fragmentos del último manifiesto leído o escrito y
+# la firma de sus clientes
+_estado = {}
+_lock = threading.Lock()
+
+
+class ErrorFragmento(Exception):
+    pass
+
+
+def carpeta(archivo):
+    return os.path.splitext(os.path.abspath(archivo))[0] + SUFIJO_CARPETA
+
+
+def clave_fragmento(comuna):
+    clave = re.sub(r"[^a-z0-9]+", "-", normalizar((comuna or "").strip())).strip("-")
+    return clave or SIN_COMUNA
+
+
+def agrupar(clientes):
+    # Clave de fragmento -> clientes, en el orden en que aparecen
+    claves = {}
+    grupos = {}
+    for cliente in clientes:
+        comuna = cliente.get("comuna")
+        clave = claves.get(comuna)
+        if clave is None:
+            clave = claves[comuna] = clave_fragmento(comuna)
+        grupos.setdefault(clave, []).append(cliente)
+    return grupos
+
+
+def claves_de(manifiesto, comunas):
+    claves = {clave_fragmento(c) for c in comunas}
+    # También por el nombre guardado en el manifiesto
+    buscadas = {normalizar((c or "").strip()) for c in comunas}
+    for clave, entrada in manifiesto.get("comunas", {}).items():
+        if normalizar(entrada.get("comuna", "")) in buscadas:
+            claves.add(clave)
+    return claves
+
+
+def _firma(clientes, huellas=None):
+    huella = concurrencia.huella
+    if huellas is None:
+        return hash(tuple(huella(c) for c in clientes))
+    return hash(tuple(huellas.get(c.get("id")) or huella(c) for c in clientes))
+
+
+def _leer_fragmento(directorio, nombre):
+    ruta = os.path.join(directorio, nombre)
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            clientes = json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ErrorFragmento(f"Fragmento de clientes dañado '{nombre}': {e}") from e
+    if not isinstance(clientes, list):
+        raise ErrorFragmento(f"El fragmento '{nombre}' no tiene la estructura esperada.")
+    return clientes
+
+
+def _escribir(ruta, clientes, compacto):
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        if compacto:
+            json.dump(clientes, f, separators=(",", ":"), ensure_ascii=False)
+        else:
+            json.dump(clientes, f, indent=4, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def leer(archivo, manifiesto, claves=None):
+    # Clientes de los fragmentos (todos, o solo los de "claves"). Un
+    # fragmento que falta lanza FileNotFoundError: otra copia acaba de
+    # guardar y hay que volver a leer el manifiesto.
+    directorio = os.path.join(os.path.dirname(os.path.abspath(archivo)), manifiesto.get("carpeta", ""))
+    comunas = manifiesto.get("comunas", {})
+    clientes = []
+    firmas = {}
+    for clave, entrada in comunas.items():
+        if claves is not None and clave not in claves:
+            continue
+        lista = _leer_fragmento(directorio, entrada["archivo"])
+        firmas[clave] = _firma(lista)
+        clientes.extend(lista)
+    with _lock:
+        _estado[os.path.abspath(archivo)] = {"comunas": dict(comunas), "firmas": firmas}
+    return clientes
+
+
+def olvidar(archivo):
+    # El próximo guardado reescribe todos los fragmentos
+    with _lock:
+        _estado.pop(os.path.abspath(archivo), None)
+
+
+class Escritura:
+    # Escribe los fragmentos que cambiaron; confirmar() se llama una vez
+    # reemplazado db.json con el nuevo manifiesto
+    def __init__(self, archivo, data, compacto=False, huellas=None):
+        self.archivo = archivo
+        self.directorio = carpeta(archivo)
+        opciones = data.get("fragmentos") or {}
+        cargados = opciones.get("cargados")
+        with _lock:
+            previo = _estado.get(os.path.abspath(archivo))
+        if previo is None:
+            # Store creado sin leer el archivo: se parte del manifiesto que trae
+            previo = {"comunas": dict(opciones.get("comunas") or {}), "firmas": {}}
+        self.previo = previo
+        os.makedirs(self.directorio, exist_ok=True)
+
+        comunas = {}
+        firmas = {}
+        self.escritos = 0
+        for clave, lista in agrupar(data.get("clientes", [])).items():
+            entrada = previo["comunas"].get(clave)
+            if cargados is not None and clave not in cargados and entrada:
+                # Cliente que pasó a una comuna que no se cargó: se suma a lo
+                # que ya tiene su fragmento
+                nuevos = {c.get("id") for c in lista}
+                lista = [c for c in _leer_fragmento(self.directorio, entrada["archivo"]) if c.get("id") not in nuevos] + lista
+            firma = _firma(lista, huellas)
+            if entrada and previo["firmas"].get(clave) == firma:
+                comunas[clave] = entrada
+                firmas[clave] = firma
+                continue
+            numero = entrada["numero"] + 1 if entrada else 1
+            while os.path.exists(os.path.join(self.directorio, f"{clave}.{numero}.json")):
+                numero += 1
+            nombre = f"{clave}.{numero}.json"
+            _escribir(os.path.join(self.directorio, nombre), lista, compacto)
+            comunas[clave] = {"archivo": nombre, "numero": numero, "comuna": lista[0].get("comuna") or "", "clientes": len(lista)}
+            firmas[clave] = firma
+            self.escritos += 1
+        if cargados is not None:
+            # Lo que no se cargó sigue igual
+            for clave, entrada in previo["comunas"].items():
+                if clave not in cargados and clave not in comunas:
+                    comunas[clave] = entrada
+                    if clave in previo["firmas"]:
+                        firmas[clave] = previo["firmas"][clave]
+        self.firmas = firmas
+        self.manifiesto = {"carpeta": os.path.basename(self.directorio), "comunas": dict(sorted(comunas.items()))}
+
+    def confirmar(self):
+        comunas = self.manifiesto["comunas"]
+        with _lock:
+            _estado[os.path.abspath(self.archivo)] = {"comunas": dict(comunas), "firmas": self.firmas}
+        en_uso = {e["archivo"] for e in comunas.values()} | {e["archivo"] for e in self.previo["comunas"].values()}
+        try:
+            nombres = os.listdir(self.directorio)
+        except OSError:
+            return
+        for nombre in nombres:
+            if _NOMBRE.match(nombre) and nombre not in en_uso:
+                try:
+                    os.remove(os.path.join(self.directorio, nombre))
+                except OSError:
+                    pass
+
+
+def borrar(archivo):
+    # Tras volver a un solo db.json
+    directorio = carpeta(archivo)
+    olvidar(archivo)
+    if not os.path.isdir(directorio):
+        return
+    for nombre in os.listdir(directorio):
+        if _NOMBRE.match(nombre) or nombre.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except OSError:
+                pass
+    try:
+        os.rmdir(directorio)
+    except OSError:
+        pass
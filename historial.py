@@ -0,0 +1,129 @@
+from collections import deque
+from contextlib import contextmanager
+
+# Deshacer/rehacer. Cada cambio del store guarda solo su delta inverso
+# (los campos que tenía un registro, dónde estaba un cliente eliminado...)
+# y no una copia del estado. Un paso agrupa los deltas de una acción del
+# usuario: marcar 500 entregas es un solo paso. La memoria se acota por
+# cantidad de pasos y por total de deltas guardados.
+
+MAX_PASOS = 100
+MAX_DELTAS = 200_000
+
+
+class _Falta:
+    # Marca de "el campo no existía" dentro de un delta
+    def __repr__(self):
+        return "FALTA"
+
+
+FALTA = _Falta()
+
+
+class Paso:
+    __slots__ = ("descripcion", "deltas")
+
+    def __init__(self, descripcion, deltas):
+        self.descripcion = descripcion
+        self.deltas = deltas
+
+
+class Historial:
+    def __init__(self, max_pasos=MAX_PASOS, max_deltas=MAX_DELTAS):
+        self.max_pasos = max_pasos
+        self.max_deltas = max_deltas
+        self._deshacer = deque()
+        self._rehacer = []
+        self._total_deltas = 0
+        self._grupo = None
+        self._profundidad = 0
+        self._pausado = 0
+
+    @contextmanager
+    def paso(self, descripcion):
+        # Los pasos anidados se suman al más externo
+        if self._profundidad == 0:
+            self._grupo = Paso(descripcion, [])
+        self._profundidad += 1
+        try:
+            yield
+        finally:
+            self._profundidad -= 1
+            if self._profundidad == 0:
+                grupo, self._grupo = self._grupo, None
+                if grupo.deltas:
+                    self._apilar(grupo)
+
+    @contextmanager
+    def pausa(self):
+        # Cambios que no son del usuario (p. ej. los de otra copia)
+        self._pausado += 1
+        try:
+            yield
+        finally:
+            self._pausado -= 1
+
+    def registrar(self, delta, descripcion="Cambio"):
+        if self._pausado:
+            return
+        if self._grupo is not None:
+            self._grupo.deltas.append(delta)
+        else:
+            self._apilar(Paso(descripcion, [delta]))
+
+    def _apilar(self, paso):
+        for previo in self._rehacer:
+            self._total_deltas -= len(previo.deltas)
+        self._rehacer.clear()
+        self._deshacer.append(paso)
+        self._total_deltas += len(paso.deltas)
+        while len(self._deshacer) > 1 and (len(self._deshacer) > self.max_pasos or self._total_deltas > self.max_deltas):
+            self._total_deltas -= len(self._deshacer.popleft().deltas)
+
+    def puede_deshacer(self):
+        return bool(self._deshacer)
+
+    def puede_rehacer(self):
+        return bool(self._rehacer)
+
+    def descripcion_deshacer(self):
+        return self._deshacer[-1].descripcion if self._deshacer else ""
+
+    def descripcion_rehacer(self):
+        return self._rehacer[-1].descripcion if self._rehacer else ""
+
+    def _aplicar(self, paso, aplicar):
+        # aplicar(delta) deja el store como indica el delta y devuelve el
+        # delta que lo revierte (None si el registro ya no existe)
+        inversos = []
+        with self.pausa():
+            for delta in reversed(paso.deltas):
+                inverso = aplicar(delta)
+                if inverso is not None:
+                    inversos.append(inverso)
+        return Paso(paso.descripcion, inversos)
+
+    def deshacer(self, aplicar):
+        if not self._deshacer:
+            return None
+        paso = self._deshacer.pop()
+        self._total_deltas -= len(paso.deltas)
+        inverso = self._aplicar(paso, aplicar)
+        self._rehacer.append(inverso)
+        self._total_deltas += len(inverso.deltas)
+        return paso.descripcion
+
+    def rehacer(self, aplicar):
+        if not self._rehacer:
+            return None
+        paso = self._rehacer.pop()
+        self._total_deltas -= len(paso.deltas)
+        inverso = self._aplicar(paso, aplicar)
+        self._deshacer.append(inverso)
+        self._total_deltas += len(inverso.deltas)
+        return paso.descripcion
+
+    def limpiar(self):
+        self._deshacer.clear()
+        self._rehacer.clear()
+        self._total_deltas = 0
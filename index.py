@@ -1,71 +1,49 @@
+import time
+
+# Antes de los demás imports, para que el arranque medido los incluya
+INICIO_ARRANQUE = time.perf_counter()
+
 import json
-import os
-import unicodedata
+import socket
+import sys
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, Alignment
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-
-ARCHIVO = "db.json"
-
-PRECIO_CAJA = 1000  # 🔹 Precio inicial de la bandeja de huevos
-DEFAULT_CAJA_MANUAL = {}
-
-# ------------------ Funciones base ------------------
-
-def normalizar(texto):
-    return ''.join(
-        c for c in unicodedata.normalize('NFD', (texto or "").lower())
-        if unicodedata.category(c) != 'Mn'
-    )
-
-def cargar_datos():
-    if not os.path.exists(ARCHIVO):
-        return {
-            "clientes": [],
-            "precio_caja": PRECIO_CAJA,
-            "precios_por_comuna": {},
-            "movimientos": [],
-            "caja_manual": DEFAULT_CAJA_MANUAL.copy(),
-            "comunas": []
-        }
-    try:
-        with open(ARCHIVO, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if not isinstance(data, dict):
-                raise ValueError("El archivo JSON no tiene la estructura esperada.")
-            # Asegurarse de que las claves necesarias estén presentes
-            data.setdefault("clientes", [])
-            data.setdefault("precio_caja", PRECIO_CAJA)
-            data.setdefault("precios_por_comuna", {})
-            data.setdefault("movimientos", [])
-            data.setdefault("comunas", [])
-            data["caja_manual"] = {}
-            return data
-    except (json.JSONDecodeError, ValueError, IOError):
-        messagebox.showerror("Error", "El archivo de datos está corrupto o tiene un formato incorrecto. Se restablecerán los valores predeterminados.")
-        return {
-            "clientes": [],
-            "precio_caja": PRECIO_CAJA,
-            "precios_por_comuna": {},
-            "movimientos": [],
-            "caja_manual": DEFAULT_CAJA_MANUAL.copy(),
-            "comunas": []
-        }
-
-def guardar_datos(data):
-    # Cargar los datos existentes para preservar las claves
-    datos_existentes = cargar_datos()
-    datos_existentes.update(data)  # Actualizar solo las claves proporcionadas
-    with open(ARCHIVO, "w", encoding="utf-8") as f:
-        json.dump(datos_existentes, f, indent=4, ensure_ascii=False)
+from tkinter import ttk, messagebox, simpledialog, filedialog
+
+import cargas
+import concurrencia
+import duplicados
+import planificador
+import rendimiento
+import replicacion
+import reportes_caja
+import rutas
+import tareas
+import vigilante
+from autocompletar import MAX_SUGERENCIAS, IndicePrefijos
+from consultas import ErrorConsulta
+from nucleo import COLUMNAS_TABLA, ORDEN_POR_DEFECTO, ErrorDatos, RepartoStore, cargar_datos, formato_moneda, guardar_datos_versionado, recuperar_datos
 
 # ------------------ Interfaz gráfica ------------------
 
+UMBRAL_GUARDADO_SEGUNDO_PLANO = 20000  # clientes + movimientos
+ETIQUETA_TEMA = "TemaReparto"  # bindtag de los widgets registrados en el tema
+PRIMER_BLOQUE_TABLA = 100
+BLOQUE_TABLA = 1000
+MAX_RESULTADOS_BUSQUEDA = 500
+INTERVALO_ARCHIVO = 2000  # ms entre revisiones de cambios hechos por otra copia
+METODOS_PAGO = ("Efectivo", "Transferencia", "Tarjeta")
+
+
 class App:
-    def __init__(self, root):
+    def __init__(self, root, medir_arranque=False):
         self.root = root
+        self.medir_arranque = medir_arranque
+        self.fases_arranque = []
+        self._generacion_tabla = 0
+        self._tabla_rellena = 0
+        self._total_pendiente = 0
+        self.marcar_fase("importaciones")
         self.style = ttk.Style()
         self.style.theme_use("clam")
 
@@ -107,7 +85,9 @@ class App:
         }
         self.tema_actual = "claro"
         self.colores = self.temas[self.tema_actual]
-        self.widgets_tema = []
+        # Registro de widgets con tema por nombre Tk; <Destroy> los quita solos
+        self.widgets_tema = {}
+        self.root.bind_class(ETIQUETA_TEMA, "<Destroy>", self._olvidar_widget_tema)
         self.root.configure(bg=self.colores["bg"])
         self.registrar_widget_tema(self.root, fondo="bg")
         self.configurar_estilos_ttk()
@@ -116,23 +96,65 @@ class App:
         self.root.geometry("1024x720")
         self.root.configure(bg=self.colores["bg"])
 
-        datos_cargados = cargar_datos()
-        self.data = datos_cargados.get("clientes", [])
-        self.precios_por_comuna = {
-            self.estandarizar_comuna(comuna): precio
-            for comuna, precio in datos_cargados.get("precios_por_comuna", {}).items()
-            if self.estandarizar_comuna(comuna)
-        }
-        self.movimientos = datos_cargados.get("movimientos", [])
-        self.caja_manual = dict(datos_cargados.get("caja_manual", {}))
-        self._combobox_comunas = []
-        self._comunas_map = {}
-        self.comunas = []
+        self.menu_principal = tk.Menu(self.root)
+        self.menu_editar = tk.Menu(self.menu_principal, tearoff=False, postcommand=self.actualizar_menu_editar)
+        self.menu_editar.add_command(label="Deshacer", accelerator="Ctrl+Z", command=self.deshacer)
+        self.menu_editar.add_command(label="Rehacer", accelerator="Ctrl+Y", command=self.rehacer)
+        self.menu_principal.add_cascade(label="Editar", menu=self.menu_editar)
+        self.menu_herramientas = tk.Menu(self.menu_principal, tearoff=False)
+        self.menu_herramientas.add_command(label="Pedidos en lote", command=self.ventana_pedidos_lote)
+        self.menu_herramientas.add_command(label="Cerrar reparto", command=self.ventana_cierre_reparto)
+        self.menu_herramientas.add_command(label="Planificar días de reparto", command=self.ventana_planificar_dias)
+        self.menu_herramientas.add_command(label="Buscar clientes duplicados", command=self.ventana_duplicados)
+        self.menu_herramientas.add_command(label="Intercambio con otra instalación", command=self.ventana_replica)
+        self.menu_herramientas.add_separator()
+        self.menu_herramientas.add_command(label="Iniciar servidor para repartidores", command=self.alternar_servidor)
+        self.menu_principal.add_cascade(label="Herramientas", menu=self.menu_herramientas)
+        self.root.config(menu=self.menu_principal)
+        # Ventana oculta de diagnóstico (Ctrl+Shift+R)
+        self.root.bind_all("<Control-R>", lambda _: self.ventana_rendimiento())
+        self.root.bind_all("<Control-z>", lambda e: self._atajo_historial(e, self.deshacer))
+        self.root.bind_all("<Control-y>", lambda e: self._atajo_historial(e, self.rehacer))
+
+        try:
+            self.store = RepartoStore.cargar()
+        except OSError as e:
+            # No se pudo leer (permisos, carpeta de red): no es un archivo
+            # dañado, así que no se recupera nada ni se sigue sin datos
+            messagebox.showerror("Error", f"No se pudo leer el archivo de datos: {e}")
+            root.destroy()
+            sys.exit(1)
+        except ErrorDatos:
+            try:
+                respaldo = recuperar_datos()
+            except OSError as e:
+                messagebox.showerror("Error", f"El archivo de datos está corrupto. {e}")
+                root.destroy()
+                sys.exit(1)
+            if respaldo is not None:
+                messagebox.showwarning(
+                    "Datos recuperados",
+                    "El archivo de datos está corrupto o tiene un formato incorrecto. "
+                    f"Se recuperó el respaldo del {respaldo.fecha:%d-%m-%Y %H:%M}; "
+                    "el archivo dañado quedó guardado aparte como db.json.danado-*."
+                )
+                self.store = RepartoStore.cargar()
+            else:
+                messagebox.showerror("Error", "El archivo de datos está corrupto o tiene un formato incorrecto y no hay respaldos. Se restablecerán los valores predeterminados.")
+                self.store = RepartoStore()
+        self.marcar_fase("datos cargados")
+        self._combobox_comunas = {}
+        self._ventanas = {}
         self.filtro_comuna_actual = None
         self.filtro_dia_actual = None
-        self.actualizar_comunas_existentes(datos_cargados.get("comunas", []))
-        global PRECIO_CAJA
-        PRECIO_CAJA = datos_cargados.get("precio_caja", PRECIO_CAJA)
+        self.consulta_actual = None
+        self.orden_tabla = list(ORDEN_POR_DEFECTO)
+        self.cache_rutas = rutas.CacheDistancias()
+        self.servidor = None
+        self._cambios_servidor = False
+        self._clientes_servidor = set()
+        self._ultimo_guardado_servidor = 0.0
+        self._token_servidor = None
 
         frame = self.crear_frame_tema(root, fondo="bg", padx=16, pady=16)
         frame.pack(fill="both", expand=True)
@@ -168,11 +190,11 @@ class App:
             ("Gestionar Precios", self.gestionar_precios_por_comuna),
             ("Cambiar precio", self.cambiar_precio_caja),
             ("Gestión de Caja", self.ventana_caja),
-            ("Salir", root.quit)
+            ("Salir", self.salir)
         ]
 
         for text, cmd in botones:
-            ttk.Button(botones_frame, text=text, command=cmd, width=20).pack(side="left", padx=6)
+            ttk.Button(botones_frame, text=text, command=rendimiento.envolver(f"Botón: {text}", cmd), width=20).pack(side="left", padx=6)
 
         filtros_frame = self.crear_frame_tema(frame, fondo="bg")
         filtros_frame.pack(fill="x", pady=(4, 10))
@@ -203,6 +225,21 @@ class App:
             width=10
         ).pack(side="left")
 
+        # Consulta libre y vistas guardadas, p. ej. "comuna in (Maipú, Ñuñoa) and pendiente >= 5"
+        consulta_frame = self.crear_frame_tema(frame, fondo="bg")
+        consulta_frame.pack(fill="x", pady=(0, 6))
+        self.crear_label_tema(consulta_frame, "Consulta", font=("Segoe UI", 9)).pack(side="left", padx=(0, 6))
+        self.entry_consulta = ttk.Entry(consulta_frame, width=60)
+        self.entry_consulta.pack(side="left", fill="x", expand=True)
+        self.entry_consulta.bind("<Return>", lambda _: self.aplicar_consulta())
+        ttk.Button(consulta_frame, text="Aplicar", command=self.aplicar_consulta, width=8).pack(side="left", padx=(6, 0))
+        self.crear_label_tema(consulta_frame, "Vista", font=("Segoe UI", 9)).pack(side="left", padx=(18, 6))
+        self.combo_vistas = ttk.Combobox(consulta_frame, state="readonly", width=18)
+        self.combo_vistas.pack(side="left")
+        self.combo_vistas.bind("<<ComboboxSelected>>", lambda _: self.abrir_vista(self.combo_vistas.get()))
+        ttk.Button(consulta_frame, text="Guardar vista", command=self.guardar_vista, width=13).pack(side="left", padx=(6, 0))
+        ttk.Button(consulta_frame, text="Borrar vista", command=self.borrar_vista, width=12).pack(side="left", padx=(6, 0))
+
         def on_cambio_comuna(_):
             seleccion = self.combo_filtro_comuna.get()
             if seleccion == "Todas" or not seleccion:
@@ -227,79 +264,117 @@ class App:
 
         self.tree = ttk.Treeview(
             frame,
-            columns=("Nombre", "Teléfono", "Dirección", "Comuna", "Día de Reparto", "Pendiente a entrega", "Total histórico", "Total adeudado"),
+            columns=COLUMNAS_TABLA,
             show="headings",
             height=16
         )
 
-        for col in ("Nombre", "Teléfono", "Dirección", "Comuna", "Día de Reparto", "Pendiente a entrega", "Total histórico", "Total adeudado"):
-            self.tree.heading(col, text=col)
+        for col in COLUMNAS_TABLA:
+            self.tree.heading(col, text=col, command=lambda c=col: self.ordenar_tabla(c))
             self.tree.column(col, width=140, anchor="center")
+        # Shift+clic en un encabezado agrega la columna como orden secundario
+        self.tree.bind("<Shift-Button-1>", self._orden_secundario)
+        self.actualizar_encabezados()
 
         self.tree.pack(fill="both", expand=True, pady=16)
 
         self.label_total = self.crear_label_tema(frame, "", font=("Segoe UI", 12, "bold"))
         self.label_total.pack(pady=(8, 0))
 
+        # Indicador de tareas en segundo plano (oculto si no hay ninguna)
+        self.frame_tareas = self.crear_frame_tema(frame, fondo="bg")
+        self.label_tarea = self.crear_label_tema(self.frame_tareas, "", font=("Segoe UI", 9))
+        self.label_tarea.pack(side="left", padx=(0, 8))
+        self.barra_tarea = ttk.Progressbar(self.frame_tareas, length=220, maximum=100)
+        self.barra_tarea.pack(side="left")
+        self.boton_cancelar_tarea = ttk.Button(self.frame_tareas, text="Cancelar", command=self.cancelar_tarea_actual, width=10)
+        self.boton_cancelar_tarea.pack(side="left", padx=(8, 0))
+
         self.label_version = self.crear_label_tema(frame, "Versión 1.4.0", font=("Segoe UI", 10, "italic"), texto_color="secundario")
         self.label_version.pack(pady=(8, 0))
 
-        self.ver_clientes()
+        self.tareas = tareas.GestorTareas(self.root, al_cambiar=self.actualizar_indicador_tareas)
+        self._guardado_en_curso = False
+        self._guardado_pendiente = False
+        self._sincronizando = False
+        self._tras_sincronizar = []
+        self.root.protocol("WM_DELETE_WINDOW", self.salir)
+        self.root.after(INTERVALO_ARCHIVO, self.vigilar_archivo)
+
+        self.marcar_fase("interfaz construida")
+        # La ventana se muestra primero y la tabla se llena después; si la
+        # ventana no llega a exponerse (minimizada) se llena igual
+        self.tree.bind("<Expose>", self._al_exponer_tabla, add="+")
+        self.root.after(500, self._primer_relleno)
+
+        # Registra en bloqueos.log lo que congele la ventana
+        self.vigilante = vigilante.iniciar_desde_entorno(self.root)
 
     def registrar_widget_tema(self, widget, fondo="bg", texto="primario"):
         if not widget:
             return
-        for idx, (w, _, _) in enumerate(self.widgets_tema):
-            if w is widget:
-                self.widgets_tema[idx] = (widget, fondo, texto)
-                break
-        else:
-            self.widgets_tema.append((widget, fondo, texto))
+        clave = str(widget)
+        if clave not in self.widgets_tema:
+            widget.bindtags(widget.bindtags() + (ETIQUETA_TEMA,))
+        self.widgets_tema[clave] = (widget, fondo, texto)
         self._aplicar_colores_widget(widget, fondo, texto)
 
-    def _aplicar_colores_widget(self, widget, fondo, texto):
-        if not widget or not widget.winfo_exists():
-            return
+    def _olvidar_widget_tema(self, event):
+        self.widgets_tema.pop(str(event.widget), None)
+
+    def _opciones_colores(self, clase, fondo, texto):
         colores = self.colores
-        color_bg = None
+        opciones = {}
         if fondo == "bg":
-            color_bg = colores["bg"]
+            opciones["bg"] = colores["bg"]
         elif fondo == "panel":
-            color_bg = colores["panel"]
+            opciones["bg"] = colores["panel"]
         elif fondo == "entry":
-            color_bg = colores["entry_bg"]
-        if color_bg is not None:
-            try:
-                widget.configure(bg=color_bg)
-            except tk.TclError:
-                pass
-        if isinstance(widget, tk.Entry):
-            widget.configure(bg=colores["entry_bg"], insertbackground=colores["texto"])
-            if hasattr(widget, "_placeholder_text"):
-                widget._placeholder_color = colores["placeholder"]
-                widget._text_color = colores["entry_fg"]
-                if widget.get() == widget._placeholder_text:
-                    widget.configure(fg=widget._placeholder_color)
-                else:
-                    widget.configure(fg=widget._text_color)
-            else:
-                widget.configure(fg=colores["entry_fg"])
-        if isinstance(widget, tk.Listbox):
-            widget.configure(bg=colores["panel"], fg=colores["texto"], selectbackground=colores["tree_sel"], selectforeground=colores["tree_fg"])
-        if isinstance(widget, tk.LabelFrame):
-            widget.configure(bg=colores["panel"], fg=colores["texto"])
-        if isinstance(widget, tk.Label):
+            opciones["bg"] = colores["entry_bg"]
+        if issubclass(clase, tk.Entry):
+            opciones.update(bg=colores["entry_bg"], insertbackground=colores["texto"], fg=colores["entry_fg"])
+        if issubclass(clase, tk.Listbox):
+            opciones.update(bg=colores["panel"], fg=colores["texto"], selectbackground=colores["tree_sel"], selectforeground=colores["tree_fg"])
+        if issubclass(clase, tk.LabelFrame):
+            opciones.update(bg=colores["panel"], fg=colores["texto"])
+        if issubclass(clase, tk.Label):
             if texto == "primario":
-                widget.configure(fg=colores["texto"])
+                opciones["fg"] = colores["texto"]
             elif texto == "secundario":
-                widget.configure(fg=colores["texto_secundario"])
-        if isinstance(widget, tk.Toplevel):
-            widget.configure(bg=colores["panel"])
+                opciones["fg"] = colores["texto_secundario"]
+        if issubclass(clase, tk.Toplevel):
+            opciones["bg"] = colores["panel"]
+        return opciones
+
+    def _aplicar_colores_widget(self, widget, fondo, texto, opciones=None):
+        if opciones is None:
+            opciones = self._opciones_colores(type(widget), fondo, texto)
+        if isinstance(widget, tk.Entry) and hasattr(widget, "_placeholder_text"):
+            widget._placeholder_color = self.colores["placeholder"]
+            widget._text_color = self.colores["entry_fg"]
+            fg = widget._placeholder_color if widget.get() == widget._placeholder_text else widget._text_color
+            opciones = dict(opciones, fg=fg)
+        # Una sola llamada a configure por widget
+        try:
+            widget.configure(**opciones)
+        except tk.TclError:
+            # Widgets sin opción bg (p. ej. ttk) aceptan el resto
+            resto = {k: v for k, v in opciones.items() if k != "bg"}
+            if resto:
+                try:
+                    widget.configure(**resto)
+                except tk.TclError:
+                    pass
 
     def actualizar_tema_widgets(self):
-        for widget, fondo, texto in list(self.widgets_tema):
-            if widget and widget.winfo_exists():
-                self._aplicar_colores_widget(widget, fondo, texto)
+        # Las opciones se calculan una vez por (clase, fondo, texto)
+        opciones_por_tipo = {}
+        for widget, fondo, texto in list(self.widgets_tema.values()):
+            clave = (type(widget), fondo, texto)
+            opciones = opciones_por_tipo.get(clave)
+            if opciones is None:
+                opciones = opciones_por_tipo[clave] = self._opciones_colores(*clave)
+            self._aplicar_colores_widget(widget, fondo, texto, opciones)
 
     def configurar_estilos_ttk(self):
         colores = self.colores
@@ -337,7 +412,8 @@ class App:
         self.colores = self.temas[self.tema_actual]
         self.configurar_estilos_ttk()
         self.root.configure(bg=self.colores["bg"])
-        self.actualizar_tema_widgets()
+        with rendimiento.medir("Aplicar tema"):
+            self.actualizar_tema_widgets()
         self.actualizar_texto_boton_tema()
         self.ver_clientes()
 
@@ -397,63 +473,113 @@ class App:
                 self.registrar_widget_tema(child, fondo="panel", texto=None)
             self.registrar_descendencia_tema(child)
 
+    def abrir_ventana_unica(self, clave, construir):
+        # Una sola instancia por diálogo: se construye la primera vez, al
+        # cerrarla se oculta y al reabrirla solo se refrescan sus datos.
+        # construir() devuelve (ventana, refrescar).
+        with rendimiento.medir(f"Abrir ventana: {clave}"):
+            win, refrescar = self._ventanas.get(clave, (None, None))
+            if win is None or not win.winfo_exists():
+                win, refrescar = construir()
+                win.protocol("WM_DELETE_WINDOW", win.withdraw)
+                self.registrar_descendencia_tema(win)
+                self._ventanas[clave] = (win, refrescar)
+            refrescar()
+            win.deiconify()
+            win.lift()
+            win.focus_set()
+        return win
+
     # ------------------ Mostrar clientes ------------------
 
     def ver_clientes(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # Un relleno anterior todavía en curso se abandona
+        self._generacion_tabla += 1
+        generacion = self._generacion_tabla
+        self.tree.delete(*self.tree.get_children())
 
         self.actualizar_opciones_dias(self.filtro_dia_actual or "Todos")
+        self.actualizar_opciones_vistas()
+
+        with rendimiento.medir("Refrescar tabla"):
+            clientes, total_pendiente = self.store.clientes_tabla(
+                comuna=self.filtro_comuna_actual,
+                dia=self.filtro_dia_actual,
+                consulta=self.consulta_actual,
+                orden=self.orden_tabla
+            )
 
-        filtro_comuna = self.filtro_comuna_actual
-        filtro_dia_norm = normalizar(self.filtro_dia_actual) if self.filtro_dia_actual else ""
-
-        clientes_filtrados = []
-        for cliente in self.data:
-            if filtro_comuna and self.estandarizar_comuna(cliente.get("comuna")) != filtro_comuna:
-                continue
-            if filtro_dia_norm and normalizar(cliente.get("dia_reparto", "")) != filtro_dia_norm:
-                continue
-            clientes_filtrados.append(cliente)
-
-        clientes_ordenados = sorted(clientes_filtrados, key=lambda c: c.get("cajas_de_huevos", 0), reverse=True)
-        total_pendiente = 0
-
-        for c in clientes_ordenados:
-            pendiente = c.get("cajas_de_huevos", 0)
-            total_pendiente += pendiente
-
-            comuna_valor = self.estandarizar_comuna(c.get("comuna"))
-            comuna_mostrar = comuna_valor or ""
-
-            dia_valor = (c.get("dia_reparto", "") or "").strip()
-            dia_mostrar = dia_valor.capitalize() if dia_valor else "-"
-
-            precio = self.obtener_precio_por_comuna(comuna_valor)
+            # La primera página se ve de inmediato; el resto llega por bloques
+            # y cada fila se arma recién al insertarla
+            def insertar(desde):
+                if generacion != self._generacion_tabla:
+                    return
+                hasta = desde + (PRIMER_BLOQUE_TABLA if desde == 0 else BLOQUE_TABLA)
+                for cliente in clientes[desde:hasta]:
+                    cliente_id, valores = self.store.fila_cliente(cliente)
+                    self.tree.insert("", "end", iid=cliente_id, values=valores)
+                if generacion == 1 and desde == 0:
+                    self.marcar_fase("primera página")
+                if hasta < len(clientes):
+                    self.root.after(1, insertar, hasta)
+                    return
+                self._tabla_rellena = generacion
+                if generacion == 1:
+                    self.root.after_idle(self.marcar_fase, "interactivo")
 
-            total_adeudado = pendiente * precio
+            insertar(0)
 
-            self.tree.insert("", "end", values=(
-                c.get("nombre_completo", ""),
-                c.get("telefono", ""),
-                c.get("direccion", ""),
-                comuna_mostrar,
-                dia_mostrar,
-                pendiente,
-                c.get("cajas_de_huevos_total", 0),
-                f"${total_adeudado:,.0f}".replace(",", ".")
-            ))
+        self.mostrar_total_pendiente(total_pendiente)
 
+    def actualizar_filas(self, clientes):
+        # Refresco por diferencia: solo se reescriben las filas de estos
+        # clientes, sin vaciar la tabla ni reordenarla
+        if self._tabla_rellena != self._generacion_tabla:
+            self.ver_clientes()
+            return
+        with rendimiento.medir("Actualizar filas"):
+            total_pendiente = self._total_pendiente
+            for cliente in clientes:
+                cliente_id, valores = self.store.fila_cliente(cliente)
+                if not self.tree.exists(cliente_id):
+                    continue
+                total_pendiente += valores[5] - int(self.tree.set(cliente_id, "Pendiente a entrega"))
+                self.tree.item(cliente_id, values=valores)
+        self.mostrar_total_pendiente(total_pendiente)
+
+    def mostrar_total_pendiente(self, total_pendiente):
         # Actualizar la etiqueta con el total de cajas pendientes
+        self._total_pendiente = total_pendiente
         filtros_activos = []
         if self.filtro_comuna_actual:
             filtros_activos.append(f"comuna {self.filtro_comuna_actual}")
         if self.filtro_dia_actual:
             filtros_activos.append(f"día {self.filtro_dia_actual}")
+        if self.consulta_actual is not None:
+            filtros_activos.append(f"consulta «{self.consulta_actual.texto}»")
         resumen_filtros = f" • Filtros: {', '.join(filtros_activos)}" if filtros_activos else ""
         self.label_total.config(text=f"🥚 Total de cajas pendientes a entrega: {total_pendiente}{resumen_filtros}")
         self.label_total.pack(pady=(8, 0))
 
+    def _al_exponer_tabla(self, _):
+        self.tree.unbind("<Expose>")
+        self.marcar_fase("primera pintura")
+        self.root.after(1, self._primer_relleno)
+
+    def _primer_relleno(self):
+        if self._generacion_tabla == 0:
+            self.ver_clientes()
+
+    def marcar_fase(self, nombre):
+        segundos = time.perf_counter() - INICIO_ARRANQUE
+        self.fases_arranque.append((nombre, segundos))
+        rendimiento.registrar(f"Arranque: {nombre}", segundos)
+        nombres = {fase for fase, _ in self.fases_arranque}
+        if self.medir_arranque and {"primera pintura", "interactivo"} <= nombres:
+            # Medición reproducible: imprime las fases y cierra
+            print(json.dumps(dict(self.fases_arranque)), flush=True)
+            self.root.after_idle(self.salir)
+
     def aplicar_placeholder(self, entry, placeholder_text):
         self.registrar_widget_tema(entry, fondo="entry")
         entry._placeholder_text = placeholder_text
@@ -489,92 +615,44 @@ class App:
             return ""
         return valor
 
-    def estandarizar_comuna(self, comuna):
-        base = (comuna or "").strip()
-        if not base:
-            return ""
-        candidato = base.title()
-        clave = normalizar(candidato)
-        existente = getattr(self, "_comunas_map", {}).get(clave)
-        return existente or candidato
-
     def registrar_comuna(self, comuna, actualizar_opciones=True):
-        nombre = self.estandarizar_comuna(comuna)
-        if not nombre:
-            return ""
-        clave = normalizar(nombre)
-        if clave not in self._comunas_map:
-            self._comunas_map[clave] = nombre
-            self.comunas = sorted(self._comunas_map.values())
-            if actualizar_opciones:
-                self.actualizar_opciones_comunas()
-        return self._comunas_map[clave]
-
-    def obtener_precio_por_comuna(self, comuna):
-        clave = normalizar(self.estandarizar_comuna(comuna))
-        if not clave:
-            return PRECIO_CAJA
-        for comuna_guardada, precio in self.precios_por_comuna.items():
-            if normalizar(comuna_guardada) == clave:
-                return precio
-        return PRECIO_CAJA
-
-    def actualizar_comunas_existentes(self, comunas_guardadas=None):
-        self._comunas_map = {}
-
-        if comunas_guardadas:
-            for comuna in comunas_guardadas:
-                self.registrar_comuna(comuna, actualizar_opciones=False)
-
-        precios_ajustados = {}
-        for comuna, precio in list(self.precios_por_comuna.items()):
-            comuna_canonica = self.registrar_comuna(comuna, actualizar_opciones=False)
-            if comuna_canonica:
-                precios_ajustados[comuna_canonica] = precio
-        self.precios_por_comuna = precios_ajustados
-
-        for cliente in self.data:
-            comuna_canonica = self.registrar_comuna(cliente.get("comuna"), actualizar_opciones=False)
-            cliente["comuna"] = comuna_canonica
-
-        self.comunas = sorted(self._comunas_map.values())
-        self.actualizar_opciones_comunas()
-        self.actualizar_opciones_dias()
+        nombre = self.store.registrar_comuna(comuna)
+        if actualizar_opciones:
+            self.actualizar_opciones_comunas()
+        return nombre
 
     def actualizar_opciones_comunas(self, seleccion_preferida=None):
-        opciones_base = list(self.comunas)
-        combos_activos = []
-        for combo in getattr(self, "_combobox_comunas", []):
-            if not combo.winfo_exists():
-                continue
-            combos_activos.append(combo)
-            opciones = list(opciones_base)
-            if getattr(combo, "incluir_todas", False):
-                opciones = ["Todas"] + opciones
-            if getattr(combo, "permitir_agregar_comuna", True):
-                opciones = opciones + ["Agregar comuna..."]
-            combo["values"] = opciones
-
-            valor_actual = combo.get()
-            if valor_actual not in opciones:
-                if getattr(combo, "incluir_todas", False) and "Todas" in opciones:
-                    combo.set("Todas")
-                elif opciones:
-                    combo.set(opciones[0])
-
-            if seleccion_preferida and seleccion_preferida in opciones and valor_actual == "Agregar comuna...":
+        # Solo se reescriben los combos armados con otra versión de la lista
+        version = self.store.version_comunas
+        for combo in list(self._combobox_comunas.values()):
+            if combo.version_comunas != version:
+                self._configurar_opciones_combo(combo, seleccion_preferida)
+            elif seleccion_preferida and combo.get() == "Agregar comuna..." and seleccion_preferida in self.store.comunas:
                 combo.set(seleccion_preferida)
 
-        self._combobox_comunas = combos_activos
+    def _configurar_opciones_combo(self, combo, seleccion_preferida=None):
+        combo.version_comunas = self.store.version_comunas
+        opciones = list(self.store.comunas)
+        if getattr(combo, "incluir_todas", False):
+            opciones = ["Todas"] + opciones
+        if getattr(combo, "permitir_agregar_comuna", True):
+            opciones = opciones + ["Agregar comuna..."]
+        combo["values"] = opciones
+
+        valor_actual = combo.get()
+        if valor_actual not in opciones:
+            if getattr(combo, "incluir_todas", False) and "Todas" in opciones:
+                combo.set("Todas")
+            elif opciones:
+                combo.set(opciones[0])
+
+        if seleccion_preferida and seleccion_preferida in opciones and valor_actual == "Agregar comuna...":
+            combo.set(seleccion_preferida)
 
     def actualizar_opciones_dias(self, seleccion_preferida=None):
         if not hasattr(self, "combo_filtro_dia") or not self.combo_filtro_dia.winfo_exists():
             return
-        dias_disponibles = sorted({
-            (c.get("dia_reparto") or "").strip().title()
-            for c in self.data
-            if (c.get("dia_reparto") or "").strip()
-        })
+        dias_disponibles = self.store.dias_disponibles()
         opciones = ["Todos"] + dias_disponibles if dias_disponibles else ["Todos"]
         valor_prev = self.combo_filtro_dia.get()
         preferencia = seleccion_preferida or (valor_prev if valor_prev in opciones else None)
@@ -589,6 +667,10 @@ class App:
     def restablecer_filtros(self, actualizar_tabla=True):
         self.filtro_comuna_actual = None
         self.filtro_dia_actual = None
+        self.consulta_actual = None
+        if hasattr(self, "entry_consulta"):
+            self.entry_consulta.delete(0, tk.END)
+            self.combo_vistas.set("")
         if hasattr(self, "combo_filtro_comuna") and self.combo_filtro_comuna.winfo_exists():
             if "Todas" in self.combo_filtro_comuna["values"]:
                 self.combo_filtro_comuna.set("Todas")
@@ -596,21 +678,114 @@ class App:
         if actualizar_tabla:
             self.ver_clientes()
 
+    # ------------------ Consultas, orden y vistas ------------------
+
+    def aplicar_consulta(self):
+        try:
+            self.consulta_actual = self.store.compilar_consulta(self.entry_consulta.get())
+        except ErrorConsulta as e:
+            messagebox.showerror("Consulta", str(e))
+            return
+        self.ver_clientes()
+
+    def ordenar_tabla(self, columna, agregar=False):
+        # Clic: ordena solo por esa columna (otro clic invierte el sentido).
+        # Shift+clic: la agrega como criterio siguiente o invierte el suyo.
+        actual = dict(self.orden_tabla)
+        if agregar:
+            if columna in actual:
+                self.orden_tabla = [(c, not d if c == columna else d) for c, d in self.orden_tabla]
+            else:
+                self.orden_tabla.append((columna, False))
+        elif len(self.orden_tabla) == 1 and columna in actual:
+            self.orden_tabla = [(columna, not actual[columna])]
+        else:
+            self.orden_tabla = [(columna, False)]
+        self.actualizar_encabezados()
+        self.ver_clientes()
+
+    def _orden_secundario(self, event):
+        if self.tree.identify_region(event.x, event.y) != "heading":
+            return None
+        indice = int(self.tree.identify_column(event.x).lstrip("#") or 0) - 1
+        if 0 <= indice < len(COLUMNAS_TABLA):
+            self.ordenar_tabla(COLUMNAS_TABLA[indice], agregar=True)
+        return "break"
+
+    def actualizar_encabezados(self):
+        posiciones = {columna: (i, descendente) for i, (columna, descendente) in enumerate(self.orden_tabla)}
+        for columna in COLUMNAS_TABLA:
+            texto = columna
+            if columna in posiciones:
+                i, descendente = posiciones[columna]
+                texto += " ▼" if descendente else " ▲"
+                if len(self.orden_tabla) > 1:
+                    texto += str(i + 1)
+            self.tree.heading(columna, text=texto)
+
+    def actualizar_opciones_vistas(self):
+        self.combo_vistas["values"] = sorted(self.store.vistas, key=str.lower)
+        if self.combo_vistas.get() not in self.store.vistas:
+            self.combo_vistas.set("")
+
+    def abrir_vista(self, nombre):
+        vista = self.store.vistas.get(nombre)
+        if not vista:
+            return
+        try:
+            self.consulta_actual = self.store.compilar_consulta(vista.get("consulta", ""))
+        except ErrorConsulta as e:
+            messagebox.showerror("Vista", f"La vista '{nombre}' tiene una consulta inválida: {e}")
+            return
+        self.entry_consulta.delete(0, tk.END)
+        self.entry_consulta.insert(0, vista.get("consulta", ""))
+        orden = [(c, bool(d)) for c, d in vista.get("orden", []) if c in COLUMNAS_TABLA]
+        self.orden_tabla = orden or list(ORDEN_POR_DEFECTO)
+        self.actualizar_encabezados()
+        self.ver_clientes()
+
+    def guardar_vista(self):
+        nombre = simpledialog.askstring("Guardar vista", "Nombre de la vista:", initialvalue=self.combo_vistas.get())
+        if not nombre:
+            return
+        if nombre.strip() in self.store.vistas and not messagebox.askyesno("Guardar vista", f"¿Reemplazar la vista '{nombre.strip()}'?"):
+            return
+        try:
+            self.store.guardar_vista(nombre, self.entry_consulta.get(), self.orden_tabla)
+        except (ErrorConsulta, ValueError) as e:
+            messagebox.showerror("Guardar vista", str(e))
+            return
+        self.guardar_estado()
+        self.actualizar_opciones_vistas()
+        self.combo_vistas.set(nombre.strip())
+
+    def borrar_vista(self):
+        nombre = self.combo_vistas.get()
+        if not nombre:
+            messagebox.showwarning("Borrar vista", "Selecciona la vista que quieres borrar.")
+            return
+        if messagebox.askyesno("Borrar vista", f"¿Borrar la vista '{nombre}'?"):
+            self.store.eliminar_vista(nombre)
+            self.guardar_estado()
+            self.actualizar_opciones_vistas()
+
     def crear_combobox_comunas(self, parent, valor_inicial=None, permitir_agregar=True, incluir_todas=False, width=24):
         combo = ttk.Combobox(parent, state="readonly", width=width)
         combo.permitir_agregar_comuna = permitir_agregar
         combo.incluir_todas = incluir_todas
-        self._combobox_comunas.append(combo)
-        self.actualizar_opciones_comunas()
+        # Solo el combo nuevo recibe opciones; al destruirse sale del registro
+        self._combobox_comunas[str(combo)] = combo
+        combo.bind("<Destroy>", lambda e: self._combobox_comunas.pop(str(e.widget), None), add="+")
+        self._configurar_opciones_combo(combo)
 
         if incluir_todas and "Todas" in combo["values"]:
             combo.set("Todas")
 
         if valor_inicial:
-            valor_est = self.estandarizar_comuna(valor_inicial)
+            valor_est = self.store.estandarizar_comuna(valor_inicial)
             if incluir_todas and valor_inicial == "Todas" and "Todas" in combo["values"]:
                 combo.set("Todas")
-            elif valor_est and valor_est in self.comunas:
+            elif valor_est and valor_est in self.store.comunas:
                 combo.set(valor_est)
 
         if permitir_agregar:
@@ -620,7 +795,7 @@ class App:
                     if not nueva:
                         self.actualizar_opciones_comunas()
                         return
-                    nueva_est = self.estandarizar_comuna(nueva)
+                    nueva_est = self.store.estandarizar_comuna(nueva)
                     if not nueva_est:
                         messagebox.showerror("Error", "El nombre de la comuna no es válido.")
                         self.actualizar_opciones_comunas()
@@ -676,49 +851,388 @@ class App:
         return resultado["comuna"]
 
     def guardar_estado(self):
-        guardar_datos({
-            "clientes": self.data,
-            "precio_caja": PRECIO_CAJA,
-            "precios_por_comuna": self.precios_por_comuna,
-            "movimientos": self.movimientos,
-            "caja_manual": self.caja_manual,
-            "comunas": self.comunas
-        })
+        # Un guardado en curso se repite al terminar con los cambios nuevos
+        if self._guardado_en_curso:
+            self._guardado_pendiente = True
+            return
+        if len(self.store.clientes) + len(self.store.movimientos) < UMBRAL_GUARDADO_SEGUNDO_PLANO:
+            conflictos_previos = len(self.store.conflictos)
+            try:
+                with rendimiento.medir("Guardar datos"):
+                    # Si otra copia escribió antes, guardar incorpora sus cambios
+                    self.store.guardar()
+            except (concurrencia.ArchivoBloqueado, ErrorDatos, OSError) as e:
+                # Queda pendiente: el próximo guardado o la salida lo reintentan
+                self._guardado_pendiente = True
+                messagebox.showerror("Error", f"No se pudieron guardar los datos: {e}")
+                return
+            self._guardado_pendiente = False
+            if len(self.store.conflictos) != conflictos_previos:
+                self.ver_clientes()
+                self.ventana_conflictos()
+            return
+
+        self._guardado_en_curso = True
+        datos = self.store.instantanea()
+        archivo, compacto = self.store.archivo, self.store.compacto
+        version, firma = self.store.version, self.store.firma_archivo
+
+        def guardar(tarea):
+            with rendimiento.medir("Guardar datos (segundo plano)"):
+                base = concurrencia.calcular_base(datos)
+                firma_nueva = guardar_datos_versionado(datos, archivo, compacto, version, firma, base["clientes"])
+                return datos["version"], firma_nueva, base
+
+        def terminado(resultado=None):
+            self._guardado_en_curso = False
+            if resultado:
+                self.store.confirmar_guardado(*resultado)
+            if self._guardado_pendiente:
+                self._guardado_pendiente = False
+                self.guardar_estado()
+
+        def error(e):
+            if isinstance(e, concurrencia.CambioExterno):
+                # Otra copia escribió primero: se incorporan sus cambios y se reintenta
+                self._guardado_en_curso = False
+                self._guardado_pendiente = False
+                self.sincronizar_archivo(al_terminar=self.guardar_estado)
+                return
+            terminado()
+            messagebox.showerror("Error", f"No se pudieron guardar los datos: {e}")
+
+        self.tareas.enviar("Guardando datos", guardar, al_terminar=terminado, al_error=error, cancelable=False)
+
+    # ------------------ Deshacer / rehacer ------------------
+
+    def actualizar_menu_editar(self):
+        historial = self.store.historial
+        self.menu_editar.entryconfig(
+            0,
+            label=f"Deshacer: {historial.descripcion_deshacer()}" if historial.puede_deshacer() else "Deshacer",
+            state="normal" if historial.puede_deshacer() else "disabled"
+        )
+        self.menu_editar.entryconfig(
+            1,
+            label=f"Rehacer: {historial.descripcion_rehacer()}" if historial.puede_rehacer() else "Rehacer",
+            state="normal" if historial.puede_rehacer() else "disabled"
+        )
+
+    def _atajo_historial(self, event, accion):
+        # En un campo de texto el atajo es del campo
+        if isinstance(event.widget, (tk.Entry, ttk.Entry, tk.Text)):
+            return
+        accion()
+
+    def deshacer(self):
+        with rendimiento.medir("Deshacer"):
+            descripcion = self.store.deshacer()
+        if descripcion:
+            self._tras_historial()
+
+    def rehacer(self):
+        with rendimiento.medir("Rehacer"):
+            descripcion = self.store.rehacer()
+        if descripcion:
+            self._tras_historial()
+
+    def _tras_historial(self):
+        self.actualizar_opciones_comunas()
+        self.guardar_estado()
+        self.ver_clientes()
+
+    # ------------------ Cambios de otra copia ------------------
+
+    def vigilar_archivo(self):
+        # Solo un stat del archivo; leerlo y fusionarlo ocurre si cambió
+        if not self._guardado_en_curso and not self._sincronizando and self.store.hay_cambios_externos():
+            self.sincronizar_archivo()
+        self.root.after(INTERVALO_ARCHIVO, self.vigilar_archivo)
+
+    def sincronizar_archivo(self, al_terminar=None):
+        if al_terminar:
+            self._tras_sincronizar.append(al_terminar)
+        if self._sincronizando:
+            return
+        self._sincronizando = True
+        archivo = self.store.archivo
+
+        def leer(tarea):
+            firma = concurrencia.firma(archivo)
+            return firma, cargar_datos(archivo) if firma else None
+
+        def terminado(resultado):
+            self._sincronizando = False
+            firma, datos = resultado
+            with rendimiento.medir("Fusionar cambios externos"):
+                conflictos = self.store.sincronizar(datos, firma) if datos else self.store.sincronizar()
+            self.actualizar_opciones_comunas()
+            self.ver_clientes()
+            if conflictos:
+                self.ventana_conflictos()
+            pendientes, self._tras_sincronizar = self._tras_sincronizar, []
+            for funcion in pendientes:
+                funcion()
+
+        def error(e):
+            self._sincronizando = False
+            self._tras_sincronizar = []
+            messagebox.showerror("Error", f"No se pudieron leer los cambios de la otra copia: {e}")
+
+        self.tareas.enviar("Leyendo cambios de otra copia", leer, al_terminar=terminado, al_error=error, cancelable=False)
+
+    def ventana_conflictos(self):
+        self.abrir_ventana_unica("conflictos", self._construir_ventana_conflictos)
+
+    def _construir_ventana_conflictos(self):
+        win = self.crear_toplevel_tema("Conflictos con otra copia", geometry="760x380")
+
+        tk.Label(
+            win,
+            text="Estos registros cambiaron aquí y en otra copia o instalación de la aplicación.",
+            bg="#f7f9fb",
+            font=("Segoe UI", 11, "bold")
+        ).pack(pady=(10, 6))
+
+        columnas = ("Registro", "Motivo", "Aquí", "En la otra copia")
+        tree = ttk.Treeview(win, columns=columnas, show="headings", height=10)
+        for col, ancho in zip(columnas, (150, 250, 160, 160)):
+            tree.heading(col, text=col)
+            tree.column(col, width=ancho, anchor="w")
+        tree.pack(fill="both", expand=True, padx=12, pady=(0, 8))
+
+        def describir(conflicto, version):
+            valor = conflicto[version]
+            if valor is None:
+                return "(eliminado)"
+            if conflicto["tipo"] == "ajuste":
+                return str(valor)
+            return (
+                f"{valor.get('cajas_de_huevos', 0)} cajas • {valor.get('telefono', '')} • "
+                f"{valor.get('direccion', '')}, {valor.get('comuna', '')}"
+            )
+
+        def refrescar():
+            tree.delete(*tree.get_children())
+            for indice, conflicto in enumerate(self.store.conflictos):
+                tree.insert("", "end", iid=str(indice), values=(
+                    conflicto["nombre"], conflicto["motivo"], describir(conflicto, "local"), describir(conflicto, "externo")
+                ))
+
+        def resolver(usar_externo):
+            seleccion = tree.selection()
+            if not seleccion:
+                messagebox.showerror("Error", "Selecciona un conflicto.")
+                return
+            elegidos = [self.store.conflictos[int(iid)] for iid in seleccion]
+            for conflicto in elegidos:
+                self.store.resolver_conflicto(conflicto, usar_externo)
+            self.guardar_estado()
+            self.ver_clientes()
+            refrescar()
+            if not self.store.conflictos:
+                win.withdraw()
+
+        botones = tk.Frame(win, bg="#f7f9fb")
+        botones.pack(pady=(0, 10))
+        ttk.Button(botones, text="Mantener el de aquí", command=lambda: resolver(False)).grid(row=0, column=0, padx=6)
+        ttk.Button(botones, text="Usar el de la otra copia", command=lambda: resolver(True)).grid(row=0, column=1, padx=6)
+        ttk.Button(botones, text="Cerrar", command=win.withdraw).grid(row=0, column=2, padx=6)
+
+        return win, refrescar
+
+    # ------------------ Intercambio con otra instalación ------------------
+
+    def ventana_replica(self):
+        self.abrir_ventana_unica("replica", self._construir_ventana_replica)
+
+    def _construir_ventana_replica(self):
+        win = self.crear_toplevel_tema("Intercambio con otra instalación", geometry="640x400")
+        estado = self.store.replica
+
+        tk.Label(win, text="🔁 Intercambio con otra instalación", bg="#f7f9fb", font=("Segoe UI", 14, "bold")).pack(pady=(10, 2))
+        tk.Label(
+            win,
+            text="Exporta los cambios a un archivo (p. ej. en un pendrive) e impórtalo en la otra instalación.",
+            bg="#f7f9fb",
+            font=("Segoe UI", 10)
+        ).pack(pady=(0, 8))
+
+        fila_nombre = tk.Frame(win, bg="#f7f9fb")
+        fila_nombre.pack(fill="x", padx=12, pady=(0, 6))
+        tk.Label(fila_nombre, text="Esta instalación:", bg="#f7f9fb").pack(side="left")
+        entry_nombre = ttk.Entry(fila_nombre, width=28)
+        entry_nombre.pack(side="left", padx=6)
+        label_id = tk.Label(fila_nombre, text="", bg="#f7f9fb", fg="#555555")
+        label_id.pack(side="left")
+
+        columnas = ("Instalación", "Id", "Enviado hasta", "Recibido hasta")
+        tree = ttk.Treeview(win, columns=columnas, show="headings", height=8, selectmode="browse")
+        for col, ancho in zip(columnas, (220, 110, 120, 120)):
+            tree.heading(col, text=col)
+            tree.column(col, width=ancho, anchor="w" if col == "Instalación" else "center")
+        tree.pack(fill="both", expand=True, padx=12, pady=(0, 8))
+
+        def refrescar():
+            entry_nombre.delete(0, tk.END)
+            entry_nombre.insert(0, estado["nombre"])
+            label_id.config(text=f"id {estado['instalacion']} • reloj {estado['reloj']}")
+            tree.delete(*tree.get_children())
+            for instalacion in sorted((set(estado["enviado"]) | set(estado["recibido"])) - {"*"}):
+                tree.insert("", "end", iid=instalacion, values=(
+                    replicacion.nombre_instalacion(estado, instalacion),
+                    instalacion,
+                    estado["enviado"].get(instalacion, "-"),
+                    estado["recibido"].get(instalacion, "-")
+                ))
+
+        def guardar_nombre():
+            nombre = entry_nombre.get().strip()
+            if nombre and nombre != estado["nombre"]:
+                estado["nombre"] = nombre
+                self.guardar_estado()
+
+        def exportar():
+            guardar_nombre()
+            seleccion = tree.selection()
+            destino = seleccion[0] if seleccion else None
+            if destino is None and not messagebox.askyesno(
+                "Exportar cambios",
+                "No elegiste una instalación: se exportarán todos los datos, como para una instalación nueva. ¿Continuar?",
+                parent=win
+            ):
+                return
+            ruta = filedialog.asksaveasfilename(
+                parent=win,
+                defaultextension=replicacion.EXTENSION,
+                initialfile=replicacion.nombre_archivo(self.store, destino),
+                filetypes=[("Cambios del reparto", "*" + replicacion.EXTENSION)]
+            )
+            if not ruta:
+                return
+            try:
+                with rendimiento.medir("Exportar cambios"):
+                    paquete = self.store.exportar_cambios(destino)
+                    replicacion.escribir(paquete, ruta)
+            except OSError as e:
+                messagebox.showerror("Error", f"No se pudo escribir el archivo: {e}", parent=win)
+                return
+            self.store.confirmar_exportacion(paquete)
+            self.guardar_estado()
+            refrescar()
+            bajas = sum(len(b) for b in paquete["bajas"].values())
+            messagebox.showinfo(
+                "Éxito",
+                f"Se exportaron {len(paquete['clientes'])} clientes, {len(paquete['movimientos'])} movimientos, "
+                f"{len(paquete['entregas'])} entregas y {bajas} eliminaciones.",
+                parent=win
+            )
+
+        def importar():
+            guardar_nombre()
+            rutas_archivos = filedialog.askopenfilenames(
+                parent=win,
+                filetypes=[("Cambios del reparto", "*" + replicacion.EXTENSION), ("Todos", "*.*")]
+            )
+            if not rutas_archivos:
+                return
+            conflictos_previos = len(self.store.conflictos)
+            lineas = []
+            for ruta in sorted(rutas_archivos):
+                try:
+                    with rendimiento.medir("Importar cambios"):
+                        resumen = self.store.importar_cambios(replicacion.leer(ruta))
+                except replicacion.ErrorReplica as e:
+                    messagebox.showerror("Error", str(e), parent=win)
+                    break
+                lineas.append(
+                    f"{resumen['clientes']} clientes ({resumen['sumados']} con cajas sumadas), "
+                    f"{resumen['eliminados']} eliminados, {resumen['movimientos']} movimientos, "
+                    f"{resumen['entregas']} entregas"
+                )
+            if not lineas:
+                return
+            self.guardar_estado()
+            self.actualizar_opciones_comunas()
+            self.ver_clientes()
+            refrescar()
+            messagebox.showinfo("Cambios importados", "\n".join(lineas), parent=win)
+            if len(self.store.conflictos) != conflictos_previos:
+                self.ventana_conflictos()
+
+        botones = tk.Frame(win, bg="#f7f9fb")
+        botones.pack(pady=(0, 10))
+        ttk.Button(botones, text="Exportar cambios…", command=exportar).grid(row=0, column=0, padx=6)
+        ttk.Button(botones, text="Importar cambios…", command=importar).grid(row=0, column=1, padx=6)
+        ttk.Button(botones, text="Cerrar", command=win.withdraw).grid(row=0, column=2, padx=6)
+
+        return win, refrescar
+
+    # ------------------ Tareas en segundo plano ------------------
+
+    def actualizar_indicador_tareas(self, activas):
+        if not activas:
+            self.barra_tarea.stop()
+            self.frame_tareas.pack_forget()
+            return
+        tarea = activas[-1]
+        texto = tarea.nombre + (f" — {tarea.mensaje}" if tarea.mensaje else "")
+        if len(activas) > 1:
+            texto += f" (+{len(activas) - 1})"
+        self.label_tarea.config(text=texto)
+        if tarea.avance is None:
+            if str(self.barra_tarea.cget("mode")) != "indeterminate":
+                self.barra_tarea.config(mode="indeterminate")
+                self.barra_tarea.start(15)
+        else:
+            self.barra_tarea.stop()
+            self.barra_tarea.config(mode="determinate", value=tarea.avance * 100)
+        self.boton_cancelar_tarea.config(state="normal" if tarea.cancelable else "disabled")
+        if not self.frame_tareas.winfo_ismapped():
+            self.frame_tareas.pack(pady=(6, 0), before=self.label_version)
+
+    def cancelar_tarea_actual(self):
+        for tarea in reversed(self.tareas.activas):
+            if tarea.cancelable:
+                tarea.cancelar()
+                break
+
+    def salir(self):
+        if self.servidor and self.servidor.activo:
+            self.servidor.detener()
+        # Exportes en curso se cancelan; los guardados terminan, pero sus
+        # callbacks ya no corren: si había uno en segundo plano no se sabe si
+        # resultó, así que se guarda otra vez aquí (guardar incorpora lo que
+        # haya quedado en el archivo)
+        guardado_en_curso = self._guardado_en_curso
+        self.tareas.cerrar(esperar=True)
+        if guardado_en_curso or self._guardado_pendiente or self._cambios_servidor:
+            while True:
+                try:
+                    self.store.guardar()
+                    break
+                except (concurrencia.ArchivoBloqueado, ErrorDatos, OSError) as e:
+                    if not messagebox.askretrycancel("Guardar", f"No se pudieron guardar los datos: {e}\n¿Reintentar?"):
+                        break
+        if self.vigilante:
+            self.vigilante.detener()
+        self.root.quit()
 
     def ventana_caja(self):
+        self.abrir_ventana_unica("caja", self._construir_ventana_caja)
+
+    def _construir_ventana_caja(self):
         win = self.crear_toplevel_tema("Gestión de Caja", geometry="600x600")
 
         tk.Label(win, text="💰 Gestión de caja", bg="#f7f9fb", font=("Segoe UI", 14, "bold")).pack(pady=(10, 8))
 
-        def formato_moneda(valor):
-            try:
-                return f"${float(valor):,.0f}".replace(",", ".")
-            except (TypeError, ValueError):
-                return "$0"
-
         resumen_label = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 11))
         resumen_label.pack(pady=(0, 4))
         saldo_label = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 11, "bold"))
         saldo_label.pack(pady=(0, 10))
 
-        def calcular_totales():
-            ingresos = egresos = otros = 0.0
-            for mov in self.movimientos:
-                tipo = (mov.get("tipo") or "").strip().lower()
-                try:
-                    monto = float(mov.get("monto", 0) or 0)
-                except (TypeError, ValueError):
-                    monto = 0.0
-                if tipo == "ingreso":
-                    ingresos += monto
-                elif tipo == "egreso":
-                    egresos += monto
-                else:
-                    otros += monto
-            return ingresos, egresos, otros
-
         def actualizar_resumen():
-            ingresos, egresos, otros = calcular_totales()
+            ingresos, egresos, otros = self.store.totales_caja()
             resumen_label.config(
                 text=(
                     f"Ingresos: {formato_moneda(ingresos)}   •   "
@@ -754,32 +1268,33 @@ class App:
         label_resumen_registros.pack(anchor="w", padx=18, pady=(0, 6))
 
         id_to_index = {}
+        firma_registros = [None]
+
+        def firma_movimientos():
+            movimientos = self.store.movimientos
+            return (id(movimientos), len(movimientos), id(movimientos[-1]) if movimientos else None)
 
         def refrescar_registros():
+            firma_registros[0] = firma_movimientos()
             id_to_index.clear()
             tree.delete(*tree.get_children())
-            if not self.movimientos:
+            if not self.store.movimientos:
                 label_resumen_registros.config(text="Registros guardados: 0")
                 actualizar_resumen()
                 return
 
             movimientos_ordenados = sorted(
-                enumerate(self.movimientos),
+                enumerate(self.store.movimientos),
                 key=lambda par: par[1].get("fecha_iso", par[1].get("fecha", ""))
             )
 
-            se_actualizo = False
+            se_actualizo = self.store.asegurar_ids_movimientos()
             for idx_original, mov in movimientos_ordenados:
-                if not mov.get("id"):
-                    mov["id"] = datetime.now().strftime("%Y%m%d%H%M%S%f")
-                    self.movimientos[idx_original] = mov
-                    se_actualizo = True
-
                 mov_id = mov.get("id")
                 id_to_index[mov_id] = idx_original
                 monto_valor = mov.get("monto", 0)
                 descripcion = mov.get("descripcion", "")
-                referencia = mov.get("metodo") or mov.get("cliente") or mov.get("referencia") or ""
+                referencia = reportes_caja.referencia_movimiento(mov)
 
                 tree.insert(
                     "",
@@ -794,7 +1309,7 @@ class App:
                     )
                 )
 
-            label_resumen_registros.config(text=f"Registros guardados: {len(self.movimientos)}")
+            label_resumen_registros.config(text=f"Registros guardados: {len(self.store.movimientos)}")
             if se_actualizo:
                 self.guardar_estado()
             actualizar_resumen()
@@ -811,10 +1326,10 @@ class App:
             if not messagebox.askyesno("Confirmar", "¿Eliminar el registro seleccionado?"):
                 return
             idx_original = id_to_index.get(item_id)
-            if idx_original is None or idx_original >= len(self.movimientos):
+            if idx_original is None or idx_original >= len(self.store.movimientos):
                 messagebox.showerror("Error", "No se encontró el registro seleccionado.")
                 return
-            del self.movimientos[idx_original]
+            self.store.eliminar_movimiento(idx_original)
             self.guardar_estado()
             refrescar_registros()
             messagebox.showinfo("Éxito", "Registro eliminado correctamente.")
@@ -823,11 +1338,17 @@ class App:
         registros_btn_frame.pack(pady=(0, 10))
         ttk.Button(registros_btn_frame, text="Agregar registro", command=agregar_registro).grid(row=0, column=0, padx=6)
         ttk.Button(registros_btn_frame, text="Eliminar seleccionado", command=eliminar_registro).grid(row=0, column=1, padx=6)
-        ttk.Button(registros_btn_frame, text="Cerrar", command=win.destroy).grid(row=0, column=2, padx=6)
+        ttk.Button(registros_btn_frame, text="Reportes", command=self.ventana_reportes_caja).grid(row=0, column=2, padx=6)
+        ttk.Button(registros_btn_frame, text="Cerrar", command=win.withdraw).grid(row=0, column=3, padx=6)
 
-        self.registrar_descendencia_tema(win)
+        def al_reabrir():
+            # Sin movimientos nuevos ni eliminados basta con los totales
+            if firma_registros[0] == firma_movimientos():
+                actualizar_resumen()
+            else:
+                refrescar_registros()
 
-        refrescar_registros()
+        return win, al_reabrir
 
     def abrir_formulario_registro(self, callback_refresco):
         win = self.crear_toplevel_tema("Nuevo registro de caja", geometry="360x360")
@@ -879,25 +1400,14 @@ class App:
 
             fecha_texto = self.obtener_valor_entry(entry_fecha) or fecha_actual
             try:
-                fecha_iso = datetime.strptime(fecha_texto, "%d-%m-%Y %H:%M").isoformat()
+                fecha = datetime.strptime(fecha_texto, "%d-%m-%Y %H:%M")
             except ValueError:
                 messagebox.showwarning("Advertencia", "Formato de fecha inválido. Se usará la fecha actual.")
-                fecha_texto = datetime.now().strftime("%d-%m-%Y %H:%M")
-                fecha_iso = datetime.now().isoformat()
+                fecha = datetime.now()
             descripcion = self.obtener_valor_entry(entry_descripcion)
             referencia = self.obtener_valor_entry(entry_referencia)
 
-            registro = {
-                "id": datetime.now().strftime("%Y%m%d%H%M%S%f"),
-                "fecha": fecha_texto,
-                "fecha_iso": fecha_iso,
-                "tipo": tipo,
-                "monto": round(monto, 2),
-                "descripcion": descripcion,
-                "referencia": referencia
-            }
-
-            self.movimientos.append(registro)
+            self.store.agregar_movimiento(tipo, monto, descripcion, referencia, fecha=fecha)
             self.guardar_estado()
             callback_refresco()
             messagebox.showinfo("Éxito", "Registro guardado correctamente.")
@@ -911,6 +1421,160 @@ class App:
         self.registrar_descendencia_tema(win)
 
         win.grab_set()
+
+    # ------------------ Reportes de caja por período ------------------
+
+    def ventana_reportes_caja(self):
+        if not self.store.movimientos:
+            messagebox.showinfo("Sin datos", "No hay movimientos registrados.")
+            return
+
+        win = self.crear_toplevel_tema("Reportes de Caja", geometry="760x560")
+
+        tk.Label(win, text="📈 Reportes de caja", bg="#f7f9fb", font=("Segoe UI", 14, "bold")).pack(pady=(10, 8))
+
+        def formato_moneda(valor):
+            return f"${valor:,.0f}".replace(",", ".")
+
+        controles = tk.Frame(win, bg="#f7f9fb")
+        controles.pack(fill="x", padx=14, pady=(0, 8))
+        tk.Label(controles, text="Período:", bg="#f7f9fb").grid(row=0, column=0, sticky="w")
+        combo_periodo = ttk.Combobox(controles, state="readonly", values=reportes_caja.PERIODOS, width=12)
+        combo_periodo.grid(row=0, column=1, padx=(6, 14))
+        combo_periodo.current(0)
+        tk.Label(controles, text="Desde (dd-mm-aaaa):", bg="#f7f9fb").grid(row=0, column=2, sticky="w")
+        entry_desde = tk.Entry(controles, width=12, font=("Segoe UI", 10))
+        entry_desde.grid(row=0, column=3, padx=(6, 14))
+        tk.Label(controles, text="Hasta:", bg="#f7f9fb").grid(row=0, column=4, sticky="w")
+        entry_hasta = tk.Entry(controles, width=12, font=("Segoe UI", 10))
+        entry_hasta.grid(row=0, column=5, padx=(6, 14))
+
+        resumen_label = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 11, "bold"))
+        resumen_label.pack(pady=(0, 6))
+
+        cuaderno = ttk.Notebook(win)
+        cuaderno.pack(fill="both", expand=True, padx=12, pady=(0, 8))
+
+        def crear_tabla(titulo, primera_columna):
+            marco = tk.Frame(cuaderno, bg="#f7f9fb")
+            cuaderno.add(marco, text=titulo)
+            cols = (primera_columna, "Movimientos", "Ingresos", "Egresos", "Otros", "Neto")
+            tabla = ttk.Treeview(marco, columns=cols, show="headings", height=12)
+            for col in cols:
+                tabla.heading(col, text=col)
+                tabla.column(col, width=200 if col == primera_columna else 100, anchor="w" if col == primera_columna else "center")
+            scrollbar = ttk.Scrollbar(marco, orient="vertical", command=tabla.yview)
+            tabla.configure(yscrollcommand=scrollbar.set)
+            tabla.grid(row=0, column=0, sticky="nsew")
+            scrollbar.grid(row=0, column=1, sticky="ns")
+            marco.columnconfigure(0, weight=1)
+            marco.rowconfigure(0, weight=1)
+            return tabla
+
+        tabla_periodos = crear_tabla("Por período", "Período")
+        tabla_descripciones = crear_tabla("Top descripciones", "Descripción")
+        tabla_referencias = crear_tabla("Por referencia / método", "Referencia")
+
+        def leer_fecha(entry):
+            texto = self.obtener_valor_entry(entry)
+            if not texto:
+                return None
+            return datetime.strptime(texto, "%d-%m-%Y").date()
+
+        def leer_rango():
+            try:
+                return leer_fecha(entry_desde), leer_fecha(entry_hasta)
+            except ValueError:
+                messagebox.showerror("Error", "Las fechas deben tener el formato dd-mm-aaaa.")
+                return None
+
+        def valores(fila):
+            return (
+                fila["movimientos"],
+                formato_moneda(fila["ingresos"]),
+                formato_moneda(fila["egresos"]),
+                formato_moneda(fila["otros"]),
+                formato_moneda(fila["neto"])
+            )
+
+        def actualizar(_=None):
+            rango = leer_rango()
+            if rango is None:
+                return
+            desde, hasta = rango
+            periodo = combo_periodo.get()
+            # Las columnas quedan en el store: solo se convierten los
+            # movimientos nuevos
+            columnas = self.store.columnas_caja()
+            for tabla in (tabla_periodos, tabla_descripciones, tabla_referencias):
+                tabla.delete(*tabla.get_children())
+            for fila in reportes_caja.reporte_periodos(columnas, periodo, desde, hasta):
+                if periodo == "Diario":
+                    etiqueta = fila["inicio"].strftime("%d-%m-%Y")
+                elif periodo == "Mensual":
+                    etiqueta = fila["inicio"].strftime("%m-%Y")
+                else:
+                    etiqueta = f"{fila['inicio'].strftime('%d-%m-%Y')} al {fila['fin'].strftime('%d-%m-%Y')}"
+                tabla_periodos.insert("", "end", values=(etiqueta,) + valores(fila))
+            for fila in reportes_caja.reporte_agrupado(columnas, "descripcion", desde, hasta, limite=50):
+                tabla_descripciones.insert("", "end", values=(fila["etiqueta"],) + valores(fila))
+            for fila in reportes_caja.reporte_agrupado(columnas, "referencia", desde, hasta):
+                tabla_referencias.insert("", "end", values=(fila["etiqueta"],) + valores(fila))
+            total = reportes_caja.resumen_total(columnas, desde, hasta)
+            resumen_label.config(
+                text=(
+                    f"Movimientos: {total['movimientos']}   •   "
+                    f"Ingresos: {formato_moneda(total['ingresos'])}   •   "
+                    f"Egresos: {formato_moneda(total['egresos'])}   •   "
+                    f"Neto: {formato_moneda(total['neto'])}"
+                )
+            )
+
+        def exportar():
+            rango = leer_rango()
+            if rango is None:
+                return
+            desde, hasta = rango
+            periodo = combo_periodo.get()
+            fecha_actual = datetime.now().strftime("%d-%m-%Y")
+            nombre_archivo = f"reporte_caja_{periodo.lower()}_{fecha_actual}.xlsx"
+            with rendimiento.medir("Exportar reportes de caja"):
+                reportes_caja.exportar_reportes_xlsx(self.store.columnas_caja(), nombre_archivo, periodo, desde, hasta)
+            messagebox.showinfo("Éxito", f"Archivo '{nombre_archivo}' generado correctamente.")
+
+        combo_periodo.bind("<<ComboboxSelected>>", actualizar)
+        entry_desde.bind("<Return>", actualizar)
+        entry_hasta.bind("<Return>", actualizar)
+
+        botones = tk.Frame(win, bg="#f7f9fb")
+        botones.pack(pady=(0, 10))
+        ttk.Button(botones, text="Actualizar", command=actualizar).grid(row=0, column=0, padx=6)
+        ttk.Button(botones, text="Exportar a Excel", command=exportar).grid(row=0, column=1, padx=6)
+        ttk.Button(botones, text="Cerrar", command=win.destroy).grid(row=0, column=2, padx=6)
+
+        self.aplicar_placeholder(entry_desde, "01-01-2024")
+        self.aplicar_placeholder(entry_hasta, "31-12-2024")
+
+        self.registrar_descendencia_tema(win)
+
+        if self.store.columnas_caja_listas or len(self.store.movimientos) < UMBRAL_GUARDADO_SEGUNDO_PLANO:
+            actualizar()
+            return
+        # La primera vez, con muchos movimientos, las columnas se arman en
+        # segundo plano
+        resumen_label.config(text="Preparando movimientos...")
+        instantanea = self.store.instantanea_caja()
+
+        def armar(tarea):
+            return reportes_caja.ColumnasCaja(instantanea["movimientos"])
+
+        def listo(columnas):
+            self.store.adoptar_columnas_caja(columnas, instantanea)
+            if win.winfo_exists():
+                actualizar()
+
+        self.tareas.enviar("Preparando reportes de caja", armar, al_terminar=listo)
+
     # ------------------ Cambiar precio de la caja ------------------
 
     def cambiar_precio_caja(self):
@@ -924,19 +1588,18 @@ class App:
                 if nuevo_precio <= 0:
                     messagebox.showerror("Error", "El precio debe ser mayor a 0.")
                     return
-                global PRECIO_CAJA
-                PRECIO_CAJA = nuevo_precio
+                self.store.fijar_precio_caja(nuevo_precio)
                 # Guardar el nuevo precio en los datos
                 self.guardar_estado()
                 self.ver_clientes()  # 🔹 Actualizar la tabla con el nuevo precio
                 win.destroy()
-                messagebox.showinfo("Éxito", f"El precio de la bandeja se actualizó a ${PRECIO_CAJA}.")
+                messagebox.showinfo("Éxito", f"El precio de la bandeja se actualizó a ${self.store.precio_caja}.")
             except ValueError:
                 messagebox.showerror("Error", "Ingrese un número válido.")
 
         win = self.crear_toplevel_tema("Cambiar Precio de la Bandeja", geometry="300x150")
 
-        tk.Label(win, text="Precio actual: $" + str(PRECIO_CAJA), bg="#f7f9fb", font=("Segoe UI", 11)).pack(pady=(10, 4))
+        tk.Label(win, text="Precio actual: $" + str(self.store.precio_caja), bg="#f7f9fb", font=("Segoe UI", 11)).pack(pady=(10, 4))
         tk.Label(win, text="Nuevo precio:", bg="#f7f9fb", font=("Segoe UI", 10)).pack(pady=(4, 0))
 
         entry_precio = tk.Entry(win, width=20, font=("Segoe UI", 10))
@@ -961,18 +1624,10 @@ class App:
                 messagebox.showerror("Error", "Todos los campos excepto el día de reparto son obligatorios.")
                 return
 
-            nuevo_cliente = {
-                "nombre_completo": nombre,
-                "telefono": telefono,
-                "direccion": direccion,
-                "comuna": comuna,
-                "cajas_de_huevos_total": 0,
-                "cajas_de_huevos": 0,
-                "dia_reparto": dia_reparto or None  # Guardar como None si está vacío
-            }
-
-            self.data.append(nuevo_cliente)
-            self.actualizar_comunas_existentes(self.comunas)
+            self.store.agregar_cliente(nombre, telefono, direccion, comuna, dia_reparto)
+            self.actualizar_opciones_comunas()
+            if dia_reparto:
+                self.actualizar_opciones_dias()
             self.guardar_estado()
             self.ver_clientes()
             win.destroy()
@@ -1013,6 +1668,9 @@ class App:
     # ------------------ Nuevo pedido (placeholders + coincidencias) ------------------
 
     def ventana_nuevo_pedido(self):
+        self.abrir_ventana_unica("nuevo_pedido", self._construir_ventana_nuevo_pedido)
+
+    def _construir_ventana_nuevo_pedido(self):
         win = self.crear_toplevel_tema("Nuevo Pedido", geometry="500x450", resizable=False)
 
         tk.Label(win, text="Buscar cliente (nombre o telefono):", bg="#f7f9fb").pack(pady=(10, 0))
@@ -1036,20 +1694,33 @@ class App:
             query = self.obtener_valor_entry(entry_buscar).lower()
             listbox.delete(0, tk.END)
             resultados.clear()
-            for cliente in self.data:
+            omitidos = 0
+            for cliente in self.store.clientes:
                 nombre = cliente.get("nombre_completo", "")
-                comuna = (cliente.get("comuna", "") or "").strip()
                 if query in nombre.lower() or query in cliente.get("telefono", ""):
+                    if len(resultados) >= MAX_RESULTADOS_BUSQUEDA:
+                        omitidos += 1
+                        continue
                     resultados.append(cliente)
-                    listbox.insert(tk.END, f"{nombre} - {comuna.capitalize() if comuna else ''}")
+            listbox.insert(tk.END, *(
+                f"{c.get('nombre_completo', '')} - {(c.get('comuna', '') or '').strip().capitalize()}"
+                for c in resultados
+            ))
             if not resultados:
                 listbox.insert(tk.END, "No se encontraron resultados.")
+            elif omitidos:
+                listbox.insert(tk.END, f"... y {omitidos} más. Escribe para acotar la búsqueda.")
 
         # Asociar la actualización de resultados al evento de escritura
         entry_buscar.bind("<KeyRelease>", actualizar_resultados)
 
-        # Cargar lista inicial de clientes
-        actualizar_resultados(None)
+        def limpiar_formulario():
+            # Al reabrir la ventana parte en blanco con la lista al día
+            for entry in (entry_buscar, entry_cantidad):
+                entry.delete(0, tk.END)
+                entry.insert(0, entry._placeholder_text)
+                entry.config(fg=entry._placeholder_color)
+            actualizar_resultados(None)
 
         def agregar_pedido():
             sel = listbox.curselection()
@@ -1074,16 +1745,335 @@ class App:
             if cantidad <= 0:
                 messagebox.showerror("Error", "Ingrese una cantidad mayor que 0.")
                 return
-            cliente["cajas_de_huevos"] = cliente.get("cajas_de_huevos", 0) + cantidad
-            cliente["cajas_de_huevos_total"] = cliente.get("cajas_de_huevos_total", 0) + cantidad
+            self.store.agregar_pedido(cliente, cantidad)
             self.guardar_estado()
             self.ver_clientes()
             messagebox.showinfo("Éxito", f"Se agregaron {cantidad} cajas a {cliente.get('nombre_completo','')}.")
-            win.destroy()
+            win.withdraw()
 
         ttk.Button(win, text="Agregar pedido", command=agregar_pedido).pack(pady=10)
 
-        self.registrar_descendencia_tema(win)
+        return win, limpiar_formulario
+
+    # ------------------ Pedidos en lote ------------------
+
+    def ventana_pedidos_lote(self):
+        self.abrir_ventana_unica("pedidos_lote", self._construir_ventana_pedidos_lote)
+
+    def _construir_ventana_pedidos_lote(self):
+        win = self.crear_toplevel_tema("Pedidos en lote", geometry="760x580")
+
+        tk.Label(win, text="🧺 Pedidos en lote", bg="#f7f9fb", font=("Segoe UI", 14, "bold")).pack(pady=(10, 2))
+        tk.Label(
+            win,
+            text="Escribe el cliente y elige con ↑/↓, Tab pasa a las cajas y Enter a la fila siguiente. "
+                 "Supr borra la fila; Ctrl+Enter guarda todo el lote.",
+            bg="#f7f9fb",
+            font=("Segoe UI", 9),
+            wraplength=700
+        ).pack(pady=(0, 6))
+
+        tree_frame = tk.Frame(win, bg="#f7f9fb")
+        tree_frame.pack(fill="both", expand=True, padx=12)
+        columnas = ("Cliente", "Comuna", "Cajas", "Subtotal")
+        tree = ttk.Treeview(tree_frame, columns=columnas, show="headings", selectmode="browse")
+        for col, ancho in zip(columnas, (320, 160, 80, 120)):
+            tree.heading(col, text=col)
+            tree.column(col, width=ancho, anchor="w" if col == "Cliente" else "center")
+        tree.tag_configure("error", background="#f8d7da")
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+
+        label_totales = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 11, "bold"))
+        label_totales.pack(anchor="w", padx=14, pady=(6, 0))
+        label_estado = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 9))
+        label_estado.pack(anchor="w", padx=14)
+
+        editor = tk.Entry(tree, font=("Segoe UI", 10))
+        sugerencias = tk.Listbox(tree, height=MAX_SUGERENCIAS, font=("Segoe UI", 9), activestyle="none")
+
+        editables = ("Cliente", "Cajas")
+        filas = {}
+        totales = {"pedidos": 0, "cajas": 0, "monto": 0}
+        celda = {"iid": None, "columna": None, "sugeridos": []}
+        indice = {"actual": None, "generacion": 0}
+
+        def mostrar_totales():
+            label_totales.config(
+                text=f"Pedidos: {totales['pedidos']}   •   Cajas: {totales['cajas']}   •   Total: {formato_moneda(totales['monto'])}"
+            )
+
+        def nueva_fila():
+            iid = tree.insert("", "end", values=("", "", "", ""))
+            filas[iid] = {"texto": "", "cliente": None, "cantidad": "", "cajas": 0, "monto": 0}
+            return iid
+
+        def actualizar_fila(iid):
+            # Los totales se ajustan con la diferencia de la fila, sin recorrer el lote
+            fila = filas[iid]
+            cliente = fila["cliente"]
+            cajas = int(fila["cantidad"]) if fila["cantidad"].isdigit() else 0
+            if not cliente:
+                cajas = 0
+            monto = cajas * self.store.obtener_precio(cliente.get("comuna")) if cajas else 0
+            totales["pedidos"] += (1 if cajas else 0) - (1 if fila["cajas"] else 0)
+            totales["cajas"] += cajas - fila["cajas"]
+            totales["monto"] += monto - fila["monto"]
+            fila["cajas"], fila["monto"] = cajas, monto
+            tree.item(iid, values=(
+                fila["texto"],
+                cliente.get("comuna", "") if cliente else ("❓ sin coincidencia" if fila["texto"] else ""),
+                fila["cantidad"],
+                formato_moneda(monto) if monto else ""
+            ), tags=())
+            mostrar_totales()
+
+        def ocultar_sugerencias():
+            sugerencias.place_forget()
+            celda["sugeridos"] = []
+
+        def actualizar_sugerencias(_=None):
+            if celda["columna"] != "Cliente" or indice["actual"] is None:
+                return
+            encontrados = indice["actual"].buscar(editor.get())
+            celda["sugeridos"] = encontrados
+            if not encontrados:
+                sugerencias.place_forget()
+                return
+            sugerencias.delete(0, tk.END)
+            sugerencias.insert(tk.END, *(
+                f"{c.get('nombre_completo', '')} • {c.get('telefono', '')} • {c.get('comuna', '')}" for c in encontrados
+            ))
+            sugerencias.selection_set(0)
+            sugerencias.place(
+                x=editor.winfo_x(), y=editor.winfo_y() + editor.winfo_height(),
+                width=max(editor.winfo_width(), 420)
+            )
+            sugerencias.lift()
+
+        def confirmar_edicion():
+            iid, columna = celda["iid"], celda["columna"]
+            if iid is None or not tree.exists(iid):
+                celda["iid"] = None
+                editor.place_forget()
+                ocultar_sugerencias()
+                return
+            fila = filas[iid]
+            valor = editor.get().strip()
+            if columna == "Cliente":
+                if celda["sugeridos"] and sugerencias.curselection():
+                    fila["cliente"] = celda["sugeridos"][sugerencias.curselection()[0]]
+                    fila["texto"] = fila["cliente"].get("nombre_completo", "")
+                elif valor != fila["texto"]:
+                    # Texto libre: sirve solo si identifica a un único cliente
+                    candidatos = indice["actual"].buscar(valor, limite=2) if indice["actual"] and valor else []
+                    fila["cliente"] = candidatos[0] if len(candidatos) == 1 else None
+                    fila["texto"] = fila["cliente"].get("nombre_completo", "") if fila["cliente"] else valor
+            else:
+                fila["cantidad"] = valor
+            celda["iid"] = None
+            editor.place_forget()
+            ocultar_sugerencias()
+            actualizar_fila(iid)
+
+        def editar(iid, columna):
+            confirmar_edicion()
+            tree.selection_set(iid)
+            tree.see(iid)
+            tree.update_idletasks()
+            caja = tree.bbox(iid, columna)
+            if not caja:
+                return
+            x, y, ancho, alto = caja
+            celda["iid"], celda["columna"] = iid, columna
+            fila = filas[iid]
+            editor.delete(0, tk.END)
+            editor.insert(0, fila["texto"] if columna == "Cliente" else fila["cantidad"])
+            editor.select_range(0, tk.END)
+            editor.place(x=x, y=y, width=ancho, height=alto)
+            editor.focus_set()
+
+        def mover(filas_delta, columnas_delta):
+            iid, columna = celda["iid"], celda["columna"]
+            if iid is None:
+                return "break"
+            hijos = tree.get_children()
+            posicion = hijos.index(iid)
+            col = editables.index(columna) + columnas_delta
+            if col >= len(editables):
+                col, filas_delta = 0, filas_delta + 1
+            elif col < 0:
+                col, filas_delta = len(editables) - 1, filas_delta - 1
+            destino = posicion + filas_delta
+            confirmar_edicion()
+            if destino < 0:
+                destino = 0
+            if destino >= len(hijos):
+                siguiente = nueva_fila()
+            else:
+                siguiente = hijos[destino]
+            editar(siguiente, editables[col])
+            return "break"
+
+        def tecla_vertical(paso):
+            if celda["sugeridos"]:
+                actual = sugerencias.curselection()
+                nuevo = max(0, min(len(celda["sugeridos"]) - 1, (actual[0] if actual else -1) + paso))
+                sugerencias.selection_clear(0, tk.END)
+                sugerencias.selection_set(nuevo)
+                sugerencias.see(nuevo)
+                return "break"
+            return mover(paso, 0)
+
+        def tecla_enter(_):
+            if celda["columna"] == "Cliente" and celda["sugeridos"]:
+                return mover(0, 1)
+            return mover(1, 0) if celda["columna"] == "Cajas" else mover(0, 1)
+
+        def cancelar(_):
+            if celda["sugeridos"]:
+                ocultar_sugerencias()
+            else:
+                celda["iid"] = None
+                editor.place_forget()
+                tree.focus_set()
+            return "break"
+
+        def borrar_fila(_=None):
+            seleccion = tree.selection()
+            if not seleccion or celda["iid"] is not None:
+                return
+            iid = seleccion[0]
+            fila = filas.pop(iid)
+            totales["pedidos"] -= 1 if fila["cajas"] else 0
+            totales["cajas"] -= fila["cajas"]
+            totales["monto"] -= fila["monto"]
+            siguiente = tree.next(iid) or tree.prev(iid)
+            tree.delete(iid)
+            mostrar_totales()
+            if not siguiente:
+                siguiente = nueva_fila()
+            tree.selection_set(siguiente)
+            tree.focus(siguiente)
+
+        def editar_seleccion(event=None):
+            seleccion = tree.selection()
+            if not seleccion:
+                return
+            columna = "Cliente"
+            if event is not None and event.type == tk.EventType.ButtonPress:
+                indice_columna = tree.identify_column(event.x)
+                if indice_columna == "#3":
+                    columna = "Cajas"
+            editar(seleccion[0], columna)
+
+        def limpiar():
+            celda["iid"] = None
+            editor.place_forget()
+            ocultar_sugerencias()
+            tree.delete(*tree.get_children())
+            filas.clear()
+            totales.update(pedidos=0, cajas=0, monto=0)
+            mostrar_totales()
+            editar(nueva_fila(), "Cliente")
+
+        def guardar_lote(_=None):
+            confirmar_edicion()
+            pedidos = []
+            errores = []
+            for numero, iid in enumerate(tree.get_children(), 1):
+                fila = filas[iid]
+                if not fila["texto"] and not fila["cantidad"]:
+                    continue
+                cliente = fila["cliente"]
+                if cliente is None or self.store.cliente_por_id(cliente.get("id")) is not cliente:
+                    errores.append((iid, f"Fila {numero}: elige un cliente de la lista ({fila['texto'] or 'vacío'})."))
+                elif not fila["cantidad"].isdigit() or int(fila["cantidad"]) <= 0:
+                    errores.append((iid, f"Fila {numero}: la cantidad de cajas debe ser un número mayor que 0."))
+                else:
+                    pedidos.append((cliente, int(fila["cantidad"])))
+            for iid, _ in errores:
+                tree.item(iid, tags=("error",))
+            if errores:
+                detalle = "\n".join(mensaje for _, mensaje in errores[:10])
+                if len(errores) > 10:
+                    detalle += f"\n... y {len(errores) - 10} más."
+                messagebox.showerror("Revisa el lote", f"No se guardó ningún pedido:\n\n{detalle}", parent=win)
+                editar(errores[0][0], "Cliente")
+                return "break"
+            if not pedidos:
+                messagebox.showinfo("Lote vacío", "No hay pedidos para guardar.", parent=win)
+                return "break"
+            with rendimiento.medir("Guardar pedidos en lote"):
+                self.store.agregar_pedidos(pedidos)
+                self.guardar_estado()
+                self.ver_clientes()
+            cajas = sum(cantidad for _, cantidad in pedidos)
+            limpiar()
+            label_estado.config(text=f"✅ Se agregaron {len(pedidos)} pedidos ({cajas} cajas). Ctrl+Z en la ventana principal lo deshace.")
+            return "break"
+
+        def preparar_indice():
+            # Con muchos clientes el índice se arma en segundo plano
+            indice["generacion"] += 1
+            generacion = indice["generacion"]
+            clientes = list(self.store.clientes)
+            label_estado.config(text="Preparando búsqueda de clientes...")
+
+            def armar(tarea):
+                return IndicePrefijos(clientes, self.store.claves_cliente)
+
+            def listo(nuevo):
+                if generacion != indice["generacion"]:
+                    return
+                indice["actual"] = nuevo
+                label_estado.config(text=f"{len(nuevo)} clientes disponibles para autocompletar.")
+                if celda["columna"] == "Cliente" and editor.get():
+                    actualizar_sugerencias()
+
+            if len(clientes) < UMBRAL_GUARDADO_SEGUNDO_PLANO:
+                listo(IndicePrefijos(clientes, self.store.claves_cliente))
+            else:
+                self.tareas.enviar("Preparando búsqueda de clientes", armar, al_terminar=listo)
+
+        editor.bind("<KeyRelease>", lambda e: None if e.keysym in ("Up", "Down", "Return", "Tab", "Escape") else actualizar_sugerencias())
+        editor.bind("<Tab>", lambda _: mover(0, 1))
+        editor.bind("<Shift-Tab>", lambda _: mover(0, -1))
+        editor.bind("<ISO_Left_Tab>", lambda _: mover(0, -1))
+        editor.bind("<Return>", tecla_enter)
+        editor.bind("<Up>", lambda _: tecla_vertical(-1))
+        editor.bind("<Down>", lambda _: tecla_vertical(1))
+        editor.bind("<Escape>", cancelar)
+        editor.bind("<Control-Return>", guardar_lote)
+        sugerencias.bind("<ButtonRelease-1>", lambda _: (editor.focus_set(), mover(0, 1)))
+        tree.bind("<Return>", editar_seleccion)
+        tree.bind("<Double-1>", editar_seleccion)
+        tree.bind("<Delete>", borrar_fila)
+        tree.bind("<Control-Return>", guardar_lote)
+        for evento in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tree.bind(evento, lambda _: confirmar_edicion(), add="+")
+
+        botones = tk.Frame(win, bg="#f7f9fb")
+        botones.pack(pady=10)
+        ttk.Button(botones, text="Guardar lote (Ctrl+Enter)", command=guardar_lote).grid(row=0, column=0, padx=6)
+        ttk.Button(botones, text="Vaciar", command=limpiar).grid(row=0, column=1, padx=6)
+        ttk.Button(botones, text="Cerrar", command=win.withdraw).grid(row=0, column=2, padx=6)
+
+        def refrescar():
+            # El borrador se conserva al cerrar; precios y clientes se releen
+            preparar_indice()
+            if not filas:
+                limpiar()
+                return
+            for iid in tree.get_children():
+                actualizar_fila(iid)
+            editar(tree.get_children()[-1], "Cliente")
+
+        return win, refrescar
 
     # ------------------ Editar (búsqueda + opciones claras) ------------------
 
@@ -1102,14 +2092,10 @@ class App:
 
         def buscar(event=None):
             listbox.delete(0, tk.END)
-            texto = normalizar(self.obtener_valor_entry(entry_buscar))
             resultados.clear()
-            if not texto:
-                return
-            for c in self.data:
-                if texto in normalizar(c.get("nombre_completo", "")) or texto in normalizar(c.get("telefono", "")):
-                    resultados.append(c)
-                    listbox.insert(tk.END, f"{c.get('nombre_completo','')} ({c.get('telefono','')}) - {c.get('comuna','')} — Pendiente: {c.get('cajas_de_huevos',0)}")
+            for c in self.store.buscar_clientes(self.obtener_valor_entry(entry_buscar)):
+                resultados.append(c)
+                listbox.insert(tk.END, f"{c.get('nombre_completo','')} ({c.get('telefono','')}) - {c.get('comuna','')} — Pendiente: {c.get('cajas_de_huevos',0)}")
 
         entry_buscar.bind("<KeyRelease>", buscar)
 
@@ -1137,9 +2123,10 @@ class App:
                 self.editar_pedido_cliente(cliente)
 
             def eliminar_cliente():
-                if messagebox.askyesno("Confirmar eliminación", f"¿Eliminar a {cliente.get('nombre_completo','')}? Esta acción no se puede deshacer."):
+                if messagebox.askyesno("Confirmar eliminación", f"¿Eliminar a {cliente.get('nombre_completo','')}? Puedes deshacerlo con Ctrl+Z."):
                     try:
-                        self.data.remove(cliente)
+                        self.store.eliminar_cliente(cliente)
+                        self.cache_rutas.invalidar(rutas.clave_cliente(cliente))
                         self.guardar_estado()
                         self.ver_clientes()
                         win_op.destroy()
@@ -1191,11 +2178,17 @@ class App:
             if not nombre or not direccion or not comuna:
                 messagebox.showerror("Error", "Complete los campos obligatorios.")
                 return
-            cliente["nombre_completo"] = nombre
-            cliente["telefono"] = entries["telefono"].get().strip()
-            cliente["direccion"] = direccion
-            cliente["comuna"] = comuna
-            self.actualizar_comunas_existentes(self.comunas)
+            clave_ruta_anterior = rutas.clave_cliente(cliente)
+            self.store.actualizar_cliente(
+                cliente,
+                nombre_completo=nombre,
+                telefono=entries["telefono"].get().strip(),
+                direccion=direccion,
+                comuna=comuna
+            )
+            if rutas.clave_cliente(cliente) != clave_ruta_anterior:
+                self.cache_rutas.invalidar(clave_ruta_anterior)
+            self.actualizar_opciones_comunas()
             self.guardar_estado()
             self.ver_clientes()
             win.destroy()
@@ -1232,9 +2225,7 @@ class App:
                     if nuevo < 0:
                         messagebox.showerror("Error", "La cantidad no puede ser negativa.")
                         return
-                    cliente["cajas_de_huevos"] = nuevo
-                    # Ajustar histórico si es menor que total actual
-                    cliente["cajas_de_huevos_total"] = max(cliente.get("cajas_de_huevos_total", 0), nuevo)
+                    self.store.reemplazar_pendiente(cliente, nuevo)
                     self.guardar_estado()
                     self.ver_clientes()
                     win_replace.destroy()
@@ -1261,33 +2252,24 @@ class App:
     # ------------------ Resumen / Estadísticas ------------------
 
     def ventana_resumen(self):
-        if not self.data:
+        if not self.store.clientes:
             messagebox.showinfo("Sin datos", "No hay clientes registrados.")
             return
+        self.abrir_ventana_unica("resumen", self._construir_ventana_resumen)
 
+    def _construir_ventana_resumen(self):
         win = self.crear_toplevel_tema("📊 Resumen de Pedidos", geometry="540x540")
 
-        total_pendiente = sum(c.get("cajas_de_huevos", 0) for c in self.data)
-        clientes_con_pedido = [c for c in self.data if c.get("cajas_de_huevos", 0) > 0]
-        total_clientes_pendientes = len(clientes_con_pedido)
-
-        # Agrupar por comuna
-        resumen_comunas = {}
-        for c in clientes_con_pedido:
-            comuna = c.get("comuna", "Sin comuna")
-            resumen_comunas[comuna] = resumen_comunas.get(comuna, 0) + c.get("cajas_de_huevos", 0)
+        label_total = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 12, "bold"))
+        label_total.pack(pady=(12, 6))
+        label_clientes = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 10))
+        label_clientes.pack(pady=(0, 8))
 
-        resumen_ordenado = sorted(resumen_comunas.items(), key=lambda x: x[1], reverse=True)
-
-        tk.Label(win, text=f"🥚 Total de cajas pendientes: {total_pendiente}", bg="#f7f9fb", font=("Segoe UI", 12, "bold")).pack(pady=(12, 6))
-        tk.Label(win, text=f"👥 Clientes con pedidos activos: {total_clientes_pendientes}", bg="#f7f9fb", font=("Segoe UI", 10)).pack(pady=(0, 8))
-
-        # Mostrar porcentaje por comuna
-        if total_pendiente > 0:
-            tk.Label(win, text="Porcentaje por comuna:", bg="#f7f9fb", font=("Segoe UI", 10, "underline")).pack(pady=(6,4))
-            for comuna, total in resumen_ordenado:
-                pct = (total / total_pendiente) * 100
-                tk.Label(win, text=f"{comuna}: {total} cajas — {pct:.1f}%", bg="#f7f9fb").pack(anchor="w", padx=20)
+        # Porcentaje por comuna (el marco queda vacío si no hay pendientes)
+        frame_porcentajes = tk.Frame(win, bg="#f7f9fb")
+        frame_porcentajes.pack(fill="x")
+        label_titulo_porcentajes = tk.Label(frame_porcentajes, text="Porcentaje por comuna:", bg="#f7f9fb", font=("Segoe UI", 10, "underline"))
+        label_porcentajes = tk.Label(frame_porcentajes, text="", bg="#f7f9fb", justify="left")
 
         # Tabla con detalle por comuna
         tk.Label(win, text="Detalle por comuna:", bg="#f7f9fb", font=("Segoe UI", 10, "underline")).pack(pady=(10,4))
@@ -1298,34 +2280,48 @@ class App:
         tree.column("Comuna", anchor="center", width=200)
         tree.column("Cajas pendientes", anchor="center", width=120)
         tree.column("Clientes con pedido", anchor="center", width=140)
+        tree.pack(pady=8)
 
-        # calcular clientes por comuna
-        clientes_por_comuna = {}
-        for c in clientes_con_pedido:
-            clientes_por_comuna[c.get("comuna", "Sin comuna")] = clientes_por_comuna.get(c.get("comuna", "Sin comuna"), 0) + 1
+        ttk.Button(win, text="Cerrar", command=win.withdraw).pack(pady=10)
 
-        for comuna, total in resumen_ordenado:
-            tree.insert("", "end", values=(comuna, total, clientes_por_comuna.get(comuna, 0)))
+        def refrescar():
+            resumen = self.store.resumen()
+            total_pendiente = resumen["total_pendiente"]
+            resumen_ordenado = resumen["por_comuna"]
 
-        tree.pack(pady=8)
+            label_total.config(text=f"🥚 Total de cajas pendientes: {total_pendiente}")
+            label_clientes.config(text=f"👥 Clientes con pedidos activos: {resumen['clientes_con_pedido']}")
 
-        ttk.Button(win, text="Cerrar", command=win.destroy).pack(pady=10)
+            if total_pendiente > 0:
+                label_porcentajes.config(text="\n".join(
+                    f"{comuna}: {total} cajas — {(total / total_pendiente) * 100:.1f}%"
+                    for comuna, total, _ in resumen_ordenado
+                ))
+                label_titulo_porcentajes.pack(pady=(6,4))
+                label_porcentajes.pack(anchor="w", padx=20)
+            else:
+                label_titulo_porcentajes.pack_forget()
+                label_porcentajes.pack_forget()
 
-        self.registrar_descendencia_tema(win)
+            tree.delete(*tree.get_children())
+            for comuna, total, clientes in resumen_ordenado:
+                tree.insert("", "end", values=(comuna, total, clientes))
+
+        return win, refrescar
 
     # ------------------ Generar reparto ------------------
 
     def generar_reparto(self):
-        if not self.data:
+        if not self.store.clientes:
             messagebox.showwarning("Sin clientes", "No hay clientes registrados.")
             return
 
         filtrar = messagebox.askyesno("Filtro", "¿Desea filtrar el reparto por comuna?")
-        clientes_filtrados = self.data
+        clientes_filtrados = self.store.clientes
         comuna = None
 
         if filtrar:
-            if not self.comunas:
+            if not self.store.comunas:
                 messagebox.showwarning("Sin comunas", "No hay comunas registradas. Agrega una antes de filtrar.")
                 return
             comuna_seleccionada = self.dialogo_seleccion_comuna("Filtrar por comuna", "Selecciona la comuna del reparto:")
@@ -1333,7 +2329,7 @@ class App:
                 messagebox.showwarning("Advertencia", "Debe seleccionar una comuna válida.")
                 return
             comuna = comuna_seleccionada
-            clientes_filtrados = [c for c in self.data if self.estandarizar_comuna(c.get("comuna")) == comuna]
+            clientes_filtrados = self.store.filtrar(comuna=comuna)
             if not clientes_filtrados:
                 messagebox.showinfo("Sin resultados", f"No hay clientes en la comuna '{comuna}'.")
                 return
@@ -1345,7 +2341,7 @@ class App:
             if not dia_reparto:
                 messagebox.showwarning("Advertencia", "Debe ingresar un día válido.")
                 return
-            clientes_filtrados = [c for c in clientes_filtrados if normalizar(c.get("dia_reparto", "")) == normalizar(dia_reparto)]
+            clientes_filtrados = self.store.filtrar(comuna=comuna, dia=dia_reparto)
             if not clientes_filtrados:
                 messagebox.showinfo("Sin resultados", f"No hay clientes con día de reparto '{dia_reparto}'.")
                 return
@@ -1355,61 +2351,352 @@ class App:
             messagebox.showinfo("Sin pedidos", "No hay pedidos pendientes para generar reparto.")
             return
 
-        fecha_actual = datetime.now().strftime("%d-%m-%Y")
-        nombre_archivo = f"reparto_huevos_{(comuna or 'general').replace(' ', '_').lower()}_{fecha_actual}.xlsx"
-
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Reparto Huevos"
-
-        # Definir encabezados y asegurarse de que `ws` esté correctamente utilizado
-        encabezados = ["Nombre completo", "Teléfono", "Dirección", "Comuna", "Cajas de huevos", "Monto a pagar", "Pagado SI/NO", "Metodo de pago"]
-        ws.append(encabezados)
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
-
-        total_cajas = 0  # 🔹 Contador de total de cajas
-        total_ganancias = 0  # 🔹 Contador de total a ganar
-
-        for cliente in clientes_con_pedidos:
-            cajas = cliente.get("cajas_de_huevos", 0)
-            comuna_cliente = self.estandarizar_comuna(cliente.get("comuna"))
-            precio = self.obtener_precio_por_comuna(comuna_cliente)
-            monto_a_pagar = cajas * precio
-            total_cajas += cajas
-            total_ganancias += monto_a_pagar
-
-            ws.append([
-                cliente.get("nombre_completo", ""),
-                cliente.get("telefono", ""),
-                cliente.get("direccion", ""),
-                comuna_cliente,
-                cajas,
-                f"${monto_a_pagar:,.0f}".replace(",", ".")  # Formato $000.000.000
-            ])
-
-        # 🔹 Nueva fila al final con el total
-        ws.append([])
-        ws.append(["", "", "", "Total", total_cajas, f"${total_ganancias:,.0f}".replace(",", ".")])
-
-        # Ajustar ancho de columnas
-        for column in ws.columns:
-            max_length = max(len(str(cell.value)) if cell.value else 0 for cell in column)
-            ws.column_dimensions[column[0].column_letter].width = max_length + 2
-
-        # Guardar el archivo Excel
-        wb.save(nombre_archivo)
-
-        # Confirmar si marcar como entregados
-        if messagebox.askyesno("Marcar entregidos", "¿Deseas marcar los pedidos generados como entregidos (poner 0)?"):
-            for cliente in clientes_con_pedidos:
-                cliente["cajas_de_huevos"] = 0
-            # Preservar los precios por comuna al guardar los datos
-            self.guardar_estado()
-            self.ver_clientes()
+        # Ordenar las paradas de cada comuna/día según la tabla local de geocódigos
+        geocodigos = rutas.cargar_geocodigos()
+        if geocodigos and messagebox.askyesno("Ruta", "¿Desea ordenar las paradas por ruta dentro de cada comuna y día?"):
+            clientes_con_pedidos, sin_coordenadas = rutas.ordenar_por_rutas(clientes_con_pedidos, geocodigos, self.cache_rutas)
+            if sin_coordenadas:
+                messagebox.showwarning(
+                    "Ruta",
+                    f"{sin_coordenadas} cliente(s) no tienen coordenadas en '{rutas.ARCHIVO_GEOCODIGOS}' y se dejaron al final de su ruta."
+                )
+
+        # Dividir en viajes según la capacidad del vehículo
+        viajes = []
+        if messagebox.askyesno("Cargas", "¿Desea dividir el reparto en viajes según la capacidad del vehículo?"):
+            capacidad = simpledialog.askinteger(
+                "Capacidad del vehículo",
+                "Cajas por viaje:",
+                initialvalue=self.store.capacidad_vehiculo,
+                minvalue=1
+            )
+            if capacidad:
+                if capacidad != self.store.capacidad_vehiculo:
+                    self.store.capacidad_vehiculo = capacidad
+                    self.guardar_estado()
+                viajes = cargas.planificar_cargas(clientes_con_pedidos, capacidad)
+
+        nombre_archivo = self.store.nombre_archivo_reparto(comuna)
+
+        # El Excel se escribe en segundo plano sobre una copia de los clientes,
+        # así la ventana sigue respondiendo aunque se editen mientras tanto
+        copias = {id(c): dict(c) for c in clientes_con_pedidos}
+        clientes_exportar = [copias[id(c)] for c in clientes_con_pedidos]
+        for viaje in viajes:
+            viaje.paradas = [(copias[id(c)], cajas) for c, cajas in viaje.paradas]
+
+        def exportar(tarea):
+            def al_avanzar(hechas, total):
+                tarea.reportar(hechas / total if total else 1.0, f"{hechas}/{total} filas")
+
+            with rendimiento.medir("Exportar reparto"):
+                return self.store.exportar_reparto(clientes_exportar, nombre_archivo, viajes, al_avanzar=al_avanzar)
+
+        def terminado(resultado):
+            total_cajas, total_ganancias = resultado
+            detalle_viajes = f" en {len(viajes)} viajes" if viajes else ""
+            messagebox.showinfo("Éxito", f"Archivo '{nombre_archivo}' generado correctamente con total de {total_cajas} cajas{detalle_viajes} y ganancias de ${total_ganancias:,.0f}".replace(",", "."))
+
+            # Las entregas reales (parciales, ausentes, cobros) se anotan al volver
+            if messagebox.askyesno("Cerrar reparto", "¿Deseas anotar ahora las entregas y cobros de este reparto?"):
+                self.ventana_cierre_reparto(clientes_con_pedidos)
+
+        self.tareas.enviar(
+            f"Exportando '{nombre_archivo}'",
+            exportar,
+            al_terminar=terminado,
+            al_error=lambda e: messagebox.showerror("Error", f"No se pudo generar el reparto: {e}"),
+            al_cancelar=lambda: messagebox.showinfo("Cancelado", "Se canceló la generación del reparto.")
+        )
+
+    # ------------------ Cierre de reparto ------------------
+
+    def ventana_cierre_reparto(self, clientes=None):
+        # Sin ruta explícita se cierra lo que muestra la tabla principal
+        if clientes is None:
+            clientes = self.store.filtrar(comuna=self.filtro_comuna_actual, dia=self.filtro_dia_actual, solo_pendientes=True)
+        if not clientes:
+            messagebox.showinfo("Sin pedidos", "No hay pedidos pendientes para cerrar.")
+            return
+        self._ruta_cierre = list(clientes)
+        self.abrir_ventana_unica("cierre_reparto", self._construir_ventana_cierre_reparto)
+
+    def _construir_ventana_cierre_reparto(self):
+        win = self.crear_toplevel_tema("Cerrar reparto", geometry="900x620")
+
+        tk.Label(win, text="🚚 Cerrar reparto", bg="#f7f9fb", font=("Segoe UI", 14, "bold")).pack(pady=(10, 2))
+        tk.Label(
+            win,
+            text="Anota por cliente las cajas entregadas, lo cobrado y el método. Enter o Tab avanzan, "
+                 "↑/↓ cambian de fila; lo que quede en blanco cuenta como no entregado.",
+            bg="#f7f9fb",
+            font=("Segoe UI", 9),
+            wraplength=840
+        ).pack(pady=(0, 6))
+
+        barra = tk.Frame(win, bg="#f7f9fb")
+        barra.pack(fill="x", padx=12)
+        tk.Label(barra, text="Método por defecto:", bg="#f7f9fb", font=("Segoe UI", 10)).pack(side="left")
+        combo_metodo = ttk.Combobox(barra, values=METODOS_PAGO, width=16)
+        combo_metodo.set(METODOS_PAGO[0])
+        combo_metodo.pack(side="left", padx=6)
+
+        tree_frame = tk.Frame(win, bg="#f7f9fb")
+        tree_frame.pack(fill="both", expand=True, padx=12, pady=(6, 0))
+        columnas = ("Cliente", "Comuna", "Pedido", "Entregadas", "Cobrado", "Método")
+        tree = ttk.Treeview(tree_frame, columns=columnas, show="headings", selectmode="browse")
+        for col, ancho in zip(columnas, (260, 140, 70, 90, 110, 120)):
+            tree.heading(col, text=col)
+            tree.column(col, width=ancho, anchor="w" if col == "Cliente" else "center")
+        tree.tag_configure("error", background="#f8d7da")
+        tree.tag_configure("parcial", background="#fff3cd")
+        tree.tag_configure("completo", background="#d4edda")
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+
+        label_totales = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 11, "bold"))
+        label_totales.pack(anchor="w", padx=14, pady=(6, 0))
+
+        editor = tk.Entry(tree, font=("Segoe UI", 10))
+        editables = ("Entregadas", "Cobrado", "Método")
+        filas = {}
+        totales = {"cajas": 0, "cobrado": 0.0, "anotados": 0}
+        celda = {"iid": None, "columna": None}
+
+        def leer_monto(texto):
+            limpio = texto.replace(" ", "").replace("$", "").replace(".", "").replace(",", ".")
+            return float(limpio) if limpio else 0.0
 
-        messagebox.showinfo("Éxito", f"Archivo '{nombre_archivo}' generado correctamente con total de {total_cajas} cajas y ganancias de ${total_ganancias:,.0f}".replace(",", "."))
+        def valores_fila(fila):
+            # (cajas, monto) válidos de la fila, o None si algo no se entiende
+            try:
+                cajas = int(fila["entregadas"]) if fila["entregadas"] else 0
+                monto = leer_monto(fila["cobrado"])
+            except ValueError:
+                return None
+            if not 0 <= cajas <= fila["pedido"] or monto < 0:
+                return None
+            return cajas, monto
+
+        def mostrar_totales():
+            label_totales.config(
+                text=f"Clientes: {len(filas)}   •   Anotados: {totales['anotados']}   •   "
+                     f"Cajas entregadas: {totales['cajas']}   •   Cobrado: {formato_moneda(totales['cobrado'])}"
+            )
+
+        def pintar(iid):
+            # Los totales se ajustan con la diferencia de la fila
+            fila = filas[iid]
+            valores = valores_fila(fila)
+            cajas, monto = valores or (0, 0.0)
+            anotado = 1 if fila["entregadas"] or fila["cobrado"] else 0
+            totales["cajas"] += cajas - fila["cajas"]
+            totales["cobrado"] += monto - fila["monto"]
+            totales["anotados"] += anotado - fila["anotado"]
+            fila["cajas"], fila["monto"], fila["anotado"] = cajas, monto, anotado
+            if valores is None:
+                etiqueta = ("error",)
+            elif cajas == fila["pedido"]:
+                etiqueta = ("completo",)
+            elif cajas:
+                etiqueta = ("parcial",)
+            else:
+                etiqueta = ()
+            tree.item(iid, values=(
+                fila["cliente"].get("nombre_completo", ""),
+                fila["cliente"].get("comuna") or "",
+                fila["pedido"],
+                fila["entregadas"],
+                formato_moneda(monto) if fila["cobrado"] and valores else fila["cobrado"],
+                fila["metodo"] if monto else ""
+            ), tags=etiqueta)
+            mostrar_totales()
+
+        def confirmar_edicion():
+            iid, columna = celda["iid"], celda["columna"]
+            celda["iid"] = None
+            editor.place_forget()
+            if iid is None or iid not in filas:
+                return
+            fila = filas[iid]
+            valor = editor.get().strip()
+            if columna == "Entregadas":
+                fila["entregadas"] = valor
+            elif columna == "Cobrado":
+                fila["cobrado"] = valor
+                if valor and not fila["metodo"]:
+                    fila["metodo"] = combo_metodo.get().strip()
+            else:
+                fila["metodo"] = valor
+            pintar(iid)
+
+        def editar(iid, columna):
+            confirmar_edicion()
+            tree.selection_set(iid)
+            tree.see(iid)
+            tree.update_idletasks()
+            caja = tree.bbox(iid, columna)
+            if not caja:
+                return
+            x, y, ancho, alto = caja
+            celda["iid"], celda["columna"] = iid, columna
+            fila = filas[iid]
+            editor.delete(0, tk.END)
+            editor.insert(0, {"Entregadas": fila["entregadas"], "Cobrado": fila["cobrado"], "Método": fila["metodo"]}[columna])
+            editor.select_range(0, tk.END)
+            editor.place(x=x, y=y, width=ancho, height=alto)
+            editor.focus_set()
+
+        def mover(filas_delta, columnas_delta):
+            iid, columna = celda["iid"], celda["columna"]
+            if iid is None:
+                return "break"
+            col = editables.index(columna) + columnas_delta
+            if col >= len(editables):
+                col, filas_delta = 0, filas_delta + 1
+            elif col < 0:
+                col, filas_delta = len(editables) - 1, filas_delta - 1
+            destino = iid
+            for _ in range(abs(filas_delta)):
+                siguiente = tree.next(destino) if filas_delta > 0 else tree.prev(destino)
+                if not siguiente:
+                    break
+                destino = siguiente
+            confirmar_edicion()
+            editar(destino, editables[col])
+            return "break"
+
+        def cancelar(_):
+            celda["iid"] = None
+            editor.place_forget()
+            tree.focus_set()
+            return "break"
+
+        def editar_seleccion(event=None):
+            seleccion = tree.selection()
+            if not seleccion:
+                return
+            columna = "Entregadas"
+            if event is not None and event.type == tk.EventType.ButtonPress:
+                indice_columna = int(tree.identify_column(event.x).lstrip("#") or 0) - 1
+                if 0 <= indice_columna < len(columnas) and columnas[indice_columna] in editables:
+                    columna = columnas[indice_columna]
+            editar(seleccion[0], columna)
+
+        def todo_entregado():
+            # Completa las filas sin anotar con el pedido completo y lo adeudado
+            confirmar_edicion()
+            metodo = combo_metodo.get().strip()
+            with rendimiento.medir("Cierre: completar filas"):
+                for iid, fila in filas.items():
+                    if fila["entregadas"] or fila["cobrado"]:
+                        continue
+                    fila["entregadas"] = str(fila["pedido"])
+                    fila["cobrado"] = str(round(fila["pedido"] * self.store.obtener_precio(fila["cliente"].get("comuna"))))
+                    fila["metodo"] = metodo
+                    pintar(iid)
+
+        def cargar_ruta():
+            celda["iid"] = None
+            editor.place_forget()
+            tree.delete(*tree.get_children())
+            filas.clear()
+            totales.update(cajas=0, cobrado=0.0, anotados=0)
+            listados = set()
+            for cliente in self._ruta_cierre:
+                pedido = cliente.get("cajas_de_huevos", 0)
+                if pedido <= 0 or id(cliente) in listados or self.store.cliente_por_id(cliente.get("id")) is not cliente:
+                    continue
+                listados.add(id(cliente))
+                iid = tree.insert("", "end")
+                filas[iid] = {
+                    "cliente": cliente, "pedido": pedido, "entregadas": "", "cobrado": "", "metodo": "",
+                    "cajas": 0, "monto": 0.0, "anotado": 0
+                }
+                pintar(iid)
+            mostrar_totales()
+            hijos = tree.get_children()
+            if hijos:
+                editar(hijos[0], "Entregadas")
+
+        def aplicar(_=None):
+            confirmar_edicion()
+            lote = []
+            errores = []
+            for numero, iid in enumerate(tree.get_children(), 1):
+                fila = filas[iid]
+                cliente = fila["cliente"]
+                valores = valores_fila(fila)
+                if self.store.cliente_por_id(cliente.get("id")) is not cliente:
+                    errores.append((iid, f"Fila {numero}: {cliente.get('nombre_completo', '')} ya no existe."))
+                elif cliente.get("cajas_de_huevos", 0) != fila["pedido"]:
+                    errores.append((iid, f"Fila {numero}: el pedido de {cliente.get('nombre_completo', '')} cambió mientras tanto."))
+                elif valores is None:
+                    errores.append((iid, f"Fila {numero}: revisa las cajas (0 a {fila['pedido']}) y el monto cobrado."))
+                else:
+                    cajas, monto = valores
+                    lote.append((cliente, cajas, monto, fila["metodo"] or combo_metodo.get().strip()))
+            for iid, _ in errores:
+                tree.item(iid, tags=("error",))
+            if errores:
+                detalle = "\n".join(mensaje for _, mensaje in errores[:10])
+                if len(errores) > 10:
+                    detalle += f"\n... y {len(errores) - 10} más."
+                messagebox.showerror("Revisa el cierre", f"No se aplicó ningún cambio:\n\n{detalle}", parent=win)
+                editar(errores[0][0], "Entregadas")
+                return "break"
+            sin_anotar = len(filas) - totales["anotados"]
+            if sin_anotar and not messagebox.askyesno(
+                "Cerrar reparto",
+                f"{sin_anotar} cliente(s) no tienen nada anotado y quedarán como no entregados. ¿Continuar?",
+                parent=win
+            ):
+                return "break"
+            with rendimiento.medir("Cerrar reparto"):
+                try:
+                    resultado = self.store.cerrar_reparto(lote)
+                except ValueError as e:
+                    messagebox.showerror("Revisa el cierre", f"No se aplicó ningún cambio:\n\n{e}", parent=win)
+                    return "break"
+                self.guardar_estado()
+                self.actualizar_filas([cliente for cliente, _, _, _ in lote])
+            win.withdraw()
+            messagebox.showinfo(
+                "Reparto cerrado",
+                f"Entregados completos: {resultado['completos']}\n"
+                f"Entregas parciales: {resultado['parciales']}\n"
+                f"No entregados: {resultado['ausentes']}\n"
+                f"Cajas entregadas: {resultado['cajas']}\n"
+                f"Cobrado: {formato_moneda(resultado['cobrado'])}\n\n"
+                "Puedes deshacerlo con Ctrl+Z."
+            )
+            return "break"
+
+        editor.bind("<Tab>", lambda _: mover(0, 1))
+        editor.bind("<Shift-Tab>", lambda _: mover(0, -1))
+        editor.bind("<ISO_Left_Tab>", lambda _: mover(0, -1))
+        editor.bind("<Return>", lambda _: mover(0, 1))
+        editor.bind("<Up>", lambda _: mover(-1, 0))
+        editor.bind("<Down>", lambda _: mover(1, 0))
+        editor.bind("<Escape>", cancelar)
+        editor.bind("<Control-Return>", aplicar)
+        tree.bind("<Return>", editar_seleccion)
+        tree.bind("<Double-1>", editar_seleccion)
+        tree.bind("<Control-Return>", aplicar)
+        for evento in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tree.bind(evento, lambda _: confirmar_edicion(), add="+")
+
+        botones = tk.Frame(win, bg="#f7f9fb")
+        botones.pack(pady=10)
+        ttk.Button(botones, text="Todo entregado y pagado", command=todo_entregado).grid(row=0, column=0, padx=6)
+        ttk.Button(botones, text="Aplicar cierre (Ctrl+Enter)", command=aplicar).grid(row=0, column=1, padx=6)
+        ttk.Button(botones, text="Cerrar", command=win.withdraw).grid(row=0, column=2, padx=6)
+
+        return win, cargar_ruta
 
     # ------------------ Centrar ventana ------------------
 
@@ -1423,21 +2710,14 @@ class App:
 
     # Crear una nueva ventana para gestionar precios por comuna
     def gestionar_precios_por_comuna(self):
-        win = self.crear_toplevel_tema("Gestionar Precios por Comuna", geometry="460x520")
+        self.abrir_ventana_unica("precios_comuna", self._construir_ventana_precios)
 
-        def formatear_moneda(valor):
-            try:
-                return f"${float(valor):,.0f}".replace(",", ".")
-            except (TypeError, ValueError):
-                return "$0"
+    def _construir_ventana_precios(self):
+        win = self.crear_toplevel_tema("Gestionar Precios por Comuna", geometry="460x520")
 
         tk.Label(win, text="Precios por Comuna", bg="#f7f9fb", font=("Segoe UI", 13, "bold")).pack(pady=(10, 4))
-        tk.Label(
-            win,
-            text=f"Precio general actual: {formatear_moneda(PRECIO_CAJA)}",
-            bg="#f7f9fb",
-            font=("Segoe UI", 10)
-        ).pack(pady=(0, 8))
+        label_precio_general = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 10))
+        label_precio_general.pack(pady=(0, 8))
 
         selector_frame = tk.LabelFrame(win, text="Asignar precio personalizado", bg="#f7f9fb", padx=8, pady=8)
         selector_frame.pack(fill="x", padx=12, pady=(0, 12))
@@ -1491,9 +2771,9 @@ class App:
                     entry_precio.insert(0, placeholder_text)
                 entry_precio.config(fg=placeholder_color)
                 return
-            if comuna_objetivo in self.precios_por_comuna:
+            if comuna_objetivo in self.store.precios_por_comuna:
                 entry_precio.delete(0, tk.END)
-                entry_precio.insert(0, str(self.precios_por_comuna[comuna_objetivo]))
+                entry_precio.insert(0, str(self.store.precios_por_comuna[comuna_objetivo]))
                 entry_precio.config(fg=getattr(entry_precio, "_text_color", "#000"))
             else:
                 placeholder_text = getattr(entry_precio, "_placeholder_text", "")
@@ -1505,19 +2785,19 @@ class App:
 
         def refrescar_tree(seleccionar_actual=None):
             tree.delete(*tree.get_children())
-            comunas_union = set(self.comunas)
-            comunas_union.update(self.estandarizar_comuna(c) for c in self.precios_por_comuna.keys())
-            comunas_ordenadas = sorted(c for c in comunas_union if c)
+            comunas_union = set(self.store.comunas)
+            comunas_union.update(self.store.estandarizar_comuna(c) for c in self.store.precios_por_comuna.keys())
+            comunas_ordenadas = self.store.ordenar_comunas(c for c in comunas_union if c)
             personalizados = 0
             for comuna in comunas_ordenadas:
-                if comuna in self.precios_por_comuna:
-                    precio = self.precios_por_comuna[comuna]
+                if comuna in self.store.precios_por_comuna:
+                    precio = self.store.precios_por_comuna[comuna]
                     origen = "Personalizado"
                     personalizados += 1
                 else:
-                    precio = PRECIO_CAJA
+                    precio = self.store.precio_caja
                     origen = "General"
-                tree.insert("", "end", iid=comuna, values=(comuna, formatear_moneda(precio), origen))
+                tree.insert("", "end", iid=comuna, values=(comuna, formato_moneda(precio), origen))
             resumen_label.config(
                 text=f"Comunas registradas: {len(comunas_ordenadas)} • Personalizados: {personalizados}"
             )
@@ -1525,8 +2805,6 @@ class App:
                 tree.selection_set(seleccionar_actual)
                 tree.see(seleccionar_actual)
 
-        refrescar_tree()
-
         def guardar_precio_personalizado():
             comuna_sel = self.obtener_comuna_combo(combo_comuna)
             if not comuna_sel:
@@ -1545,7 +2823,7 @@ class App:
                 messagebox.showerror("Error", "El precio debe ser mayor a 0.")
                 return
             comuna_registrada = self.registrar_comuna(comuna_sel)
-            self.precios_por_comuna[comuna_registrada] = precio
+            self.store.fijar_precio_comuna(comuna_registrada, precio)
             self.guardar_estado()
             self.ver_clientes()
             combo_comuna.set(comuna_registrada)
@@ -1553,7 +2831,7 @@ class App:
             actualizar_entry_para_comuna(comuna_registrada)
             messagebox.showinfo(
                 "Éxito",
-                f"Precio personalizado para {comuna_registrada} guardado en {formatear_moneda(precio)}."
+                f"Precio personalizado para {comuna_registrada} guardado en {formato_moneda(precio)}."
             )
 
         def restablecer_precio_general():
@@ -1562,7 +2840,7 @@ class App:
                 messagebox.showerror("Error", "Selecciona una comuna para restablecer el precio general.")
                 return
             comuna_registrada = self.registrar_comuna(comuna_sel, actualizar_opciones=False)
-            if comuna_registrada not in self.precios_por_comuna:
+            if comuna_registrada not in self.store.precios_por_comuna:
                 messagebox.showinfo("Sin cambios", "La comuna ya usa el precio general.")
                 actualizar_entry_para_comuna(comuna_registrada)
                 return
@@ -1571,14 +2849,14 @@ class App:
                 f"¿Restablecer el precio general para {comuna_registrada}?"
             ):
                 return
-            self.precios_por_comuna.pop(comuna_registrada, None)
+            self.store.quitar_precio_comuna(comuna_registrada)
             self.guardar_estado()
             self.ver_clientes()
             refrescar_tree(seleccionar_actual=comuna_registrada)
             actualizar_entry_para_comuna(comuna_registrada)
             messagebox.showinfo(
                 "Éxito",
-                f"{comuna_registrada} volverá a usar el precio general ({formatear_moneda(PRECIO_CAJA)})."
+                f"{comuna_registrada} volverá a usar el precio general ({formato_moneda(self.store.precio_caja)})."
             )
 
         def on_tree_select(_):
@@ -1606,19 +2884,317 @@ class App:
         botones.pack(pady=12)
         ttk.Button(botones, text="Guardar precio", command=guardar_precio_personalizado).grid(row=0, column=0, padx=6)
         ttk.Button(botones, text="Restablecer general", command=restablecer_precio_general).grid(row=0, column=1, padx=6)
-        ttk.Button(botones, text="Cerrar", command=win.destroy).grid(row=0, column=2, padx=6)
+        ttk.Button(botones, text="Cerrar", command=win.withdraw).grid(row=0, column=2, padx=6)
+
+        def refrescar():
+            label_precio_general.config(text=f"Precio general actual: {formato_moneda(self.store.precio_caja)}")
+            comuna_sel = self.obtener_comuna_combo(combo_comuna)
+            refrescar_tree(seleccionar_actual=comuna_sel)
+            actualizar_entry_para_comuna(comuna_sel)
+
+        return win, refrescar
+
+    # ------------------ Planificar días de reparto ------------------
 
-        actualizar_entry_para_comuna(self.obtener_comuna_combo(combo_comuna))
+    def ventana_planificar_dias(self):
+        if not self.store.clientes:
+            messagebox.showinfo("Sin datos", "No hay clientes registrados.")
+            return
+
+        win = self.crear_toplevel_tema("Planificar días de reparto", geometry="820x640")
+
+        tk.Label(win, text="🗓️ Planificar días de reparto", bg="#f7f9fb", font=("Segoe UI", 14, "bold")).pack(pady=(10, 4))
+        tk.Label(
+            win,
+            text="Equilibra cajas pendientes y paradas por día, manteniendo cada comuna en pocos días.",
+            bg="#f7f9fb",
+            font=("Segoe UI", 10)
+        ).pack(pady=(0, 8))
+
+        dias_frame = tk.Frame(win, bg="#f7f9fb")
+        dias_frame.pack(fill="x", padx=14)
+        tk.Label(dias_frame, text="Días (separados por coma):", bg="#f7f9fb").pack(side="left")
+        entry_dias = tk.Entry(dias_frame, width=50, font=("Segoe UI", 10))
+        entry_dias.insert(0, ", ".join(planificador.DIAS_POR_DEFECTO))
+        entry_dias.pack(side="left", padx=(6, 0))
+
+        cols_resumen = ("Día", "Paradas actuales", "Cajas actuales", "Paradas propuestas", "Cajas propuestas", "Comunas")
+        tree_resumen = ttk.Treeview(win, columns=cols_resumen, show="headings", height=7)
+        for col in cols_resumen:
+            tree_resumen.heading(col, text=col)
+            tree_resumen.column(col, width=120, anchor="center")
+        tree_resumen.pack(fill="x", padx=12, pady=(10, 6))
+
+        label_cambios = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 10, "bold"))
+        label_cambios.pack(anchor="w", padx=14)
+
+        tree_frame = tk.Frame(win, bg="#f7f9fb")
+        tree_frame.pack(fill="both", expand=True, padx=12, pady=(4, 6))
+        cols_clientes = ("Cliente", "Comuna", "Día actual", "Día propuesto", "Fijo")
+        tree_clientes = ttk.Treeview(tree_frame, columns=cols_clientes, show="headings", height=12)
+        for col in cols_clientes:
+            tree_clientes.heading(col, text=col)
+            tree_clientes.column(col, width=200 if col == "Cliente" else 130, anchor="w" if col == "Cliente" else "center")
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree_clientes.yview)
+        tree_clientes.configure(yscrollcommand=scrollbar.set)
+        tree_clientes.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+
+        # Fijaciones pendientes de aplicar (id de cliente -> fijo)
+        fijados = {c.get("id"): bool(c.get("dia_fijo")) for c in self.store.clientes}
+        estado = {"plan": None, "dias": [], "generacion": 0}
+        max_filas = 2000
+
+        def leer_dias():
+            dias = []
+            for parte in self.obtener_valor_entry(entry_dias).split(","):
+                dia = parte.strip().title()
+                if dia and dia not in dias:
+                    dias.append(dia)
+            return dias
+
+        def recalcular():
+            dias = leer_dias()
+            if not dias:
+                messagebox.showerror("Error", "Ingresa al menos un día de reparto.")
+                return
+            # Un plan a medio calcular no se aplica; si llega uno viejo se ignora
+            estado["plan"] = None
+            estado["generacion"] += 1
+            generacion = estado["generacion"]
+            clientes = list(self.store.clientes)
+            fijos = dict(fijados)
+
+            def calcular(tarea=None):
+                plan = planificador.planificar(clientes, dias, es_fijo=lambda c: fijos.get(c.get("id"), False))
+                actual = {fila["dia"]: fila for fila in planificador.resumen_actual(clientes, dias)}
+                return plan, actual
+
+            def listo(resultado):
+                if generacion == estado["generacion"] and win.winfo_exists():
+                    mostrar(dias, *resultado)
+
+            if len(clientes) < UMBRAL_GUARDADO_SEGUNDO_PLANO:
+                listo(calcular())
+                return
+            # Con muchos clientes el cálculo toma segundos: va en segundo plano
+            label_cambios.config(text="Calculando propuesta...")
+            self.tareas.enviar(
+                "Planificando días de reparto", calcular, al_terminar=listo,
+                al_error=lambda e: messagebox.showerror("Error", f"No se pudo calcular la propuesta: {e}")
+            )
+
+        def mostrar(dias, plan, actual):
+            estado["plan"] = plan
+            estado["dias"] = dias
+
+            tree_resumen.delete(*tree_resumen.get_children())
+            for fila in plan.resumen():
+                previo = actual.get(fila["dia"], {"paradas": 0, "cajas": 0})
+                tree_resumen.insert("", "end", values=(
+                    fila["dia"], previo["paradas"], previo["cajas"], fila["paradas"], fila["cajas"], fila["comunas"]
+                ))
+            if "Sin día" in actual:
+                sin_dia = actual["Sin día"]
+                tree_resumen.insert("", "end", values=("Sin día", sin_dia["paradas"], sin_dia["cajas"], 0, 0, "-"))
+
+            tree_clientes.delete(*tree_clientes.get_children())
+            cambios = plan.cambios()
+            mostrados = 0
+            # Se listan los cambios y los clientes fijados
+            for cliente, dia in plan.asignacion:
+                cliente_id = cliente.get("id")
+                actual_dia = (cliente.get("dia_reparto") or "").strip().title() or "-"
+                if dia == planificador.canonizar_dia(cliente.get("dia_reparto"), dias) and not fijados.get(cliente_id):
+                    continue
+                if mostrados >= max_filas:
+                    break
+                tree_clientes.insert("", "end", iid=cliente_id, values=(
+                    cliente.get("nombre_completo", ""),
+                    cliente.get("comuna", ""),
+                    actual_dia,
+                    dia,
+                    "Sí" if fijados.get(cliente_id) else ""
+                ))
+                mostrados += 1
+            extra = f" (mostrando {mostrados})" if len(cambios) > mostrados else ""
+            label_cambios.config(
+                text=f"Clientes que cambian de día: {len(cambios)}{extra} • Calculado en {plan.segundos * 1000:.0f} ms"
+            )
+
+        def alternar_fijo():
+            seleccion = tree_clientes.selection()
+            if not seleccion:
+                messagebox.showerror("Error", "Selecciona uno o más clientes.")
+                return
+            sin_dia = []
+            for cliente_id in seleccion:
+                cliente = self.store.cliente_por_id(cliente_id)
+                if cliente is None:
+                    continue
+                if not fijados.get(cliente_id) and not (cliente.get("dia_reparto") or "").strip():
+                    sin_dia.append(cliente.get("nombre_completo", ""))
+                    continue
+                fijados[cliente_id] = not fijados.get(cliente_id)
+            if sin_dia:
+                messagebox.showwarning("Sin día", "No se pueden fijar clientes sin día de reparto:\n" + "\n".join(sin_dia[:10]))
+            recalcular()
+
+        def aplicar():
+            plan = estado["plan"]
+            if plan is None:
+                return
+            cambios = len(plan.cambios())
+            if not messagebox.askyesno("Confirmar", f"¿Asignar el día propuesto a {cambios} cliente(s)?"):
+                return
+            cambios = self.store.aplicar_planificacion(planificador.propuesta(plan), fijados)
+            self.guardar_estado()
+            self.ver_clientes()
+            win.destroy()
+            messagebox.showinfo("Éxito", f"Se actualizaron los días de reparto de {cambios} cliente(s).")
+
+        entry_dias.bind("<Return>", lambda _: recalcular())
+
+        botones = tk.Frame(win, bg="#f7f9fb")
+        botones.pack(pady=(0, 10))
+        ttk.Button(botones, text="Recalcular", command=recalcular).grid(row=0, column=0, padx=6)
+        ttk.Button(botones, text="Fijar / soltar seleccionados", command=alternar_fijo).grid(row=0, column=1, padx=6)
+        ttk.Button(botones, text="Aplicar", command=aplicar).grid(row=0, column=2, padx=6)
+        ttk.Button(botones, text="Cerrar", command=win.destroy).grid(row=0, column=3, padx=6)
 
         self.registrar_descendencia_tema(win)
 
+        recalcular()
+
+    # ------------------ Clientes duplicados ------------------
+
+    def ventana_duplicados(self):
+        if len(self.store.clientes) < 2:
+            messagebox.showinfo("Sin datos", "No hay suficientes clientes para comparar.")
+            return
+        clientes = list(self.store.clientes)
+        if len(clientes) < UMBRAL_GUARDADO_SEGUNDO_PLANO:
+            self._mostrar_duplicados(*duplicados.buscar_duplicados(clientes))
+            return
+
+        # Con muchos clientes la búsqueda toma segundos: va en segundo plano
+        def buscar(tarea):
+            return duplicados.buscar_duplicados(clientes)
+
+        def listo(resultado):
+            pares, estadisticas = resultado
+            # Lo eliminado o fusionado mientras se buscaba ya no aplica
+            vigentes = [
+                par for par in pares
+                if self.store.cliente_por_id(par[0].get("id")) is par[0] and self.store.cliente_por_id(par[1].get("id")) is par[1]
+            ]
+            self._mostrar_duplicados(vigentes, estadisticas)
+
+        self.tareas.enviar(
+            "Buscando clientes duplicados", buscar, al_terminar=listo,
+            al_error=lambda e: messagebox.showerror("Error", f"No se pudo buscar duplicados: {e}")
+        )
+
+    def _mostrar_duplicados(self, pares, estadisticas):
+        if not pares:
+            messagebox.showinfo("Sin duplicados", "No se encontraron clientes duplicados.")
+            return
+
+        win = self.crear_toplevel_tema("Clientes duplicados", geometry="900x520")
+
+        tk.Label(win, text="👥 Posibles clientes duplicados", bg="#f7f9fb", font=("Segoe UI", 14, "bold")).pack(pady=(10, 4))
+        label_estado = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 10))
+        label_estado.pack(pady=(0, 8))
+
+        tree_frame = tk.Frame(win, bg="#f7f9fb")
+        tree_frame.pack(fill="both", expand=True, padx=12, pady=(0, 6))
+        columnas = ("Cliente A", "Cliente B", "Similitud", "Motivo")
+        tree = ttk.Treeview(tree_frame, columns=columnas, show="headings", height=14)
+        for col in columnas:
+            tree.heading(col, text=col)
+        tree.column("Cliente A", width=300, anchor="w")
+        tree.column("Cliente B", width=300, anchor="w")
+        tree.column("Similitud", width=80, anchor="center")
+        tree.column("Motivo", width=180, anchor="w")
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+
+        def describir(c):
+            return (
+                f"{c.get('nombre_completo', '')} ({c.get('telefono', '')}) - "
+                f"{c.get('direccion', '')}, {c.get('comuna', '')} — Pendiente: {c.get('cajas_de_huevos', 0)}"
+            )
+
+        pendientes = {}
+
+        def refrescar():
+            tree.delete(*tree.get_children())
+            pendientes.clear()
+            for idx, (a, b, puntaje, motivos) in enumerate(pares):
+                pendientes[str(idx)] = (a, b)
+                tree.insert("", "end", iid=str(idx), values=(describir(a), describir(b), f"{puntaje:.0%}", ", ".join(motivos)))
+            label_estado.config(
+                text=(
+                    f"{len(pares)} par(es) • {estadisticas['comparaciones']} comparaciones entre "
+                    f"{estadisticas['clientes']} clientes en {estadisticas['segundos']:.2f} s"
+                )
+            )
+
+        def fusionar(conservar_a):
+            seleccion = tree.selection()
+            if not seleccion:
+                messagebox.showerror("Error", "Selecciona un par de clientes.")
+                return
+            a, b = pendientes[seleccion[0]]
+            conservado, duplicado = (a, b) if conservar_a else (b, a)
+            if not messagebox.askyesno(
+                "Confirmar fusión",
+                f"¿Fusionar '{duplicado.get('nombre_completo', '')}' en '{conservado.get('nombre_completo', '')}'?\n"
+                "Se sumarán las cajas y se eliminará el registro duplicado."
+            ):
+                return
+            relinkeados = self.store.fusionar_clientes(conservado, duplicado)
+            self.cache_rutas.invalidar(rutas.clave_cliente(duplicado))
+            # Los pares que involucraban al registro eliminado ya no aplican
+            pares[:] = [p for p in pares if p[0] is not duplicado and p[1] is not duplicado]
+            self.guardar_estado()
+            self.ver_clientes()
+            refrescar()
+            detalle = f" Se actualizaron {relinkeados} registro(s) de caja y entregas." if relinkeados else ""
+            messagebox.showinfo("Éxito", f"Clientes fusionados correctamente.{detalle}")
+
+        def ignorar():
+            seleccion = tree.selection()
+            if not seleccion:
+                return
+            a, b = pendientes[seleccion[0]]
+            pares[:] = [p for p in pares if not (p[0] is a and p[1] is b)]
+            refrescar()
+
+        botones = tk.Frame(win, bg="#f7f9fb")
+        botones.pack(pady=(0, 10))
+        ttk.Button(botones, text="Fusionar (conservar A)", command=lambda: fusionar(True)).grid(row=0, column=0, padx=6)
+        ttk.Button(botones, text="Fusionar (conservar B)", command=lambda: fusionar(False)).grid(row=0, column=1, padx=6)
+        ttk.Button(botones, text="Ignorar", command=ignorar).grid(row=0, column=2, padx=6)
+        ttk.Button(botones, text="Cerrar", command=win.destroy).grid(row=0, column=3, padx=6)
+
+        self.registrar_descendencia_tema(win)
+
+        refrescar()
+
     # ------------------ Agregar día de reparto ------------------
 
     def agregar_dia_reparto(self):
         def guardar_dia():
             dia = self.obtener_valor_entry(entry_dia)
             if dia:
-                cliente["dia_reparto"] = dia
+                self.store.asignar_dia(cliente, dia)
                 self.guardar_estado()
                 self.ver_clientes()
                 win.destroy()
@@ -1631,7 +3207,7 @@ class App:
             messagebox.showerror("Error", "Seleccione un cliente para agregar el día de reparto.")
             return
 
-        cliente = self.data[self.tree.index(sel[0])]
+        cliente = self.store.cliente_por_id(sel[0])
 
         win = self.crear_toplevel_tema("Agregar Día de Reparto", geometry="300x150")
 
@@ -1649,9 +3225,164 @@ class App:
 
         self.registrar_descendencia_tema(win)
 
+    # ------------------ Rendimiento ------------------
+
+    def ventana_rendimiento(self):
+        win = self.crear_toplevel_tema("Rendimiento", geometry="720x460")
+
+        tk.Label(win, text="⏱️ Tiempos por acción", bg="#f7f9fb", font=("Segoe UI", 14, "bold")).pack(pady=(10, 4))
+
+        medir_var = tk.BooleanVar(value=rendimiento.activo())
+        ttk.Checkbutton(
+            win,
+            text="Medir acciones",
+            variable=medir_var,
+            command=lambda: rendimiento.activar(medir_var.get())
+        ).pack(pady=(0, 6))
+
+        tree_frame = tk.Frame(win, bg="#f7f9fb")
+        tree_frame.pack(fill="both", expand=True, padx=12, pady=(0, 6))
+        columnas = ("Acción", "Muestras", "p50 (ms)", "p95 (ms)", "Máx (ms)", "Último (ms)")
+        tree = ttk.Treeview(tree_frame, columns=columnas, show="headings", height=12)
+        for col in columnas:
+            tree.heading(col, text=col)
+            tree.column(col, width=90, anchor="e")
+        tree.column("Acción", width=240, anchor="w")
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+
+        label_indicadores = tk.Label(win, text="", bg="#f7f9fb", font=("Segoe UI", 10), justify="left")
+        label_indicadores.pack(anchor="w", padx=18, pady=(0, 6))
+
+        def refrescar():
+            if not win.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for fila in rendimiento.estadisticas():
+                tree.insert("", "end", values=(
+                    fila["accion"],
+                    fila["muestras"],
+                    f"{fila['p50'] * 1000:.1f}",
+                    f"{fila['p95'] * 1000:.1f}",
+                    f"{fila['max'] * 1000:.1f}",
+                    f"{fila['ultimo'] * 1000:.1f}"
+                ))
+            label_indicadores.config(text="\n".join(f"{nombre}: {valor}" for nombre, valor in rendimiento.indicadores().items()))
+            win.after(1000, refrescar)
+
+        def exportar():
+            nombre_archivo = filedialog.asksaveasfilename(
+                parent=win,
+                defaultextension=".json",
+                initialfile=f"rendimiento_{datetime.now().strftime('%d-%m-%Y_%H%M')}.json",
+                filetypes=[("JSON", "*.json")]
+            )
+            if not nombre_archivo:
+                return
+            try:
+                rendimiento.exportar(nombre_archivo)
+            except OSError as e:
+                messagebox.showerror("Error", f"No se pudo guardar el archivo: {e}")
+                return
+            messagebox.showinfo("Éxito", f"Tiempos guardados en '{nombre_archivo}'.")
+
+        botones = tk.Frame(win, bg="#f7f9fb")
+        botones.pack(pady=(0, 10))
+        ttk.Button(botones, text="Limpiar", command=rendimiento.limpiar).grid(row=0, column=0, padx=6)
+        ttk.Button(botones, text="Exportar…", command=exportar).grid(row=0, column=1, padx=6)
+        ttk.Button(botones, text="Cerrar", command=win.destroy).grid(row=0, column=2, padx=6)
+
+        self.registrar_descendencia_tema(win)
+
+        refrescar()
+
+    # ------------------ Servidor para repartidores ------------------
+
+    def alternar_servidor(self):
+        import servidor
+
+        indice_menu = self.menu_herramientas.index("end")
+        if self.servidor and self.servidor.activo:
+            if not messagebox.askyesno("Servidor", "¿Detener el servidor para repartidores?"):
+                return
+            self.servidor.detener()
+            self.servidor = None
+            if self._cambios_servidor:
+                self.aplicar_cambios_servidor()
+            self.menu_herramientas.entryconfig(indice_menu, label="Iniciar servidor para repartidores")
+            return
+
+        puerto = simpledialog.askinteger(
+            "Servidor para repartidores",
+            "Puerto:",
+            initialvalue=servidor.PUERTO_POR_DEFECTO,
+            minvalue=1024,
+            maxvalue=65535,
+            parent=self.root
+        )
+        if not puerto:
+            return
+        # Escucha en toda la red local: sin el token nadie más puede marcar
+        # entregas ni pagos. Se mantiene mientras la ventana esté abierta
+        if not self._token_servidor:
+            self._token_servidor = servidor.nuevo_token()
+        self.servidor = servidor.ServidorReparto(self.store, puerto=puerto, token=self._token_servidor)
+        try:
+            self.servidor.iniciar()
+        except OSError as e:
+            self.servidor = None
+            messagebox.showerror("Error", f"No se pudo iniciar el servidor: {e}")
+            return
+        self.menu_herramientas.entryconfig(indice_menu, label="Detener servidor para repartidores")
+        self.root.after(50, self.atender_servidor)
+        try:
+            direccion = socket.gethostbyname(socket.gethostname())
+        except OSError:
+            direccion = "127.0.0.1"
+        messagebox.showinfo(
+            "Servidor",
+            f"Servidor activo en http://{direccion}:{self.servidor.puerto}\n"
+            f"Token para los repartidores: {self._token_servidor}\n"
+            f"(encabezado 'Authorization: Bearer {self._token_servidor}' o ?token={self._token_servidor} en la dirección)\n"
+            "Rutas: GET /rutas, GET /clientes?q=, POST /clientes/<id>/entrega, POST /clientes/<id>/pago"
+        )
+
+    def atender_servidor(self):
+        from servidor import INTERVALO_GUARDADO
+
+        # El hilo de Tk es el único que aplica los cambios pedidos por red
+        if not self.servidor or not self.servidor.activo:
+            return
+        _, modificados = self.servidor.atender_cola()
+        if modificados:
+            self._cambios_servidor = True
+            self._clientes_servidor |= modificados
+        ahora = time.monotonic()
+        if self._cambios_servidor and ahora - self._ultimo_guardado_servidor >= INTERVALO_GUARDADO:
+            self._ultimo_guardado_servidor = ahora
+            self.aplicar_cambios_servidor()
+        self.root.after(50, self.atender_servidor)
+
+    def aplicar_cambios_servidor(self):
+        # Guarda y refresca solo las filas de los clientes que tocó la red
+        self._cambios_servidor = False
+        ids, self._clientes_servidor = self._clientes_servidor, set()
+        self.guardar_estado()
+        clientes = [self.store.cliente_por_id(cliente_id) for cliente_id in ids]
+        self.actualizar_filas([c for c in clientes if c is not None])
+
 # ------------------ Ejecución ------------------
 
 if __name__ == "__main__":
+    medir_arranque = sys.argv[1:] == ["--medir-arranque"]
+    if len(sys.argv) > 1 and not medir_arranque:
+        # Con argumentos se ejecuta por lotes, sin abrir la ventana
+        import cli
+        sys.exit(cli.main(sys.argv[1:]))
     root = tk.Tk()
-    app = App(root)
+    app = App(root, medir_arranque=medir_arranque)
     root.mainloop()  # 🔹 Verificado: formato correcto
@@ -0,0 +1,1232 @@
+import json
+import math
+import os
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+import cargas
+import concurrencia
+import consultas
+import duplicados
+import fragmentos
+import replicacion
+import reportes_caja
+import respaldos
+from comunas import RegistroComunas
+from historial import FALTA, Historial
+from texto import normalizar
+
+# Núcleo sin interfaz gráfica: modelo de datos y operaciones del reparto.
+# La ventana Tk, la línea de comandos y los benchmarks trabajan sobre un
+# RepartoStore; ninguna función de este módulo toca widgets ni messagebox.
+
+ARCHIVO = "db.json"
+
+PRECIO_CAJA = 1000  # 🔹 Precio inicial de la bandeja de huevos
+DEFAULT_CAJA_MANUAL = {}
+
+COLUMNAS_TABLA = consultas.COLUMNAS
+ORDEN_POR_DEFECTO = (("Pendiente a entrega", True),)
+
+CLAVES_DATOS = ("version", "clientes", "precio_caja", "precios_por_comuna", "movimientos", "entregas", "caja_manual", "comunas", "capacidad_vehiculo", "vistas", "replicacion", "fragmentos")
+
+
+# Textos de búsqueda y filtro de cada cliente, ya normalizados
+ClavesCliente = namedtuple("ClavesCliente", "nombre telefono comuna dia")
+
+
+class ErrorDatos(Exception):
+    pass
+
+
+# ------------------ Funciones base ------------------
+
+def datos_por_defecto():
+    return {
+        "clientes": [],
+        "precio_caja": PRECIO_CAJA,
+        "precios_por_comuna": {},
+        "movimientos": [],
+        "entregas": [],
+        "caja_manual": DEFAULT_CAJA_MANUAL.copy(),
+        "comunas": [],
+        "capacidad_vehiculo": cargas.CAPACIDAD_POR_DEFECTO,
+        "vistas": {}
+    }
+
+
+def cargar_datos(archivo=ARCHIVO, comunas=None):
+    # Con comunas, de un archivo por fragmentos se leen solo esos clientes
+    if not os.path.exists(archivo):
+        return datos_por_defecto()
+    # Solo un contenido ilegible es ErrorDatos (y se recupera de un respaldo);
+    # un error de lectura (permisos, carpeta de red ocupada) sale como
+    # OSError sin tocar el archivo
+    for intento in range(3):
+        try:
+            with open(archivo, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ErrorDatos(f"El archivo de datos está corrupto o tiene un formato incorrecto: {e}") from e
+        if not isinstance(data, dict):
+            raise ErrorDatos("El archivo JSON no tiene la estructura esperada.")
+        manifiesto = data.get("fragmentos")
+        if not isinstance(manifiesto, dict):
+            data.pop("fragmentos", None)
+            break
+        claves = fragmentos.claves_de(manifiesto, comunas) if comunas else None
+        try:
+            data["clientes"] = fragmentos.leer(archivo, manifiesto, claves)
+        except FileNotFoundError as e:
+            # Otra copia acaba de guardar: se vuelve a leer el manifiesto
+            if intento == 2:
+                raise ErrorDatos(f"Falta un fragmento de clientes: {e}") from e
+            time.sleep(concurrencia.INTERVALO_REINTENTO)
+            continue
+        except fragmentos.ErrorFragmento as e:
+            raise ErrorDatos(str(e)) from e
+        data["fragmentos"] = {"cargados": sorted(claves)} if claves is not None else {}
+        break
+    # Asegurarse de que las claves necesarias estén presentes
+    for clave, valor in datos_por_defecto().items():
+        data.setdefault(clave, valor)
+    data["caja_manual"] = {}
+    return data
+
+
+def guardar_datos(data, archivo=ARCHIVO, compacto=False, huellas=None):
+    # Se escribe aparte y se reemplaza: un corte a mitad no deja db.json a medias.
+    # Con "fragmentos", los clientes van a sus archivos por comuna y db.json
+    # queda como manifiesto. huellas: id -> huella, si ya se calcularon.
+    escritura = None
+    if data.get("fragmentos") is not None:
+        escritura = fragmentos.Escritura(archivo, data, compacto, huellas)
+        data = {k: v for k, v in data.items() if k != "clientes"}
+        data["fragmentos"] = escritura.manifiesto
+    temporal = archivo + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        if compacto:
+            json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+        else:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(temporal, archivo)
+    if escritura:
+        escritura.confirmar()
+
+
+def guardar_datos_versionado(data, archivo, compacto, version_base, firma_base, huellas=None):
+    # Solo escribe si nadie más tocó el archivo desde la última sincronización;
+    # devuelve la firma del archivo escrito
+    with concurrencia.bloquear(archivo):
+        if concurrencia.firma(archivo) != firma_base or concurrencia.leer_version(archivo) != version_base:
+            raise concurrencia.CambioExterno(archivo)
+        data["version"] = version_base + 1
+        guardar_datos(data, archivo, compacto, huellas)
+        firma = concurrencia.firma(archivo)
+    if (data.get("fragmentos") or {}).get("cargados") is not None:
+        # Con solo algunas comunas cargadas el respaldo saldría incompleto
+        return firma
+    # Fuera del bloqueo: la otra copia no espera a que se comprima el respaldo
+    try:
+        respaldos.gestor(archivo).respaldar(data)
+    except OSError:
+        pass  # sin respaldo esta vez; el guardado ya quedó hecho
+    return firma
+
+
+def recuperar_datos(archivo=ARCHIVO):
+    # db.json ilegible: se aparta (así ningún guardado lo pisa) y se vuelve
+    # al respaldo válido más reciente. Devuelve ese respaldo, o None. Si no
+    # se puede apartar, OSError: no se escribe nada encima.
+    if os.path.exists(archivo):
+        danado = f"{archivo}.danado-{datetime.now():%Y%m%d-%H%M%S}"
+        try:
+            os.replace(archivo, danado)
+        except OSError as e:
+            raise OSError(f"No se pudo apartar el archivo dañado '{archivo}': {e}") from e
+    encontrado = respaldos.ultimo_valido(archivo)
+    if encontrado is None:
+        return None
+    respaldo, datos = encontrado
+    fragmentos.olvidar(archivo)
+    guardar_datos(datos, archivo)
+    return respaldo
+
+
+def es_archivo_compacto(archivo=ARCHIVO):
+    # Un archivo sin saltos de línea al inicio fue escrito en formato compacto
+    if not os.path.exists(archivo):
+        return False
+    with open(archivo, "r", encoding="utf-8", errors="ignore") as f:
+        inicio = f.read(256)
+    return bool(inicio) and "\n" not in inicio
+
+
+def nuevo_id():
+    return uuid.uuid4().hex
+
+
+def formato_moneda(valor):
+    try:
+        return f"${float(valor):,.0f}".replace(",", ".")
+    except (TypeError, ValueError):
+        return "$0"
+
+
+# ------------------ Store ------------------
+
+class RepartoStore:
+    def __init__(self, datos=None, archivo=ARCHIVO):
+        datos = datos if datos is not None else datos_por_defecto()
+        self.archivo = archivo
+        self.compacto = False
+        # Estado del archivo en la última lectura/escritura (antes de canonizar)
+        self.version = datos.get("version", 0)
+        self.firma_archivo = None
+        self._base = concurrencia.calcular_base(datos)
+        self.conflictos = []
+        self.historial = Historial()
+        self.clientes = datos.get("clientes", [])
+        self.precio_caja = datos.get("precio_caja", PRECIO_CAJA)
+        self.movimientos = datos.get("movimientos", [])
+        self.entregas = datos.get("entregas", [])
+        self._ultimo_id_movimiento = ""
+        self.caja_manual = dict(datos.get("caja_manual", {}))
+        self.capacidad_vehiculo = datos.get("capacidad_vehiculo", cargas.CAPACIDAD_POR_DEFECTO)
+        # Claves que no maneja el núcleo se conservan tal cual al guardar
+        self.extras = {k: v for k, v in datos.items() if k not in CLAVES_DATOS}
+        self.precios_por_comuna = dict(datos.get("precios_por_comuna", {}))
+        self.vistas = dict(datos.get("vistas", {}))
+        self.replica = replicacion.estado_inicial(datos.get("replicacion"))
+        # None: un solo db.json; si no, clientes por comuna (ver fragmentos.py)
+        self.fragmentos = datos.get("fragmentos")
+        self._comunas = RegistroComunas()
+        self._indice_ids = {}
+        self._claves = {}
+        self._indice_precios = None
+        # Columnas del reporte de caja y contador de ediciones de movimientos
+        # ya existentes (ver columnas_caja)
+        self._columnas_caja = None
+        self._ediciones_caja = 0
+        self.actualizar_comunas_existentes(datos.get("comunas", []))
+        self._asegurar_ids()
+
+    @classmethod
+    def cargar(cls, archivo=ARCHIVO, comunas=None):
+        firma = concurrencia.firma(archivo)
+        store = cls(cargar_datos(archivo, comunas), archivo=archivo)
+        store.compacto = es_archivo_compacto(archivo)
+        store.firma_archivo = firma
+        return store
+
+    def como_dict(self):
+        # "version" va primero: concurrencia.leer_version lee solo el comienzo
+        datos = {"version": self.version}
+        datos.update(self.extras)
+        datos.update({
+            "clientes": self.clientes,
+            "precio_caja": self.precio_caja,
+            "precios_por_comuna": self.precios_por_comuna,
+            "movimientos": self.movimientos,
+            "entregas": self.entregas,
+            "caja_manual": self.caja_manual,
+            "comunas": self.comunas,
+            "capacidad_vehiculo": self.capacidad_vehiculo,
+            "vistas": self.vistas,
+            "replicacion": self.replica
+        })
+        if self.fragmentos is not None:
+            datos["fragmentos"] = self.fragmentos
+        return datos
+
+    def guardar(self, archivo=None):
+        if archivo and archivo != self.archivo:
+            guardar_datos(self.como_dict(), archivo, self.compacto)
+            return
+        while True:
+            datos = self.como_dict()
+            # Las huellas de la base también dicen qué fragmentos cambiaron
+            base = concurrencia.calcular_base(datos)
+            try:
+                firma = guardar_datos_versionado(datos, self.archivo, self.compacto, self.version, self.firma_archivo, base["clientes"])
+            except concurrencia.CambioExterno:
+                self.sincronizar()
+                continue
+            self.confirmar_guardado(datos["version"], firma, base)
+            return
+
+    def instantanea(self):
+        # Copia barata para guardar desde otro hilo mientras la interfaz sigue editando
+        datos = self.como_dict()
+        datos["clientes"] = [dict(c) for c in self.clientes]
+        datos["movimientos"] = [dict(m) for m in self.movimientos]
+        datos["entregas"] = list(self.entregas)
+        datos["precios_por_comuna"] = dict(self.precios_por_comuna)
+        datos["comunas"] = list(self.comunas)
+        datos["caja_manual"] = dict(self.caja_manual)
+        datos["vistas"] = dict(self.vistas)
+        datos["replicacion"] = replicacion.copiar_estado(self.replica)
+        if self.fragmentos is not None:
+            datos["fragmentos"] = dict(self.fragmentos)
+        return datos
+
+    @property
+    def fragmentos_cargados(self):
+        # Claves de los fragmentos leídos; None si están todos los clientes
+        return (self.fragmentos or {}).get("cargados")
+
+    def fragmentar(self, activar=True):
+        # Cambia el formato del próximo guardado; se reescribe todo
+        if self.fragmentos_cargados is not None:
+            raise ValueError("Hay que cargar todos los clientes para cambiar el formato.")
+        self.fragmentos = {} if activar else None
+        fragmentos.olvidar(self.archivo)
+
+    def _asegurar_ids(self):
+        self._indice_ids = {}
+        for cliente in self.clientes:
+            if not cliente.get("id"):
+                cliente["id"] = nuevo_id()
+            self._indice_ids[cliente["id"]] = cliente
+            self.claves_cliente(cliente)
+
+    def claves_cliente(self, cliente):
+        # Se calculan al cargar y al editar; si el registro cambió por otra
+        # vía (fusiones, servidor) los campos de origen ya no coinciden y se
+        # recalculan aquí
+        fuente = (cliente.get("nombre_completo"), cliente.get("telefono"), cliente.get("comuna"), cliente.get("dia_reparto"))
+        guardado = self._claves.get(id(cliente))
+        if guardado is None or guardado[0] != fuente:
+            nombre, telefono, comuna, dia = fuente
+            guardado = self._claves[id(cliente)] = (fuente, ClavesCliente(
+                normalizar(nombre), normalizar(telefono), normalizar((comuna or "").strip()), normalizar(dia)
+            ))
+        return guardado[1]
+
+    # ------------------ Comunas ------------------
+
+    @property
+    def comunas(self):
+        return self._comunas.nombres
+
+    @property
+    def version_comunas(self):
+        # Cambia solo cuando cambia la lista de comunas
+        return self._comunas.version
+
+    def ordenar_comunas(self, nombres):
+        return self._comunas.ordenar(nombres)
+
+    def estandarizar_comuna(self, comuna):
+        base = (comuna or "").strip()
+        if not base:
+            return ""
+        candidato = base.title()
+        existente = self._comunas.buscar(candidato)
+        return existente or candidato
+
+    def registrar_comuna(self, comuna):
+        nombre = self.estandarizar_comuna(comuna)
+        if not nombre:
+            return ""
+        return self._comunas.agregar(nombre)[0]
+
+    def actualizar_comunas_existentes(self, comunas_guardadas=None):
+        # Recanoniza todas las comunas (al cargar o compactar); agregar o
+        # editar un cliente solo registra su comuna con registrar_comuna
+        anterior = self._comunas
+        self._comunas = RegistroComunas()
+
+        if comunas_guardadas:
+            for comuna in comunas_guardadas:
+                self.registrar_comuna(comuna)
+
+        precios_ajustados = {}
+        for comuna, precio in list(self.precios_por_comuna.items()):
+            comuna_canonica = self.registrar_comuna(comuna)
+            if comuna_canonica:
+                precios_ajustados[comuna_canonica] = precio
+        self.precios_por_comuna = precios_ajustados
+        self._indice_precios = None
+
+        for cliente in self.clientes:
+            cliente["comuna"] = self.registrar_comuna(cliente.get("comuna"))
+
+        cambio = self._comunas.nombres != anterior.nombres
+        self._comunas.version = anterior.version + (1 if cambio else 0)
+
+    # ------------------ Precios ------------------
+
+    def obtener_precio(self, comuna):
+        clave = normalizar(self.estandarizar_comuna(comuna))
+        if not clave:
+            return self.precio_caja
+        # La exportación lee precios desde otro hilo: el índice se arma
+        # aparte y se publica entero, y se lee una sola vez por si otro hilo
+        # lo invalida entre medio
+        indice = self._indice_precios
+        if indice is None:
+            indice = {}
+            for comuna_guardada, precio in list(self.precios_por_comuna.items()):
+                indice.setdefault(normalizar(comuna_guardada), precio)
+            self._indice_precios = indice
+        return indice.get(clave, self.precio_caja)
+
+    def fijar_precio_caja(self, precio):
+        if precio <= 0:
+            raise ValueError("El precio debe ser mayor a 0.")
+        self.historial.registrar(("atributo", "precio_caja", self.precio_caja), "Cambiar precio de la caja")
+        self.precio_caja = precio
+        self._sellar_ajuste("precio_caja")
+
+    def fijar_precio_comuna(self, comuna, precio):
+        if precio <= 0:
+            raise ValueError("El precio debe ser mayor a 0.")
+        comuna = self.registrar_comuna(comuna)
+        if not comuna:
+            raise ValueError("El nombre de la comuna no es válido.")
+        anterior = self.precios_por_comuna.get(comuna, FALTA)
+        self.precios_por_comuna[comuna] = precio
+        self._indice_precios = None
+        self.historial.registrar(("precio_comuna", comuna, anterior), f"Precio de {comuna}")
+        self._sellar_ajuste(replicacion.clave_precio_comuna(comuna))
+        return comuna
+
+    def quitar_precio_comuna(self, comuna):
+        comuna = self.estandarizar_comuna(comuna)
+        if comuna not in self.precios_por_comuna:
+            return False
+        anterior = self.precios_por_comuna.pop(comuna)
+        self._indice_precios = None
+        self.historial.registrar(("precio_comuna", comuna, anterior), f"Precio general para {comuna}")
+        self._sellar_ajuste(replicacion.clave_precio_comuna(comuna))
+        return True
+
+    # ------------------ Vistas guardadas ------------------
+
+    def guardar_vista(self, nombre, consulta, orden):
+        nombre = (nombre or "").strip()
+        if not nombre:
+            raise ValueError("La vista necesita un nombre.")
+        # Una consulta con errores no se guarda
+        self.compilar_consulta(consulta)
+        vista = {"consulta": (consulta or "").strip(), "orden": [[columna, bool(descendente)] for columna, descendente in orden]}
+        self.historial.registrar(("vista", nombre, self.vistas.get(nombre, FALTA)), f"Guardar vista {nombre}")
+        self.vistas[nombre] = vista
+        return vista
+
+    def eliminar_vista(self, nombre):
+        if nombre in self.vistas:
+            self.historial.registrar(("vista", nombre, self.vistas.pop(nombre)), f"Eliminar vista {nombre}")
+
+    # ------------------ Clientes ------------------
+
+    def cliente_por_id(self, cliente_id):
+        return self._indice_ids.get(cliente_id)
+
+    def agregar_cliente(self, nombre, telefono, direccion, comuna, dia_reparto=None):
+        nombre = (nombre or "").strip()
+        telefono = (telefono or "").strip()
+        direccion = (direccion or "").strip()
+        if not nombre or not telefono or not direccion or not self.estandarizar_comuna(comuna):
+            raise ValueError("Todos los campos excepto el día de reparto son obligatorios.")
+        comuna = self.registrar_comuna(comuna)
+        cliente = {
+            "id": nuevo_id(),
+            "nombre_completo": nombre,
+            "telefono": telefono,
+            "direccion": direccion,
+            "comuna": comuna,
+            "cajas_de_huevos_total": 0,
+            "cajas_de_huevos": 0,
+            "dia_reparto": (dia_reparto or "").strip() or None  # Guardar como None si está vacío
+        }
+        self._sellar(cliente)
+        self.clientes.append(cliente)
+        self._indice_ids[cliente["id"]] = cliente
+        self.claves_cliente(cliente)
+        self.historial.registrar(("quitar", "clientes", cliente), f"Agregar a {nombre}")
+        return cliente
+
+    def actualizar_cliente(self, cliente, **campos):
+        if "comuna" in campos:
+            campos["comuna"] = self.registrar_comuna(campos["comuna"])
+            if not campos["comuna"]:
+                raise ValueError("El nombre de la comuna no es válido.")
+        for campo in ("nombre_completo", "direccion"):
+            if campo in campos and not (campos[campo] or "").strip():
+                raise ValueError("Complete los campos obligatorios.")
+        self._cambiar_campos(cliente, f"Editar a {cliente.get('nombre_completo', '')}", **campos)
+        self.claves_cliente(cliente)
+        return cliente
+
+    def _cambiar_campos(self, registro, descripcion, **campos):
+        anteriores = {campo: registro.get(campo, FALTA) for campo in campos}
+        for campo, valor in campos.items():
+            if valor is FALTA:
+                registro.pop(campo, None)
+            else:
+                registro[campo] = valor
+        self._sellar(registro, anteriores)
+        self.historial.registrar(("campos", registro, anteriores), descripcion)
+
+    def eliminar_cliente(self, cliente):
+        indice = self.clientes.index(cliente)
+        del self.clientes[indice]
+        self._indice_ids.pop(cliente.get("id"), None)
+        self._claves.pop(id(cliente), None)
+        self._dar_de_baja("clientes", cliente)
+        self.historial.registrar(("insertar", "clientes", indice, cliente), f"Eliminar a {cliente.get('nombre_completo', '')}")
+
+    def fusionar_clientes(self, conservado, duplicado):
+        # Por los mismos caminos que una edición y una eliminación, para que
+        # el deshacer, los sellos y los contadores de cajas de la réplica
+        # queden al día
+        nombre_duplicado = duplicado.get("nombre_completo", "")
+        nombre_conservado = conservado.get("nombre_completo", "")
+        id_duplicado = duplicado.get("id")
+        relinkeados = 0
+        with self.historial.paso(f"Fusionar {nombre_duplicado}"):
+            # Caja y entregas pasan al conservado: por id, y por nombre solo
+            # los registros antiguos que no lo tienen. Solo crecen entre
+            # instalaciones: el cambio no se sella
+            for lista in ("movimientos", "entregas"):
+                for registro in getattr(self, lista):
+                    if registro.get("cliente_id"):
+                        if registro["cliente_id"] != id_duplicado:
+                            continue
+                        campos = {"cliente_id": conservado.get("id"), "cliente": nombre_conservado}
+                    elif nombre_duplicado and nombre_duplicado != nombre_conservado and registro.get("cliente") == nombre_duplicado:
+                        campos = {"cliente": nombre_conservado}
+                    else:
+                        continue
+                    self.historial.registrar(("campos", registro, {campo: registro.get(campo, FALTA) for campo in campos}))
+                    registro.update(campos)
+                    relinkeados += 1
+            self._ediciones_caja += relinkeados
+            cambios = duplicados.cambios_fusion(conservado, duplicado)
+            if cambios:
+                self._cambiar_campos(conservado, "Fusionar", **cambios)
+            self.eliminar_cliente(duplicado)
+        return relinkeados
+
+    def asignar_dia(self, cliente, dia):
+        self._cambiar_campos(cliente, "Asignar día", dia_reparto=(dia or "").strip() or None)
+        self.claves_cliente(cliente)
+
+    def aplicar_planificacion(self, dias, fijados):
+        # dias: id de cliente -> día propuesto; fijados: id -> fijo. Todo en
+        # un solo paso del deshacer; los clientes que ya no existen se omiten
+        cambiados = 0
+        with self.historial.paso("Planificar días de reparto"):
+            for cliente_id, fijo in fijados.items():
+                cliente = self._indice_ids.get(cliente_id)
+                if cliente is not None and bool(cliente.get("dia_fijo")) != fijo:
+                    self._cambiar_campos(cliente, "Fijar día", dia_fijo=True if fijo else FALTA)
+            for cliente_id, dia in dias.items():
+                cliente = self._indice_ids.get(cliente_id)
+                if cliente is not None and cliente.get("dia_reparto") != dia:
+                    self.asignar_dia(cliente, dia)
+                    cambiados += 1
+        return cambiados
+
+    def buscar_clientes(self, texto, limite=None):
+        texto = normalizar((texto or "").strip())
+        if not texto:
+            return []
+        resultados = []
+        for c in self.clientes:
+            claves = self.claves_cliente(c)
+            if texto in claves.nombre or texto in claves.telefono:
+                resultados.append(c)
+                if limite and len(resultados) >= limite:
+                    break
+        return resultados
+
+    # ------------------ Pedidos ------------------
+
+    def agregar_pedido(self, cliente, cantidad):
+        if cantidad <= 0:
+            raise ValueError("Ingrese una cantidad mayor que 0.")
+        self._cambiar_campos(
+            cliente, f"Pedido de {cliente.get('nombre_completo', '')}",
+            cajas_de_huevos=cliente.get("cajas_de_huevos", 0) + cantidad,
+            cajas_de_huevos_total=cliente.get("cajas_de_huevos_total", 0) + cantidad
+        )
+
+    def agregar_pedidos(self, pedidos):
+        # Todo o nada: el lote se valida completo antes de tocar un cliente
+        for cliente, cantidad in pedidos:
+            if cantidad <= 0:
+                raise ValueError(f"Cantidad inválida para {cliente.get('nombre_completo', '')}.")
+        with self.historial.paso(f"Agregar {len(pedidos)} pedidos"):
+            for cliente, cantidad in pedidos:
+                self.agregar_pedido(cliente, cantidad)
+
+    def reemplazar_pendiente(self, cliente, cantidad):
+        if cantidad < 0:
+            raise ValueError("La cantidad no puede ser negativa.")
+        # Ajustar histórico si es menor que total actual
+        self._cambiar_campos(
+            cliente, f"Pendiente de {cliente.get('nombre_completo', '')}",
+            cajas_de_huevos=cantidad,
+            cajas_de_huevos_total=max(cliente.get("cajas_de_huevos_total", 0), cantidad)
+        )
+
+    def marcar_entregados(self, clientes):
+        with self.historial.paso("Marcar entregados"):
+            for cliente in clientes:
+                if cliente.get("cajas_de_huevos", 0):
+                    self._cambiar_campos(cliente, "Marcar entregado", cajas_de_huevos=0)
+
+    def registrar_entrega(self, cliente, cantidad=None):
+        pendiente = cliente.get("cajas_de_huevos", 0)
+        if cantidad is None:
+            cantidad = pendiente
+        if cantidad < 0:
+            raise ValueError("La cantidad no puede ser negativa.")
+        entregadas = min(cantidad, pendiente)
+        if entregadas:
+            self._cambiar_campos(cliente, f"Entrega a {cliente.get('nombre_completo', '')}", cajas_de_huevos=pendiente - entregadas)
+        return entregadas
+
+    # ------------------ Cierre de reparto ------------------
+
+    def cerrar_reparto(self, filas, fecha=None):
+        # filas: (cliente, cajas entregadas, monto cobrado, método). Todo el
+        # lote se valida antes de tocar nada y se deshace en un solo paso.
+        # Un cliente va una sola vez: cada fila se compara con su pendiente
+        vistos = set()
+        for cliente, entregadas, monto, _ in filas:
+            nombre = cliente.get("nombre_completo", "")
+            if id(cliente) in vistos:
+                raise ValueError(f"{nombre} aparece más de una vez en el cierre.")
+            vistos.add(id(cliente))
+            if not 0 <= entregadas <= cliente.get("cajas_de_huevos", 0):
+                raise ValueError(f"Cajas entregadas inválidas para {nombre}.")
+            if not math.isfinite(monto) or monto < 0:
+                raise ValueError(f"Monto cobrado inválido para {nombre}.")
+        fecha = fecha or datetime.now()
+        totales = {"clientes": len(filas), "completos": 0, "parciales": 0, "ausentes": 0, "cajas": 0, "cobrado": 0.0}
+        with self.historial.paso(f"Cerrar reparto de {len(filas)} clientes"):
+            for cliente, entregadas, monto, metodo in filas:
+                pedidas = cliente.get("cajas_de_huevos", 0)
+                self.registrar_entrega(cliente, entregadas)
+                if monto:
+                    self.registrar_pago(cliente, monto, metodo, fecha=fecha)
+                if entregadas == pedidas:
+                    estado = "entregado"
+                elif entregadas:
+                    estado = "parcial"
+                else:
+                    estado = "ausente"
+                totales["completos" if estado == "entregado" else "parciales" if estado == "parcial" else "ausentes"] += 1
+                totales["cajas"] += entregadas
+                totales["cobrado"] += monto
+                evento = {
+                    "id": nuevo_id(),
+                    "fecha": fecha.strftime("%d-%m-%Y %H:%M"),
+                    "fecha_iso": fecha.isoformat(),
+                    "cliente_id": cliente.get("id"),
+                    "cliente": cliente.get("nombre_completo", ""),
+                    "comuna": cliente.get("comuna") or "",
+                    "pedidas": pedidas,
+                    "entregadas": entregadas,
+                    "monto": round(monto, 2),
+                    "metodo": metodo if monto else "",
+                    "estado": estado
+                }
+                self._sellar(evento)
+                self.entregas.append(evento)
+                self.historial.registrar(("quitar", "entregas", evento))
+        return totales
+
+    # ------------------ Movimientos de caja ------------------
+
+    def agregar_movimiento(self, tipo, monto, descripcion="", referencia="", fecha=None, **extra):
+        if not math.isfinite(monto) or monto <= 0:
+            raise ValueError("El monto debe ser mayor a 0.")
+        fecha = fecha or datetime.now()
+        registro = {
+            "id": self._id_movimiento(),
+            "fecha": fecha.strftime("%d-%m-%Y %H:%M"),
+            "fecha_iso": fecha.isoformat(),
+            "tipo": tipo or "Otro",
+            "monto": round(monto, 2),
+            "descripcion": descripcion,
+            "referencia": referencia
+        }
+        registro.update(extra)
+        self._sellar(registro)
+        self.movimientos.append(registro)
+        self.historial.registrar(("quitar", "movimientos", registro), f"Registrar {registro['tipo'].lower()}")
+        return registro
+
+    def _id_movimiento(self):
+        # Marca de tiempo como hasta ahora, pero sin repetirse cuando se
+        # registran muchos movimientos dentro del mismo microsegundo
+        nuevo = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        if nuevo <= self._ultimo_id_movimiento:
+            nuevo = str(int(self._ultimo_id_movimiento) + 1)
+        self._ultimo_id_movimiento = nuevo
+        return nuevo
+
+    def registrar_pago(self, cliente, monto, metodo="", fecha=None):
+        nombre = cliente.get("nombre_completo", "")
+        return self.agregar_movimiento(
+            "Ingreso", monto, f"Pago de {nombre}", metodo, fecha=fecha,
+            cliente=nombre, cliente_id=cliente.get("id"), metodo=metodo
+        )
+
+    def eliminar_movimiento(self, indice):
+        registro = self.movimientos.pop(indice)
+        self._dar_de_baja("movimientos", registro)
+        self.historial.registrar(("insertar", "movimientos", indice, registro), "Eliminar registro de caja")
+
+    def asegurar_ids_movimientos(self):
+        se_actualizo = False
+        for mov in self.movimientos:
+            if not mov.get("id"):
+                mov["id"] = self._id_movimiento()
+                se_actualizo = True
+        return se_actualizo
+
+    def columnas_caja(self):
+        # Columnas de reportes_caja sin reconstruirlas cada vez: si la lista
+        # solo creció (el último movimiento visto sigue en su lugar) se suma
+        # lo nuevo; si se borró, insertó o editó algo, se rehacen
+        movimientos = self.movimientos
+        cache = self._columnas_caja
+        columnas = None
+        if cache is not None and cache["ediciones"] == self._ediciones_caja:
+            vistos = cache["vistos"]
+            if vistos <= len(movimientos) and (not vistos or movimientos[vistos - 1] is cache["ultimo"]):
+                columnas = cache["columnas"]
+                if not columnas.extender(movimientos[vistos:]):
+                    columnas = None
+        if columnas is None:
+            columnas = reportes_caja.ColumnasCaja(movimientos)
+        self.adoptar_columnas_caja(columnas, self.instantanea_caja(copiar=False))
+        return columnas
+
+    @property
+    def columnas_caja_listas(self):
+        return self._columnas_caja is not None
+
+    def instantanea_caja(self, copiar=True):
+        # Para armar las columnas en otro hilo y luego adoptarlas
+        movimientos = list(self.movimientos) if copiar else self.movimientos
+        return {
+            "movimientos": movimientos,
+            "vistos": len(movimientos),
+            "ultimo": movimientos[-1] if movimientos else None,
+            "ediciones": self._ediciones_caja
+        }
+
+    def adoptar_columnas_caja(self, columnas, instantanea):
+        self._columnas_caja = {
+            "columnas": columnas,
+            "vistos": instantanea["vistos"],
+            "ultimo": instantanea["ultimo"],
+            "ediciones": instantanea["ediciones"]
+        }
+
+    def totales_caja(self):
+        ingresos = egresos = otros = 0.0
+        for mov in self.movimientos:
+            tipo = (mov.get("tipo") or "").strip().lower()
+            try:
+                monto = float(mov.get("monto", 0) or 0)
+            except (TypeError, ValueError):
+                monto = 0.0
+            if tipo == "ingreso":
+                ingresos += monto
+            elif tipo == "egreso":
+                egresos += monto
+            else:
+                otros += monto
+        return ingresos, egresos, otros
+
+    # ------------------ Deshacer / rehacer ------------------
+
+    def deshacer(self):
+        return self.historial.deshacer(self._aplicar_delta)
+
+    def rehacer(self):
+        return self.historial.rehacer(self._aplicar_delta)
+
+    def _aplicar_delta(self, delta):
+        # Aplica un delta del historial y devuelve el que lo revierte
+        tipo = delta[0]
+        if tipo == "campos":
+            _, registro, valores = delta
+            actuales = {campo: registro.get(campo, FALTA) for campo in valores}
+            for campo, valor in valores.items():
+                if valor is FALTA:
+                    registro.pop(campo, None)
+                else:
+                    registro[campo] = valor
+            if "comuna" in valores and registro.get("comuna"):
+                registro["comuna"] = self.registrar_comuna(registro["comuna"])
+            if "tipo" in registro:
+                self._ediciones_caja += 1
+            # Caja y entregas solo crecen entre instalaciones: se sellan al
+            # crearse y el deshacer no les da un sello nuevo
+            if self._indice_ids.get(registro.get("id")) is registro:
+                self._sellar(registro, actuales)
+            return ("campos", registro, actuales)
+        if tipo == "quitar":
+            _, lista, registro = delta
+            registros = getattr(self, lista)
+            # Lo recién agregado suele estar al final
+            indice = next((i for i in range(len(registros) - 1, -1, -1) if registros[i] is registro), None)
+            if indice is None:
+                return None
+            del registros[indice]
+            self._dar_de_baja(lista, registro)
+            if lista == "clientes":
+                self._indice_ids.pop(registro.get("id"), None)
+                self._claves.pop(id(registro), None)
+            return ("insertar", lista, indice, registro)
+        if tipo == "insertar":
+            _, lista, indice, registro = delta
+            registros = getattr(self, lista)
+            registros.insert(min(indice, len(registros)), registro)
+            if lista == "clientes" or not self._quitar_baja(lista, registro):
+                self._sellar(registro)
+            if lista == "clientes":
+                self._indice_ids[registro["id"]] = registro
+                registro["comuna"] = self.registrar_comuna(registro.get("comuna"))
+            return ("quitar", lista, registro)
+        if tipo == "atributo":
+            _, nombre, valor = delta
+            actual = getattr(self, nombre)
+            setattr(self, nombre, valor)
+            if nombre == "precio_caja":
+                self._sellar_ajuste(nombre)
+            return ("atributo", nombre, actual)
+        if tipo == "precio_comuna":
+            _, comuna, valor = delta
+            actual = self.precios_por_comuna.get(comuna, FALTA)
+            if valor is FALTA:
+                self.precios_por_comuna.pop(comuna, None)
+            else:
+                self.precios_por_comuna[comuna] = valor
+            self._indice_precios = None
+            self._sellar_ajuste(replicacion.clave_precio_comuna(comuna))
+            return ("precio_comuna", comuna, actual)
+        if tipo == "vista":
+            _, nombre, valor = delta
+            actual = self.vistas.get(nombre, FALTA)
+            if valor is FALTA:
+                self.vistas.pop(nombre, None)
+            else:
+                self.vistas[nombre] = valor
+            return ("vista", nombre, actual)
+        raise ValueError(f"Delta desconocido: {tipo}")
+
+    # ------------------ Sincronización entre copias ------------------
+
+    def hay_cambios_externos(self):
+        return concurrencia.firma(self.archivo) != self.firma_archivo
+
+    def confirmar_guardado(self, version, firma, base):
+        self.version = version
+        self.firma_archivo = firma
+        self._base = base
+
+    def sincronizar(self, datos=None, firma=None):
+        # Incorpora lo que otra copia escribió en el archivo sin recargar todo:
+        # solo se tocan los registros que cambiaron allá. Devuelve los
+        # conflictos nuevos (mismo cliente cambiado aquí y allá).
+        with self.historial.pausa():
+            return self._sincronizar(datos, firma)
+
+    def _sincronizar(self, datos, firma):
+        if datos is None:
+            firma = concurrencia.firma(self.archivo)
+            if firma == self.firma_archivo and concurrencia.leer_version(self.archivo) == self.version:
+                return []
+            if firma is None:
+                # Archivo borrado: el próximo guardado lo vuelve a crear
+                self.version, self.firma_archivo = 0, None
+                return []
+            datos = cargar_datos(self.archivo, self.fragmentos_cargados)
+        base_nueva = concurrencia.calcular_base(datos)
+        nuevos = self._fusionar_clientes(datos.get("clientes", []))
+        self._fusionar_registros("movimientos", datos.get("movimientos", []))
+        self._fusionar_registros("entregas", datos.get("entregas", []))
+        nuevos.extend(self._fusionar_ajustes(datos))
+        replicacion.fusionar_estados(self.replica, datos.get("replicacion"))
+        for comuna in datos.get("comunas", []):
+            self.registrar_comuna(comuna)
+        self.version = datos.get("version", 0)
+        self.firma_archivo = firma
+        self._base = base_nueva
+        self.conflictos.extend(nuevos)
+        return nuevos
+
+    def _aplicar_externo(self, local, externo):
+        if local is None:
+            local = dict(externo)
+            self.clientes.append(local)
+            self._indice_ids[local["id"]] = local
+        else:
+            local.clear()
+            local.update(externo)
+        local["comuna"] = self.registrar_comuna(local.get("comuna"))
+        self.claves_cliente(local)
+
+    def _fusionar_clientes(self, externos):
+        base = self._base["clientes"]
+        conflictos = []
+        vistos = set()
+
+        def conflicto(cliente_id, local, externo, motivo):
+            referencia = local or externo
+            conflictos.append({
+                "tipo": "cliente",
+                "id": cliente_id,
+                "nombre": referencia.get("nombre_completo", ""),
+                "motivo": motivo,
+                "local": dict(local) if local else None,
+                "externo": dict(externo) if externo else None
+            })
+
+        # Registros sin id vienen de archivos antiguos y ya se cargaron al abrir
+        for externo in externos:
+            cliente_id = externo.get("id")
+            if not cliente_id:
+                continue
+            vistos.add(cliente_id)
+            huella_externa = concurrencia.huella(externo)
+            huella_base = base.get(cliente_id)
+            if huella_externa == huella_base:
+                continue
+            local = self._indice_ids.get(cliente_id)
+            if local is None:
+                self._aplicar_externo(None, externo)
+                if huella_base is not None:
+                    conflicto(cliente_id, None, externo, "Eliminado aquí y modificado en la otra copia (se restauró)")
+                continue
+            huella_local = concurrencia.huella(local)
+            if huella_local == huella_externa:
+                continue
+            if huella_local == huella_base:
+                self._aplicar_externo(local, externo)
+            else:
+                conflicto(cliente_id, local, externo, "Modificado aquí y en la otra copia (se mantuvo el de aquí)")
+
+        for cliente_id, huella_base in base.items():
+            if cliente_id in vistos:
+                continue
+            local = self._indice_ids.get(cliente_id)
+            if local is None:
+                continue
+            if concurrencia.huella(local) == huella_base:
+                self.eliminar_cliente(local)
+            else:
+                conflicto(cliente_id, local, None, "Eliminado en la otra copia y modificado aquí (se mantuvo)")
+        return conflictos
+
+    def _fusionar_registros(self, lista, externos):
+        # Listas donde solo se agrega o se borra (caja, entregas)
+        registros = getattr(self, lista)
+        base = self._base[lista]
+        locales = {concurrencia.clave_movimiento(m) for m in registros}
+        claves_externas = set()
+        for mov in externos:
+            clave = concurrencia.clave_movimiento(mov)
+            claves_externas.add(clave)
+            if clave not in base and clave not in locales:
+                registros.append(dict(mov))
+        borrados = base - claves_externas
+        if borrados:
+            registros[:] = [m for m in registros if concurrencia.clave_movimiento(m) not in borrados]
+
+    def _fusionar_ajustes(self, datos):
+        conflictos = []
+        for campo in ("precio_caja", "capacidad_vehiculo", "precios_por_comuna", "vistas"):
+            externo = datos.get(campo)
+            base = self._base[campo]
+            local = getattr(self, campo)
+            if externo is None or externo == base or externo == local:
+                continue
+            if local == base:
+                setattr(self, campo, dict(externo) if isinstance(externo, dict) else externo)
+            else:
+                conflictos.append({
+                    "tipo": "ajuste",
+                    "id": campo,
+                    "nombre": campo.replace("_", " "),
+                    "motivo": "Cambiado aquí y en la otra copia (se mantuvo el de aquí)",
+                    "local": local,
+                    "externo": externo
+                })
+        self._indice_precios = None
+        return conflictos
+
+    def resolver_conflicto(self, conflicto, usar_externo):
+        with self.historial.pausa():
+            self._resolver_conflicto(conflicto, usar_externo)
+
+    def _resolver_conflicto(self, conflicto, usar_externo):
+        if conflicto in self.conflictos:
+            self.conflictos.remove(conflicto)
+        externo = conflicto["externo"]
+        if conflicto.get("origen") == "replica" and conflicto["local"] and externo:
+            # La fusión ya dejó el cambio más reciente y las cajas sumadas:
+            # elegir una versión solo cambia los campos en disputa y sale como
+            # cambio nuevo de esta instalación
+            local = self._indice_ids.get(conflicto["id"])
+            if local is not None:
+                version = externo if usar_externo else conflicto["local"]
+                self._cambiar_campos(local, "Resolver conflicto", **{c: version.get(c) for c in conflicto["campos"]})
+                self.claves_cliente(local)
+            return
+        if not usar_externo:
+            if conflicto["tipo"] == "cliente" and conflicto["local"] is None:
+                # Se había restaurado para no perderlo; vuelve a quedar eliminado
+                local = self._indice_ids.get(conflicto["id"])
+                if local is not None:
+                    self.eliminar_cliente(local)
+            return
+        if conflicto["tipo"] == "ajuste":
+            setattr(self, conflicto["id"], dict(externo) if isinstance(externo, dict) else externo)
+            self._indice_precios = None
+            return
+        local = self._indice_ids.get(conflicto["id"])
+        if externo is None:
+            if local is not None:
+                self.eliminar_cliente(local)
+        else:
+            self._aplicar_externo(local, externo)
+
+    # ------------------ Réplica entre instalaciones ------------------
+
+    def _exigir_todos_los_clientes(self):
+        if self.fragmentos_cargados is not None:
+            raise ValueError("Hay que cargar todos los clientes para intercambiar cambios.")
+
+    def _sellar(self, registro, anteriores=None):
+        # Sello de Lamport del cambio; en los clientes además se acumula lo
+        # que cambiaron las cajas desde la última exportación
+        replica = self.replica
+        replica["reloj"] += 1
+        registro["sello"] = replica["reloj"]
+        registro["origen"] = replica["instalacion"]
+        if not anteriores:
+            return
+        for campo, contador in zip(replicacion.CAMPOS_CAJAS, replicacion.CONTADORES):
+            if campo in anteriores:
+                antes = anteriores[campo]
+                antes = 0 if antes is FALTA else antes or 0
+                cambio = registro.get(contador, 0) + (registro.get(campo, 0) or 0) - antes
+                if cambio:
+                    registro[contador] = cambio
+                else:
+                    registro.pop(contador, None)
+
+    def _sellar_ajuste(self, clave):
+        replica = self.replica
+        replica["reloj"] += 1
+        replica["ajustes"][clave] = [replica["reloj"], replica["instalacion"]]
+
+    def _dar_de_baja(self, lista, registro):
+        bajas = self.replica["bajas"].get(lista)
+        if bajas is None or not registro.get("id"):
+            return
+        self.replica["reloj"] += 1
+        bajas[registro["id"]] = [self.replica["reloj"], self.replica["instalacion"]]
+
+    def _quitar_baja(self, lista, registro):
+        # Caja y entregas recuperadas con el deshacer: si la baja no salió
+        # en ninguna exportación se olvida y el registro conserva su sello;
+        # si salió, hay que sellarlo de nuevo para que la supere
+        bajas = self.replica["bajas"].get(lista)
+        baja = bajas.get(registro.get("id")) if bajas else None
+        if baja is None or baja[0] <= max(self.replica["enviado"].values(), default=0):
+            return False
+        del bajas[registro["id"]]
+        return True
+
+    def exportar_cambios(self, destino=None, desde=None):
+        self._exigir_todos_los_clientes()
+        return replicacion.exportar(self, destino, desde)
+
+    def confirmar_exportacion(self, paquete):
+        replicacion.confirmar_exportacion(self, paquete)
+
+    def importar_cambios(self, paquete):
+        self._exigir_todos_los_clientes()
+        return replicacion.importar(self, paquete)
+
+    # ------------------ Consultas ------------------
+
+    def compilar_consulta(self, texto):
+        return consultas.compilar(texto, self)
+
+    def filtrar(self, comuna=None, dia=None, solo_pendientes=False):
+        comuna_norm = normalizar(self.estandarizar_comuna(comuna)) if comuna else ""
+        dia_norm = normalizar(dia) if dia else ""
+        resultado = []
+        for cliente in self.clientes:
+            if comuna_norm or dia_norm:
+                claves = self.claves_cliente(cliente)
+                if comuna_norm and claves.comuna != comuna_norm:
+                    continue
+                if dia_norm and claves.dia != dia_norm:
+                    continue
+            if solo_pendientes and cliente.get("cajas_de_huevos", 0) <= 0:
+                continue
+            resultado.append(cliente)
+        return resultado
+
+    def clientes_tabla(self, comuna=None, dia=None, consulta=None, orden=ORDEN_POR_DEFECTO):
+        # Clientes de la tabla principal, por defecto de mayor a menor
+        # pendiente; consulta es una consultas.Consulta ya compilada
+        clientes = self.filtrar(comuna=comuna, dia=dia)
+        if consulta is not None:
+            clientes = consulta.filtrar(clientes)
+        consultas.ordenar(self, clientes, orden or ORDEN_POR_DEFECTO)
+        return clientes, sum(c.get("cajas_de_huevos", 0) for c in clientes)
+
+    def filas_clientes(self, comuna=None, dia=None, consulta=None, orden=ORDEN_POR_DEFECTO):
+        clientes, total_pendiente = self.clientes_tabla(comuna, dia, consulta, orden)
+        return [self.fila_cliente(c) for c in clientes], total_pendiente
+
+    def fila_cliente(self, c):
+        pendiente = c.get("cajas_de_huevos", 0)
+        comuna_valor = self.estandarizar_comuna(c.get("comuna"))
+        dia_valor = (c.get("dia_reparto", "") or "").strip()
+        total_adeudado = pendiente * self.obtener_precio(comuna_valor)
+
+        return c["id"], (
+            c.get("nombre_completo", ""),
+            c.get("telefono", ""),
+            c.get("direccion", ""),
+            comuna_valor or "",
+            dia_valor.capitalize() if dia_valor else "-",
+            pendiente,
+            c.get("cajas_de_huevos_total", 0),
+            formato_moneda(total_adeudado)
+        )
+
+    def dias_disponibles(self):
+        return sorted({
+            (c.get("dia_reparto") or "").strip().title()
+            for c in self.clientes
+            if (c.get("dia_reparto") or "").strip()
+        })
+
+    def resumen(self):
+        total_pendiente = sum(c.get("cajas_de_huevos", 0) for c in self.clientes)
+        clientes_con_pedido = [c for c in self.clientes if c.get("cajas_de_huevos", 0) > 0]
+
+        # Agrupar por comuna
+        cajas_por_comuna = {}
+        clientes_por_comuna = {}
+        for c in clientes_con_pedido:
+            comuna = c.get("comuna", "Sin comuna")
+            cajas_por_comuna[comuna] = cajas_por_comuna.get(comuna, 0) + c.get("cajas_de_huevos", 0)
+            clientes_por_comuna[comuna] = clientes_por_comuna.get(comuna, 0) + 1
+
+        por_comuna = [
+            (comuna, total, clientes_por_comuna.get(comuna, 0))
+            for comuna, total in sorted(cajas_por_comuna.items(), key=lambda x: x[1], reverse=True)
+        ]
+        return {
+            "total_pendiente": total_pendiente,
+            "clientes_con_pedido": len(clientes_con_pedido),
+            "por_comuna": por_comuna
+        }
+
+    # ------------------ Exportar reparto ------------------
+
+    def nombre_archivo_reparto(self, comuna=None, fecha=None):
+        fecha_actual = (fecha or datetime.now()).strftime("%d-%m-%Y")
+        return f"reparto_huevos_{(comuna or 'general').replace(' ', '_').lower()}_{fecha_actual}.xlsx"
+
+    def exportar_reparto(self, clientes, nombre_archivo, viajes=None, al_avanzar=None):
+        # openpyxl tarda en importarse: se carga recién al exportar
+        import openpyxl
+        from openpyxl.styles import Font, Alignment
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Reparto Huevos"
+
+        # Avance global (hoja principal + hojas de viajes) para quien lo pida
+        total_filas = len(clientes) + sum(len(v.paradas) for v in viajes or [])
+        filas_escritas = [0]
+
+        encabezados = ["Nombre completo", "Teléfono", "Dirección", "Comuna", "Cajas de huevos", "Monto a pagar", "Pagado SI/NO", "Metodo de pago"]
+
+        def ajustar_columnas(hoja):
+            for column in hoja.columns:
+                max_length = max(len(str(cell.value)) if cell.value else 0 for cell in column)
+                hoja.column_dimensions[column[0].column_letter].width = max_length + 2
+
+        def escribir_hoja(hoja, paradas):
+            hoja.append(encabezados)
+            for cell in hoja[1]:
+                cell.font = Font(bold=True)
+                cell.alignment = Alignment(horizontal="center")
+
+            total_cajas = 0  # 🔹 Contador de total de cajas
+            total_ganancias = 0  # 🔹 Contador de total a ganar
+
+            for cliente, cajas in paradas:
+                filas_escritas[0] += 1
+                if al_avanzar and filas_escritas[0] % 500 == 0:
+                    al_avanzar(filas_escritas[0], total_filas)
+                comuna_cliente = self.estandarizar_comuna(cliente.get("comuna"))
+                monto_a_pagar = cajas * self.obtener_precio(comuna_cliente)
+                total_cajas += cajas
+                total_ganancias += monto_a_pagar
+
+                hoja.append([
+                    cliente.get("nombre_completo", ""),
+                    cliente.get("telefono", ""),
+                    cliente.get("direccion", ""),
+                    comuna_cliente,
+                    cajas,
+                    formato_moneda(monto_a_pagar)  # Formato $000.000.000
+                ])
+
+            # 🔹 Nueva fila al final con el total
+            hoja.append([])
+            hoja.append(["", "", "", "Total", total_cajas, formato_moneda(total_ganancias)])
+            ajustar_columnas(hoja)
+            return total_cajas, total_ganancias
+
+        total_cajas, total_ganancias = escribir_hoja(
+            ws,
+            [(cliente, cliente.get("cajas_de_huevos", 0)) for cliente in clientes]
+        )
+
+        if viajes:
+            ws_viajes = wb.create_sheet("Viajes")
+            ws_viajes.append(["Viaje", "Comunas", "Paradas", "Cajas", "Capacidad libre", "Monto"])
+            for cell in ws_viajes[1]:
+                cell.font = Font(bold=True)
+                cell.alignment = Alignment(horizontal="center")
+            for viaje in viajes:
+                cajas_viaje, monto_viaje = escribir_hoja(wb.create_sheet(f"Viaje {viaje.numero}"), viaje.paradas)
+                ws_viajes.append([
+                    viaje.numero,
+                    ", ".join(viaje.comunas()),
+                    len(viaje.paradas),
+                    cajas_viaje,
+                    viaje.capacidad - cajas_viaje,
+                    formato_moneda(monto_viaje)
+                ])
+            ajustar_columnas(ws_viajes)
+
+        # Guardar el archivo Excel
+        if al_avanzar:
+            al_avanzar(total_filas, total_filas)
+        wb.save(nombre_archivo)
+        return total_cajas, total_ganancias
@@ -0,0 +1,274 @@
+import math
+import time
+from collections import OrderedDict
+
+from texto import normalizar
+
+# Propuesta automática de día de reparto para cada cliente.
+# Los clientes se agrupan en bloques por comuna (partidos solo cuando una
+# comuna no cabe en un día), los bloques se asignan con un voraz tipo LPT y
+# luego una búsqueda local mueve/intercambia bloques mientras mejore el
+# equilibrio. Los clientes fijados conservan su día.
+
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+DIAS_POR_DEFECTO = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes"]
+
+PESO_CAJAS = 1.0
+PESO_PARADAS = 1.0
+PESO_DISPERSION = 0.05
+
+
+def canonizar_dia(dia, dias):
+    clave = normalizar((dia or "").strip())
+    if not clave:
+        return None
+    for candidato in dias:
+        if normalizar(candidato) == clave:
+            return candidato
+    return None
+
+
+class Bloque:
+    __slots__ = ("comuna", "clientes", "cajas", "paradas", "dia")
+
+    def __init__(self, comuna, clientes):
+        self.comuna = comuna
+        self.clientes = clientes
+        self.cajas = sum(max(0, c.get("cajas_de_huevos", 0) or 0) for c in clientes)
+        self.paradas = len(clientes)
+        self.dia = None
+
+
+class Planificacion:
+    def __init__(self, dias, asignacion, cargas_cajas, cargas_paradas, comunas_por_dia, iteraciones, segundos):
+        self.dias = dias
+        self.asignacion = asignacion
+        self.cargas_cajas = cargas_cajas
+        self.cargas_paradas = cargas_paradas
+        self.comunas_por_dia = comunas_por_dia
+        self.iteraciones = iteraciones
+        self.segundos = segundos
+
+    def cambios(self):
+        return [
+            (cliente, dia)
+            for cliente, dia in self.asignacion
+            if canonizar_dia(cliente.get("dia_reparto"), self.dias) != dia
+        ]
+
+    def resumen(self):
+        return [
+            {
+                "dia": dia,
+                "paradas": self.cargas_paradas[i],
+                "cajas": self.cargas_cajas[i],
+                "comunas": len(self.comunas_por_dia[i])
+            }
+            for i, dia in enumerate(self.dias)
+        ]
+
+
+def resumen_actual(clientes, dias):
+    filas = OrderedDict((dia, {"dia": dia, "paradas": 0, "cajas": 0, "comunas": set()}) for dia in dias)
+    sin_dia = {"dia": "Sin día", "paradas": 0, "cajas": 0, "comunas": set()}
+    for cliente in clientes:
+        dia = canonizar_dia(cliente.get("dia_reparto"), dias)
+        fila = filas[dia] if dia else sin_dia
+        fila["paradas"] += 1
+        fila["cajas"] += max(0, cliente.get("cajas_de_huevos", 0) or 0)
+        fila["comunas"].add(normalizar(cliente.get("comuna", "")))
+    resultado = list(filas.values())
+    if sin_dia["paradas"]:
+        resultado.append(sin_dia)
+    for fila in resultado:
+        fila["comunas"] = len(fila["comunas"])
+    return resultado
+
+
+def _partir_bloque(comuna, clientes, max_cajas, max_paradas):
+    bloque = Bloque(comuna, clientes)
+    partes = max(
+        1,
+        math.ceil(bloque.cajas / max_cajas) if max_cajas else 1,
+        math.ceil(bloque.paradas / max_paradas) if max_paradas else 1
+    )
+    if partes == 1:
+        return [bloque]
+    # Direcciones ordenadas para que cada parte quede con calles cercanas
+    ordenados = sorted(clientes, key=lambda c: normalizar(c.get("direccion", "")))
+    objetivo_cajas = bloque.cajas / partes
+    objetivo_paradas = bloque.paradas / partes
+    bloques = []
+    actual = []
+    cajas = 0
+    for cliente in ordenados:
+        actual.append(cliente)
+        cajas += max(0, cliente.get("cajas_de_huevos", 0) or 0)
+        lleno = (objetivo_cajas and cajas >= objetivo_cajas) or len(actual) >= math.ceil(objetivo_paradas)
+        if lleno and len(bloques) < partes - 1:
+            bloques.append(Bloque(comuna, actual))
+            actual = []
+            cajas = 0
+    if actual:
+        bloques.append(Bloque(comuna, actual))
+    return bloques
+
+
+class _Estado:
+    def __init__(self, n_dias, media_cajas, media_paradas):
+        self.cajas = [0.0] * n_dias
+        self.paradas = [0.0] * n_dias
+        self.comunas = [dict() for _ in range(n_dias)]
+        self.escala_cajas = PESO_CAJAS / (media_cajas * media_cajas) if media_cajas else 0.0
+        self.escala_paradas = PESO_PARADAS / (media_paradas * media_paradas) if media_paradas else 0.0
+        self.media_cajas = media_cajas
+        self.media_paradas = media_paradas
+
+    def costo_dia(self, d, cajas, paradas):
+        dc = cajas - self.media_cajas
+        dp = paradas - self.media_paradas
+        return dc * dc * self.escala_cajas + dp * dp * self.escala_paradas
+
+    def agregar(self, d, comuna, cajas, paradas):
+        self.cajas[d] += cajas
+        self.paradas[d] += paradas
+        self.comunas[d][comuna] = self.comunas[d].get(comuna, 0) + 1
+
+    def quitar(self, d, comuna, cajas, paradas):
+        self.cajas[d] -= cajas
+        self.paradas[d] -= paradas
+        restantes = self.comunas[d][comuna] - 1
+        if restantes:
+            self.comunas[d][comuna] = restantes
+        else:
+            del self.comunas[d][comuna]
+
+    def delta_agregar(self, d, comuna, cajas, paradas):
+        antes = self.costo_dia(d, self.cajas[d], self.paradas[d])
+        despues = self.costo_dia(d, self.cajas[d] + cajas, self.paradas[d] + paradas)
+        dispersion = 0.0 if comuna in self.comunas[d] else PESO_DISPERSION
+        return despues - antes + dispersion
+
+    def delta_quitar(self, d, comuna, cajas, paradas):
+        antes = self.costo_dia(d, self.cajas[d], self.paradas[d])
+        despues = self.costo_dia(d, self.cajas[d] - cajas, self.paradas[d] - paradas)
+        dispersion = -PESO_DISPERSION if self.comunas[d].get(comuna) == 1 else 0.0
+        return despues - antes + dispersion
+
+
+def planificar(clientes, dias=None, es_fijo=None, max_segundos=5.0):
+    dias = list(dias or DIAS_POR_DEFECTO)
+    if not dias:
+        raise ValueError("Se necesita al menos un día de reparto.")
+    es_fijo = es_fijo or (lambda c: bool(c.get("dia_fijo")))
+    inicio = time.perf_counter()
+    indice_dia = {dia: i for i, dia in enumerate(dias)}
+
+    fijos = []
+    libres_por_comuna = OrderedDict()
+    for cliente in clientes:
+        if es_fijo(cliente) and (cliente.get("dia_reparto") or "").strip():
+            dia_fijo = canonizar_dia(cliente.get("dia_reparto"), dias)
+            # Un cliente fijado en un día fuera de la planificación no se toca
+            if dia_fijo:
+                fijos.append((cliente, dia_fijo))
+            continue
+        libres_por_comuna.setdefault(normalizar(cliente.get("comuna", "")), []).append(cliente)
+
+    planificados = [c for c, _ in fijos] + [c for grupo in libres_por_comuna.values() for c in grupo]
+    total_cajas = sum(max(0, c.get("cajas_de_huevos", 0) or 0) for c in planificados)
+    n = len(dias)
+    media_cajas = total_cajas / n
+    media_paradas = len(planificados) / n
+    estado = _Estado(n, media_cajas, media_paradas)
+
+    for cliente, dia in fijos:
+        estado.agregar(indice_dia[dia], normalizar(cliente.get("comuna", "")), max(0, cliente.get("cajas_de_huevos", 0) or 0), 1)
+
+    bloques = []
+    for comuna, grupo in libres_por_comuna.items():
+        bloques.extend(_partir_bloque(comuna, grupo, media_cajas, media_paradas))
+
+    # Voraz: bloques más pesados primero, cada uno al día con menor costo marginal
+    def peso(b):
+        return b.cajas * estado.escala_cajas * media_cajas + b.paradas * estado.escala_paradas * media_paradas
+
+    bloques.sort(key=peso, reverse=True)
+    for bloque in bloques:
+        mejor = min(range(n), key=lambda d: estado.delta_agregar(d, bloque.comuna, bloque.cajas, bloque.paradas))
+        bloque.dia = mejor
+        estado.agregar(mejor, bloque.comuna, bloque.cajas, bloque.paradas)
+
+    # Búsqueda local: mover un bloque o intercambiar dos mientras mejore
+    iteraciones = 0
+    mejoro = True
+    while mejoro and time.perf_counter() - inicio < max_segundos:
+        mejoro = False
+        iteraciones += 1
+        for bloque in bloques:
+            origen = bloque.dia
+            costo_salida = estado.delta_quitar(origen, bloque.comuna, bloque.cajas, bloque.paradas)
+            estado.quitar(origen, bloque.comuna, bloque.cajas, bloque.paradas)
+            mejor_dia, mejor_delta = origen, -costo_salida
+            for d in range(n):
+                if d == origen:
+                    continue
+                delta = estado.delta_agregar(d, bloque.comuna, bloque.cajas, bloque.paradas)
+                if delta < mejor_delta - 1e-12:
+                    mejor_dia, mejor_delta = d, delta
+            estado.agregar(mejor_dia, bloque.comuna, bloque.cajas, bloque.paradas)
+            if mejor_dia != origen:
+                bloque.dia = mejor_dia
+                mejoro = True
+
+        if mejoro:
+            continue
+        for i, a in enumerate(bloques):
+            for b in bloques[i + 1:]:
+                if a.dia == b.dia:
+                    continue
+                da, db = a.dia, b.dia
+                costo_antes = (
+                    estado.costo_dia(da, estado.cajas[da], estado.paradas[da])
+                    + estado.costo_dia(db, estado.cajas[db], estado.paradas[db])
+                    + PESO_DISPERSION * (len(estado.comunas[da]) + len(estado.comunas[db]))
+                )
+                estado.quitar(da, a.comuna, a.cajas, a.paradas)
+                estado.quitar(db, b.comuna, b.cajas, b.paradas)
+                estado.agregar(da, b.comuna, b.cajas, b.paradas)
+                estado.agregar(db, a.comuna, a.cajas, a.paradas)
+                costo_despues = (
+                    estado.costo_dia(da, estado.cajas[da], estado.paradas[da])
+                    + estado.costo_dia(db, estado.cajas[db], estado.paradas[db])
+                    + PESO_DISPERSION * (len(estado.comunas[da]) + len(estado.comunas[db]))
+                )
+                if costo_despues < costo_antes - 1e-12:
+                    a.dia, b.dia = db, da
+                    mejoro = True
+                else:
+                    estado.quitar(da, b.comuna, b.cajas, b.paradas)
+                    estado.quitar(db, a.comuna, a.cajas, a.paradas)
+                    estado.agregar(da, a.comuna, a.cajas, a.paradas)
+                    estado.agregar(db, b.comuna, b.cajas, b.paradas)
+            if time.perf_counter() - inicio >= max_segundos:
+                break
+
+    asignacion = list(fijos)
+    for bloque in bloques:
+        dia = dias[bloque.dia]
+        asignacion.extend((cliente, dia) for cliente in bloque.clientes)
+
+    return Planificacion(
+        dias,
+        asignacion,
+        [int(c) for c in estado.cajas],
+        [int(p) for p in estado.paradas],
+        [set(comunas) for comunas in estado.comunas],
+        iteraciones,
+        time.perf_counter() - inicio
+    )
+
+
+def propuesta(planificacion):
+    # id de cliente -> día, para RepartoStore.aplicar_planificacion
+    return {cliente.get("id"): dia for cliente, dia in planificacion.cambios()}
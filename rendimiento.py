@@ -0,0 +1,141 @@
+import json
+import os
+import platform
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+from functools import wraps
+
+# Tiempos por acción del usuario (botones, guardados, refrescos, exportes).
+# Desactivado cuesta una comparación por llamada; activado guarda las
+# últimas CAPACIDAD mediciones de cada acción en un búfer circular.
+# Se activa con CONTROL_REPARTO_RENDIMIENTO=1 o desde la ventana oculta
+# "Rendimiento" (Ctrl+Shift+R).
+
+CAPACIDAD = 512
+VARIABLE_ENTORNO = "CONTROL_REPARTO_RENDIMIENTO"
+
+_activo = os.environ.get(VARIABLE_ENTORNO, "") not in ("", "0")
+_mediciones = {}
+_indicadores = {}
+_bloqueo = threading.Lock()
+_NULO = nullcontext()
+
+
+def activo():
+    return _activo
+
+
+def activar(valor=True):
+    global _activo
+    _activo = bool(valor)
+
+
+def registrar(accion, segundos):
+    with _bloqueo:
+        buffer = _mediciones.get(accion)
+        if buffer is None:
+            buffer = _mediciones[accion] = deque(maxlen=CAPACIDAD)
+        buffer.append(segundos)
+
+
+class _Medicion:
+    __slots__ = ("accion", "inicio")
+
+    def __init__(self, accion):
+        self.accion = accion
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registrar(self.accion, time.perf_counter() - self.inicio)
+        return False
+
+
+def medir(accion):
+    if not _activo:
+        return _NULO
+    return _Medicion(accion)
+
+
+def envolver(accion, funcion):
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if not _activo:
+            return funcion(*args, **kwargs)
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            registrar(accion, time.perf_counter() - inicio)
+    return envoltura
+
+
+def cronometrado(accion):
+    def decorador(funcion):
+        return envolver(accion, funcion)
+    return decorador
+
+
+def registrar_indicador(nombre, funcion):
+    # Valores calculados al momento de consultar (p. ej. aciertos de una caché)
+    _indicadores[nombre] = funcion
+
+
+def _percentil(ordenados, fraccion):
+    if not ordenados:
+        return 0.0
+    posicion = min(len(ordenados) - 1, max(0, round(fraccion * (len(ordenados) - 1))))
+    return ordenados[posicion]
+
+
+def estadisticas():
+    with _bloqueo:
+        copias = {accion: list(buffer) for accion, buffer in _mediciones.items()}
+    filas = []
+    for accion, valores in copias.items():
+        ordenados = sorted(valores)
+        filas.append({
+            "accion": accion,
+            "muestras": len(ordenados),
+            "p50": _percentil(ordenados, 0.5),
+            "p95": _percentil(ordenados, 0.95),
+            "max": ordenados[-1] if ordenados else 0.0,
+            "ultimo": valores[-1] if valores else 0.0
+        })
+    filas.sort(key=lambda f: f["p95"], reverse=True)
+    return filas
+
+
+def indicadores():
+    valores = {}
+    for nombre, funcion in _indicadores.items():
+        try:
+            valores[nombre] = funcion()
+        except Exception as e:
+            valores[nombre] = f"error: {e}"
+    return valores
+
+
+def limpiar():
+    with _bloqueo:
+        _mediciones.clear()
+
+
+def exportar(archivo):
+    with _bloqueo:
+        muestras = {accion: list(buffer) for accion, buffer in _mediciones.items()}
+    datos = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "estadisticas": estadisticas(),
+        "indicadores": indicadores(),
+        "muestras": muestras
+    }
+    with open(archivo, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=4, ensure_ascii=False)
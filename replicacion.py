@@ -0,0 +1,478 @@
+import gzip
+import json
+import os
+import platform
+import uuid
+from datetime import datetime
+
+# Réplica sin conexión entre dos instalaciones (p. ej. la bodega y un
+# segundo local). Cada cliente, movimiento y entrega lleva el sello de
+# Lamport de su último cambio: "sello" (reloj de la instalación) y "origen"
+# (su id). Exportar junta en un archivo pequeño (.cambios.json.gz, para
+# llevar en un pendrive) lo que cambió desde la última exportación a esa
+# instalación; importar lo fusiona registro a registro por id, así que
+# depende de la cantidad de cambios y no del tamaño de la base.
+#
+# La fusión es determinista: entre dos cambios simultáneos (el de aquí no
+# lo había visto la otra instalación) gana el sello mayor (reloj, origen)
+# en ambos lados. Las cajas se suman: cada cliente acumula en
+# "cambio_cajas"/"cambio_total" lo que se agregó o entregó aquí desde la
+# última exportación, y al fusionar se suma lo de la otra instalación si el
+# resultado no queda negativo. Un cliente modificado de un lado y eliminado
+# del otro se mantiene.
+#
+# Las vistas guardadas y la capacidad del vehículo son de cada instalación.
+
+FORMATO = 1
+EXTENSION = ".cambios.json.gz"
+LISTAS = ("clientes", "movimientos", "entregas")
+CONTADORES = ("cambio_cajas", "cambio_total")
+CAMPOS_CONTROL = ("sello", "origen") + CONTADORES
+CAMPOS_CAJAS = ("cajas_de_huevos", "cajas_de_huevos_total")
+_PREFIJO_COMUNA = "comuna:"
+
+
+class ErrorReplica(ValueError):
+    pass
+
+
+def estado_inicial(guardado=None):
+    estado = dict(guardado or {})
+    estado.setdefault("instalacion", uuid.uuid4().hex[:8])
+    estado.setdefault("nombre", platform.node() or estado["instalacion"])
+    estado["reloj"] = int(estado.get("reloj", 0) or 0)
+    for clave in ("enviado", "recibido", "nombres", "ajustes"):
+        estado[clave] = dict(estado.get(clave) or {})
+    bajas = estado.get("bajas") or {}
+    estado["bajas"] = {lista: dict(bajas.get(lista) or {}) for lista in LISTAS}
+    return estado
+
+
+def copiar_estado(estado):
+    copia = dict(estado)
+    for clave in ("enviado", "recibido", "nombres", "ajustes"):
+        copia[clave] = dict(estado[clave])
+    copia["bajas"] = {lista: dict(estado["bajas"][lista]) for lista in LISTAS}
+    if "copia" in estado:
+        copia["copia"] = {"origen": estado["copia"]["origen"], "contadores": dict(estado["copia"]["contadores"])}
+    return copia
+
+
+def sello(registro):
+    return (registro.get("sello", 0) or 0, registro.get("origen") or "")
+
+
+def _marca(valor):
+    return tuple(valor) if valor else (0, "")
+
+
+def nombre_instalacion(estado, instalacion):
+    return estado["nombres"].get(instalacion) or instalacion
+
+
+def buscar_instalacion(estado, texto):
+    # Por id o por nombre, sin distinguir mayúsculas
+    texto = (texto or "").strip()
+    if texto in estado["nombres"] or texto in estado["recibido"]:
+        return texto
+    for instalacion, nombre in estado["nombres"].items():
+        if nombre.lower() == texto.lower():
+            return instalacion
+    raise ErrorReplica(f"No se conoce la instalación '{texto}'. Importe primero un archivo suyo.")
+
+
+def nueva_instalacion(store):
+    # Tras copiar db.json a otro equipo: la copia toma un id propio y da por
+    # intercambiado con el original todo lo que ya tiene. Las cajas que el
+    # original aún no exportaba ya vienen en la copia: sus contadores se
+    # apartan aquí y se descuentan de lo primero que llegue del original
+    # para cada cliente, así no se suman dos veces.
+    estado = store.replica
+    anterior = estado["instalacion"]
+    estado["instalacion"] = uuid.uuid4().hex[:8]
+    estado["nombres"][anterior] = estado.get("nombre") or anterior
+    estado["nombre"] = platform.node() or estado["instalacion"]
+    estado["enviado"][anterior] = estado["reloj"]
+    estado["recibido"][anterior] = estado["reloj"]
+    contadores = {}
+    for cliente in store.clientes:
+        valores = [cliente.pop(campo, 0) or 0 for campo in CONTADORES]
+        if any(valores) and cliente.get("id"):
+            contadores[cliente["id"]] = valores
+    if contadores:
+        estado["copia"] = {"origen": anterior, "contadores": contadores}
+    return estado["instalacion"]
+
+
+def fusionar_estados(local, externo):
+    # Dos copias de la aplicación sobre el mismo archivo comparten instalación
+    if not externo or externo.get("instalacion") != local["instalacion"]:
+        return
+    local["reloj"] = max(local["reloj"], externo.get("reloj", 0))
+    for clave in ("enviado", "recibido"):
+        for instalacion, reloj in (externo.get(clave) or {}).items():
+            local[clave][instalacion] = max(local[clave].get(instalacion, 0), reloj)
+    local["nombres"].update(externo.get("nombres") or {})
+    for clave, marca in (externo.get("ajustes") or {}).items():
+        if _marca(marca) > _marca(local["ajustes"].get(clave)):
+            local["ajustes"][clave] = marca
+    for lista in LISTAS:
+        for registro_id, marca in ((externo.get("bajas") or {}).get(lista) or {}).items():
+            if _marca(marca) > _marca(local["bajas"][lista].get(registro_id)):
+                local["bajas"][lista][registro_id] = marca
+    # Contadores de la copia ya descontados por cualquiera de las dos
+    if "copia" in local:
+        pendientes = ((externo.get("copia") or {}).get("contadores")) or {}
+        contadores = local["copia"]["contadores"]
+        for cliente_id in [i for i in contadores if i not in pendientes]:
+            del contadores[cliente_id]
+        if not contadores:
+            del local["copia"]
+
+
+# ------------------ Exportar ------------------
+
+def nombre_archivo(store, destino=None):
+    estado = store.replica
+    partes = [estado["nombre"] or estado["instalacion"]]
+    if destino:
+        partes.append("para " + nombre_instalacion(estado, destino))
+    partes.append(datetime.now().strftime("%d-%m-%Y_%H%M"))
+    return " ".join(partes).replace("/", "-") + EXTENSION
+
+
+def exportar(store, destino=None, desde=None):
+    # Para una instalación nueva (sin destino) va todo, también lo que no
+    # tiene sello. No cambia nada: una vez escrito el archivo,
+    # confirmar_exportacion anota hasta dónde se envió.
+    estado = store.replica
+    if desde is None:
+        desde = estado["enviado"].get(destino, estado["enviado"].get("*", -1)) if destino else -1
+
+    def pendiente(registro):
+        # Lo último que cambió la instalación destino no se le devuelve
+        if destino and registro.get("origen") == destino:
+            return False
+        return (registro.get("sello", 0) or 0) > desde
+
+    return {
+        "formato": FORMATO,
+        "origen": estado["instalacion"],
+        "nombre": estado["nombre"],
+        "destino": destino,
+        "desde": desde,
+        "reloj": estado["reloj"],
+        # Hasta dónde vio esta instalación los cambios de cada otra
+        "visto": dict(estado["recibido"]),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "clientes": [dict(c) for c in store.clientes if pendiente(c)],
+        "movimientos": [dict(m) for m in store.movimientos if pendiente(m)],
+        "entregas": [dict(e) for e in store.entregas if pendiente(e)],
+        "bajas": {
+            lista: {
+                registro_id: marca for registro_id, marca in estado["bajas"][lista].items()
+                if marca[0] > desde and marca[1] != destino
+            }
+            for lista in LISTAS
+        },
+        "ajustes": {
+            clave: {"valor": _valor_ajuste(store, clave), "sello": marca}
+            for clave, marca in estado["ajustes"].items()
+            if marca[0] > desde and marca[1] != destino
+        },
+        "comunas": list(store.comunas)
+    }
+
+
+def confirmar_exportacion(store, paquete):
+    # Lo exportado de las cajas se descuenta de los contadores (un cliente
+    # pudo cambiar mientras se escribía el archivo)
+    for registro in paquete["clientes"]:
+        cliente = store.cliente_por_id(registro.get("id"))
+        if cliente is None:
+            continue
+        for campo in CONTADORES:
+            restante = cliente.get(campo, 0) - (registro.get(campo, 0) or 0)
+            if restante:
+                cliente[campo] = restante
+            else:
+                cliente.pop(campo, None)
+    enviado = store.replica["enviado"]
+    clave = paquete["destino"] or "*"
+    enviado[clave] = max(enviado.get(clave, 0), paquete["reloj"])
+
+
+def _valor_ajuste(store, clave):
+    if clave == "precio_caja":
+        return store.precio_caja
+    return store.precios_por_comuna.get(clave[len(_PREFIJO_COMUNA):])
+
+
+def clave_precio_comuna(comuna):
+    return _PREFIJO_COMUNA + comuna
+
+
+def escribir(paquete, ruta):
+    temporal = ruta + ".tmp"
+    with gzip.open(temporal, "wt", encoding="utf-8") as f:
+        json.dump(paquete, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def leer(ruta):
+    try:
+        with gzip.open(ruta, "rt", encoding="utf-8") as f:
+            paquete = json.load(f)
+    except (OSError, EOFError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ErrorReplica(f"No se pudo leer '{os.path.basename(ruta)}': {e}") from e
+    if not isinstance(paquete, dict) or paquete.get("formato") != FORMATO or not paquete.get("origen"):
+        raise ErrorReplica(f"'{os.path.basename(ruta)}' no es un archivo de cambios de esta aplicación.")
+    return paquete
+
+
+# ------------------ Importar ------------------
+
+def importar(store, paquete):
+    # Devuelve un resumen; los conflictos quedan en store.conflictos
+    estado = store.replica
+    origen = paquete["origen"]
+    if origen == estado["instalacion"]:
+        raise ErrorReplica(
+            "El archivo viene de esta misma instalación. Si db.json se copió desde la otra, "
+            "esta copia necesita un id nuevo (replica-info --nueva-instalacion)."
+        )
+    nombre = paquete.get("nombre") or origen
+    visto = (paquete.get("visto") or {}).get(estado["instalacion"], 0)
+    fusion = _Fusion(store, origen, nombre, visto)
+    with store.historial.pausa():
+        for externo in paquete.get("clientes", []):
+            fusion.cliente(externo)
+        for cliente_id, marca in paquete.get("bajas", {}).get("clientes", {}).items():
+            fusion.baja_cliente(cliente_id, _marca(marca))
+        for lista in LISTAS[1:]:
+            fusion.registros(lista, paquete.get(lista, []), paquete.get("bajas", {}).get(lista, {}))
+        for clave, ajuste in paquete.get("ajustes", {}).items():
+            fusion.ajuste(clave, ajuste)
+        for comuna in paquete.get("comunas", []):
+            store.registrar_comuna(comuna)
+
+    reloj = paquete.get("reloj", 0) or 0
+    estado["reloj"] = max(estado["reloj"], reloj) + 1
+    estado["recibido"][origen] = max(estado["recibido"].get(origen, 0), reloj)
+    estado["nombres"][origen] = nombre
+    # Lo que ya vio el origen no hace falta mandárselo en la primera exportación
+    estado["enviado"].setdefault(origen, visto)
+    store.conflictos.extend(fusion.conflictos)
+    fusion.resumen["conflictos"] = len(fusion.conflictos)
+    return fusion.resumen
+
+
+class _Fusion:
+    def __init__(self, store, origen, nombre, visto):
+        self.store = store
+        self.estado = store.replica
+        self.propio = self.estado["instalacion"]
+        self.origen = origen
+        self.nombre = nombre
+        self.visto = visto
+        self.ya_recibido = self.estado["recibido"].get(origen, 0)
+        self.conflictos = []
+        self.resumen = {"clientes": 0, "sumados": 0, "eliminados": 0, "movimientos": 0, "entregas": 0, "ajustes": 0}
+
+    def _ya_recibido(self, marca):
+        # Vuelve a llegar algo del origen que ya se importó (mismo archivo
+        # importado dos veces o una exportación completa)
+        return marca[1] == self.origen and marca[0] <= self.ya_recibido
+
+    def _concurrente(self, marca):
+        # Cambio de aquí que la otra instalación todavía no había visto
+        return marca[1] == self.propio and marca[0] > self.visto
+
+    def _conflicto(self, cliente_id, local, externo, motivo, campos=None):
+        referencia = local or externo
+        self.conflictos.append({
+            "tipo": "cliente",
+            "origen": "replica",
+            "id": cliente_id,
+            "nombre": referencia.get("nombre_completo", ""),
+            "motivo": motivo,
+            "local": dict(local) if local else None,
+            "externo": dict(externo) if externo else None,
+            "campos": campos
+        })
+
+    def cliente(self, externo):
+        cliente_id = externo.get("id")
+        if not cliente_id:
+            return
+        store = self.store
+        marca = sello(externo)
+        # También si ya se tenía: el original pone sus contadores en cero al
+        # exportarlo
+        externo = self._descontar_copia(cliente_id, externo)
+        if self._ya_recibido(marca):
+            return
+        recibido = {k: v for k, v in externo.items() if k not in CONTADORES}
+        local = store.cliente_por_id(cliente_id)
+        if local is None:
+            baja = self.estado["bajas"]["clientes"].get(cliente_id)
+            if baja and _marca(baja) >= marca:
+                if marca[1] != self.origen or not self._concurrente(_marca(baja)):
+                    return
+                # Eliminado aquí mientras allá se modificaba: se restaura
+                self._conflicto(cliente_id, None, externo, f"Eliminado aquí y modificado en {self.nombre} (se restauró)")
+            store._aplicar_externo(None, recibido)
+            self.resumen["clientes"] += 1
+            return
+
+        marca_local = sello(local)
+        if marca_local == marca:
+            return
+        if not self._concurrente(marca_local):
+            if marca > marca_local:
+                store._aplicar_externo(local, recibido)
+                self.resumen["clientes"] += 1
+            return
+
+        gana_externo = marca > marca_local
+        resultado = dict(recibido if gana_externo else local)
+        for campo in CONTADORES:
+            resultado.pop(campo, None)
+            if campo in local:
+                resultado[campo] = local[campo]
+        sumadas = _sumar_cajas(local, externo)
+        if sumadas:
+            resultado["cajas_de_huevos"], resultado["cajas_de_huevos_total"] = sumadas
+            if externo.get("cambio_cajas") or externo.get("cambio_total"):
+                self.resumen["sumados"] += 1
+        enviado = self.estado["enviado"]
+        if marca_local[0] > enviado.get(self.origen, enviado.get("*", 0)):
+            # Lo de aquí aún no se exportó: el resultado vuelve a salir como
+            # cambio propio para que llegue a la otra instalación
+            self.estado["reloj"] += 1
+            resultado["sello"], resultado["origen"] = self.estado["reloj"], self.propio
+        else:
+            resultado["sello"], resultado["origen"] = max(marca, marca_local)
+
+        excluidos = CAMPOS_CONTROL + (CAMPOS_CAJAS if sumadas else ())
+        distintos = sorted(
+            campo for campo in set(local) | set(externo)
+            if campo not in excluidos and local.get(campo) != externo.get(campo)
+        )
+        anterior = dict(local)
+        store._aplicar_externo(local, resultado)
+        self.resumen["clientes"] += 1
+        if distintos:
+            quedo = f"el de {self.nombre}" if gana_externo else "el de aquí"
+            self._conflicto(cliente_id, anterior, externo, f"Modificado aquí y en {self.nombre} (quedó {quedo})", distintos)
+
+    def _descontar_copia(self, cliente_id, externo):
+        # Lo que el original no había exportado al copiar db.json ya está aquí
+        copia = self.estado.get("copia")
+        if not copia or copia["origen"] != self.origen:
+            return externo
+        base = copia["contadores"].pop(cliente_id, None)
+        if not copia["contadores"]:
+            del self.estado["copia"]
+        if base is None:
+            return externo
+        externo = dict(externo)
+        for campo, valor in zip(CONTADORES, base):
+            externo[campo] = (externo.get(campo, 0) or 0) - valor
+        return externo
+
+    def baja_cliente(self, cliente_id, marca):
+        bajas = self.estado["bajas"]["clientes"]
+        if marca > _marca(bajas.get(cliente_id)):
+            bajas[cliente_id] = list(marca)
+        local = self.store.cliente_por_id(cliente_id)
+        if local is None:
+            return
+        marca_local = sello(local)
+        if self._concurrente(marca_local):
+            self._conflicto(cliente_id, local, None, f"Eliminado en {self.nombre} y modificado aquí (se mantuvo)")
+            return
+        if marca_local > marca:
+            return
+        self.store.eliminar_cliente(local)
+        # La baja conserva el sello de la otra instalación
+        bajas[cliente_id] = list(marca)
+        self.resumen["eliminados"] += 1
+
+    def registros(self, lista, externos, bajas_externas):
+        # Caja y entregas solo crecen: lo del origen ya recibido se salta sin
+        # buscarlo. Un id que ya está aquí (venga de donde venga) no se
+        # agrega otra vez; si llega con un sello más nuevo se reemplaza
+        registros = getattr(self.store, lista)
+        bajas = self.estado["bajas"][lista]
+        por_id = None
+        for registro in externos:
+            marca = sello(registro)
+            if self._ya_recibido(marca):
+                continue
+            baja = bajas.get(registro.get("id"))
+            if baja and _marca(baja) > marca:
+                continue
+            registro_id = registro.get("id")
+            if registro_id:
+                if por_id is None:
+                    por_id = {r["id"]: r for r in registros if r.get("id")}
+                actual = por_id.get(registro_id)
+                if actual is not None:
+                    # En su lugar: el deshacer guarda el mismo objeto
+                    if marca > sello(actual):
+                        actual.clear()
+                        actual.update(registro)
+                        if lista == "movimientos":
+                            self.store._ediciones_caja += 1
+                    continue
+                por_id[registro_id] = registro = dict(registro)
+            else:
+                registro = dict(registro)
+            registros.append(registro)
+            self.resumen[lista] += 1
+
+        quitar = {}
+        for registro_id, marca in bajas_externas.items():
+            marca = _marca(marca)
+            if marca > _marca(bajas.get(registro_id)):
+                bajas[registro_id] = list(marca)
+                quitar[registro_id] = marca
+        if quitar:
+            registros[:] = [
+                r for r in registros
+                if r.get("id") not in quitar or sello(r) > quitar[r.get("id")]
+            ]
+
+    def ajuste(self, clave, ajuste):
+        marca = _marca(ajuste.get("sello"))
+        if marca <= _marca(self.estado["ajustes"].get(clave)):
+            return
+        self.estado["ajustes"][clave] = list(marca)
+        store = self.store
+        valor = ajuste.get("valor")
+        if clave == "precio_caja":
+            if valor:
+                store.precio_caja = valor
+        elif clave.startswith(_PREFIJO_COMUNA):
+            comuna = store.registrar_comuna(clave[len(_PREFIJO_COMUNA):])
+            if not comuna:
+                return
+            if valor is None:
+                store.precios_por_comuna.pop(comuna, None)
+            else:
+                store.precios_por_comuna[comuna] = valor
+        store._indice_precios = None
+        self.resumen["ajustes"] += 1
+
+
+def _sumar_cajas(local, externo):
+    # Lo que la otra instalación agregó o entregó desde su última
+    # exportación, sobre lo que hay aquí. None si no es seguro sumar.
+    # Sin cambios allá queda lo de aquí, que ya trae lo propio: así ambos
+    # lados llegan al mismo número.
+    cajas = (local.get("cajas_de_huevos", 0) or 0) + (externo.get("cambio_cajas", 0) or 0)
+    total = (local.get("cajas_de_huevos_total", 0) or 0) + (externo.get("cambio_total", 0) or 0)
+    if cajas < 0 or total < 0:
+        return None
+    return cajas, total
@@ -0,0 +1,324 @@
+import bisect
+from array import array
+from datetime import date, datetime, timedelta
+from itertools import accumulate, islice
+
+# Reportes de caja por período construidos sobre arreglos compactos.
+# Los movimientos se convierten una sola vez a columnas numéricas ordenadas
+# por día; los totales por período salen de sumas acumuladas + bisect y las
+# agrupaciones recorren solo arreglos de enteros/flotantes.
+
+TIPO_INGRESO = 0
+TIPO_EGRESO = 1
+TIPO_OTRO = 2
+
+PERIODOS = ("Diario", "Semanal", "Mensual")
+
+FORMATO_MONEDA_XLSX = '"$"#,##0'
+
+
+def _codigo_tipo(tipo):
+    tipo = (tipo or "").strip().lower()
+    if tipo == "ingreso":
+        return TIPO_INGRESO
+    if tipo == "egreso":
+        return TIPO_EGRESO
+    return TIPO_OTRO
+
+
+def _monto(valor):
+    try:
+        return float(valor or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parsear_dia(mov, cache):
+    # Los movimientos comparten muchas fechas: se parsea cada día una sola vez.
+    fecha_iso = mov.get("fecha_iso") or ""
+    if fecha_iso:
+        clave = fecha_iso[:10]
+        ordinal = cache.get(clave)
+        if ordinal is None:
+            try:
+                ordinal = date.fromisoformat(clave).toordinal()
+            except ValueError:
+                ordinal = -1
+            cache[clave] = ordinal
+        if ordinal >= 0:
+            return ordinal
+    fecha = mov.get("fecha") or ""
+    clave = fecha[:10]
+    ordinal = cache.get(clave)
+    if ordinal is None:
+        try:
+            ordinal = datetime.strptime(clave, "%d-%m-%Y").toordinal()
+        except ValueError:
+            ordinal = -1
+        cache[clave] = ordinal
+    return ordinal
+
+
+def referencia_movimiento(mov):
+    return mov.get("metodo") or mov.get("cliente") or mov.get("referencia") or ""
+
+
+class ColumnasCaja:
+    def __init__(self, movimientos):
+        self._fechas = {}
+        self._codigos_desc = {}
+        self._codigos_ref = {}
+        self._codigos_tipo = {}
+        self._textos_desc = {}
+        self._textos_ref = {}
+        self.descripciones = []
+        self.referencias = []
+
+        dias, montos, tipos, descs, refs = self._convertir(movimientos)
+
+        # Los movimientos suelen agregarse en orden cronológico; solo se
+        # reordena cuando hace falta.
+        if any(dias[i] > dias[i + 1] for i in range(len(dias) - 1)):
+            orden = sorted(range(len(dias)), key=dias.__getitem__)
+            dias = [dias[i] for i in orden]
+            montos = [montos[i] for i in orden]
+            tipos = [tipos[i] for i in orden]
+            descs = [descs[i] for i in orden]
+            refs = [refs[i] for i in orden]
+
+        self.dias = array("l", dias)
+        self.montos = array("d", montos)
+        self.tipos = array("b", tipos)
+        self.codigos_descripcion = array("l", descs)
+        self.codigos_referencia = array("l", refs)
+
+        self.acumulados = [
+            array("d", accumulate((m if t == tipo else 0.0 for m, t in zip(self.montos, self.tipos)), initial=0.0))
+            for tipo in (TIPO_INGRESO, TIPO_EGRESO, TIPO_OTRO)
+        ]
+
+    def _convertir(self, movimientos):
+        # Un millón de movimientos repite pocas fechas, tipos, descripciones y
+        # referencias: cada valor tal como viene se resuelve una sola vez
+        cache_fechas = self._fechas
+        codigos_desc = self._codigos_desc
+        codigos_ref = self._codigos_ref
+        codigos_tipo = self._codigos_tipo
+        dias = []
+        montos = []
+        tipos = []
+        descs = []
+        refs = []
+        for mov in movimientos:
+            ordinal = cache_fechas.get((mov.get("fecha_iso") or "")[:10])
+            if ordinal is None or ordinal < 0:
+                ordinal = _parsear_dia(mov, cache_fechas)
+                if ordinal < 0:
+                    continue
+            valor = mov.get("descripcion")
+            codigo_desc = codigos_desc.get(valor)
+            if codigo_desc is None:
+                codigo_desc = codigos_desc[valor] = self._codigo(self.descripciones, self._textos_desc, (valor or "").strip() or "Sin descripción")
+            valor = mov.get("metodo") or mov.get("cliente") or mov.get("referencia") or ""
+            codigo_ref = codigos_ref.get(valor)
+            if codigo_ref is None:
+                codigo_ref = codigos_ref[valor] = self._codigo(self.referencias, self._textos_ref, valor.strip() or "Sin referencia")
+            valor = mov.get("tipo")
+            codigo_tipo = codigos_tipo.get(valor)
+            if codigo_tipo is None:
+                codigo_tipo = codigos_tipo[valor] = _codigo_tipo(valor)
+            monto = mov.get("monto")
+            dias.append(ordinal)
+            montos.append(monto if monto.__class__ is float else _monto(monto))
+            tipos.append(codigo_tipo)
+            descs.append(codigo_desc)
+            refs.append(codigo_ref)
+        return dias, montos, tipos, descs, refs
+
+    def _codigo(self, textos, codigos, texto):
+        # Valores distintos con el mismo texto limpio comparten código
+        codigo = codigos.get(texto)
+        if codigo is None:
+            codigo = codigos[texto] = len(textos)
+            textos.append(texto)
+        return codigo
+
+    def extender(self, movimientos):
+        # Suma movimientos agregados al final. Devuelve False si alguno es de
+        # un día anterior al último: entonces hay que reconstruir
+        dias, montos, tipos, descs, refs = self._convertir(movimientos)
+        if not dias:
+            return True
+        if (self.dias and dias[0] < self.dias[-1]) or any(dias[i] > dias[i + 1] for i in range(len(dias) - 1)):
+            return False
+        self.dias.extend(dias)
+        self.montos.extend(montos)
+        self.tipos.extend(tipos)
+        self.codigos_descripcion.extend(descs)
+        self.codigos_referencia.extend(refs)
+        for tipo, acumulado in zip((TIPO_INGRESO, TIPO_EGRESO, TIPO_OTRO), self.acumulados):
+            sumas = accumulate((m if t == tipo else 0.0 for m, t in zip(montos, tipos)), initial=acumulado[-1])
+            acumulado.extend(islice(sumas, 1, None))
+        return True
+
+    def __len__(self):
+        return len(self.dias)
+
+    def rango_indices(self, desde=None, hasta=None):
+        lo = bisect.bisect_left(self.dias, desde.toordinal()) if desde else 0
+        hi = bisect.bisect_right(self.dias, hasta.toordinal()) if hasta else len(self.dias)
+        return lo, max(lo, hi)
+
+    def totales(self, lo, hi):
+        ingresos, egresos, otros = (acum[hi] - acum[lo] for acum in self.acumulados)
+        return ingresos, egresos, otros
+
+
+# ------------------ Reportes ------------------
+
+def _inicio_periodo(dia, periodo):
+    if periodo == "Semanal":
+        return dia - timedelta(days=dia.weekday())
+    if periodo == "Mensual":
+        return dia.replace(day=1)
+    return dia
+
+
+def _siguiente_periodo(inicio, periodo):
+    if periodo == "Semanal":
+        return inicio + timedelta(days=7)
+    if periodo == "Mensual":
+        if inicio.month == 12:
+            return inicio.replace(year=inicio.year + 1, month=1)
+        return inicio.replace(month=inicio.month + 1)
+    return inicio + timedelta(days=1)
+
+
+def reporte_periodos(columnas, periodo="Diario", desde=None, hasta=None):
+    lo, hi = columnas.rango_indices(desde, hasta)
+    if lo >= hi:
+        return []
+    dias = columnas.dias
+    filas = []
+    inicio = _inicio_periodo(date.fromordinal(dias[lo]), periodo)
+    while lo < hi:
+        fin = _siguiente_periodo(inicio, periodo)
+        corte = min(bisect.bisect_left(dias, fin.toordinal(), lo, hi), hi)
+        if corte > lo:
+            ingresos, egresos, otros = columnas.totales(lo, corte)
+            filas.append({
+                "inicio": inicio,
+                "fin": fin - timedelta(days=1),
+                "movimientos": corte - lo,
+                "ingresos": ingresos,
+                "egresos": egresos,
+                "otros": otros,
+                "neto": ingresos - egresos
+            })
+            lo = corte
+            inicio = fin
+        else:
+            # Saltar directamente al período del siguiente movimiento
+            inicio = _inicio_periodo(date.fromordinal(dias[lo]), periodo)
+    return filas
+
+
+def reporte_agrupado(columnas, por="descripcion", desde=None, hasta=None, limite=None):
+    if por == "descripcion":
+        codigos, etiquetas = columnas.codigos_descripcion, columnas.descripciones
+    else:
+        codigos, etiquetas = columnas.codigos_referencia, columnas.referencias
+    lo, hi = columnas.rango_indices(desde, hasta)
+    n = len(etiquetas)
+    cantidades = [0] * n
+    sumas = ([0.0] * n, [0.0] * n, [0.0] * n)
+    for codigo, monto, tipo in zip(codigos[lo:hi], columnas.montos[lo:hi], columnas.tipos[lo:hi]):
+        cantidades[codigo] += 1
+        sumas[tipo][codigo] += monto
+    ingresos, egresos, otros = sumas
+    filas = [
+        {
+            "etiqueta": etiquetas[codigo],
+            "movimientos": cantidades[codigo],
+            "ingresos": ingresos[codigo],
+            "egresos": egresos[codigo],
+            "otros": otros[codigo],
+            "neto": ingresos[codigo] - egresos[codigo]
+        }
+        for codigo in range(n)
+        if cantidades[codigo]
+    ]
+    filas.sort(key=lambda f: f["ingresos"] + f["egresos"] + f["otros"], reverse=True)
+    if limite:
+        filas = filas[:limite]
+    return filas
+
+
+def resumen_total(columnas, desde=None, hasta=None):
+    lo, hi = columnas.rango_indices(desde, hasta)
+    ingresos, egresos, otros = columnas.totales(lo, hi)
+    return {
+        "movimientos": hi - lo,
+        "ingresos": ingresos,
+        "egresos": egresos,
+        "otros": otros,
+        "neto": ingresos - egresos
+    }
+
+
+# ------------------ Exportar a Excel ------------------
+
+def _escribir_hoja(ws, encabezados, filas, columnas_moneda):
+    from openpyxl.styles import Font, Alignment
+
+    ws.append(encabezados)
+    for cell in ws[1]:
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal="center")
+    for fila in filas:
+        ws.append(fila)
+    for col in columnas_moneda:
+        for (cell,) in ws.iter_rows(min_row=2, min_col=col, max_col=col):
+            cell.number_format = FORMATO_MONEDA_XLSX
+    for column in ws.columns:
+        max_length = max(len(str(cell.value)) if cell.value is not None else 0 for cell in column)
+        ws.column_dimensions[column[0].column_letter].width = max_length + 2
+
+
+def exportar_reportes_xlsx(columnas, nombre_archivo, periodo="Diario", desde=None, hasta=None):
+    # openpyxl se importa solo al exportar para no demorar el arranque
+    import openpyxl
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = f"Caja {periodo.lower()}"
+    filas = [
+        [
+            f["inicio"].strftime("%d-%m-%Y"),
+            f["fin"].strftime("%d-%m-%Y"),
+            f["movimientos"],
+            f["ingresos"],
+            f["egresos"],
+            f["otros"],
+            f["neto"]
+        ]
+        for f in reporte_periodos(columnas, periodo, desde, hasta)
+    ]
+    total = resumen_total(columnas, desde, hasta)
+    filas.append([])
+    filas.append(["Total", "", total["movimientos"], total["ingresos"], total["egresos"], total["otros"], total["neto"]])
+    _escribir_hoja(ws, ["Desde", "Hasta", "Movimientos", "Ingresos", "Egresos", "Otros", "Neto"], filas, (4, 5, 6, 7))
+
+    for por, titulo, encabezado in (
+        ("descripcion", "Por descripción", "Descripción"),
+        ("referencia", "Por referencia", "Referencia / Método")
+    ):
+        ws_grupo = wb.create_sheet(titulo)
+        filas = [
+            [f["etiqueta"], f["movimientos"], f["ingresos"], f["egresos"], f["otros"], f["neto"]]
+            for f in reporte_agrupado(columnas, por, desde, hasta)
+        ]
+        _escribir_hoja(ws_grupo, [encabezado, "Movimientos", "Ingresos", "Egresos", "Otros", "Neto"], filas, (3, 4, 5, 6))
+
+    wb.save(nombre_archivo)
+    return nombre_archivo
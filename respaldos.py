@@ -0,0 +1,273 @@
+import gzip
+import json
+import lzma
+import os
+import threading
+import time
+from datetime import datetime
+
+import concurrencia
+
+# Respaldos comprimidos de db.json en la carpeta "respaldos" junto al archivo.
+# Cada cadena empieza con una copia completa (lzma) y sigue con deltas (gzip)
+# que solo traen los clientes cambiados y los registros agregados a la caja y
+# a las entregas desde el respaldo anterior. Se respalda al guardar, como
+# mucho cada INTERVALO_RESPALDO segundos, y se conservan los más recientes y
+# el último de cada hora, día y semana según RETENCION (más lo que haga falta
+# de sus cadenas).
+#
+# Nombres: AAAAMMDD-HHMMSS-ffffff.completo.json.xz
+#          AAAAMMDD-HHMMSS-ffffff.delta.<completo>.json.gz
+# así la cadena de cada delta se conoce sin abrir ningún archivo.
+
+CARPETA = "respaldos"
+INTERVALO_RESPALDO = 10 * 60  # segundos
+MAX_DELTAS_CADENA = 24
+RETENCION = (("%Y%m%d%H", 24), ("%Y%m%d", 7), ("%G%V", 8))  # horas, días, semanas ISO
+MINIMO_RECIENTES = 10  # además, siempre los últimos N
+PRESET_LZMA = 1
+
+_COMPLETO = ".completo.json.xz"
+_DELTA = ".delta."
+_EXT_DELTA = ".json.gz"
+_FORMATO_FECHA = "%Y%m%d-%H%M%S-%f"
+_LISTAS = ("movimientos", "entregas")
+
+
+class ErrorRespaldo(Exception):
+    pass
+
+
+def carpeta_respaldos(archivo):
+    return os.path.join(os.path.dirname(os.path.abspath(archivo)), CARPETA)
+
+
+class Respaldo:
+    __slots__ = ("nombre", "fecha", "completo")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        marca = nombre[:22]
+        self.fecha = datetime.strptime(marca, _FORMATO_FECHA)
+        if nombre.endswith(_COMPLETO):
+            self.completo = marca
+        elif _DELTA in nombre and nombre.endswith(_EXT_DELTA):
+            self.completo = nombre[len(marca) + len(_DELTA):-len(_EXT_DELTA)]
+        else:
+            raise ValueError(nombre)
+
+    @property
+    def es_completo(self):
+        return self.nombre.endswith(_COMPLETO)
+
+    def __repr__(self):
+        return self.nombre
+
+
+def listar(archivo):
+    # Del más antiguo al más nuevo
+    carpeta = carpeta_respaldos(archivo)
+    try:
+        nombres = os.listdir(carpeta)
+    except FileNotFoundError:
+        return []
+    respaldos = []
+    for nombre in nombres:
+        try:
+            respaldos.append(Respaldo(nombre))
+        except ValueError:
+            continue
+    respaldos.sort(key=lambda r: r.nombre)
+    return respaldos
+
+
+def _escribir(ruta, contenido, comprimir):
+    temporal = ruta + ".tmp"
+    with comprimir(temporal, "wt", encoding="utf-8") as f:
+        json.dump(contenido, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def _lzma(ruta, modo, encoding):
+    return lzma.open(ruta, modo, encoding=encoding, preset=PRESET_LZMA)
+
+
+def _leer(ruta):
+    abrir = lzma.open if ruta.endswith(".xz") else gzip.open
+    try:
+        with abrir(ruta, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, EOFError, lzma.LZMAError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ErrorRespaldo(f"Respaldo dañado '{os.path.basename(ruta)}': {e}") from e
+
+
+def _cadena(respaldos, respaldo):
+    # Completo + deltas de su cadena hasta "respaldo", en orden
+    return [
+        r for r in respaldos
+        if r.completo == respaldo.completo and r.nombre <= respaldo.nombre
+    ]
+
+
+def _aplicar_delta(datos, delta):
+    clientes = datos.get("clientes", [])
+    cambiados = {c["id"]: c for c in delta["clientes"]["cambiados"]}
+    quitados = set(delta["clientes"]["quitados"])
+    resultado = []
+    for cliente in clientes:
+        cliente_id = cliente.get("id")
+        if cliente_id in quitados:
+            continue
+        resultado.append(cambiados.pop(cliente_id, cliente))
+    resultado.extend(cambiados.values())
+    nuevo = dict(delta["resto"])
+    nuevo["clientes"] = resultado
+    for lista in _LISTAS:
+        cambio = delta[lista]
+        nuevo[lista] = datos.get(lista, [])[:cambio["conservados"]] + cambio["agregados"]
+    return nuevo
+
+
+def reconstruir(archivo, respaldo, respaldos=None):
+    respaldos = respaldos if respaldos is not None else listar(archivo)
+    cadena = _cadena(respaldos, respaldo)
+    if not cadena or not cadena[0].es_completo:
+        raise ErrorRespaldo(f"Falta la copia completa de '{respaldo.nombre}'.")
+    carpeta = carpeta_respaldos(archivo)
+    datos = _leer(os.path.join(carpeta, cadena[0].nombre))["datos"]
+    for eslabon in cadena[1:]:
+        datos = _aplicar_delta(datos, _leer(os.path.join(carpeta, eslabon.nombre)))
+    return datos
+
+
+def ultimo_valido(archivo):
+    # (respaldo, datos) del respaldo legible más reciente, o None
+    respaldos = listar(archivo)
+    for respaldo in reversed(respaldos):
+        try:
+            return respaldo, reconstruir(archivo, respaldo, respaldos)
+        except (ErrorRespaldo, KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def buscar(archivo, nombre):
+    # Con una fecha incompleta, el más reciente que coincida
+    for respaldo in reversed(listar(archivo)):
+        if respaldo.nombre.startswith(nombre):
+            return respaldo
+    return None
+
+
+def _conservar(respaldos):
+    # Los más recientes, el último de cada hora/día/semana y lo que
+    # necesitan sus cadenas
+    if not respaldos:
+        return set()
+    elegidos = {r.nombre for r in respaldos[-MINIMO_RECIENTES:]}
+    for formato, cantidad in RETENCION:
+        grupos = {}
+        for respaldo in respaldos:
+            grupos[respaldo.fecha.strftime(formato)] = respaldo
+        for grupo in sorted(grupos)[-cantidad:]:
+            elegidos.add(grupos[grupo].nombre)
+    necesarios = set()
+    for respaldo in respaldos:
+        if respaldo.nombre in elegidos:
+            necesarios.update(r.nombre for r in _cadena(respaldos, respaldo))
+    return necesarios
+
+
+def podar(archivo):
+    respaldos = listar(archivo)
+    necesarios = _conservar(respaldos)
+    carpeta = carpeta_respaldos(archivo)
+    borrados = 0
+    for respaldo in respaldos:
+        if respaldo.nombre not in necesarios:
+            try:
+                os.remove(os.path.join(carpeta, respaldo.nombre))
+                borrados += 1
+            except OSError:
+                pass
+    return borrados
+
+
+class GestorRespaldos:
+    # Recuerda en memoria lo que tenía el último respaldo propio (huellas de
+    # los clientes y claves de caja/entregas) para escribir solo el delta.
+    # Las huellas usan hash(): no sirven entre procesos, así que cada
+    # ejecución empieza su propia cadena con una copia completa.
+    def __init__(self, archivo, intervalo=INTERVALO_RESPALDO):
+        self.archivo = archivo
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._ultimo = None
+        self._momento = None
+
+    def _estado(self, datos):
+        return {
+            "clientes": {c.get("id"): concurrencia.huella(c) for c in datos.get("clientes", [])},
+            **{lista: [concurrencia.clave_movimiento(r) for r in datos.get(lista, [])] for lista in _LISTAS}
+        }
+
+    def _delta(self, datos, estado):
+        anterior = self._ultimo["estado"]
+        cambiados = [
+            c for c in datos.get("clientes", [])
+            if anterior["clientes"].get(c.get("id")) != estado["clientes"][c.get("id")]
+        ]
+        delta = {
+            "formato": 1,
+            "clientes": {"cambiados": cambiados, "quitados": [i for i in anterior["clientes"] if i not in estado["clientes"]]},
+            "resto": {k: v for k, v in datos.items() if k not in ("clientes",) + _LISTAS}
+        }
+        for lista in _LISTAS:
+            previas, actuales = anterior[lista], estado[lista]
+            # Caja y entregas casi solo crecen al final: se guarda cuánto del
+            # principio sigue igual y lo que viene después
+            conservados = 0
+            limite = min(len(previas), len(actuales))
+            while conservados < limite and previas[conservados] == actuales[conservados]:
+                conservados += 1
+            delta[lista] = {"conservados": conservados, "agregados": datos.get(lista, [])[conservados:]}
+        return delta
+
+    def respaldar(self, datos, forzar=False):
+        # Devuelve el nombre del respaldo escrito, o None si no tocaba
+        with self._lock:
+            ahora = time.monotonic()
+            if not forzar and self._momento is not None and ahora - self._momento < self.intervalo:
+                return None
+            carpeta = carpeta_respaldos(self.archivo)
+            os.makedirs(carpeta, exist_ok=True)
+            marca = datetime.now().strftime(_FORMATO_FECHA)
+            estado = self._estado(datos)
+            ultimo = self._ultimo
+            if (
+                ultimo is None
+                or ultimo["deltas"] >= MAX_DELTAS_CADENA
+                or not os.path.exists(os.path.join(carpeta, ultimo["nombre"]))
+            ):
+                nombre = marca + _COMPLETO
+                _escribir(os.path.join(carpeta, nombre), {"formato": 1, "datos": datos}, _lzma)
+                self._ultimo = {"nombre": nombre, "completo": marca, "deltas": 0, "estado": estado}
+            else:
+                nombre = f"{marca}{_DELTA}{ultimo['completo']}{_EXT_DELTA}"
+                _escribir(os.path.join(carpeta, nombre), self._delta(datos, estado), gzip.open)
+                self._ultimo = {"nombre": nombre, "completo": ultimo["completo"], "deltas": ultimo["deltas"] + 1, "estado": estado}
+            self._momento = ahora
+        podar(self.archivo)
+        return nombre
+
+
+_gestores = {}
+_lock_gestores = threading.Lock()
+
+
+def gestor(archivo):
+    clave = os.path.abspath(archivo)
+    with _lock_gestores:
+        if clave not in _gestores:
+            _gestores[clave] = GestorRespaldos(archivo)
+        return _gestores[clave]
@@ -0,0 +1,302 @@
+import json
+import math
+import os
+import re
+from array import array
+from collections import OrderedDict
+
+from texto import normalizar
+
+# Ordenamiento de paradas de reparto dentro de cada comuna/día.
+# Las coordenadas salen de una tabla local (sin conexión) indexada por
+# dirección + comuna normalizadas. Cada ruta se ordena con vecino más
+# cercano + 2-opt sobre una matriz de distancias que se guarda en caché por
+# ruta y se reutiliza fila a fila cuando cambian algunas paradas.
+
+ARCHIVO_GEOCODIGOS = "geocodigos.json"
+CLAVE_ORIGEN = "__origen__"
+
+RADIO_TIERRA_KM = 6371.0
+VECINOS_2OPT = 12
+
+
+# ------------------ Tabla de geocódigos ------------------
+
+def _normalizar_direccion(texto):
+    texto = normalizar(texto)
+    texto = re.sub(r"[.,#°º]", " ", texto)
+    return " ".join(texto.split())
+
+
+def clave_geocodigo(direccion, comuna):
+    return f"{_normalizar_direccion(direccion)}|{_normalizar_direccion(comuna)}"
+
+
+def clave_cliente(cliente):
+    return clave_geocodigo(cliente.get("direccion", ""), cliente.get("comuna", ""))
+
+
+def cargar_geocodigos(archivo=ARCHIVO_GEOCODIGOS):
+    if not os.path.exists(archivo):
+        return {}
+    try:
+        with open(archivo, "r", encoding="utf-8") as f:
+            crudo = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+    if not isinstance(crudo, dict):
+        return {}
+    geocodigos = {}
+    for clave, valor in crudo.items():
+        try:
+            lat, lon = float(valor[0]), float(valor[1])
+        except (TypeError, ValueError, IndexError, KeyError):
+            continue
+        if clave == CLAVE_ORIGEN:
+            geocodigos[CLAVE_ORIGEN] = (lat, lon)
+            continue
+        # Las claves del archivo pueden venir escritas "a mano"
+        if "|" in clave:
+            direccion, comuna = clave.split("|", 1)
+            clave = clave_geocodigo(direccion, comuna)
+        geocodigos[clave] = (lat, lon)
+    return geocodigos
+
+
+def guardar_geocodigos(geocodigos, archivo=ARCHIVO_GEOCODIGOS):
+    with open(archivo, "w", encoding="utf-8") as f:
+        json.dump({k: list(v) for k, v in geocodigos.items()}, f, indent=4, ensure_ascii=False)
+
+
+# ------------------ Distancias ------------------
+
+def distancia_km(a, b):
+    lat1, lon1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lon2 = math.radians(b[0]), math.radians(b[1])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+class CacheDistancias:
+    def __init__(self, max_rutas=64):
+        self.max_rutas = max_rutas
+        self._rutas = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.filas_reutilizadas = 0
+
+    def matriz(self, ruta, claves, coords):
+        claves = tuple(claves)
+        entrada = self._rutas.get(ruta)
+        if entrada is not None and entrada[0] == claves:
+            self._rutas.move_to_end(ruta)
+            self.aciertos += 1
+            return entrada[1]
+        self.fallos += 1
+
+        previas = {}
+        matriz_previa = None
+        if entrada is not None:
+            claves_previas, matriz_previa = entrada
+            previas = {clave: idx for idx, clave in enumerate(claves_previas) if clave is not None}
+
+        n = len(claves)
+        radianes = [(math.radians(lat), math.radians(lon)) for lat, lon in coords]
+        cosenos = [math.cos(lat) for lat, _ in radianes]
+        indices_previos = [previas.get(clave) for clave in claves]
+        matriz = []
+        for i in range(n):
+            fila = array("d", bytes(8 * n))
+            oi = indices_previos[i]
+            fila_previa = matriz_previa[oi] if oi is not None else None
+            if fila_previa is not None:
+                self.filas_reutilizadas += 1
+            lat1, lon1 = radianes[i]
+            cos1 = cosenos[i]
+            for j in range(i):
+                oj = indices_previos[j]
+                if fila_previa is not None and oj is not None:
+                    d = fila_previa[oj]
+                else:
+                    lat2, lon2 = radianes[j]
+                    h = math.sin((lat2 - lat1) / 2) ** 2 + cos1 * cosenos[j] * math.sin((lon2 - lon1) / 2) ** 2
+                    d = 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(h)))
+                fila[j] = d
+                matriz[j][i] = d
+            matriz.append(fila)
+
+        self._rutas[ruta] = (claves, matriz)
+        self._rutas.move_to_end(ruta)
+        while len(self._rutas) > self.max_rutas:
+            self._rutas.popitem(last=False)
+        return matriz
+
+    def invalidar(self, clave):
+        # Se olvida solo la parada afectada: sus distancias se recalculan en
+        # la siguiente consulta y el resto de la matriz se reutiliza.
+        for ruta, (claves, matriz) in list(self._rutas.items()):
+            if clave in claves:
+                self._rutas[ruta] = (tuple(None if c == clave else c for c in claves), matriz)
+
+    def limpiar(self):
+        self._rutas.clear()
+
+
+# ------------------ Heurística TSP ------------------
+
+def _vecino_mas_cercano(dist, inicio):
+    n = len(dist)
+    visitado = bytearray(n)
+    tour = [inicio]
+    visitado[inicio] = 1
+    actual = inicio
+    for _ in range(n - 1):
+        fila = dist[actual]
+        mejor = -1
+        mejor_d = math.inf
+        for j in range(n):
+            if not visitado[j] and fila[j] < mejor_d:
+                mejor_d = fila[j]
+                mejor = j
+        tour.append(mejor)
+        visitado[mejor] = 1
+        actual = mejor
+    return tour
+
+
+def _invertir(tour, pos, i, j):
+    # Invierte el tramo cíclico tour[i..j] (ambos inclusive)
+    n = len(tour)
+    largo = (j - i) % n + 1
+    for _ in range(largo // 2):
+        a, b = tour[i], tour[j]
+        tour[i], tour[j] = b, a
+        pos[b], pos[a] = i, j
+        i = (i + 1) % n
+        j = (j - 1) % n
+
+
+def _dos_opt(tour, dist, k=VECINOS_2OPT, max_pasadas=50):
+    n = len(tour)
+    if n < 4:
+        return tour
+    vecinos = [
+        sorted((j for j in range(n) if j != i), key=dist[i].__getitem__)[:k]
+        for i in range(n)
+    ]
+    pos = [0] * n
+    for idx, c in enumerate(tour):
+        pos[c] = idx
+
+    for _ in range(max_pasadas):
+        mejoro = False
+        for i in range(n):
+            a = tour[i]
+            # Arista sucesora (a, b)
+            b = tour[(i + 1) % n]
+            d_ab = dist[a][b]
+            for c in vecinos[a]:
+                d_ac = dist[a][c]
+                if d_ac >= d_ab:
+                    break
+                j = pos[c]
+                d = tour[(j + 1) % n]
+                if c == b or d == a:
+                    continue
+                if d_ac + dist[b][d] - d_ab - dist[c][d] < -1e-9:
+                    _invertir(tour, pos, (i + 1) % n, j)
+                    mejoro = True
+                    break
+            # Arista predecesora (p, a)
+            i = pos[a]
+            p = tour[(i - 1) % n]
+            d_pa = dist[p][a]
+            for c in vecinos[a]:
+                d_ac = dist[a][c]
+                if d_ac >= d_pa:
+                    break
+                j = pos[c]
+                q = tour[(j - 1) % n]
+                if c == p or q == a:
+                    continue
+                if d_ac + dist[p][q] - d_pa - dist[q][c] < -1e-9:
+                    _invertir(tour, pos, j, (i - 1) % n)
+                    mejoro = True
+                    break
+        if not mejoro:
+            break
+    return tour
+
+
+def ordenar_paradas(dist, origen=None):
+    # Con origen la ruta es un circuito que parte y vuelve a él (el origen no
+    # se incluye en el resultado). Sin origen se agrega un nodo ficticio a
+    # distancia cero de todos para obtener un recorrido abierto.
+    n = len(dist)
+    if n <= 2 and origen is None:
+        return list(range(n))
+
+    if origen is None:
+        ficticio = array("d", bytes(8 * (n + 1)))
+        dist = [array("d", fila) + array("d", [0.0]) for fila in dist] + [ficticio]
+        origen = n
+
+    tour = _vecino_mas_cercano(dist, origen)
+    tour = _dos_opt(tour, dist)
+    inicio = tour.index(origen)
+    ordenado = tour[inicio + 1:] + tour[:inicio]
+    return [i for i in ordenado if i < n and i != origen]
+
+
+def longitud_recorrido(dist, orden):
+    return sum(dist[orden[i]][orden[i + 1]] for i in range(len(orden) - 1))
+
+
+# ------------------ Ordenar clientes por ruta ------------------
+
+def clave_ruta(cliente):
+    return (normalizar(cliente.get("comuna", "")), normalizar((cliente.get("dia_reparto") or "").strip()))
+
+
+def ordenar_ruta(clientes, geocodigos, cache=None, ruta=None):
+    con_coords = []
+    sin_coords = []
+    for cliente in clientes:
+        clave = clave_cliente(cliente)
+        coords = geocodigos.get(clave)
+        if coords is None:
+            sin_coords.append(cliente)
+        else:
+            con_coords.append((clave, coords, cliente))
+
+    if len(con_coords) < 2:
+        return [c for _, _, c in con_coords] + sin_coords, len(sin_coords)
+
+    claves = [clave for clave, _, _ in con_coords]
+    coords = [coord for _, coord, _ in con_coords]
+    origen = geocodigos.get(CLAVE_ORIGEN)
+    if origen is not None:
+        claves.append(CLAVE_ORIGEN)
+        coords.append(origen)
+
+    if cache is not None:
+        dist = cache.matriz(ruta or tuple(sorted(claves)), claves, coords)
+    else:
+        dist = CacheDistancias(max_rutas=1).matriz(None, claves, coords)
+
+    orden = ordenar_paradas(dist, origen=len(con_coords) if origen is not None else None)
+    return [con_coords[i][2] for i in orden] + sin_coords, len(sin_coords)
+
+
+def ordenar_por_rutas(clientes, geocodigos, cache=None):
+    # Agrupa por comuna/día respetando el orden de aparición de cada grupo
+    grupos = OrderedDict()
+    for cliente in clientes:
+        grupos.setdefault(clave_ruta(cliente), []).append(cliente)
+    resultado = []
+    sin_coordenadas = 0
+    for ruta, grupo in grupos.items():
+        ordenados, faltantes = ordenar_ruta(grupo, geocodigos, cache, ruta)
+        resultado.extend(ordenados)
+        sin_coordenadas += faltantes
+    return resultado, sin_coordenadas
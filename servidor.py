@@ -0,0 +1,423 @@
+import asyncio
+import concurrent.futures
+import hmac
+import http.client
+import json
+import math
+import queue
+import re
+import secrets
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, quote, urlsplit
+
+import rutas
+from nucleo import formato_moneda
+
+# Servidor HTTP/JSON para que los repartidores marquen entregas desde el
+# teléfono. Las conexiones se atienden con asyncio en un hilo propio, pero
+# ninguna operación toca los datos desde ese hilo: todas pasan por una cola
+# que vacía un único escritor (el hilo de Tk en la ventana, o un hilo
+# dedicado en modo consola). Así las solicitudes concurrentes nunca chocan
+# con la interfaz; db.json se guarda como máximo una vez por intervalo.
+
+PUERTO_POR_DEFECTO = 8765
+HOSTS_LOCALES = {"127.0.0.1", "localhost", "::1"}
+MAX_CUERPO = 64 * 1024
+MAX_LOTE = 500
+INTERVALO_GUARDADO = 0.5
+
+ESTADOS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ErrorHttp(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+
+
+def nuevo_token():
+    # Corto para dictarlo o escribirlo en el teléfono del repartidor
+    return secrets.token_hex(4)
+
+
+def es_local(host):
+    return host in HOSTS_LOCALES
+
+
+# ------------------ Operaciones (se ejecutan en el escritor) ------------------
+
+def _parada(store, cliente):
+    pendiente = cliente.get("cajas_de_huevos", 0)
+    return {
+        "id": cliente.get("id"),
+        "nombre": cliente.get("nombre_completo", ""),
+        "telefono": cliente.get("telefono", ""),
+        "direccion": cliente.get("direccion", ""),
+        "comuna": cliente.get("comuna", ""),
+        "dia": cliente.get("dia_reparto") or "",
+        "pendiente": pendiente,
+        "monto": pendiente * store.obtener_precio(cliente.get("comuna"))
+    }
+
+
+def _cliente(store, cliente_id):
+    cliente = store.cliente_por_id(cliente_id)
+    if cliente is None:
+        raise ErrorHttp(404, "Cliente no encontrado.")
+    return cliente
+
+
+def _entero(valor, campo):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ErrorHttp(400, f"'{campo}' debe ser un número entero.")
+
+
+def op_rutas(servidor, consulta, cuerpo):
+    store = servidor.store
+    clientes = store.filtrar(comuna=consulta.get("comuna"), dia=consulta.get("dia"), solo_pendientes=True)
+    if servidor.geocodigos:
+        clientes, _ = rutas.ordenar_por_rutas(clientes, servidor.geocodigos, servidor.cache_rutas)
+    grupos = {}
+    for cliente in clientes:
+        clave = (cliente.get("comuna", ""), cliente.get("dia_reparto") or "")
+        grupos.setdefault(clave, []).append(_parada(store, cliente))
+    return {
+        "rutas": [
+            {
+                "comuna": comuna,
+                "dia": dia,
+                "cajas": sum(p["pendiente"] for p in paradas),
+                "monto": sum(p["monto"] for p in paradas),
+                "paradas": paradas
+            }
+            for (comuna, dia), paradas in grupos.items()
+        ]
+    }
+
+
+def op_buscar(servidor, consulta, cuerpo):
+    limite = _entero(consulta.get("limite", 20), "limite")
+    clientes = servidor.store.buscar_clientes(consulta.get("q", ""), limite=max(1, min(limite, 200)))
+    return {"clientes": [_parada(servidor.store, c) for c in clientes]}
+
+
+def op_entrega(servidor, consulta, cuerpo, cliente_id):
+    store = servidor.store
+    cliente = _cliente(store, cliente_id)
+    cantidad = cuerpo.get("cantidad")
+    try:
+        entregadas = store.registrar_entrega(cliente, None if cantidad is None else _entero(cantidad, "cantidad"))
+    except ValueError as e:
+        raise ErrorHttp(400, str(e))
+    return {"entregadas": entregadas, "cliente": _parada(store, cliente)}
+
+
+def op_pago(servidor, consulta, cuerpo, cliente_id):
+    store = servidor.store
+    cliente = _cliente(store, cliente_id)
+    try:
+        monto = float(cuerpo.get("monto"))
+    except (TypeError, ValueError):
+        raise ErrorHttp(400, "'monto' debe ser numérico.")
+    if not math.isfinite(monto):
+        raise ErrorHttp(400, "'monto' debe ser numérico.")
+    try:
+        movimiento = store.registrar_pago(cliente, monto, (cuerpo.get("metodo") or "").strip())
+    except ValueError as e:
+        raise ErrorHttp(400, str(e))
+    return {"movimiento": movimiento, "monto": formato_moneda(movimiento["monto"])}
+
+
+# (método, patrón, operación, modifica datos). Las que modifican reciben
+# el id del cliente como último argumento
+RUTAS_HTTP = [
+    ("GET", re.compile(r"^/rutas$"), op_rutas, False),
+    ("GET", re.compile(r"^/clientes$"), op_buscar, False),
+    ("POST", re.compile(r"^/clientes/([0-9a-f]+)/entrega$"), op_entrega, True),
+    ("POST", re.compile(r"^/clientes/([0-9a-f]+)/pago$"), op_pago, True),
+]
+
+
+# ------------------ Servidor ------------------
+
+class ServidorReparto:
+    def __init__(self, store, host="0.0.0.0", puerto=PUERTO_POR_DEFECTO, token=None, geocodigos=None):
+        self.store = store
+        self.host = host
+        self.puerto = puerto
+        self.token = token
+        self.geocodigos = geocodigos if geocodigos is not None else rutas.cargar_geocodigos()
+        self.cache_rutas = rutas.CacheDistancias()
+        self.cola = queue.Queue()
+        self.solicitudes = 0
+        self._loop = None
+        self._servidor = None
+        self._hilo = None
+        self._hilo_escritor = None
+        self._detenido = threading.Event()
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    # Único punto de escritura: lo llama el dueño de los datos. Devuelve
+    # cuántas atendió y los ids de los clientes que cambiaron
+    def atender_cola(self, bloquear=False, espera=0.2, max_operaciones=MAX_LOTE):
+        procesadas = 0
+        modificados = set()
+        try:
+            tarea = self.cola.get(timeout=espera) if bloquear else self.cola.get_nowait()
+        except queue.Empty:
+            return 0, modificados
+        while True:
+            operacion, argumentos, modifica, futuro = tarea
+            if futuro.set_running_or_notify_cancel():
+                try:
+                    futuro.set_result(operacion(self, *argumentos))
+                    if modifica:
+                        modificados.add(argumentos[-1])
+                except Exception as e:
+                    futuro.set_exception(e)
+            procesadas += 1
+            if procesadas >= max_operaciones:
+                break
+            try:
+                tarea = self.cola.get_nowait()
+            except queue.Empty:
+                break
+        return procesadas, modificados
+
+    def enviar(self, operacion, argumentos=(), modifica=False):
+        futuro = concurrent.futures.Future()
+        self.cola.put((operacion, argumentos, modifica, futuro))
+        return futuro
+
+    def iniciar(self, escritor_propio=False, al_guardar=None):
+        listo = threading.Event()
+        errores = []
+        self._detenido.clear()
+
+        def ejecutar():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._servidor = self._loop.run_until_complete(
+                    asyncio.start_server(self._atender_conexion, self.host, self.puerto)
+                )
+                self.puerto = self._servidor.sockets[0].getsockname()[1]
+            except OSError as e:
+                errores.append(e)
+                listo.set()
+                self._loop.close()
+                return
+            listo.set()
+            try:
+                self._loop.run_forever()
+            finally:
+                self._servidor.close()
+                # Conexiones abiertas (keep-alive) se cierran cancelando sus tareas
+                pendientes = asyncio.all_tasks(self._loop)
+                for tarea in pendientes:
+                    tarea.cancel()
+                self._loop.run_until_complete(asyncio.gather(*pendientes, return_exceptions=True))
+                self._loop.close()
+
+        self._hilo = threading.Thread(target=ejecutar, name="servidor-reparto", daemon=True)
+        self._hilo.start()
+        listo.wait()
+        if errores:
+            self._hilo = None
+            raise errores[0]
+
+        if escritor_propio:
+            def guardar():
+                # Un guardado fallido (archivo bloqueado, carpeta de red
+                # caída...) no puede detener al escritor: la cola se sigue
+                # atendiendo y se reintenta en el próximo intervalo
+                try:
+                    self.store.guardar()
+                except Exception as e:
+                    print(f"No se pudo guardar ({e}); se reintentará.", file=sys.stderr)
+                    return False
+                if al_guardar:
+                    al_guardar()
+                return True
+
+            def escribir():
+                pendiente = False
+                ultimo_guardado = time.monotonic()
+                while not self._detenido.is_set():
+                    _, modificados = self.atender_cola(bloquear=True)
+                    pendiente = pendiente or bool(modificados)
+                    # Los cambios se agrupan: a lo más un guardado por intervalo
+                    if pendiente and time.monotonic() - ultimo_guardado >= INTERVALO_GUARDADO:
+                        pendiente = not guardar()
+                        ultimo_guardado = time.monotonic()
+                _, modificados = self.atender_cola()
+                if pendiente or modificados:
+                    guardar()
+
+            self._hilo_escritor = threading.Thread(target=escribir, name="escritor-reparto", daemon=True)
+            self._hilo_escritor.start()
+
+    def esperar(self):
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def detener(self):
+        self._detenido.set()
+        if self._loop is not None and self.activo:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._hilo.join(timeout=5)
+        if self._hilo_escritor is not None:
+            self._hilo_escritor.join(timeout=5)
+            self._hilo_escritor = None
+        # Lo que quedó en la cola ya no se atenderá
+        while True:
+            try:
+                _, _, _, futuro = self.cola.get_nowait()
+            except queue.Empty:
+                break
+            futuro.cancel()
+        self._hilo = None
+
+    # ------------------ HTTP ------------------
+
+    async def _atender_conexion(self, reader, writer):
+        try:
+            while True:
+                try:
+                    solicitud = await _leer_solicitud(reader)
+                except ErrorHttp as e:
+                    writer.write(_respuesta(e.estado, {"error": e.mensaje}, False))
+                    await writer.drain()
+                    break
+                if solicitud is None:
+                    break
+                metodo, destino, encabezados, cuerpo, mantener = solicitud
+                estado, datos = await self._despachar(metodo, destino, encabezados, cuerpo)
+                writer.write(_respuesta(estado, datos, mantener))
+                await writer.drain()
+                if not mantener:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # CancelledError: el servidor se detuvo con la conexión abierta
+            pass
+        finally:
+            writer.close()
+
+    async def _despachar(self, metodo, destino, encabezados, cuerpo):
+        self.solicitudes += 1
+        partes = urlsplit(destino)
+        consulta = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+        if self.token:
+            enviado = encabezados.get("authorization", "").removeprefix("Bearer ").strip() or consulta.get("token")
+            if not enviado or not hmac.compare_digest(enviado.encode("utf-8"), self.token.encode("utf-8")):
+                return 401, {"error": "Token inválido."}
+        if partes.path == "/salud":
+            return 200, {"ok": True, "solicitudes": self.solicitudes}
+
+        permitido = False
+        for metodo_ruta, patron, operacion, modifica in RUTAS_HTTP:
+            coincidencia = patron.match(partes.path)
+            if not coincidencia:
+                continue
+            permitido = True
+            if metodo_ruta != metodo:
+                continue
+            try:
+                datos = json.loads(cuerpo.decode("utf-8")) if cuerpo else {}
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                return 400, {"error": "El cuerpo debe ser JSON."}
+            if not isinstance(datos, dict):
+                return 400, {"error": "El cuerpo debe ser un objeto JSON."}
+            futuro = self.enviar(operacion, (consulta, datos) + coincidencia.groups(), modifica)
+            try:
+                return 200, await asyncio.wrap_future(futuro)
+            except ErrorHttp as e:
+                return e.estado, {"error": e.mensaje}
+            except asyncio.CancelledError:
+                if not futuro.cancelled():
+                    raise
+                return 503, {"error": "El servidor se está deteniendo."}
+            except Exception as e:
+                return 500, {"error": str(e)}
+        if permitido:
+            return 405, {"error": "Método no permitido."}
+        return 404, {"error": "Ruta no encontrada."}
+
+
+async def _leer_solicitud(reader):
+    linea = await reader.readline()
+    if not linea:
+        return None
+    try:
+        metodo, destino, version = linea.decode("latin-1").split()
+    except ValueError:
+        raise ErrorHttp(400, "Solicitud mal formada.")
+    encabezados = {}
+    while True:
+        linea = await reader.readline()
+        if linea in (b"\r\n", b"\n", b""):
+            break
+        nombre, _, valor = linea.decode("latin-1").partition(":")
+        encabezados[nombre.strip().lower()] = valor.strip()
+    try:
+        largo = int(encabezados.get("content-length", 0) or 0)
+    except ValueError:
+        raise ErrorHttp(400, "Content-Length inválido.")
+    if largo > MAX_CUERPO:
+        raise ErrorHttp(413, "Cuerpo demasiado grande.")
+    cuerpo = await reader.readexactly(largo) if largo else b""
+    conexion = encabezados.get("connection", "").lower()
+    mantener = conexion == "keep-alive" or (version == "HTTP/1.1" and conexion != "close")
+    return metodo.upper(), destino, encabezados, cuerpo, mantener
+
+
+def _respuesta(estado, datos, mantener):
+    cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+    cabecera = (
+        f"HTTP/1.1 {estado} {ESTADOS.get(estado, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(cuerpo)}\r\n"
+        f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n"
+    )
+    return cabecera.encode("latin-1") + cuerpo
+
+
+# ------------------ Cliente local ------------------
+
+class ClienteReparto:
+    def __init__(self, host="127.0.0.1", puerto=PUERTO_POR_DEFECTO, token=None, timeout=10):
+        self.conexion = http.client.HTTPConnection(host, puerto, timeout=timeout)
+        self.token = token
+
+    def solicitar(self, metodo, ruta, datos=None):
+        encabezados = {"Content-Type": "application/json"}
+        if self.token:
+            encabezados["Authorization"] = f"Bearer {self.token}"
+        cuerpo = json.dumps(datos).encode("utf-8") if datos is not None else None
+        self.conexion.request(metodo, ruta, body=cuerpo, headers=encabezados)
+        respuesta = self.conexion.getresponse()
+        return respuesta.status, json.loads(respuesta.read().decode("utf-8"))
+
+    def rutas(self, comuna=None, dia=None):
+        parametros = "&".join(f"{k}={quote(v)}" for k, v in (("comuna", comuna), ("dia", dia)) if v)
+        return self.solicitar("GET", "/rutas" + (f"?{parametros}" if parametros else ""))
+
+    def buscar(self, texto, limite=20):
+        return self.solicitar("GET", f"/clientes?q={quote(texto)}&limite={limite}")
+
+    def entregar(self, cliente_id, cantidad=None):
+        return self.solicitar("POST", f"/clientes/{cliente_id}/entrega", {} if cantidad is None else {"cantidad": cantidad})
+
+    def pagar(self, cliente_id, monto, metodo=""):
+        return self.solicitar("POST", f"/clientes/{cliente_id}/pago", {"monto": monto, "metodo": metodo})
+
+    def cerrar(self):
+        self.conexion.close()
@@ -0,0 +1,145 @@
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Tareas en segundo plano para operaciones lentas (exportar, guardar datos
+# grandes, importar). El trabajo corre en un pool de hilos; los resultados,
+# errores y avances vuelven por una cola que el hilo de Tk revisa con
+# root.after, así los widgets solo se tocan desde el hilo principal.
+
+INTERVALO_REVISION = 50  # ms
+MAX_HILOS = 2
+
+
+class TareaCancelada(Exception):
+    pass
+
+
+class Tarea:
+    _contador = itertools.count(1)
+
+    def __init__(self, nombre, gestor, cancelable=True):
+        self.id = next(Tarea._contador)
+        self.nombre = nombre
+        self.cancelable = cancelable
+        self.avance = None
+        self.mensaje = ""
+        self.terminada = False
+        self._gestor = gestor
+        self._cancelada = threading.Event()
+
+    @property
+    def cancelada(self):
+        return self._cancelada.is_set()
+
+    def cancelar(self):
+        if self.cancelable:
+            self._cancelada.set()
+
+    def verificar(self):
+        # El trabajo la llama entre pasos para detenerse si se canceló
+        if self._cancelada.is_set():
+            raise TareaCancelada(self.nombre)
+
+    def reportar(self, avance=None, mensaje=None):
+        self.verificar()
+        self._gestor._cola.put(("avance", self, (avance, mensaje)))
+
+
+class GestorTareas:
+    def __init__(self, root, max_hilos=MAX_HILOS, al_cambiar=None):
+        self.root = root
+        self.al_cambiar = al_cambiar
+        self.activas = []
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="tarea")
+        self._cola = queue.Queue()
+        self._callbacks = {}
+        self._revisando = False
+
+    def enviar(self, nombre, funcion, *args, al_terminar=None, al_error=None, al_cancelar=None, al_progreso=None, cancelable=True):
+        # funcion(tarea, *args) corre en otro hilo; los al_* corren en el de Tk
+        tarea = Tarea(nombre, self, cancelable)
+        self._callbacks[tarea.id] = (al_terminar, al_error, al_cancelar, al_progreso)
+        self.activas.append(tarea)
+
+        def ejecutar():
+            try:
+                tarea.verificar()
+                resultado = funcion(tarea, *args)
+            except TareaCancelada:
+                self._cola.put(("cancelada", tarea, None))
+            except Exception as e:
+                self._cola.put(("error", tarea, e))
+            else:
+                self._cola.put(("resultado", tarea, resultado))
+
+        self._pool.submit(ejecutar)
+        self._notificar()
+        if not self._revisando:
+            self._revisando = True
+            self.root.after(INTERVALO_REVISION, self._revisar)
+        return tarea
+
+    def ocupado(self):
+        return bool(self.activas)
+
+    def _notificar(self):
+        if self.al_cambiar:
+            self.al_cambiar(self.activas)
+
+    def _revisar(self):
+        try:
+            self._atender_cola()
+        finally:
+            # Aunque un callback falle, la revisión sigue mientras haya tareas
+            if self.activas or not self._cola.empty():
+                self.root.after(INTERVALO_REVISION, self._revisar)
+            else:
+                self._revisando = False
+
+    def _atender_cola(self):
+        avances = {}
+        terminadas = []
+        while True:
+            try:
+                tipo, tarea, valor = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if tipo == "avance":
+                # Solo importa el último avance de cada tarea en esta vuelta
+                avances[tarea.id] = (tarea, valor)
+            else:
+                terminadas.append((tipo, tarea, valor))
+
+        for tarea, (avance, mensaje) in avances.values():
+            if tarea.terminada:
+                continue
+            tarea.avance = avance if avance is not None else tarea.avance
+            tarea.mensaje = mensaje if mensaje is not None else tarea.mensaje
+            al_progreso = self._callbacks.get(tarea.id, (None,) * 4)[3]
+            if al_progreso:
+                al_progreso(tarea)
+
+        for tipo, tarea, valor in terminadas:
+            tarea.terminada = True
+            if tarea in self.activas:
+                self.activas.remove(tarea)
+
+        if avances or terminadas:
+            self._notificar()
+
+        for tipo, tarea, valor in terminadas:
+            al_terminar, al_error, al_cancelar, _ = self._callbacks.pop(tarea.id, (None,) * 4)
+            if tipo == "resultado" and al_terminar:
+                al_terminar(valor)
+            elif tipo == "error" and al_error:
+                al_error(valor)
+            elif tipo == "cancelada" and al_cancelar:
+                al_cancelar()
+
+    def cerrar(self, esperar=True):
+        # Las no cancelables (p. ej. guardar) terminan antes de salir
+        for tarea in self.activas:
+            tarea.cancelar()
+        self._pool.shutdown(wait=esperar)
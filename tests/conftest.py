@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nucleo import RepartoStore  # noqa: E402
+
+CLIENTES = (
+    ("Ana Pérez", "+56 9 1234 5678", "Los Alerces 123", "Maipú", "Lunes"),
+    ("Bruno Díaz", "+56 9 2222 3333", "Av. Pajaritos 45", "Maipú", "Lunes"),
+    ("Carla Soto", "+56 9 4444 5555", "Irarrázaval 900", "Ñuñoa", "Martes"),
+    ("Diego Rojas", "+56 9 6666 7777", "Gran Avenida 3000", "San Miguel", None),
+)
+
+
+@pytest.fixture
+def archivo(tmp_path):
+    return str(tmp_path / "db.json")
+
+
+@pytest.fixture
+def store(archivo):
+    store = RepartoStore(archivo=archivo)
+    for nombre, telefono, direccion, comuna, dia in CLIENTES:
+        cliente = store.agregar_cliente(nombre, telefono, direccion, comuna, dia)
+        store.agregar_pedido(cliente, 5)
+    store.historial.limpiar()
+    store.guardar()
+    return store
+
+
+def por_nombre(store, nombre):
+    return next(c for c in store.clientes if c["nombre_completo"] == nombre)
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+import openpyxl
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_abrir_la_aplicacion_no_importa_modulos_pesados():
+    # En un proceso aparte: aquí otros tests ya importaron de todo
+    codigo = "import sys, index; print(sorted(m for m in ('openpyxl', 'servidor', 'asyncio') if m in sys.modules))"
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True)
+    assert salida.stdout.strip() == "[]"
+
+
+def test_exportar_reparto_carga_openpyxl_al_usarse(store, tmp_path):
+    destino = str(tmp_path / "reparto.xlsx")
+    store.exportar_reparto(store.clientes, destino)
+    hoja = openpyxl.load_workbook(destino).active
+    nombres = {fila[0] for fila in hoja.iter_rows(values_only=True)}
+    assert {"Ana Pérez", "Diego Rojas"} <= nombres
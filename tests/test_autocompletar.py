@@ -0,0 +1,46 @@
+import pytest
+
+from autocompletar import IndicePrefijos
+from conftest import por_nombre
+
+
+def nombres(clientes):
+    return [c["nombre_completo"] for c in clientes]
+
+
+def test_prefijos_de_nombre_y_telefono(store):
+    indice = IndicePrefijos(store.clientes, store.claves_cliente)
+    assert len(indice) == 4
+    assert nombres(indice.buscar("pe")) == ["Ana Pérez"]
+    assert nombres(indice.buscar("CARLA so")) == ["Carla Soto"]
+    assert indice.buscar("carla diaz") == []
+    assert nombres(indice.buscar("+56 9 4444 5555")) == ["Carla Soto"]
+    assert nombres(indice.buscar("2222")) == ["Bruno Díaz"]
+    assert indice.buscar("   ") == []
+    # "a" no es prefijo de ningún nombre salvo "ana"
+    assert nombres(indice.buscar("a")) == ["Ana Pérez"]
+
+
+def test_limite_de_sugerencias():
+    clientes = [{"nombre_completo": f"Cliente {i}", "telefono": ""} for i in range(20)]
+    indice = IndicePrefijos(clientes)
+    assert len(indice.buscar("cli")) == 8
+    assert len(indice.buscar("cli", limite=3)) == 3
+    assert nombres(indice.buscar("cliente 1")) == ["Cliente 1", "Cliente 10", "Cliente 11", "Cliente 12",
+                                                   "Cliente 13", "Cliente 14", "Cliente 15", "Cliente 16"]
+
+
+def test_pedidos_en_lote_todo_o_nada(store):
+    ana, bruno = por_nombre(store, "Ana Pérez"), por_nombre(store, "Bruno Díaz")
+    with pytest.raises(ValueError):
+        store.agregar_pedidos([(ana, 3), (bruno, 0)])
+    assert (ana["cajas_de_huevos"], bruno["cajas_de_huevos"]) == (5, 5)
+    assert not store.historial.puede_deshacer()
+
+    store.agregar_pedidos([(ana, 3), (bruno, 2), (ana, 1)])
+    assert (ana["cajas_de_huevos"], bruno["cajas_de_huevos"]) == (9, 7)
+    assert ana["cajas_de_huevos_total"] == 9
+    assert store.deshacer() == "Agregar 3 pedidos"
+    assert (ana["cajas_de_huevos"], bruno["cajas_de_huevos"]) == (5, 5)
+    assert ana["cajas_de_huevos_total"] == 5
+    assert not store.historial.puede_deshacer()
@@ -0,0 +1,51 @@
+from datetime import date, datetime
+
+import reportes_caja
+from conftest import por_nombre
+
+
+def reportes(columnas):
+    return (
+        reportes_caja.resumen_total(columnas),
+        reportes_caja.reporte_periodos(columnas, "Diario"),
+        reportes_caja.reporte_agrupado(columnas, "referencia")
+    )
+
+
+def igual_a_nuevas(store):
+    return reportes(store.columnas_caja()) == reportes(reportes_caja.ColumnasCaja(store.movimientos))
+
+
+def test_columnas_siguen_a_los_movimientos(store):
+    ana = por_nombre(store, "Ana Pérez")
+    store.registrar_pago(ana, 5000, fecha=datetime(2024, 3, 1))
+    store.agregar_movimiento("Egreso", 1200, "Bencina", fecha=datetime(2024, 3, 2))
+    assert igual_a_nuevas(store)
+    columnas = store.columnas_caja()
+
+    store.registrar_pago(por_nombre(store, "Carla Soto"), 3000, fecha=datetime(2024, 3, 5))
+    assert store.columnas_caja() is columnas
+    assert igual_a_nuevas(store)
+
+    # Un día anterior al último obliga a reconstruir
+    store.registrar_pago(ana, 700, fecha=datetime(2024, 2, 1))
+    assert igual_a_nuevas(store)
+
+    store.deshacer()
+    store.deshacer()
+    assert igual_a_nuevas(store)
+    assert reportes_caja.resumen_total(store.columnas_caja())["neto"] == 3800
+
+
+def test_reporte_mensual_y_por_descripcion(store):
+    store.agregar_movimiento("Ingreso", 1000, "Venta", fecha=datetime(2024, 1, 31))
+    store.agregar_movimiento("Egreso", 300, "Bencina", fecha=datetime(2024, 2, 1))
+    store.agregar_movimiento("Ingreso", 500, "Venta", fecha=datetime(2024, 2, 20))
+    store.agregar_movimiento("Ingreso", 200, "Venta", fecha=datetime(2024, 4, 2))
+    columnas = store.columnas_caja()
+    meses = reportes_caja.reporte_periodos(columnas, "Mensual")
+    assert [(f["inicio"].month, f["movimientos"], f["neto"]) for f in meses] == [(1, 1, 1000), (2, 2, 200), (4, 1, 200)]
+    ventas = reportes_caja.reporte_agrupado(columnas, "descripcion")[0]
+    assert (ventas["etiqueta"], ventas["movimientos"], ventas["ingresos"]) == ("Venta", 3, 1700)
+    febrero = reportes_caja.resumen_total(columnas, date(2024, 2, 1), date(2024, 2, 29))
+    assert (febrero["movimientos"], febrero["egresos"]) == (2, 300)
@@ -0,0 +1,43 @@
+import pytest
+
+import cargas
+
+
+def clientes(*pedidos):
+    return [{"id": str(i), "comuna": comuna, "cajas_de_huevos": cajas} for i, (comuna, cajas) in enumerate(pedidos)]
+
+
+def entregado(viajes):
+    total = {}
+    for viaje in viajes:
+        for cliente, cajas in viaje.paradas:
+            total[cliente["id"]] = total.get(cliente["id"], 0) + cajas
+    return total
+
+
+def test_comunas_viajan_juntas_y_nada_excede_la_capacidad():
+    lista = clientes(("Maipú", 20), ("Ñuñoa", 15), ("Maipú", 10), ("La Florida", 25), ("Ñuñoa", 5), ("Macul", 30))
+    viajes = cargas.planificar_cargas(lista, 60)
+    assert all(v.cajas <= 60 for v in viajes)
+    assert entregado(viajes) == {c["id"]: c["cajas_de_huevos"] for c in lista}
+    assert len(viajes) == 2
+    for comuna in ("Maipú", "Ñuñoa"):
+        assert sum(comuna in v.comunas() for v in viajes) == 1
+    assert [v.numero for v in viajes] == [1, 2]
+    # Dentro del viaje se respeta el orden de la ruta
+    for viaje in viajes:
+        posiciones = [lista.index(c) for c, _ in viaje.paradas]
+        assert posiciones == sorted(posiciones)
+
+
+def test_comuna_y_pedido_mas_grandes_que_el_vehiculo():
+    lista = clientes(("Maipú", 130), ("Maipú", 20), ("Ñuñoa", 10), ("Macul", 0))
+    viajes = cargas.planificar_cargas(lista, 50)
+    assert all(v.cajas <= 50 for v in viajes)
+    assert entregado(viajes) == {"0": 130, "1": 20, "2": 10}
+    assert len(viajes) == 4
+
+
+def test_capacidad_invalida():
+    with pytest.raises(ValueError):
+        cargas.planificar_cargas(clientes(("Maipú", 5)), 0)
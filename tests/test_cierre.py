@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import por_nombre
+
+
+def test_cierre_completo_parcial_y_ausente(store):
+    ana, bruno, carla = (por_nombre(store, n) for n in ("Ana Pérez", "Bruno Díaz", "Carla Soto"))
+    totales = store.cerrar_reparto(
+        [(ana, 5, 25000, "Efectivo"), (bruno, 2, 0, ""), (carla, 0, 0, "")],
+        fecha=datetime(2024, 5, 6, 18, 0)
+    )
+    assert (totales["completos"], totales["parciales"], totales["ausentes"]) == (1, 1, 1)
+    assert (totales["cajas"], totales["cobrado"]) == (7, 25000)
+    assert [c["cajas_de_huevos"] for c in (ana, bruno, carla)] == [0, 3, 5]
+    assert [e["estado"] for e in store.entregas] == ["entregado", "parcial", "ausente"]
+    assert [(m["cliente_id"], m["monto"], m["referencia"]) for m in store.movimientos] == [(ana["id"], 25000, "Efectivo")]
+
+    assert store.deshacer() == "Cerrar reparto de 3 clientes"
+    assert [c["cajas_de_huevos"] for c in (ana, bruno, carla)] == [5, 5, 5]
+    assert not store.entregas and not store.movimientos
+
+
+def test_cierre_rechaza_cliente_repetido(store):
+    ana = por_nombre(store, "Ana Pérez")
+    with pytest.raises(ValueError, match="más de una vez"):
+        store.cerrar_reparto([(ana, 2, 0, ""), (ana, 3, 0, "")])
+    assert ana["cajas_de_huevos"] == 5
+    assert not store.entregas
+    assert not store.historial.puede_deshacer()
+
+
+@pytest.mark.parametrize("entregadas, monto", [(6, 0), (-1, 0), (5, -10), (5, float("nan")), (5, float("inf"))])
+def test_cierre_invalido_no_cambia_nada(store, entregadas, monto):
+    ana, bruno = por_nombre(store, "Ana Pérez"), por_nombre(store, "Bruno Díaz")
+    with pytest.raises(ValueError):
+        store.cerrar_reparto([(bruno, 5, 1000, "Efectivo"), (ana, entregadas, monto, "Efectivo")])
+    assert bruno["cajas_de_huevos"] == 5
+    assert not store.entregas and not store.movimientos
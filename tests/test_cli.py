@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import cli
+import nucleo
+from concurrencia import ArchivoBloqueado
+from nucleo import RepartoStore
+
+
+def escribir_jsonl(ruta, filas):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for fila in filas:
+            f.write(fila if isinstance(fila, str) else json.dumps(fila, ensure_ascii=False))
+            f.write("\n")
+
+
+def test_importar_clientes_con_valores_numericos(archivo, tmp_path, capsys):
+    ruta = str(tmp_path / "clientes.jsonl")
+    escribir_jsonl(ruta, [
+        {"nombre": "Ana Pérez", "telefono": 912345678, "direccion": "Los Alerces 123", "comuna": "Maipú", "pendiente": 3},
+        {"NOMBRE": "Bruno Díaz", "telefono": "+56 9 2222 3333", "direccion": 45, "comuna": "Ñuñoa", "pendiente": 2.0},
+        "esto no es json",
+        [1, 2],
+        {"nombre": None, "telefono": 911112222, "direccion": "x", "comuna": "Maipú"},
+    ])
+    assert cli.main(["--db", archivo, "import-clients", ruta]) == 0
+    salida = capsys.readouterr()
+    assert "Clientes agregados: 2" in salida.out
+    assert "línea 3: línea JSON inválida" in salida.err
+    assert "línea 5:" in salida.err
+    store = RepartoStore.cargar(archivo)
+    assert sorted((c["telefono"], c["cajas_de_huevos"]) for c in store.clientes) == [("+56 9 2222 3333", 2), ("912345678", 3)]
+
+
+def test_pedidos_con_cantidad_invalida(store, tmp_path, capsys):
+    ruta = str(tmp_path / "pedidos.jsonl")
+    escribir_jsonl(ruta, [
+        {"telefono": 56912345678, "cantidad": 4},
+        {"telefono": "+56 9 2222 3333", "cantidad": 1.5},
+        {"telefono": 999, "cantidad": 1},
+    ])
+    assert cli.main(["--db", store.archivo, "add-orders", ruta]) == 0
+    salida = capsys.readouterr()
+    assert "Pedidos aplicados: 1 (4 cajas)" in salida.out
+    assert "cantidad inválida: 1.5" in salida.err
+    assert "cliente no encontrado" in salida.err
+
+
+@pytest.mark.parametrize("error", [ArchivoBloqueado("Otra copia está guardando"), OSError(28, "No queda espacio")])
+@pytest.mark.parametrize("comando", [["compact"], ["shard"], ["import-clients", "clientes.jsonl"]])
+def test_error_al_guardar_no_deja_traza(store, tmp_path, monkeypatch, capsys, error, comando):
+    escribir_jsonl(str(tmp_path / "clientes.jsonl"), [{"nombre": "Eva Mora", "telefono": "+56 9 1010 2020", "direccion": "Calle 1", "comuna": "Maipú"}])
+
+    def falla(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(nucleo, "guardar_datos_versionado", falla)
+    monkeypatch.chdir(tmp_path)
+    assert cli.main(["--db", store.archivo] + comando) == 1
+    assert capsys.readouterr().err.startswith("Error: ")
@@ -0,0 +1,63 @@
+from comunas import RegistroComunas, clave_orden
+from conftest import por_nombre
+
+
+def test_colacion_del_espanol():
+    nombres = ["Ñuñoa", "Nogales", "Estadio", "Estación Central", "maipú", "Macul", "La Florida"]
+    assert sorted(nombres, key=clave_orden) == [
+        "Estación Central", "Estadio", "La Florida", "Macul", "maipú", "Nogales", "Ñuñoa"
+    ]
+
+
+def test_registro_inserta_en_orden_sin_repetir():
+    registro = RegistroComunas()
+    for nombre in ("Ñuñoa", "Maipú", "Nogales", "Cerrillos"):
+        assert registro.agregar(nombre) == (nombre, True)
+    assert registro.nombres == ["Cerrillos", "Maipú", "Nogales", "Ñuñoa"]
+    version = registro.version
+    assert registro.agregar("MAIPU") == ("Maipú", False)
+    assert registro.version == version
+    assert "nunoa" in registro
+    assert registro.buscar("ñuñoa") == "Ñuñoa"
+    assert registro.buscar("Lo Espejo") is None
+    assert registro.ordenar(["Ñuñoa", "Ñiquén", "Nueva Imperial"]) == ["Nueva Imperial", "Ñiquén", "Ñuñoa"]
+
+
+def test_comunas_del_store_se_canonizan(store):
+    assert store.comunas == ["Maipú", "Ñuñoa", "San Miguel"]
+    assert store.registrar_comuna("  maipu ") == "Maipú"
+    version = store.version_comunas
+    assert store.registrar_comuna("lo prado") == "Lo Prado"
+    assert store.comunas == ["Lo Prado", "Maipú", "Ñuñoa", "San Miguel"]
+    assert store.version_comunas == version + 1
+
+
+def test_deshacer_precio_por_comuna(store):
+    store.fijar_precio_comuna("maipu", 4000)
+    assert store.precios_por_comuna == {"Maipú": 4000}
+    assert store.obtener_precio("MAIPÚ") == 4000
+    store.fijar_precio_comuna("Maipú", 4200)
+    store.deshacer()
+    assert store.obtener_precio("Maipú") == 4000
+    store.deshacer()
+    assert store.precios_por_comuna == {}
+    assert store.obtener_precio("Maipú") == store.precio_caja
+    store.rehacer()
+    assert store.obtener_precio("Maipú") == 4000
+
+    assert store.quitar_precio_comuna("maipú")
+    assert store.obtener_precio("Maipú") == store.precio_caja
+    store.deshacer()
+    assert store.obtener_precio("Maipú") == 4000
+
+
+def test_deshacer_edicion_registra_la_comuna(store):
+    ana = por_nombre(store, "Ana Pérez")
+    store.actualizar_cliente(ana, comuna="lo prado")
+    assert ana["comuna"] == "Lo Prado"
+    store.deshacer()
+    assert ana["comuna"] == "Maipú"
+    store.rehacer()
+    assert ana["comuna"] == "Lo Prado"
+    assert "Lo Prado" in store.comunas
+
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+import concurrencia
+from conftest import por_nombre
+from nucleo import RepartoStore
+
+
+def test_bloqueo_entre_copias(archivo):
+    tomado, soltar = threading.Event(), threading.Event()
+
+    def otra_copia():
+        with concurrencia.bloquear(archivo):
+            tomado.set()
+            soltar.wait(5)
+
+    hilo = threading.Thread(target=otra_copia)
+    hilo.start()
+    try:
+        assert tomado.wait(5)
+        with pytest.raises(concurrencia.ArchivoBloqueado):
+            with concurrencia.bloquear(archivo, espera=0.1):
+                pass
+    finally:
+        soltar.set()
+        hilo.join()
+    with concurrencia.bloquear(archivo, espera=0.1):
+        pass
+
+
+def test_leer_version(store, archivo, tmp_path):
+    version = store.version
+    assert concurrencia.leer_version(archivo) == version
+    store.agregar_pedido(store.clientes[0], 1)
+    store.guardar()
+    assert concurrencia.leer_version(archivo) == version + 1
+    assert concurrencia.leer_version(str(tmp_path / "no-existe.json")) == 0
+
+
+def test_sincronizar_trae_cambios_de_la_otra_copia(store, archivo):
+    otra = RepartoStore.cargar(archivo)
+    otra.agregar_pedido(por_nombre(otra, "Bruno Díaz"), 2)
+    otra.agregar_cliente("Elena Vidal", "+56 9 8888 9999", "Santa Rosa 10", "La Granja", "Jueves")
+    otra.agregar_movimiento("Ingreso", 7000, "Pago")
+    otra.guardar()
+
+    ana = por_nombre(store, "Ana Pérez")
+    store.agregar_pedido(ana, 1)
+    assert store.hay_cambios_externos()
+    assert store.sincronizar() == []
+    assert por_nombre(store, "Bruno Díaz")["cajas_de_huevos"] == 7
+    assert por_nombre(store, "Elena Vidal")["comuna"] == "La Granja"
+    assert "La Granja" in store.comunas
+    assert [m["monto"] for m in store.movimientos] == [7000]
+    assert not store.hay_cambios_externos()
+
+    # Lo propio sigue en el historial y se guarda encima sin pisar lo ajeno
+    assert store.deshacer()
+    assert ana["cajas_de_huevos"] == 5
+    store.guardar()
+    final = RepartoStore.cargar(archivo)
+    assert por_nombre(final, "Bruno Díaz")["cajas_de_huevos"] == 7
+    assert len(final.clientes) == 5
+
+
+def test_conflicto_mantiene_el_cambio_local(store, archivo):
+    otra = RepartoStore.cargar(archivo)
+    otra.actualizar_cliente(por_nombre(otra, "Carla Soto"), telefono="+56 9 0000 0001")
+    otra.guardar()
+
+    carla = por_nombre(store, "Carla Soto")
+    store.actualizar_cliente(carla, telefono="+56 9 0000 0002")
+    # guardar detecta el cambio ajeno, sincroniza y reintenta
+    store.guardar()
+    assert [c["id"] for c in store.conflictos] == [carla["id"]]
+    assert carla["telefono"] == "+56 9 0000 0002"
+
+    store.resolver_conflicto(store.conflictos[0], usar_externo=True)
+    assert store.conflictos == []
+    assert por_nombre(store, "Carla Soto")["telefono"] == "+56 9 0000 0001"
+
+
+def test_cliente_borrado_en_la_otra_copia(store, archivo):
+    otra = RepartoStore.cargar(archivo)
+    otra.eliminar_cliente(por_nombre(otra, "Diego Rojas"))
+    otra.guardar()
+    store.sincronizar()
+    assert [c["nombre_completo"] for c in store.clientes] == ["Ana Pérez", "Bruno Díaz", "Carla Soto"]
+    assert store.conflictos == []
@@ -0,0 +1,39 @@
+import pytest
+
+from consultas import ErrorConsulta, compilar, ordenar
+
+
+def nombres(store, texto):
+    return sorted(c["nombre_completo"] for c in compilar(texto, store).filtrar(store.clientes))
+
+
+def test_comparaciones(store):
+    store.agregar_pedido(store.clientes[2], 3)
+    assert nombres(store, "comuna in (maipu, Ñuñoa) and pendiente > 5") == ["Carla Soto"]
+    assert nombres(store, "comuna = San Miguel or nombre ~ bruno") == ["Bruno Díaz", "Diego Rojas"]
+    assert nombres(store, "not dia = lunes and comuna != nunoa") == ["Diego Rojas"]
+
+
+def test_numeros(store):
+    store.clientes[0]["cajas_de_huevos"] = 3
+    assert nombres(store, "pendiente < 4.5") == ["Ana Pérez"]
+    assert nombres(store, "pendiente < 2.5") == []
+    store.fijar_precio_caja(4000)
+    assert nombres(store, "adeudado >= 20.000") == ["Bruno Díaz", "Carla Soto", "Diego Rojas"]
+    assert nombres(store, "adeudado = '12.000,0'") == ["Ana Pérez"]
+
+
+def test_sin_consulta():
+    assert compilar("  ", None) is None
+
+
+@pytest.mark.parametrize("texto", ["pendiente >", "color = rojo", "(comuna = maipu", "nombre > 3", "pendiente ~ 2", "pendiente > dos"])
+def test_errores(store, texto):
+    with pytest.raises(ErrorConsulta):
+        compilar(texto, store)
+
+
+def test_orden_por_varias_columnas(store):
+    store.clientes[3]["cajas_de_huevos"] = 9
+    clientes = ordenar(store, list(store.clientes), [("Pendiente a entrega", True), ("Nombre", False)])
+    assert [c["nombre_completo"] for c in clientes] == ["Diego Rojas", "Ana Pérez", "Bruno Díaz", "Carla Soto"]
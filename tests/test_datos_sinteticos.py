@@ -0,0 +1,27 @@
+from benchmarks.datos_sinteticos import COMUNAS, generar_datos
+from nucleo import RepartoStore, guardar_datos
+
+
+def test_misma_semilla_mismos_datos():
+    datos = generar_datos(50, 200)
+    assert datos == generar_datos(50, 200)
+    assert datos != generar_datos(50, 200, semilla=7)
+    assert (len(datos["clientes"]), len(datos["movimientos"])) == (50, 200)
+    assert len(generar_datos(30)["movimientos"]) == 30
+    fechas = [m["fecha_iso"] for m in datos["movimientos"]]
+    assert fechas == sorted(fechas)
+    assert len({c["id"] for c in datos["clientes"]}) == 50
+    assert set(datos["precios_por_comuna"]) <= set(COMUNAS)
+
+
+def test_el_store_los_carga(tmp_path):
+    archivo = str(tmp_path / "db.json")
+    guardar_datos(generar_datos(100, 300), archivo)
+    store = RepartoStore.cargar(archivo)
+    assert len(store.clientes) == 100
+    assert len(store.movimientos) == 300
+    # Las comunas escritas en minúsculas quedan canonizadas
+    assert all(c["comuna"] in store.comunas for c in store.clientes)
+    assert set(store.comunas) <= set(COMUNAS)
+    ingresos, egresos, _ = store.totales_caja()
+    assert ingresos > 0 and egresos > 0
@@ -0,0 +1,53 @@
+import duplicados
+from conftest import por_nombre
+
+
+def test_detecta_duplicados_por_bloques(store):
+    store.agregar_cliente("Perez Ana", "9 1234 5678", "Av. Los Alerces 123", "Maipú")
+    store.agregar_cliente("Ana Perez", "+56 2 9999 0000", "Avda. Los Alerces 123, depto", "Maipu")
+    store.agregar_cliente("Ana Pérez", "+56 9 8888 1111", "Colón 4500", "Las Condes")
+    pares, estadisticas = duplicados.buscar_duplicados(store.clientes)
+    nombres = {frozenset((a["nombre_completo"], b["nombre_completo"])) for a, b, _, _ in pares}
+    assert frozenset(("Ana Pérez", "Perez Ana")) in nombres
+    assert frozenset(("Ana Pérez", "Ana Perez")) in nombres
+    assert all(a is not b for a, b, _, _ in pares)
+    # La homónima de otra comuna y otro teléfono no comparte bloque
+    assert not any("Colón 4500" in (a["direccion"], b["direccion"]) for a, b, _, _ in pares)
+    assert estadisticas["comparaciones"] < len(store.clientes) * (len(store.clientes) - 1) // 2
+
+
+def test_bloque_demasiado_grande_se_omite(store):
+    for i in range(5):
+        store.agregar_cliente(f"Cliente {i}", "+56 9 0000 0000", f"Calle {i}", "Maipú")
+    pares, _ = duplicados.buscar_duplicados(store.clientes, max_bloque=4)
+    assert not pares
+
+
+def test_fusion_pasa_caja_y_entregas_por_id(store):
+    ana, bruno = por_nombre(store, "Ana Pérez"), por_nombre(store, "Bruno Díaz")
+    pago = store.registrar_pago(bruno, 1000)
+    store.cerrar_reparto([(bruno, 2, 0, "")])
+    # Otro cliente con el mismo nombre que el duplicado no se toca
+    homonimo = store.agregar_cliente("Bruno Díaz", "+56 9 7777 8888", "Colón 4500", "Las Condes")
+    ajeno = store.registrar_pago(homonimo, 2000)
+    antiguo = store.agregar_movimiento("Ingreso", 500, cliente="Bruno Díaz")
+
+    assert store.fusionar_clientes(ana, bruno) == 3
+    assert (pago["cliente_id"], pago["cliente"]) == (ana["id"], "Ana Pérez")
+    assert store.entregas[0]["cliente_id"] == ana["id"]
+    assert (ajeno["cliente_id"], ajeno["cliente"]) == (homonimo["id"], "Bruno Díaz")
+    # Sin id solo queda el nombre
+    assert antiguo["cliente"] == "Ana Pérez"
+    assert ana["cajas_de_huevos"] == 8
+
+
+def test_fusion_se_deshace_en_un_paso(store):
+    ana, bruno = por_nombre(store, "Ana Pérez"), por_nombre(store, "Bruno Díaz")
+    pago = store.registrar_pago(bruno, 1000)
+    store.fusionar_clientes(ana, bruno)
+    assert ana["cajas_de_huevos"] == 10
+    assert store.cliente_por_id(bruno["id"]) is None
+    store.deshacer()
+    assert ana["cajas_de_huevos"] == 5
+    assert store.cliente_por_id(bruno["id"]) is bruno
+    assert (pago["cliente_id"], pago["cliente"]) == (bruno["id"], "Bruno Díaz")
@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+import fragmentos
+from conftest import por_nombre
+from nucleo import RepartoStore
+
+
+@pytest.fixture
+def por_comunas(store):
+    store.fragmentar()
+    store.guardar()
+    return store
+
+
+def archivos(store):
+    return sorted(os.listdir(fragmentos.carpeta(store.archivo)))
+
+
+def en_uso(store):
+    with open(store.archivo, encoding="utf-8") as f:
+        return sorted(e["archivo"] for e in json.load(f)["fragmentos"]["comunas"].values())
+
+
+def test_guardar_y_cargar(por_comunas):
+    assert archivos(por_comunas) == ["maipu.1.json", "nunoa.1.json", "san-miguel.1.json"]
+    with open(por_comunas.archivo, encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    assert "clientes" not in manifiesto
+    assert manifiesto["fragmentos"]["comunas"]["maipu"]["clientes"] == 2
+    cargado = RepartoStore.cargar(por_comunas.archivo)
+    assert sorted(c["id"] for c in cargado.clientes) == sorted(c["id"] for c in por_comunas.clientes)
+    assert cargado.fragmentos_cargados is None
+
+
+def test_solo_se_reescribe_la_comuna_cambiada(por_comunas):
+    por_comunas.agregar_pedido(por_nombre(por_comunas, "Carla Soto"), 1)
+    por_comunas.guardar()
+    assert en_uso(por_comunas) == ["maipu.1.json", "nunoa.2.json", "san-miguel.1.json"]
+    # El anterior se borra recién en el guardado siguiente (otra copia
+    # podría estar leyéndolo)
+    assert "nunoa.1.json" in archivos(por_comunas)
+    por_comunas.agregar_pedido(por_nombre(por_comunas, "Ana Pérez"), 1)
+    por_comunas.guardar()
+    assert archivos(por_comunas) == ["maipu.1.json", "maipu.2.json", "nunoa.2.json", "san-miguel.1.json"]
+
+
+def test_cambio_de_comuna_actualiza_ambos_fragmentos(por_comunas):
+    ana = por_nombre(por_comunas, "Ana Pérez")
+    por_comunas.actualizar_cliente(ana, comuna="Ñuñoa")
+    por_comunas.guardar()
+    assert en_uso(por_comunas) == ["maipu.2.json", "nunoa.2.json", "san-miguel.1.json"]
+    cargado = RepartoStore.cargar(por_comunas.archivo)
+    assert [c["comuna"] for c in cargado.clientes if c["id"] == ana["id"]] == ["Ñuñoa"]
+
+
+def test_carga_parcial_conserva_las_demas_comunas(por_comunas):
+    parcial = RepartoStore.cargar(por_comunas.archivo, ["Maipú"])
+    assert sorted(c["nombre_completo"] for c in parcial.clientes) == ["Ana Pérez", "Bruno Díaz"]
+    bruno = por_nombre(parcial, "Bruno Díaz")
+    parcial.marcar_entregados([por_nombre(parcial, "Ana Pérez")])
+    parcial.actualizar_cliente(bruno, comuna="San Miguel")
+    parcial.guardar()
+    completo = RepartoStore.cargar(por_comunas.archivo)
+    assert len(completo.clientes) == 4
+    assert por_nombre(completo, "Ana Pérez")["cajas_de_huevos"] == 0
+    assert por_nombre(completo, "Bruno Díaz")["comuna"] == "San Miguel"
+    assert por_nombre(completo, "Carla Soto")["cajas_de_huevos"] == 5
+    with pytest.raises(ValueError):
+        parcial.exportar_cambios()
+
+
+def test_volver_a_un_solo_archivo(por_comunas):
+    por_comunas.fragmentar(False)
+    por_comunas.guardar()
+    fragmentos.borrar(por_comunas.archivo)
+    assert not os.path.exists(fragmentos.carpeta(por_comunas.archivo))
+    assert len(RepartoStore.cargar(por_comunas.archivo).clientes) == 4
@@ -0,0 +1,71 @@
+from conftest import por_nombre
+from historial import Historial
+
+
+def test_deshacer_y_rehacer_pedido(store):
+    ana = por_nombre(store, "Ana Pérez")
+    store.agregar_pedido(ana, 3)
+    assert ana["cajas_de_huevos"] == 8
+    assert store.deshacer()
+    assert ana["cajas_de_huevos"] == 5
+    assert ana["cajas_de_huevos_total"] == 5
+    assert store.rehacer()
+    assert ana["cajas_de_huevos"] == 8
+
+
+def test_deshacer_eliminar_cliente(store):
+    carla = por_nombre(store, "Carla Soto")
+    store.eliminar_cliente(carla)
+    assert store.cliente_por_id(carla["id"]) is None
+    store.deshacer()
+    assert store.cliente_por_id(carla["id"]) is carla
+    assert len(store.clientes) == 4
+
+
+def test_planificacion_se_deshace_en_un_paso(store):
+    ana, diego = por_nombre(store, "Ana Pérez"), por_nombre(store, "Diego Rojas")
+    cambiados = store.aplicar_planificacion({ana["id"]: "Viernes", diego["id"]: "Jueves", "no-existe": "Lunes"}, {ana["id"]: True})
+    assert cambiados == 2
+    assert (ana["dia_reparto"], ana.get("dia_fijo"), diego["dia_reparto"]) == ("Viernes", True, "Jueves")
+    store.deshacer()
+    assert (ana["dia_reparto"], "dia_fijo" in ana, diego["dia_reparto"]) == ("Lunes", False, None)
+    assert not store.historial.puede_deshacer()
+
+
+def test_marcar_entregados_es_un_paso(store):
+    store.marcar_entregados(store.clientes)
+    assert all(c["cajas_de_huevos"] == 0 for c in store.clientes)
+    assert store.deshacer() == "Marcar entregados"
+    assert all(c["cajas_de_huevos"] == 5 for c in store.clientes)
+    assert not store.historial.puede_deshacer()
+
+
+def test_cambio_nuevo_borra_el_rehacer(store):
+    ana = por_nombre(store, "Ana Pérez")
+    store.agregar_pedido(ana, 1)
+    store.deshacer()
+    store.agregar_pedido(ana, 2)
+    assert not store.historial.puede_rehacer()
+    assert ana["cajas_de_huevos"] == 7
+
+
+def test_deshacer_eliminar_movimiento_vuelve_a_su_lugar(store):
+    for monto in (100, 200, 300):
+        store.agregar_movimiento("Ingreso", monto)
+    store.eliminar_movimiento(1)
+    store.fijar_precio_caja(4000)
+    store.deshacer()
+    store.deshacer()
+    assert [m["monto"] for m in store.movimientos] == [100, 200, 300]
+    store.rehacer()
+    assert [m["monto"] for m in store.movimientos] == [100, 300]
+
+
+def test_limite_de_pasos():
+    historial = Historial(max_pasos=3)
+    for i in range(5):
+        historial.registrar(("atributo", "x", i), f"paso {i}")
+    deshechos = []
+    while historial.puede_deshacer():
+        deshechos.append(historial.deshacer(lambda delta: delta))
+    assert deshechos == ["paso 4", "paso 3", "paso 2"]
@@ -0,0 +1,54 @@
+import threading
+
+from conftest import por_nombre
+from nucleo import RepartoStore
+
+
+def test_guardar_y_cargar(store):
+    store.fijar_precio_comuna("Maipú", 4500)
+    store.registrar_pago(por_nombre(store, "Ana Pérez"), 5000)
+    store.guardar()
+    cargado = RepartoStore.cargar(store.archivo)
+    assert [c["nombre_completo"] for c in cargado.clientes] == [c["nombre_completo"] for c in store.clientes]
+    assert cargado.obtener_precio("maipu") == 4500
+    assert [m["monto"] for m in cargado.movimientos] == [5000]
+
+
+def test_filtrar_y_buscar(store):
+    assert [c["nombre_completo"] for c in store.filtrar(comuna="nunoa")] == ["Carla Soto"]
+    assert len(store.filtrar(comuna="Maipú", dia="lunes")) == 2
+    assert [c["nombre_completo"] for c in store.buscar_clientes("perez")] == ["Ana Pérez"]
+    assert [c["nombre_completo"] for c in store.buscar_clientes("6666")] == ["Diego Rojas"]
+    store.registrar_entrega(por_nombre(store, "Bruno Díaz"))
+    assert len(store.filtrar(comuna="Maipú", solo_pendientes=True)) == 1
+
+
+def test_resumen(store):
+    store.registrar_entrega(por_nombre(store, "Diego Rojas"), 2)
+    resumen = store.resumen()
+    assert resumen["total_pendiente"] == 18
+    assert resumen["clientes_con_pedido"] == 4
+    assert resumen["por_comuna"][0] == ("Maipú", 10, 2)
+
+
+def test_precios_se_leen_bien_mientras_otro_hilo_los_invalida(store):
+    for i in range(300):
+        store.precios_por_comuna[f"Comuna {i}"] = 1000 + i
+    store.fijar_precio_comuna("Maipú", 4500)
+    detener = threading.Event()
+    errores = []
+
+    def leer():
+        while not detener.is_set():
+            precio = store.obtener_precio("Maipú")
+            if precio != 4500:
+                errores.append(precio)
+
+    hilo = threading.Thread(target=leer)
+    hilo.start()
+    for _ in range(2000):
+        store._indice_precios = None
+        store.obtener_precio("Ñuñoa")
+    detener.set()
+    hilo.join()
+    assert not errores
@@ -0,0 +1,53 @@
+import planificador
+
+
+def clientes_sinteticos():
+    clientes = []
+    for comuna, cantidad in (("Maipú", 30), ("Ñuñoa", 20), ("La Florida", 20), ("Puente Alto", 15), ("San Miguel", 15)):
+        for i in range(cantidad):
+            clientes.append({"id": f"{comuna}-{i}", "comuna": comuna, "cajas_de_huevos": 2 + i % 3, "dia_reparto": "Lunes"})
+    return clientes
+
+
+def test_reparte_la_carga_en_la_semana():
+    clientes = clientes_sinteticos()
+    plan = planificador.planificar(clientes, ["Lunes", "Martes", "Miércoles"])
+    assert sorted(id(c) for c, _ in plan.asignacion) == sorted(id(c) for c in clientes)
+    resumen = plan.resumen()
+    total = sum(f["cajas"] for f in resumen)
+    assert total == sum(c["cajas_de_huevos"] for c in clientes)
+    assert max(f["cajas"] for f in resumen) <= total / 3 * 1.25
+    # Una comuna que cabe en un día no se parte
+    dias_por_comuna = {}
+    for cliente, dia in plan.asignacion:
+        dias_por_comuna.setdefault(cliente["comuna"], set()).add(dia)
+    assert all(len(dias) == 1 for comuna, dias in dias_por_comuna.items() if comuna != "Maipú")
+
+
+def test_fijados_conservan_su_dia():
+    clientes = clientes_sinteticos()
+    for cliente in clientes[:10]:
+        cliente["dia_fijo"] = True
+    plan = planificador.planificar(clientes, ["Lunes", "Martes", "Miércoles"])
+    asignado = {id(c): dia for c, dia in plan.asignacion}
+    assert all(asignado[id(c)] == "Lunes" for c in clientes[:10])
+    # es_fijo reemplaza a dia_fijo (la ventana fija sin tocar los clientes)
+    plan = planificador.planificar(clientes, ["Martes"], es_fijo=lambda c: False)
+    assert {dia for _, dia in plan.asignacion} == {"Martes"}
+
+
+def test_propuesta_solo_trae_los_cambios():
+    clientes = [
+        {"id": "a", "comuna": "Maipú", "cajas_de_huevos": 4, "dia_reparto": "lunes"},
+        {"id": "b", "comuna": "Ñuñoa", "cajas_de_huevos": 4, "dia_reparto": "Lunes"},
+    ]
+    plan = planificador.planificar(clientes, ["Lunes", "Martes"])
+    propuesta = planificador.propuesta(plan)
+    assert len(propuesta) == 1 and list(propuesta.values()) == ["Martes"]
+
+
+def test_canonizar_dia():
+    dias = ["Lunes", "Miércoles"]
+    assert planificador.canonizar_dia(" miercoles ", dias) == "Miércoles"
+    assert planificador.canonizar_dia("Jueves", dias) is None
+    assert planificador.canonizar_dia(None, dias) is None
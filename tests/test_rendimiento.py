@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import rendimiento
+
+
+@pytest.fixture(autouse=True)
+def limpio():
+    estado = rendimiento.activo()
+    rendimiento.limpiar()
+    yield
+    rendimiento.limpiar()
+    rendimiento.activar(estado)
+
+
+def test_desactivado_no_mide():
+    rendimiento.activar(False)
+    with rendimiento.medir("Guardar"):
+        pass
+    rendimiento.envolver("Refrescar", lambda: None)()
+    assert rendimiento.estadisticas() == []
+
+
+def test_percentiles_y_orden():
+    rendimiento.activar()
+    for ms in range(1, 101):
+        rendimiento.registrar("Refrescar tabla", ms / 1000)
+    rendimiento.registrar("Guardar", 0.5)
+    with rendimiento.medir("Exportar"):
+        pass
+
+    @rendimiento.cronometrado("Buscar")
+    def buscar():
+        return "ok"
+
+    assert buscar() == "ok"
+    filas = {f["accion"]: f for f in rendimiento.estadisticas()}
+    refrescar = filas["Refrescar tabla"]
+    assert refrescar["muestras"] == 100
+    assert refrescar["p50"] == pytest.approx(0.050, abs=0.0015)
+    assert refrescar["p95"] == pytest.approx(0.095, abs=0.0015)
+    assert (refrescar["max"], refrescar["ultimo"]) == (0.1, 0.1)
+    assert filas["Buscar"]["muestras"] == filas["Exportar"]["muestras"] == 1
+    assert rendimiento.estadisticas()[0]["accion"] == "Guardar"
+
+
+def test_bufer_acotado():
+    rendimiento.activar()
+    for i in range(rendimiento.CAPACIDAD + 10):
+        rendimiento.registrar("Clic", i)
+    fila = rendimiento.estadisticas()[0]
+    assert fila["muestras"] == rendimiento.CAPACIDAD
+    assert fila["ultimo"] == rendimiento.CAPACIDAD + 9
+
+
+def test_exportar(tmp_path, monkeypatch):
+    rendimiento.activar()
+    rendimiento.registrar("Guardar", 0.25)
+    monkeypatch.setitem(rendimiento._indicadores, "Prueba", lambda: 1 / 0)
+    destino = tmp_path / "rendimiento.json"
+    rendimiento.exportar(str(destino))
+    datos = json.loads(destino.read_text(encoding="utf-8"))
+    assert datos["muestras"] == {"Guardar": [0.25]}
+    assert datos["estadisticas"][0]["p95"] == 0.25
+    assert datos["indicadores"]["Prueba"].startswith("error:")
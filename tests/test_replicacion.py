@@ -0,0 +1,152 @@
+import shutil
+
+import pytest
+
+import replicacion
+from conftest import por_nombre
+from nucleo import RepartoStore
+
+
+@pytest.fixture
+def par(store, tmp_path):
+    # La bodega y una copia de su db.json en otro equipo
+    copia = str(tmp_path / "local2.json")
+    shutil.copy(store.archivo, copia)
+    local2 = RepartoStore.cargar(copia)
+    replicacion.nueva_instalacion(local2)
+    return store, local2
+
+
+def intercambiar(origen, destino):
+    paquete = origen.exportar_cambios(destino.replica["instalacion"])
+    origen.confirmar_exportacion(paquete)
+    return destino.importar_cambios(paquete)
+
+
+def test_cajas_de_ambos_lados_se_suman(par):
+    bodega, local2 = par
+    bodega.agregar_pedido(por_nombre(bodega, "Ana Pérez"), 2)
+    local2.agregar_pedido(por_nombre(local2, "Ana Pérez"), 3)
+    intercambiar(bodega, local2)
+    intercambiar(local2, bodega)
+    assert por_nombre(bodega, "Ana Pérez")["cajas_de_huevos"] == 10
+    assert por_nombre(local2, "Ana Pérez")["cajas_de_huevos"] == 10
+
+
+def test_copia_no_suma_dos_veces_lo_no_exportado(par):
+    # Los pedidos iniciales (5 cajas) no se habían exportado al copiar
+    bodega, local2 = par
+    intercambiar(local2, bodega)
+    intercambiar(bodega, local2)
+    assert [c["cajas_de_huevos"] for c in bodega.clientes] == [5, 5, 5, 5]
+    assert [c["cajas_de_huevos"] for c in local2.clientes] == [5, 5, 5, 5]
+
+
+def test_copia_recibe_primero_todo_del_original(par):
+    bodega, local2 = par
+    intercambiar(bodega, local2)
+    bodega.agregar_pedido(por_nombre(bodega, "Bruno Díaz"), 1)
+    local2.agregar_pedido(por_nombre(local2, "Bruno Díaz"), 2)
+    intercambiar(bodega, local2)
+    intercambiar(local2, bodega)
+    assert por_nombre(bodega, "Bruno Díaz")["cajas_de_huevos"] == 8
+    assert por_nombre(local2, "Bruno Díaz")["cajas_de_huevos"] == 8
+    assert "copia" not in local2.replica
+
+
+def test_reimportar_no_duplica(par):
+    bodega, local2 = par
+    bodega.agregar_pedido(por_nombre(bodega, "Carla Soto"), 1)
+    bodega.registrar_pago(por_nombre(bodega, "Carla Soto"), 5000)
+    paquete = bodega.exportar_cambios(local2.replica["instalacion"])
+    local2.importar_cambios(paquete)
+    local2.importar_cambios(paquete)
+    assert por_nombre(local2, "Carla Soto")["cajas_de_huevos"] == 6
+    assert len(local2.movimientos) == 1
+
+
+def test_eliminacion_se_replica(par):
+    bodega, local2 = par
+    diego = por_nombre(bodega, "Diego Rojas")
+    bodega.eliminar_cliente(diego)
+    intercambiar(bodega, local2)
+    assert local2.cliente_por_id(diego["id"]) is None
+
+
+def test_fusion_se_replica(par):
+    bodega, local2 = par
+    # Tras un primer intercambio solo viaja lo nuevo
+    intercambiar(local2, bodega)
+    ana, bruno = por_nombre(bodega, "Ana Pérez"), por_nombre(bodega, "Bruno Díaz")
+    bodega.fusionar_clientes(ana, bruno)
+    paquete = bodega.exportar_cambios(local2.replica["instalacion"])
+    assert [c["id"] for c in paquete["clientes"]] == [ana["id"]]
+    assert bruno["id"] in paquete["bajas"]["clientes"]
+    local2.importar_cambios(paquete)
+    assert local2.cliente_por_id(bruno["id"]) is None
+    assert local2.cliente_por_id(ana["id"])["cajas_de_huevos"] == 10
+
+
+def test_deshacer_fusion_no_duplica_la_caja(par):
+    bodega, local2 = par
+    bodega.registrar_pago(por_nombre(bodega, "Bruno Díaz"), 5000)
+    intercambiar(bodega, local2)
+    intercambiar(local2, bodega)
+    bodega.fusionar_clientes(por_nombre(bodega, "Ana Pérez"), por_nombre(bodega, "Bruno Díaz"))
+    bodega.deshacer()
+    intercambiar(bodega, local2)
+    assert len(local2.movimientos) == 1
+    assert local2.movimientos[0]["cliente"] == "Bruno Díaz"
+
+
+def test_pago_repetido_desde_otro_origen_no_se_duplica(par):
+    bodega, local2 = par
+    pago = bodega.registrar_pago(por_nombre(bodega, "Ana Pérez"), 5000)
+    intercambiar(bodega, local2)
+    # Vuelve a llegar el mismo id con otro sello (p. ej. desde una tercera)
+    paquete = bodega.exportar_cambios()
+    paquete["origen"] = "tercera"
+    paquete["movimientos"] = [dict(pago, monto=6000, sello=pago["sello"] + 50, origen="tercera")]
+    local2.importar_cambios(paquete)
+    assert [m["monto"] for m in local2.movimientos] == [6000]
+
+
+def test_pago_eliminado_y_recuperado_vuelve(par):
+    bodega, local2 = par
+    bodega.registrar_pago(por_nombre(bodega, "Ana Pérez"), 5000)
+    intercambiar(bodega, local2)
+    bodega.eliminar_movimiento(0)
+    intercambiar(bodega, local2)
+    assert not local2.movimientos
+    bodega.deshacer()
+    intercambiar(bodega, local2)
+    assert len(local2.movimientos) == 1
+
+
+def test_pago_eliminado_sin_exportar_conserva_su_sello(par):
+    bodega, local2 = par
+    pago = bodega.registrar_pago(por_nombre(bodega, "Ana Pérez"), 5000)
+    marca = replicacion.sello(pago)
+    bodega.eliminar_movimiento(0)
+    bodega.deshacer()
+    assert replicacion.sello(pago) == marca
+    assert not bodega.replica["bajas"]["movimientos"]
+    intercambiar(bodega, local2)
+    assert len(local2.movimientos) == 1
+
+
+def test_planificacion_se_replica(par):
+    bodega, local2 = par
+    diego = por_nombre(bodega, "Diego Rojas")
+    bodega.aplicar_planificacion({diego["id"]: "Jueves"}, {})
+    intercambiar(bodega, local2)
+    assert local2.cliente_por_id(diego["id"])["dia_reparto"] == "Jueves"
+
+
+def test_archivo_de_cambios(par, tmp_path):
+    bodega, local2 = par
+    bodega.fijar_precio_caja(9000)
+    ruta = str(tmp_path / ("x" + replicacion.EXTENSION))
+    replicacion.escribir(bodega.exportar_cambios(), ruta)
+    local2.importar_cambios(replicacion.leer(ruta))
+    assert local2.precio_caja == 9000
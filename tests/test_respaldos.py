@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import cli
+import respaldos
+from conftest import por_nombre
+from nucleo import ErrorDatos, RepartoStore, cargar_datos, recuperar_datos
+
+
+def respaldar(store, gestor):
+    store.guardar()
+    return gestor.respaldar(store.como_dict(), forzar=True)
+
+
+def test_cadena_de_deltas(store):
+    gestor = respaldos.GestorRespaldos(store.archivo, intervalo=0)
+    primero = respaldar(store, gestor)
+    store.agregar_pedido(por_nombre(store, "Ana Pérez"), 2)
+    store.registrar_pago(por_nombre(store, "Ana Pérez"), 5000)
+    respaldar(store, gestor)
+    store.eliminar_cliente(por_nombre(store, "Diego Rojas"))
+    ultimo = respaldar(store, gestor)
+    assert primero.endswith(".completo.json.xz")
+    assert ".delta." in ultimo
+
+    disponibles = respaldos.listar(store.archivo)
+    assert [r.nombre for r in disponibles][-1] == ultimo
+    datos = respaldos.reconstruir(store.archivo, disponibles[-1], disponibles)
+    assert sorted(c["id"] for c in datos["clientes"]) == sorted(c["id"] for c in store.clientes)
+    assert next(c for c in datos["clientes"] if c["nombre_completo"] == "Ana Pérez")["cajas_de_huevos"] == 7
+    assert len(datos["movimientos"]) == 1
+
+    inicial = respaldos.reconstruir(store.archivo, disponibles[0], disponibles)
+    assert len(inicial["clientes"]) == 4
+
+
+def test_archivo_danado_vuelve_al_ultimo_respaldo(store):
+    gestor = respaldos.GestorRespaldos(store.archivo, intervalo=0)
+    respaldar(store, gestor)
+    with open(store.archivo, "w", encoding="utf-8") as f:
+        f.write('{"version": 3, "clientes": [')
+    with pytest.raises(ErrorDatos):
+        cargar_datos(store.archivo)
+    respaldo = recuperar_datos(store.archivo)
+    assert respaldo is not None
+    assert len(RepartoStore.cargar(store.archivo).clientes) == 4
+    apartados = [n for n in os.listdir(os.path.dirname(store.archivo)) if ".danado-" in n]
+    assert len(apartados) == 1
+
+
+def test_error_de_lectura_no_es_dano(tmp_path):
+    carpeta = tmp_path / "db.json"
+    carpeta.mkdir()
+    with pytest.raises(OSError):
+        cargar_datos(str(carpeta))
+
+
+def test_archivo_ilegible_no_se_recupera(tmp_path, capsys):
+    # Un error de lectura no es un archivo dañado: no se aparta ni se restaura
+    carpeta = tmp_path / "db.json"
+    carpeta.mkdir()
+    assert cli.main(["--db", str(carpeta), "caja-report"]) == 2
+    assert "Error" in capsys.readouterr().err
+    assert [p.name for p in tmp_path.iterdir()] == ["db.json"]
@@ -0,0 +1,83 @@
+import itertools
+import json
+import random
+
+import rutas
+
+
+def cliente(nombre, direccion, comuna="Maipú", dia="Lunes"):
+    return {"nombre_completo": nombre, "direccion": direccion, "comuna": comuna, "dia_reparto": dia}
+
+
+def matriz(puntos):
+    return rutas.CacheDistancias().matriz("r", range(len(puntos)), puntos)
+
+
+def test_paradas_en_linea_quedan_en_orden():
+    puntos = [(-33.50, -70.60 - 0.01 * i) for i in (3, 0, 5, 1, 4, 2)]
+    orden = rutas.ordenar_paradas(matriz(puntos))
+    assert [puntos[i] for i in orden] in (sorted(puntos), sorted(puntos, reverse=True))
+
+
+def test_recorrido_cercano_al_optimo():
+    azar = random.Random(7)
+    puntos = [(-33.4 - azar.random() * 0.1, -70.6 - azar.random() * 0.1) for _ in range(8)]
+    dist = matriz(puntos)
+    orden = rutas.ordenar_paradas(dist)
+    assert sorted(orden) == list(range(8))
+    optimo = min(rutas.longitud_recorrido(dist, list(p)) for p in itertools.permutations(range(8)))
+    assert rutas.longitud_recorrido(dist, orden) <= optimo * 1.05
+
+
+def test_ruta_con_origen_parte_cerca_de_el():
+    puntos = [(-33.50, -70.60 - 0.01 * i) for i in range(6)]
+    dist = matriz(puntos + [(-33.50, -70.55)])
+    orden = rutas.ordenar_paradas(dist, origen=6)
+    assert sorted(orden) == list(range(6))
+    assert 0 in (orden[0], orden[-1])
+
+
+def test_ordenar_por_rutas_agrupa_y_deja_al_final_los_sin_coordenadas():
+    clientes = [
+        cliente("A", "Calle 3"), cliente("B", "Calle 1"), cliente("C", "Sin mapa 1"),
+        cliente("D", "Calle 2"), cliente("E", "Otra 1", comuna="Ñuñoa"), cliente("F", "Calle 4"),
+    ]
+    geocodigos = {
+        rutas.clave_cliente(c): (-33.5, -70.60 - 0.01 * int(c["direccion"][-1]))
+        for c in clientes if c["direccion"].startswith(("Calle", "Otra"))
+    }
+    ordenados, sin_coordenadas = rutas.ordenar_por_rutas(clientes, geocodigos)
+    nombres = [c["nombre_completo"] for c in ordenados]
+    assert sin_coordenadas == 1
+    assert nombres[:5] in (["B", "D", "A", "F", "C"], ["F", "A", "D", "B", "C"])
+    assert nombres[5] == "E"
+
+
+def test_cache_reutiliza_filas_al_invalidar_una_parada():
+    puntos = [(-33.4 - 0.01 * i, -70.6 + 0.003 * i * i) for i in range(6)]
+    claves = [f"p{i}" for i in range(6)]
+    cache = rutas.CacheDistancias()
+    cache.matriz("r", claves, puntos)
+    cache.matriz("r", claves, puntos)
+    assert (cache.aciertos, cache.fallos) == (1, 1)
+
+    puntos[2] = (-33.45, -70.65)
+    cache.invalidar("p2")
+    nueva = cache.matriz("r", claves, puntos)
+    assert cache.filas_reutilizadas == 5
+    fresca = rutas.CacheDistancias().matriz("x", claves, puntos)
+    assert all(abs(nueva[i][j] - fresca[i][j]) < 1e-9 for i in range(6) for j in range(6))
+
+
+def test_cargar_geocodigos(tmp_path):
+    archivo = tmp_path / "geocodigos.json"
+    archivo.write_text(json.dumps({
+        "Av. Los Alerces 123|Maipú": [-33.51, -70.75],
+        "__origen__": [-33.45, -70.65],
+        "malo|Maipú": ["x", 1],
+    }), encoding="utf-8")
+    geocodigos = rutas.cargar_geocodigos(str(archivo))
+    assert geocodigos[rutas.clave_geocodigo("av los alerces 123", "maipu")] == (-33.51, -70.75)
+    assert geocodigos[rutas.CLAVE_ORIGEN] == (-33.45, -70.65)
+    assert len(geocodigos) == 2
+    assert rutas.cargar_geocodigos(str(tmp_path / "no-existe.json")) == {}
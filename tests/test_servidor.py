@@ -0,0 +1,115 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import servidor
+from conftest import por_nombre
+from nucleo import RepartoStore
+
+
+@pytest.fixture
+def arrancar(store):
+    servidores = []
+
+    def arrancar(token=None, **opciones):
+        srv = servidor.ServidorReparto(store, host="127.0.0.1", puerto=0, token=token, geocodigos={})
+        srv.iniciar(**opciones)
+        servidores.append(srv)
+        return srv
+
+    yield arrancar
+    for srv in servidores:
+        srv.detener()
+
+
+def cliente_http(srv, token=None):
+    return servidor.ClienteReparto(puerto=srv.puerto, token=token)
+
+
+def test_token_obligatorio(store, arrancar):
+    srv = arrancar(token="abc123", escritor_propio=True)
+    ana = por_nombre(store, "Ana Pérez")
+    assert cliente_http(srv).entregar(ana["id"], 1)[0] == 401
+    assert cliente_http(srv, "otro").entregar(ana["id"], 1)[0] == 401
+    assert cliente_http(srv).solicitar("GET", "/salud?token=abc123")[0] == 200
+    estado, datos = cliente_http(srv, "abc123").entregar(ana["id"], 1)
+    assert (estado, datos["entregadas"]) == (200, 1)
+    assert ana["cajas_de_huevos"] == 4
+
+
+def test_token_generado():
+    tokens = {servidor.nuevo_token() for _ in range(20)}
+    assert len(tokens) == 20
+    assert servidor.es_local("127.0.0.1") and not servidor.es_local("0.0.0.0")
+
+
+def test_entregas_concurrentes_pasan_por_un_solo_escritor(store, arrancar):
+    srv = arrancar(escritor_propio=True)
+    bruno = por_nombre(store, "Bruno Díaz")
+
+    def entregar(_):
+        conexion = cliente_http(srv)
+        try:
+            return conexion.entregar(bruno["id"], 1)[1]["entregadas"]
+        finally:
+            conexion.cerrar()
+
+    with ThreadPoolExecutor(8) as pool:
+        entregadas = list(pool.map(entregar, range(12)))
+    assert sum(entregadas) == 5
+    assert bruno["cajas_de_huevos"] == 0
+    srv.detener()
+    assert por_nombre(RepartoStore.cargar(store.archivo), "Bruno Díaz")["cajas_de_huevos"] == 0
+
+
+def test_pago_y_errores(store, arrancar):
+    srv = arrancar(escritor_propio=True)
+    carla = por_nombre(store, "Carla Soto")
+    http = cliente_http(srv)
+    assert http.pagar(carla["id"], 4500, "Efectivo")[0] == 200
+    for monto in (math.nan, math.inf, "mucho", -5):
+        assert http.pagar(carla["id"], monto)[0] == 400
+    assert http.entregar("abcdef", 1)[0] == 404
+    assert http.solicitar("GET", "/clientes/abc/pago")[0] == 405
+    assert [m["monto"] for m in store.movimientos] == [4500]
+
+
+def test_escritor_sigue_tras_un_guardado_fallido(store, arrancar, monkeypatch, capsys):
+    guardar = store.guardar
+    intentos = []
+
+    def falla_una_vez():
+        intentos.append(1)
+        if len(intentos) == 1:
+            raise OSError(28, "No queda espacio")
+        guardar()
+
+    monkeypatch.setattr(store, "guardar", falla_una_vez)
+    monkeypatch.setattr(servidor, "INTERVALO_GUARDADO", 0)
+    srv = arrancar(escritor_propio=True)
+    diego = por_nombre(store, "Diego Rojas")
+    http = cliente_http(srv)
+    assert http.entregar(diego["id"], 1)[0] == 200
+    assert http.entregar(diego["id"], 1)[0] == 200
+    srv.detener()
+    assert len(intentos) >= 2
+    assert "se reintentará" in capsys.readouterr().err
+    assert por_nombre(RepartoStore.cargar(store.archivo), "Diego Rojas")["cajas_de_huevos"] == 3
+
+
+def test_atender_cola_devuelve_los_clientes_modificados(store):
+    srv = servidor.ServidorReparto(store, geocodigos={})
+    ana, carla = por_nombre(store, "Ana Pérez"), por_nombre(store, "Carla Soto")
+    futuros = [
+        srv.enviar(servidor.op_entrega, ({}, {"cantidad": 1}, ana["id"]), True),
+        srv.enviar(servidor.op_buscar, ({"q": "soto"}, {})),
+        srv.enviar(servidor.op_pago, ({}, {"monto": 1000}, carla["id"]), True),
+        srv.enviar(servidor.op_entrega, ({}, {"cantidad": 1}, "no-existe"), True),
+    ]
+    procesadas, modificados = srv.atender_cola()
+    assert (procesadas, modificados) == (4, {ana["id"], carla["id"]})
+    assert futuros[1].result()["clientes"][0]["id"] == carla["id"]
+    with pytest.raises(servidor.ErrorHttp):
+        futuros[3].result()
+    assert srv.atender_cola() == (0, set())
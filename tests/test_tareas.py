@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from tareas import GestorTareas
+
+
+class RaizFalsa:
+    # Reemplaza a Tk: guarda los after y el test los corre en este hilo
+    def __init__(self):
+        self.pendientes = []
+
+    def after(self, ms, funcion):
+        self.pendientes.append(funcion)
+
+    def atender(self, gestor, limite=5):
+        fin = time.monotonic() + limite
+        while gestor.ocupado() and time.monotonic() < fin:
+            while self.pendientes:
+                self.pendientes.pop(0)()
+            time.sleep(0.01)
+        while self.pendientes:
+            self.pendientes.pop(0)()
+
+
+@pytest.fixture
+def gestor():
+    raiz = RaizFalsa()
+    gestor = GestorTareas(raiz)
+    yield gestor
+    gestor.cerrar()
+
+
+def test_resultado_y_error_vuelven_al_hilo_principal(gestor):
+    principal = threading.get_ident()
+    vistos = []
+    cambios = []
+    gestor.al_cambiar = lambda activas: cambios.append(len(activas))
+
+    gestor.enviar("Sumar", lambda tarea, a, b: (threading.get_ident(), a + b), 2, 3,
+                  al_terminar=lambda r: vistos.append(("ok", r[0] != principal, r[1], threading.get_ident())))
+    gestor.enviar("Fallar", lambda tarea: 1 / 0,
+                  al_error=lambda e: vistos.append(("error", type(e).__name__, threading.get_ident())))
+    gestor.root.atender(gestor)
+
+    assert sorted(vistos) == [("error", "ZeroDivisionError", principal), ("ok", True, 5, principal)]
+    assert not gestor.ocupado()
+    assert cambios[0] == 1 and cambios[-1] == 0
+    assert gestor.root.pendientes == []
+
+
+def test_cancelar_y_avance(gestor):
+    empezar = threading.Event()
+    avances, canceladas = [], []
+
+    def trabajo(tarea):
+        tarea.reportar(0.5, "Mitad")
+        empezar.wait(5)
+        tarea.reportar(0.9)
+        return "no debería terminar"
+
+    tarea = gestor.enviar("Exportar", trabajo, al_progreso=lambda t: avances.append((t.avance, t.mensaje)),
+                          al_terminar=canceladas.append, al_cancelar=lambda: canceladas.append("cancelada"))
+    while not avances:
+        gestor.root.pendientes.pop(0)()
+        time.sleep(0.01)
+    assert avances == [(0.5, "Mitad")]
+    tarea.cancelar()
+    empezar.set()
+    gestor.root.atender(gestor)
+    assert canceladas == ["cancelada"]
+    assert tarea.terminada
+
+
+def test_no_cancelable_termina(gestor):
+    resultados = []
+    tarea = gestor.enviar("Guardar", lambda t: "guardado", al_terminar=resultados.append, cancelable=False)
+    tarea.cancelar()
+    gestor.root.atender(gestor)
+    assert resultados == ["guardado"]
@@ -0,0 +1,33 @@
+import texto
+from conftest import por_nombre
+
+
+def test_normalizar_quita_tildes_y_mayusculas():
+    assert texto.normalizar("Ñuñoa") == "nunoa"
+    assert texto.normalizar("ESTACIÓN Central") == "estacion central"
+    assert texto.normalizar("Maipu") == "maipu"
+    assert texto.normalizar("") == ""
+    assert texto.normalizar(None) == ""
+
+
+def test_cache_solo_para_textos_con_tildes():
+    texto.limpiar_cache()
+    assert texto.tasa_aciertos_cache() == "sin consultas"
+    texto.normalizar("San Miguel")
+    assert texto.tasa_aciertos_cache() == "sin consultas"
+    for _ in range(4):
+        texto.normalizar("Peñalolén")
+    assert texto.tasa_aciertos_cache().startswith("75.0% (1/")
+    texto.limpiar_cache()
+    assert texto.tasa_aciertos_cache() == "sin consultas"
+
+
+def test_busqueda_usa_claves_actualizadas(store):
+    assert store.buscar_clientes("PEREZ") == [por_nombre(store, "Ana Pérez")]
+    assert store.buscar_clientes("2222") == [por_nombre(store, "Bruno Díaz")]
+    carla = por_nombre(store, "Carla Soto")
+    # Un cambio que no pasa por actualizar_cliente (fusión, servidor)
+    carla["nombre_completo"] = "Carla Muñoz"
+    assert store.buscar_clientes("munoz") == [carla]
+    assert store.buscar_clientes("soto") == []
+    assert len(store.buscar_clientes("a", limite=2)) == 2
@@ -0,0 +1,69 @@
+import logging
+import time
+
+import pytest
+
+import vigilante
+
+
+class RaizFalsa:
+    def __init__(self):
+        self.pendientes = {}
+        self._ids = 0
+
+    def after(self, ms, funcion):
+        self._ids += 1
+        self.pendientes[self._ids] = funcion
+        return self._ids
+
+    def after_cancel(self, id_after):
+        self.pendientes.pop(id_after, None)
+
+    def latir(self):
+        for id_after in list(self.pendientes):
+            self.pendientes.pop(id_after)()
+
+
+class Lista(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.mensajes = []
+
+    def emit(self, record):
+        self.mensajes.append(record.getMessage())
+
+
+@pytest.fixture
+def mensajes():
+    manejador = Lista()
+    vigilante.registro.addHandler(manejador)
+    yield manejador.mensajes
+    vigilante.registro.removeHandler(manejador)
+
+
+def calculo_lento(segundos):
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        pass
+
+
+def test_registra_bloqueo_con_la_pila(mensajes):
+    raiz = RaizFalsa()
+    vigia = vigilante.VigilanteTk(raiz, umbral=0.1, intervalo=0.01, muestreo=0.01)
+    vigia.iniciar()
+    try:
+        for _ in range(5):
+            raiz.latir()
+            time.sleep(0.01)
+        assert vigia.bloqueos == 0
+        calculo_lento(0.4)
+        raiz.latir()
+        fin = time.monotonic() + 2
+        while not vigia.bloqueos and time.monotonic() < fin:
+            time.sleep(0.01)
+    finally:
+        vigia.detener()
+    assert vigia.bloqueos == 1
+    assert mensajes[0].startswith("Bloqueo de ")
+    assert "calculo_lento" in mensajes[0]
+    assert raiz.pendientes == {}
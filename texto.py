@@ -0,0 +1,41 @@
+import unicodedata
+from functools import lru_cache
+
+import rendimiento
+
+# ------------------ Normalización de texto ------------------
+
+# Nombres, teléfonos y comunas se repiten mucho: los textos con tildes se
+# recuerdan en una caché LRU acotada y los ASCII no pasan por unicodedata.
+CAPACIDAD_CACHE = 65536
+
+
+def _normalizar_unicode(texto):
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', texto.lower())
+        if unicodedata.category(c) != 'Mn'
+    )
+
+
+_normalizar_cacheado = lru_cache(maxsize=CAPACIDAD_CACHE)(_normalizar_unicode)
+
+
+def normalizar(texto):
+    if not texto:
+        return ""
+    if texto.isascii():
+        return texto.lower()
+    return _normalizar_cacheado(texto)
+
+
+def tasa_aciertos_cache():
+    info = _normalizar_cacheado.cache_info()
+    consultas = info.hits + info.misses
+    return f"{info.hits / consultas:.1%} ({info.currsize}/{info.maxsize})" if consultas else "sin consultas"
+
+
+def limpiar_cache():
+    _normalizar_cacheado.cache_clear()
+
+
+rendimiento.registrar_indicador("Aciertos caché de normalizar", tasa_aciertos_cache)
@@ -0,0 +1,133 @@
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+import rendimiento
+
+# Vigilante del bucle de eventos de Tk. Un latido con root.after marca cada
+# vuelta del bucle; un hilo aparte revisa el último latido y, si el bucle
+# lleva más de `umbral` segundos sin responder, toma muestras de la pila del
+# hilo principal (sys._current_frames) hasta que se libera. Cada bloqueo se
+# registra en bloqueos.log con su duración y la pila más frecuente.
+
+ARCHIVO_LOG = "bloqueos.log"
+VARIABLE_ENTORNO = "CONTROL_REPARTO_VIGILANTE"  # "0" lo desactiva; otro número es el umbral en ms
+UMBRAL_POR_DEFECTO = 0.5
+INTERVALO_LATIDO = 0.05
+INTERVALO_MUESTREO = 0.02
+MAX_PROFUNDIDAD = 40
+
+registro = logging.getLogger("control_reparto.bloqueos")
+
+
+def configurar_log(archivo=ARCHIVO_LOG):
+    if not registro.handlers:
+        manejador = logging.FileHandler(archivo, encoding="utf-8")
+        manejador.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        registro.addHandler(manejador)
+        registro.setLevel(logging.INFO)
+        registro.propagate = False
+    return registro
+
+
+class VigilanteTk:
+    def __init__(self, root, umbral=UMBRAL_POR_DEFECTO, intervalo=INTERVALO_LATIDO, muestreo=INTERVALO_MUESTREO):
+        self.root = root
+        self.umbral = umbral
+        self.intervalo = intervalo
+        self.muestreo = muestreo
+        self.bloqueos = 0
+        self._hilo_principal = threading.get_ident()
+        self._ultimo_latido = time.monotonic()
+        self._id_after = None
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+        self._ultimo_latido = time.monotonic()
+        self._latido()
+        self._hilo = threading.Thread(target=self._vigilar, name="vigilante-tk", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._id_after is not None:
+            try:
+                self.root.after_cancel(self._id_after)
+            except Exception:
+                pass
+            self._id_after = None
+        if self._hilo is not None:
+            self._hilo.join(timeout=1)
+            self._hilo = None
+
+    def _latido(self):
+        ahora = time.monotonic()
+        # Retraso del latido respecto de lo programado = latencia del bucle
+        if rendimiento.activo():
+            rendimiento.registrar("Latencia del bucle de Tk", max(0.0, ahora - self._ultimo_latido - self.intervalo))
+        self._ultimo_latido = ahora
+        if not self._detener.is_set():
+            self._id_after = self.root.after(int(self.intervalo * 1000), self._latido)
+
+    def _pila_principal(self):
+        frame = sys._current_frames().get(self._hilo_principal)
+        if frame is None:
+            return None
+        return tuple(
+            (os.path.basename(f.filename), f.lineno, f.name, (f.line or "").strip())
+            for f in traceback.extract_stack(frame, limit=MAX_PROFUNDIDAD)
+        )
+
+    def _vigilar(self):
+        while not self._detener.wait(self.muestreo):
+            latido = self._ultimo_latido
+            if time.monotonic() - latido < self.umbral:
+                continue
+            # Bloqueo en curso: muestrear hasta que vuelva el latido
+            muestras = Counter()
+            primera = None
+            while self._ultimo_latido == latido and not self._detener.is_set():
+                pila = self._pila_principal()
+                if pila:
+                    muestras[pila] += 1
+                    primera = primera or pila
+                time.sleep(self.muestreo)
+            duracion = time.monotonic() - latido
+            self._reportar(duracion, muestras, primera)
+
+    def _reportar(self, duracion, muestras, primera):
+        self.bloqueos += 1
+        rendimiento.registrar("Bloqueo del hilo de Tk", duracion)
+        total = sum(muestras.values())
+        lineas = [f"Bloqueo de {duracion * 1000:.0f} ms en el hilo de Tk ({total} muestras)"]
+        if muestras:
+            pila, veces = muestras.most_common(1)[0]
+            lineas.append(f"  Pila más frecuente ({veces}/{total}):")
+            lineas.extend(f"    {archivo}:{linea} en {funcion}: {codigo}" for archivo, linea, funcion, codigo in pila)
+            if primera != pila:
+                lineas.append("  Primera pila observada:")
+                lineas.extend(f"    {archivo}:{linea} en {funcion}: {codigo}" for archivo, linea, funcion, codigo in primera)
+        registro.warning("\n".join(lineas))
+
+
+def iniciar_desde_entorno(root):
+    valor = os.environ.get(VARIABLE_ENTORNO, "").strip()
+    if valor == "0":
+        return None
+    try:
+        umbral = int(valor) / 1000 if valor else UMBRAL_POR_DEFECTO
+    except ValueError:
+        umbral = UMBRAL_POR_DEFECTO
+    configurar_log()
+    vigilante = VigilanteTk(root, umbral=umbral)
+    vigilante.iniciar()
+    rendimiento.registrar_indicador("Bloqueos del hilo de Tk", lambda: vigilante.bloqueos)
+    return vigilante